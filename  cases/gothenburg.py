@@ -3,15 +3,21 @@ Generates algorithmically cleaned primal network and runs centralities
 """
 
 # %%
+import logging
+from pathlib import Path
+
 import geopandas as gpd
-import osmnx as ox
 from cityseer import metrics
-from cityseer.tools import graphs, io
-from pyproj import Transformer
-from shapely import geometry, to_wkt
+from cityseer.tools import io
+
+from src import boundaries, cache, dual, incremental, outputs, primal
 
+logging.basicConfig(level=logging.INFO)
+
+# cache OSM downloads so that reruns for the same extents are not refetched
+osm_cache = cache.OSMCache()
 # fetch using relation id
-gothenburg_extents_gdf = ox.geocode_to_gdf("R935611", by_osmid=True)
+gothenburg_extents_gdf = osm_cache.geocode_to_gdf("R935611", by_osmid=True)
 # take convex hull
 gothenburg_extents_gdf.geometry = gothenburg_extents_gdf.geometry.convex_hull
 # save for QGIS
@@ -20,21 +26,15 @@ gothenburg_extents_gdf.to_file(f"../temp/gothenburg_boundary.gpkg")
 # %%
 # read the extents file (in case edited from QGIS)
 extents_gpd = gpd.read_file(f"../temp/gothenburg_boundary.gpkg")
-# fetch geom
-extents_geom_wgs = extents_gpd.iloc[0].geometry
-# transform to 3007
-transformer = Transformer.from_crs("EPSG:4326", "EPSG:3007", always_xy=True)
-extents_geom = geometry.Polygon(
-    [transformer.transform(x, y) for x, y in extents_geom_wgs.exterior.coords]
+# transform to 3007, take convex hull, then buffer by 20km, and simplify by 100m
+# with a separate 10km buffered version for edge effects
+extents_geom, extents_geom_buff = boundaries.prepare_extents(
+    extents_gpd, buffer_dist=10000, live_buffer_dist=20000, to_crs=3007
 )
-# take convex hull, then buffer by 20km, and simplify by 100m
-extents_geom = extents_geom.convex_hull.buffer(20000).simplify(100)
-# a separate 10km buffered version for edge effects
-extents_geom_buff = extents_geom.buffer(10000)
 
 # %%
 # fetch and automatically clean
-G_clean = io.osm_graph_from_poly(
+G_clean = osm_cache.osm_graph_from_poly(
     extents_geom_buff,
     poly_crs_code=3007,
     to_crs_code=3007,
@@ -52,43 +52,53 @@ edges_gdf_primal.to_file(f"../temp/gothenburg_osm_network_cleaned.gpkg")
 # %%
 # reopen in case edited in QGIS
 edges_gdf_qgis = gpd.read_file(f"../temp/gothenburg_osm_network_cleaned.gpkg")
-G_qgis = io.nx_from_generic_geopandas(edges_gdf_qgis)
-# mark nodes inside original unbuffered extents as "live"
-for nd_key, nd_data in G_clean.nodes(data=True):
-    if extents_geom.contains(geometry.Point(nd_data["x"], nd_data["y"])):
-        G_clean.nodes[nd_key]["live"] = True
-    else:
-        G_clean.nodes[nd_key]["live"] = False
-# prepare data structures
-nodes_gdf, edges_gdf, network_structure = io.network_structure_from_nx(G_qgis, crs=3007)
+primal_qgis = primal.primal_edges(edges_gdf_qgis)
+# prepare data structures, with nodes inside original unbuffered extents marked as "live"
+nodes_gdf, edges_gdf, network_structure = primal.network_structure_from_primal(
+    primal_qgis, crs=3007, boundary_geom=extents_geom
+)
 
 # %%
 # compute centralities
-metrics.networks.node_centrality_shortest(
-    network_structure, nodes_gdf, distances=[500, 1000, 2000, 5000, 10000]
-)
-nodes_gdf.to_file(f"../temp/gothenburg_osm_nodes.gpkg")
+distances = [500, 1000, 2000, 5000, 10000]
+nodes_path = "../temp/gothenburg_osm_nodes.gpkg"
+# copy of the edges as of the last computation
+# after editing in QGIS, only the nodes within the largest distance of edited edges are recomputed
+computed_edges_path = "../temp/gothenburg_osm_network_computed.parquet"
+if Path(computed_edges_path).exists() and Path(nodes_path).exists():
+    prev_edges_gdf = outputs.read_geoparquet(computed_edges_path)
+    changed_geoms = incremental.changed_geometries(
+        prev_edges_gdf.geometry, edges_gdf_qgis.geometry
+    )
+    nodes_gdf = incremental.incremental_node_centrality(
+        network_structure,
+        nodes_gdf,
+        gpd.read_file(nodes_path),
+        changed_geoms,
+        distances=distances,
+    )
+else:
+    metrics.networks.node_centrality_shortest(
+        network_structure, nodes_gdf, distances=distances
+    )
+nodes_gdf.to_file(nodes_path)
 edges_gdf.to_file(f"../temp/gothenburg_osm_edges.gpkg")
+outputs.write_geoparquet(
+    edges_gdf_qgis[[edges_gdf_qgis.geometry.name]], computed_edges_path
+)
 
 # %%
 # generate vis lines for nodes - view in QGIS as "edge_geom"
-G_qgis = graphs.nx_generate_vis_lines(G_qgis)
-
-
-def generate_vis_lines(node_row):
-    return G_qgis.nodes[node_row.name]["line_geom"]
-
-
-def geom_to_wkt(node_row):
-    return to_wkt(node_row["geom"])
-
-
-nodes_gdf["edge_geom"] = nodes_gdf.apply(generate_vis_lines, axis=1)
-nodes_gdf["node_geom_wkt"] = nodes_gdf.apply(geom_to_wkt, axis=1)
-nodes_gdf = nodes_gdf.drop(columns=["geom"])
-nodes_gdf = nodes_gdf.set_geometry("edge_geom")
-nodes_gdf = nodes_gdf.set_crs(3007)
+# the half edges are built from the edge arrays, in the order of the nodes
+nodes_gdf = outputs.nodes_as_lines(
+    nodes_gdf, dual.vis_lines(primal_qgis), point_col="node_geom_wkt"
+)
 
 # %%
 # save to GPKG
-nodes_gdf.to_file(f"../temp/gothenburg_osm_nodes_as_edges.gpkg")
+# the node points are written as WKT
+outputs.write_gpkg(nodes_gdf, f"../temp/gothenburg_osm_nodes_as_edges.gpkg")
+
+# %%
+# report OSM cache hits and misses
+osm_cache.report()
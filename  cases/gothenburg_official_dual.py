@@ -3,31 +3,30 @@ runs centralities on official network
 """
 
 # %%
-import geopandas as gpd
+import logging
+
 from cityseer import metrics
-from cityseer.tools import graphs, io
-from shapely import geometry, ops
+
+from src import dual, primal, readers
+
+logging.basicConfig(level=logging.INFO)
 
 # reopen in case edited in QGIS
-edges_gdf = gpd.read_file(f"../temp/GOT_NMS_Revised_231115/GOT_NMS_Network_231115.shp")
-# Union all geometries in the GeoDataFrame
-extents_geom_buff = ops.unary_union(edges_gdf["geometry"]).convex_hull
+# only the geometries are used, so skip reading the attribute columns
+edges_gdf = readers.read_layer(
+    f"../temp/GOT_NMS_Revised_231115/GOT_NMS_Network_231115.shp", columns=[]
+)
+# convex hull of the edge vertices - same as the hull of a union without noding the edges
+extents_geom_buff = readers.vertex_hull(edges_gdf.geometry)
 # a reverse buffer 10km for edge effects
 extents_geom = extents_geom_buff.buffer(-10000)
-# convert edges GDF to networkx
-G_official = io.nx_from_generic_geopandas(edges_gdf)
-# makes sure nodes are properly connected
-G_official = graphs.nx_consolidate_nodes(G_official, 2)
-# cast to dual
-G_dual = graphs.nx_to_dual(G_official)
-# mark nodes inside original unbuffered extents as "live"
-for nd_key, nd_data in G_dual.nodes(data=True):
-    if extents_geom.contains(geometry.Point(nd_data["x"], nd_data["y"])):
-        G_dual.nodes[nd_key]["live"] = True
-    else:
-        G_dual.nodes[nd_key]["live"] = False
-# prepare data structures
-nodes_gdf, edges_gdf, network_structure = io.network_structure_from_nx(G_dual, crs=3007)
+# prepare the primal edges, snapping endpoints that miss each other by up to 2m so that nodes are connected
+primal_official = primal.primal_edges(edges_gdf, snap_dist=2)
+# prepare the dual data structures directly from the primal edges
+# dual nodes inside original unbuffered extents are marked as "live"
+nodes_gdf, edges_gdf, network_structure = dual.network_structure_dual(
+    primal_official, crs=3007, boundary_geom=extents_geom
+)
 # compute centralities
 metrics.networks.node_centrality_shortest(
     network_structure, nodes_gdf, distances=[500, 1000, 2000, 5000, 10000]
@@ -3,32 +3,33 @@ runs centralities on official network
 """
 
 # %%
-import geopandas as gpd
+import logging
+
 from cityseer import metrics
 from cityseer.tools import graphs, io
-from shapely import geometry, ops, to_wkt
+
+from src import dual, outputs, primal, readers, util
+
+logging.basicConfig(level=logging.INFO)
 
 # reopen in case edited in QGIS
-edges_gdf = gpd.read_file(f"../temp/GOT_NMS_Revised_231115/GOT_NMS_Network_231115.shp")
-# Union all geometries in the GeoDataFrame
-extents_geom_buff = ops.unary_union(edges_gdf["geometry"]).convex_hull
+# only the geometries are used, so skip reading the attribute columns
+edges_gdf = readers.read_layer(
+    f"../temp/GOT_NMS_Revised_231115/GOT_NMS_Network_231115.shp", columns=[]
+)
+# convex hull of the edge vertices - same as the hull of a union without noding the edges
+extents_geom_buff = readers.vertex_hull(edges_gdf.geometry)
 # a reverse buffer 10km for edge effects
 extents_geom = extents_geom_buff.buffer(-10000)
-# convert edges GDF to networkx
-G_official = io.nx_from_generic_geopandas(edges_gdf)
-# makes sure nodes are properly connected
-G_official = graphs.nx_consolidate_nodes(G_official, 2)
+# build the network directly from the edges, snapping endpoints that miss each other by up to 2m
+primal_official = primal.primal_edges(edges_gdf, snap_dist=2)
+# the networkx graph is only needed for the decomposed option
+G_official = primal.nx_from_primal(primal_official)
 
 # %%
-# mark nodes inside original unbuffered extents as "live"
-for nd_key, nd_data in G_official.nodes(data=True):
-    if extents_geom.contains(geometry.Point(nd_data["x"], nd_data["y"])):
-        G_official.nodes[nd_key]["live"] = True
-    else:
-        G_official.nodes[nd_key]["live"] = False
-# prepare data structures
-nodes_gdf, edges_gdf, network_structure = io.network_structure_from_nx(
-    G_official, crs=3007
+# prepare data structures, with nodes inside original unbuffered extents marked as "live"
+nodes_gdf, edges_gdf, network_structure = primal.network_structure_from_primal(
+    primal_official, crs=3007, boundary_geom=extents_geom
 )
 # compute centralities
 metrics.networks.node_centrality_shortest(
@@ -40,34 +41,18 @@ edges_gdf.to_file(f"../temp/gothenburg_official_edges.gpkg")
 
 # %%
 # generate vis lines for nodes - view in QGIS as "edge_geom"
-G_qgis = graphs.nx_generate_vis_lines(G_official)
-
-
-def generate_vis_lines(node_row):
-    return G_qgis.nodes[node_row.name]["line_geom"]
-
-
-def geom_to_wkt(node_row):
-    return to_wkt(node_row["geom"])
-
-
-nodes_gdf["edge_geom"] = nodes_gdf.apply(generate_vis_lines, axis=1)
-nodes_gdf["node_geom_wkt"] = nodes_gdf.apply(geom_to_wkt, axis=1)
-nodes_gdf = nodes_gdf.drop(columns=["geom"])
-nodes_gdf = nodes_gdf.set_geometry("edge_geom")
-nodes_gdf = nodes_gdf.set_crs(3007)
-
-nodes_gdf.to_file(f"../temp/gothenburg_official_nodes_as_edges.gpkg")
+# the half edges are built from the edge arrays, in the order of the nodes
+nodes_gdf = outputs.nodes_as_lines(
+    nodes_gdf, dual.vis_lines(primal_official), point_col="node_geom_wkt"
+)
+# the node points are written as WKT
+outputs.write_gpkg(nodes_gdf, f"../temp/gothenburg_official_nodes_as_edges.gpkg")
 
 # %%
 # DECOMPOSED OPTION
 G_decomposed = graphs.nx_decompose(G_official, 20)
 # mark nodes inside original unbuffered extents as "live"
-for nd_key, nd_data in G_decomposed.nodes(data=True):
-    if extents_geom.contains(geometry.Point(nd_data["x"], nd_data["y"])):
-        G_decomposed.nodes[nd_key]["live"] = True
-    else:
-        G_decomposed.nodes[nd_key]["live"] = False
+G_decomposed = util.mark_live_nodes(G_decomposed, extents_geom)
 # prepare data structures
 (
     nodes_gdf_decomp,
@@ -0,0 +1,102 @@
+"""
+Compares sampled centrality estimates against exact centralities on a synthetic city to show the accuracy and speed
+trade-off of src.sampling.
+
+The synthetic city is a jittered grid with a dense centre and a sparser periphery. Run from the repository root:
+python -m benchmarks.approximate_centrality
+
+Pass --side for the number of grid nodes per side, --distances and --exact-max-distance to set which distances are
+sampled, and --fractions for the sample fractions to compare. For each sampled metric the script reports the median
+relative error of the estimates against the exact values, and the share of nodes where the actual error falls within
+two of the reported standard errors, which should be about 95%. On small networks the sampled run can be slower
+than the exact run, as each replicate takes at least a second.
+"""
+
+import argparse
+import logging
+import time
+
+import numpy as np
+from cityseer.metrics import networks
+from cityseer.tools import graphs, io
+
+from src import sampling, synthetic
+
+
+def run(
+    side: int,
+    distances: list[int],
+    exact_max_distance: int,
+    fractions: list[float],
+    simplest: bool = False,
+):
+    """Times the exact and sampled computations and summarises the errors of the sampled metrics"""
+    G = synthetic.city_graph(side)
+    G_dual = graphs.nx_to_dual(G)
+    nodes_gdf, _edges_gdf, network_structure = io.network_structure_from_nx(
+        G_dual, crs=3857
+    )
+    print(f"{network_structure.node_count()} dual nodes, distances {distances}")
+    centrality_func = (
+        networks.node_centrality_simplest
+        if simplest
+        else networks.node_centrality_shortest
+    )
+    start = time.perf_counter()
+    exact_gdf = centrality_func(
+        network_structure, nodes_gdf.copy(), distances=distances
+    )
+    exact_s = time.perf_counter() - start
+    print(f"exact: {exact_s:.2f}s")
+    for fraction in fractions:
+        start = time.perf_counter()
+        approx_gdf = sampling.approximate_node_centrality(
+            network_structure,
+            nodes_gdf,
+            distances=distances,
+            exact_max_distance=exact_max_distance,
+            sample_fraction=fraction,
+            shortest=not simplest,
+            simplest=simplest,
+        )
+        approx_s = time.perf_counter() - start
+        print(
+            f"sample fraction {fraction}: {approx_s:.2f}s ({exact_s / approx_s:.1f}x speed-up)"
+        )
+        for col in [col for col in exact_gdf.columns if col.startswith("cc_")]:
+            if not int(col.split("_")[-1 if not simplest else -2]) > exact_max_distance:
+                continue
+            exact_vals = exact_gdf[col].to_numpy(dtype=np.float64)
+            approx_vals = approx_gdf[col].to_numpy(dtype=np.float64)
+            err_vals = approx_gdf[f"{col}_err"].to_numpy(dtype=np.float64)
+            nonzero = exact_vals > 0
+            rel_error = np.median(
+                np.abs(approx_vals[nonzero] - exact_vals[nonzero]) / exact_vals[nonzero]
+            )
+            covered = np.mean(
+                np.abs(approx_vals[nonzero] - exact_vals[nonzero])
+                <= 2 * err_vals[nonzero] + 1e-9
+            )
+            print(
+                f"{col:>32}: median relative error {rel_error:.3f}, within 2 std errors {covered:.0%}"
+            )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--side", type=int, default=60)
+    parser.add_argument(
+        "--distances", type=int, nargs="+", default=[500, 1000, 2500, 5000]
+    )
+    parser.add_argument("--exact-max-distance", type=int, default=1000)
+    parser.add_argument("--fractions", type=float, nargs="+", default=[0.05, 0.1, 0.2])
+    parser.add_argument("--simplest", action="store_true")
+    args = parser.parse_args()
+    run(
+        args.side,
+        args.distances,
+        args.exact_max_distance,
+        args.fractions,
+        args.simplest,
+    )
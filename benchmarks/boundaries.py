@@ -0,0 +1,114 @@
+"""
+Compares the per-coordinate boundary reprojection used by the workflows against src.boundaries.
+
+The workflows built a Polygon from a list comprehension transforming one exterior coordinate at a time with a new
+Transformer, which drops interior rings and only supports single Polygons, then applied the hull, simplify, and buffer
+steps. This script times that approach on the largest part of a detailed boundary against boundaries.prepare_extents
+on the whole boundary, and reports the parts and holes dropped by the per-coordinate approach.
+
+By default a synthetic WGS84 island boundary the size of Cyprus is used, with offshore islands and lakes. Pass --bounds
+for a boundary file instead, e.g. the combined Cyprus geocode written by workflows/download_extent.py. Run from the
+repository root, e.g. python -m benchmarks.boundaries --vertices 500000
+"""
+
+import argparse
+import logging
+import time
+
+import geopandas as gpd
+import shapely
+from pyproj import Transformer
+from shapely import geometry
+
+from src import boundaries, synthetic
+
+# the origin of the synthetic boundary and the working CRS, as for Cyprus
+ORIGIN = (33.2, 35.1)
+WORKING_CRS = 6312
+
+
+def synthetic_bounds(vertex_count: int) -> gpd.GeoDataFrame:
+    coast = synthetic.coastline(vertex_count)
+    local_crs = f"+proj=tmerc +lat_0={ORIGIN[1]} +lon_0={ORIGIN[0]} +k=1 +x_0=0 +y_0=0 +ellps=WGS84"
+    return gpd.GeoDataFrame(
+        geometry=[boundaries.project_geom(coast, local_crs, 4326)], crs=4326
+    )
+
+
+def per_coordinate_extents(
+    extents_geom_wgs: geometry.Polygon, buffer_dist: float
+) -> tuple[geometry.Polygon, geometry.Polygon]:
+    """The approach previously copied between the workflows"""
+    transformer = Transformer.from_crs(
+        "EPSG:4326", f"EPSG:{WORKING_CRS}", always_xy=True
+    )
+    extents_geom = geometry.Polygon(
+        [transformer.transform(x, y) for x, y in extents_geom_wgs.exterior.coords]
+    )
+    extents_geom = extents_geom.convex_hull.simplify(100)
+    return extents_geom, extents_geom.buffer(buffer_dist)
+
+
+def run(bounds_gdf: gpd.GeoDataFrame, buffer_dist: float):
+    bounds_gdf = bounds_gdf.to_crs(4326)
+    bounds_geom = boundaries.boundary_geom(bounds_gdf)
+    parts = shapely.get_parts(bounds_geom)
+    largest_part = parts[shapely.area(parts).argmax()]
+    print(
+        f"{shapely.get_num_coordinates(bounds_geom)} vertices in {len(parts)} parts with "
+        f"{int(shapely.get_num_interior_rings(parts).sum())} holes"
+    )
+    start = time.perf_counter()
+    old_live, old_buffered = per_coordinate_extents(largest_part, buffer_dist)
+    old_s = time.perf_counter() - start
+    # the first call creates the transformer, later calls reuse it
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        new_live, new_buffered = boundaries.prepare_extents(
+            bounds_gdf, buffer_dist, to_crs=WORKING_CRS
+        )
+        timings.append(time.perf_counter() - start)
+    print(
+        f"per coordinate: {old_s:.2f}s, vectorised: {timings[0]:.2f}s, "
+        f"with a cached transformer: {timings[1]:.2f}s"
+    )
+    # compare the live extents for the largest part only, as the per-coordinate approach drops the other parts
+    part_live, _ = boundaries.prepare_extents(
+        largest_part, buffer_dist, from_crs=4326, to_crs=WORKING_CRS
+    )
+    print(
+        f"largest part live extents differ by {old_live.symmetric_difference(part_live).area:.3f}m2 "
+        f"of {part_live.area / 1000**2:.1f}km2"
+    )
+    missed = new_live.difference(old_live).area / 1000**2
+    print(
+        f"the per-coordinate live extents miss {missed:.1f}km2 of the hull of all parts, "
+        f"buffered extents {old_buffered.area / 1000**2:.1f}km2 against {new_buffered.area / 1000**2:.1f}km2"
+    )
+    # without the hull, the boundary's own shape keeps its holes and parts
+    start = time.perf_counter()
+    projected = boundaries.boundary_geom(bounds_gdf, to_crs=WORKING_CRS)
+    project_s = time.perf_counter() - start
+    projected_parts = shapely.get_parts(projected)
+    print(
+        f"projected the full boundary in {project_s:.2f}s, keeping {len(projected_parts)} parts and "
+        f"{int(shapely.get_num_interior_rings(projected_parts).sum())} holes, "
+        f"area {projected.area / 1000**2:.1f}km2 against {bounds_gdf.to_crs(WORKING_CRS).area.sum() / 1000**2:.1f}km2"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--bounds", help="A boundary file, e.g. ../temp/cyprus_boundary.gpkg"
+    )
+    parser.add_argument("--vertices", type=int, default=500000)
+    parser.add_argument("--buffer-dist", type=float, default=10000)
+    args = parser.parse_args()
+    if args.bounds is not None:
+        bounds_gdf = gpd.read_file(args.bounds)
+    else:
+        bounds_gdf = synthetic_bounds(args.vertices)
+    run(bounds_gdf, args.buffer_dist)
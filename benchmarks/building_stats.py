@@ -0,0 +1,102 @@
+"""
+Compares per-column cityseer statistics against the single traversal aggregation in src.aggregation.
+
+Synthetic buildings with morphometrics from src.morphometrics are placed along a synthetic city's street network. Their
+morphometrics are aggregated onto the network nodes by calling layers.compute_stats once per column, and by
+aggregation.compute_stats for all columns at once, first with an empty and then with a warm assignment cache. The
+script fails unless the live nodes' statistics match within float32 tolerance. Run from the repository root, e.g.
+
+    python -m benchmarks.building_stats --side 60 --buildings 30000 --distances 200 500 1000
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+import warnings
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from cityseer.metrics import layers
+from cityseer.tools import io
+
+from src import aggregation, morphometrics, synthetic
+
+
+def run(side: int, building_count: int, distances: list[int], seed: int = 0):
+    G = synthetic.city_graph(side, seed=seed)
+    nodes_gdf, edges_gdf, network_structure = io.network_structure_from_nx(
+        G, crs=synthetic.SYNTHETIC_CRS
+    )
+    edges_gdf = gpd.GeoDataFrame(
+        geometry=edges_gdf.geometry.values, crs=synthetic.SYNTHETIC_CRS
+    )
+    bldgs_gdf = synthetic.buildings_gdf(
+        edges_gdf, building_count, terrace_fraction=0.3, seed=seed
+    )
+    bldgs_gdf = morphometrics.compute_morphometrics(bldgs_gdf)
+    points_gdf = aggregation.building_points(bldgs_gdf, aggregation.STATS_COLUMNS)
+    print(
+        f"{len(nodes_gdf)} nodes, {len(points_gdf)} buildings, "
+        f"{len(aggregation.STATS_COLUMNS)} columns, distances {distances}"
+    )
+    start = time.perf_counter()
+    cityseer_gdf = nodes_gdf.copy()
+    # cityseer adds the columns one at a time
+    warnings.simplefilter("ignore", pd.errors.PerformanceWarning)
+    for col in aggregation.STATS_COLUMNS:
+        cityseer_gdf, _ = layers.compute_stats(
+            points_gdf.copy(),
+            col,
+            cityseer_gdf,
+            network_structure,
+            distances=distances,
+        )
+    print(f"layers.compute_stats per column: {time.perf_counter() - start:.2f}s")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for label in ["empty cache", "warm cache"]:
+            start = time.perf_counter()
+            stats_gdf = aggregation.compute_stats(
+                points_gdf,
+                aggregation.STATS_COLUMNS,
+                nodes_gdf,
+                network_structure,
+                distances=distances,
+                cache_dir=cache_dir,
+            )
+            print(
+                f"aggregation.compute_stats, {label}: {time.perf_counter() - start:.2f}s"
+            )
+    stats_cols = [col for col in cityseer_gdf.columns if col.startswith("cc_")]
+    if sorted(stats_cols) != sorted(
+        col for col in stats_gdf.columns if col.startswith("cc_")
+    ):
+        raise ValueError("The stats columns differ.")
+    live = nodes_gdf["live"].to_numpy()
+    worst = 0.0
+    for col in stats_cols:
+        expected = cityseer_gdf[col].to_numpy()[live]
+        actual = stats_gdf[col].to_numpy()[live]
+        # cityseer leaves the max and min of nodes without buildings at -inf and inf
+        expected = np.where(np.isinf(expected), np.nan, expected)
+        if not np.allclose(actual, expected, rtol=1e-4, atol=1e-3, equal_nan=True):
+            raise ValueError(f"{col} differs from layers.compute_stats.")
+        # relative to values of at least one, as variances of near identical values are only float32 noise
+        large = np.abs(expected) >= 1
+        rel = np.abs(actual[large] - expected[large]) / np.abs(expected[large])
+        worst = max(worst, float(rel.max(initial=0)))
+    print(
+        f"{len(stats_cols)} stats columns match, largest relative difference {worst:.2e}"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--side", type=int, default=60)
+    parser.add_argument("--buildings", type=int, default=30000)
+    parser.add_argument("--distances", type=int, nargs="+", default=[200, 500, 1000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.side, args.buildings, args.distances, args.seed)
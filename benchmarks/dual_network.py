@@ -0,0 +1,187 @@
+"""
+Compares graphs.nx_to_dual and io.network_structure_from_nx against the array-based dual in src.dual.
+
+A synthetic network is loaded to a networkX graph as for the download workflows, and some of its edges are given
+reversed geoms, bent parallel edges, and self-loops, as found in raw OSM networks. Its nodes are marked live within the
+middle of its extents. The dual is built with graphs.nx_to_dual and io.network_structure_from_nx, and with
+primal.primal_from_nx and dual.network_structure_dual. The script fails unless the dual nodes tables, the directed dual
+edges tables, and the shortest and simplest path closeness centralities are identical. Run from the repository root, e.g.
+
+    python -m benchmarks.dual_network --layouts grid organic --edges 100000
+"""
+
+import argparse
+import logging
+
+import networkx as nx
+import numpy as np
+import shapely
+from cityseer import config
+from cityseer.metrics import networks
+from cityseer.tools import graphs, io
+from shapely import geometry
+
+from src import dual, primal, profiling, synthetic, util
+
+
+def with_irregular_edges(G: nx.MultiGraph, fraction: float, seed: int) -> nx.MultiGraph:
+    """Reverses the geoms of a fraction of the edges, bends a parallel edge next to others, and adds self-loops"""
+    rng = np.random.default_rng(seed)
+    for start, end, key, geom in list(G.edges(keys=True, data="geom")):
+        draw = rng.random()
+        if draw < fraction:
+            G[start][end][key]["geom"] = geom.reverse()
+        elif draw < 2 * fraction:
+            # a parallel edge via a vertex a third of the way along and 20m to the side
+            (x_a, y_a), (x_b, y_b) = geom.coords[0], geom.coords[-1]
+            length = np.hypot(x_b - x_a, y_b - y_a)
+            bend = (
+                x_a + (x_b - x_a) / 3 - (y_b - y_a) / length * 20,
+                y_a + (y_b - y_a) / 3 + (x_b - x_a) / length * 20,
+            )
+            G.add_edge(
+                start, end, geom=geometry.LineString([(x_a, y_a), bend, (x_b, y_b)])
+            )
+    node_keys = list(G.nodes)
+    loop_count = int(len(node_keys) * fraction)
+    for node_idx in rng.choice(len(node_keys), loop_count, replace=False).tolist():
+        node_key = node_keys[node_idx]
+        x, y = G.nodes[node_key]["x"], G.nodes[node_key]["y"]
+        loop = [(x, y), (x + 30, y), (x + 30, y + 40), (x, y + 30), (x, y)]
+        G.add_edge(node_key, node_key, geom=geometry.LineString(loop))
+    return G
+
+
+def measure(func, *args, **kwargs):
+    """Returns the result, the seconds taken, and the growth of the sampled peak RSS in MB"""
+    with profiling.RunProfiler("dual_network", trace_memory=False) as profiler:
+        with profiling.stage("measure"):
+            result = func(*args, **kwargs)
+    stage = profiler.stages[0]
+    return result, stage["wall_s"], stage["peak_rss_mb"] - stage["rss_start_mb"]
+
+
+def nx_route(G: nx.MultiGraph, crs: int):
+    G_dual = graphs.nx_to_dual(G)
+    return io.network_structure_from_nx(G_dual, crs=crs)
+
+
+def array_route(G: nx.MultiGraph, crs: int):
+    return dual.network_structure_dual(primal.primal_from_nx(G), crs=crs)
+
+
+def compare_nodes(nodes_gdf, a_nodes_gdf):
+    """Fails unless the dual nodes, in their order and with their primal edge geoms, match"""
+    if list(nodes_gdf.columns) != list(a_nodes_gdf.columns):
+        raise ValueError("The dual node columns differ.")
+    if not nodes_gdf.index.equals(a_nodes_gdf.index):
+        raise ValueError("The dual node keys differ.")
+    for col in nodes_gdf.columns.drop(nodes_gdf.geometry.name):
+        if not (nodes_gdf[col].to_numpy() == a_nodes_gdf[col].to_numpy()).all():
+            raise ValueError(f"The dual node {col} values differ.")
+    if not (
+        shapely.to_wkb(nodes_gdf.geometry.values)
+        == shapely.to_wkb(a_nodes_gdf.geometry.values)
+    ).all():
+        raise ValueError("The primal edge geoms differ.")
+
+
+def compare_edges(edges_gdf, a_edges_gdf):
+    """Fails unless the directed dual edges, in their order and with their welded geoms, match"""
+    if list(edges_gdf.columns) != list(a_edges_gdf.columns):
+        raise ValueError("The dual edge columns differ.")
+    if not edges_gdf.index.equals(a_edges_gdf.index):
+        raise ValueError("The directed dual edges differ.")
+    for col in edges_gdf.columns.drop(edges_gdf.geometry.name):
+        if not (edges_gdf[col].to_numpy() == a_edges_gdf[col].to_numpy()).all():
+            raise ValueError(f"The dual edge {col} values differ.")
+    if not (
+        shapely.to_wkb(edges_gdf.geometry.values)
+        == shapely.to_wkb(a_edges_gdf.geometry.values)
+    ).all():
+        raise ValueError("The welded dual edge geoms differ.")
+
+
+def compare_centralities(
+    network_structure, nodes_gdf, a_network_structure, a_nodes_gdf, distance
+):
+    """Fails unless the shortest and simplest path closeness centralities match"""
+    for centrality in [
+        networks.node_centrality_shortest,
+        networks.node_centrality_simplest,
+    ]:
+        closeness = centrality(
+            network_structure,
+            nodes_gdf,
+            distances=[distance],
+            compute_betweenness=False,
+        )
+        a_closeness = centrality(
+            a_network_structure,
+            a_nodes_gdf,
+            distances=[distance],
+            compute_betweenness=False,
+        )
+        for col in [c for c in closeness.columns if c.startswith("cc_")]:
+            # the nodes that are not live have no centralities
+            if not np.array_equal(closeness[col], a_closeness[col], equal_nan=True):
+                raise ValueError(f"The {col} centralities differ.")
+
+
+def run(
+    layouts: list[str], edge_count: int, fraction: float, distance: int, seed: int = 0
+):
+    config.QUIET_MODE = True
+    for layout in layouts:
+        edges_gdf = synthetic.LAYOUTS[layout](edge_count, seed=seed)
+        G = primal.nx_from_primal(primal.primal_edges(edges_gdf))
+        G = with_irregular_edges(G, fraction, seed)
+        min_x, min_y, max_x, max_y = edges_gdf.total_bounds
+        boundary_geom = geometry.box(min_x, min_y, max_x, max_y).buffer(
+            -min(max_x - min_x, max_y - min_y) / 4
+        )
+        G = util.mark_live_nodes(G, boundary_geom)
+        print(
+            f"{layout}: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges "
+            f"including parallel edges and self-loops"
+        )
+        crs = synthetic.SYNTHETIC_CRS
+        # the networkX route runs last, as freed memory is kept by the process and hides the growth of later runs
+        (a_nodes_gdf, a_edges_gdf, a_network_structure), a_s, a_mb = measure(
+            array_route, G, crs
+        )
+        print(
+            f"  primal_from_nx and network_structure_dual: {a_s:.2f}s, peak RSS growth {a_mb:.0f}MB"
+        )
+        (nodes_gdf, edges_gdf_dual, network_structure), nx_s, nx_mb = measure(
+            nx_route, G, crs
+        )
+        print(
+            f"  nx_to_dual and network_structure_from_nx: {nx_s:.2f}s, peak RSS growth {nx_mb:.0f}MB"
+        )
+        compare_nodes(nodes_gdf, a_nodes_gdf)
+        compare_edges(edges_gdf_dual, a_edges_gdf)
+        compare_centralities(
+            network_structure, nodes_gdf, a_network_structure, a_nodes_gdf, distance
+        )
+        print(
+            f"  {len(nodes_gdf)} dual nodes and {len(edges_gdf_dual)} directed dual edges match, "
+            f"as do the shortest and simplest path closeness centralities at {distance}m"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--layouts",
+        nargs="+",
+        default=list(synthetic.LAYOUTS),
+        choices=synthetic.LAYOUTS,
+    )
+    parser.add_argument("--edges", type=int, default=10000)
+    parser.add_argument("--fraction", type=float, default=0.02)
+    parser.add_argument("--distance", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    run(args.layouts, args.edges, args.fraction, args.distance, args.seed)
@@ -0,0 +1,107 @@
+"""
+Verifies incremental centrality recomputation against a full recomputation after simulated network edits.
+
+The synthetic city is written out as primal edges, a few edges are removed and a new edge is added in one
+neighbourhood, similar to a QGIS edit session, and the dual centralities are recomputed both in full and incrementally
+via src.incremental. Run from the repository root: python -m benchmarks.incremental_centrality
+
+Pass --side for the number of grid nodes per side and --distances for the distance thresholds. The script exits with
+an error if any incrementally recomputed metric differs from the full recomputation beyond floating point tolerance.
+"""
+
+import argparse
+import logging
+import time
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from cityseer.metrics import networks
+from cityseer.tools import graphs, io
+from shapely import geometry
+
+from src import incremental, synthetic
+
+
+def build_dual(edges_gdf: gpd.GeoDataFrame):
+    """Builds the dual network structure from primal edges, as for edges reopened from QGIS"""
+    G = io.nx_from_generic_geopandas(edges_gdf)
+    G_dual = graphs.nx_to_dual(G)
+    return io.network_structure_from_nx(G_dual, crs=edges_gdf.crs)
+
+
+def compute(network_structure, nodes_gdf, distances: list[int]) -> gpd.GeoDataFrame:
+    nodes_gdf = networks.node_centrality_shortest(
+        network_structure, nodes_gdf, distances=distances
+    )
+    return networks.node_centrality_simplest(
+        network_structure, nodes_gdf, distances=distances
+    )
+
+
+def edit_edges(edges_gdf: gpd.GeoDataFrame, edit_count: int = 3) -> gpd.GeoDataFrame:
+    """Removes the edges nearest to a point in the south west quarter and adds a diagonal edge"""
+    min_x, min_y, max_x, max_y = edges_gdf.total_bounds
+    edit_point = geometry.Point(
+        min_x + (max_x - min_x) / 4, min_y + (max_y - min_y) / 4
+    )
+    nearest = edges_gdf.geometry.distance(edit_point).nsmallest(edit_count).index
+    start = edges_gdf.loc[nearest[0]].geometry.coords[0]
+    end = edges_gdf.loc[nearest[-1]].geometry.coords[-1]
+    edited_gdf = edges_gdf.drop(index=nearest)
+    new_edge = gpd.GeoDataFrame(
+        geometry=[geometry.LineString([start, end])], crs=edges_gdf.crs
+    )
+    return pd.concat([edited_gdf, new_edge], ignore_index=True)
+
+
+def run(side: int, distances: list[int], rtol: float = 1e-4, atol: float = 1e-3):
+    """Compares the full and incremental recomputation after editing a few edges"""
+    G = synthetic.city_graph(side)
+    prev_edges_gdf = io.geopandas_from_nx(G, crs=3857).reset_index(drop=True)
+    prev_edges_gdf = prev_edges_gdf[["geom"]].rename_geometry("geometry")
+    prev_nodes_gdf, _prev_edges_dual, prev_structure = build_dual(prev_edges_gdf)
+    prev_nodes_gdf = compute(prev_structure, prev_nodes_gdf, distances)
+    edges_gdf = edit_edges(prev_edges_gdf)
+    nodes_gdf, _edges_gdf, network_structure = build_dual(edges_gdf)
+    print(f"{network_structure.node_count()} dual nodes, distances {distances}")
+    start = time.perf_counter()
+    full_gdf = compute(network_structure, nodes_gdf.copy(), distances)
+    full_s = time.perf_counter() - start
+    start = time.perf_counter()
+    changed_geoms = incremental.changed_geometries(
+        prev_edges_gdf.geometry, edges_gdf.geometry
+    )
+    incremental_gdf = incremental.incremental_node_centrality(
+        network_structure,
+        nodes_gdf,
+        prev_nodes_gdf,
+        changed_geoms,
+        distances=distances,
+        shortest=True,
+        simplest=True,
+    )
+    incremental_s = time.perf_counter() - start
+    print(f"full: {full_s:.2f}s, incremental: {incremental_s:.2f}s")
+    mismatched = []
+    for col in [col for col in full_gdf.columns if col.startswith("cc_")]:
+        full_vals = full_gdf[col].to_numpy(dtype=np.float64)
+        incremental_vals = incremental_gdf[col].to_numpy(dtype=np.float64)
+        max_diff = np.nanmax(np.abs(full_vals - incremental_vals))
+        matches = np.allclose(full_vals, incremental_vals, rtol=rtol, atol=atol)
+        print(
+            f"{col:>28}: max abs diff {max_diff:.3e} {'ok' if matches else 'MISMATCH'}"
+        )
+        if not matches:
+            mismatched.append(col)
+    if mismatched:
+        raise ValueError(f"Incremental centralities differ from full: {mismatched}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--side", type=int, default=60)
+    parser.add_argument("--distances", type=int, nargs="+", default=[400, 800])
+    args = parser.parse_args()
+    run(args.side, args.distances)
@@ -0,0 +1,73 @@
+"""
+Compares the per-node "live" tagging loop against the vectorised util.mark_live_nodes helper.
+
+Run from the repository root: python -m benchmarks.live_nodes
+"""
+
+import logging
+import time
+
+import networkx as nx
+import numpy as np
+from shapely import geometry
+
+from src import util
+
+
+def build_boundary() -> geometry.MultiPolygon:
+    """A two-part boundary with a hole, covering part of the sampled extents"""
+    part_a = geometry.Polygon(
+        [(0, 0), (6000, 0), (6000, 10000), (0, 10000)],
+        holes=[[(2000, 2000), (4000, 2000), (4000, 4000), (2000, 4000)]],
+    )
+    part_b = geometry.Point(8500, 5000).buffer(1500)
+    return geometry.MultiPolygon([part_a, part_b])
+
+
+def build_graph(node_count: int, seed: int = 0) -> nx.MultiGraph:
+    """Nodes with random coordinates - edges are not needed for tagging"""
+    rng = np.random.default_rng(seed)
+    xs = rng.uniform(0, 10000, node_count)
+    ys = rng.uniform(0, 10000, node_count)
+    G = nx.MultiGraph()
+    G.add_nodes_from(
+        (str(idx), {"x": x, "y": y})
+        for idx, (x, y) in enumerate(zip(xs.tolist(), ys.tolist()))
+    )
+    return G
+
+
+def mark_live_nodes_loop(G: nx.MultiGraph, extents_geom) -> nx.MultiGraph:
+    """The original per-node approach used throughout the workflows"""
+    for nd_key, nd_data in G.nodes(data=True):
+        if extents_geom.contains(geometry.Point(nd_data["x"], nd_data["y"])):
+            G.nodes[nd_key]["live"] = True
+        else:
+            G.nodes[nd_key]["live"] = False
+    return G
+
+
+def run(node_counts: list[int]):
+    """Times both approaches and checks that the resultant flags are identical"""
+    extents_geom = build_boundary()
+    print(f"{'nodes':>10} {'loop (s)':>10} {'vector (s)':>11} {'speedup':>8}")
+    for node_count in node_counts:
+        G_loop = build_graph(node_count)
+        G_vec = G_loop.copy()
+        start = time.perf_counter()
+        mark_live_nodes_loop(G_loop, extents_geom)
+        loop_time = time.perf_counter() - start
+        # use a fresh geometry so that the prepared state is not shared between runs
+        start = time.perf_counter()
+        util.mark_live_nodes(G_vec, build_boundary())
+        vec_time = time.perf_counter() - start
+        if dict(G_loop.nodes(data="live")) != dict(G_vec.nodes(data="live")):
+            raise ValueError(f"Mismatched live flags for {node_count} nodes.")
+        print(
+            f"{node_count:>10} {loop_time:>10.3f} {vec_time:>11.3f} {loop_time / vec_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run([10_000, 100_000, 1_000_000])
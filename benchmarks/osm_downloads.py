@@ -0,0 +1,158 @@
+"""
+Measures the OSM download stages offline against the local Overpass and Nominatim stand-in in src.osm_server.
+
+A synthetic network from src.synthetic, with landuses tagged as per the workflow landuse schema and buildings, is
+served by the stand-in with the given latency, rate limit, and error rate. The geocoding, network, buildings, and
+landuse downloads are then run through OSMCache as in the workflows, first against an empty cache and then again to
+check that the cache serves every request. Run from the repository root, e.g.
+
+    python -m benchmarks.osm_downloads --edges 20000 --latency 0.2 --rate-limit 1
+
+Pass --elements, and optionally --places, to serve a recorded Overpass JSON response and Nominatim JSON response
+instead of synthetic data. Note that osmnx waits 60s before retrying after a 429 or 504 response, so error injection
+makes the features downloads slow.
+
+Pass --serve to keep the stand-in running so that the workflows can be pointed at it, e.g. for a stand-in on port 8765
+set OSM_OVERPASS_URL=http://127.0.0.1:8765/api and OSM_NOMINATIM_URL=http://127.0.0.1:8765/nominatim before running a
+workflow. The --origin and --place-name options place the synthetic city where the workflow expects it.
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+
+import osmnx as ox
+from shapely import geometry
+from workflows.landuse_schema_osm import SCHEMA
+
+from src import cache, landuses, osm_server, synthetic
+
+
+def schema_landuse_tags() -> dict[str, dict[str, str]]:
+    """Tags each landuse category with its first OSM key and value in the schema"""
+    landuse_tags = {}
+    for cat_key, osm_tags in SCHEMA.items():
+        osm_key, osm_vals = next(iter(osm_tags.items()))
+        landuse_tags[cat_key] = {osm_key: "yes" if osm_vals is True else osm_vals[0]}
+    return landuse_tags
+
+
+def synthetic_data(
+    layout: str,
+    edge_count: int,
+    origin: tuple[float, float],
+    place_name: str,
+    seed: int = 0,
+) -> osm_server.OSMData:
+    edges_gdf = synthetic.LAYOUTS[layout](edge_count, seed=seed)
+    landuse_tags = schema_landuse_tags()
+    landuses_gdf = synthetic.landuses_gdf(
+        edges_gdf, edge_count // 4, list(landuse_tags), seed=seed
+    )
+    bldgs_gdf = synthetic.buildings_gdf(edges_gdf, edge_count // 2, seed=seed)
+    return osm_server.OSMData.from_synthetic(
+        edges_gdf,
+        landuses_gdf,
+        bldgs_gdf,
+        landuse_tags=landuse_tags,
+        origin=origin,
+        place_name=place_name,
+    )
+
+
+def run_downloads(osm_cache: cache.OSMCache, place_name: str) -> dict[str, float]:
+    """Runs the workflow downloads for the place and returns the seconds taken by each"""
+    timings = {}
+    start = time.perf_counter()
+    extents_gdf = osm_cache.geocode_to_gdf(place_name)
+    timings["geocode"] = time.perf_counter() - start
+    extents_geom = extents_gdf.geometry.union_all()
+    if not isinstance(extents_geom, (geometry.Polygon, geometry.MultiPolygon)):
+        raise ValueError(f"The geocoded extents for {place_name} are not a polygon.")
+    start = time.perf_counter()
+    G = osm_cache.osm_graph_from_poly(extents_geom.convex_hull, simplify=False)
+    timings["network"] = time.perf_counter() - start
+    start = time.perf_counter()
+    bldgs_gdf = osm_cache.features_from_polygon(extents_geom, tags={"building": True})
+    timings["buildings"] = time.perf_counter() - start
+    start = time.perf_counter()
+    landuses_gdf = osm_cache.features_from_polygon(
+        extents_geom, tags=landuses.schema_tags(SCHEMA)
+    )
+    timings["landuses"] = time.perf_counter() - start
+    print(
+        f"Downloaded {G.number_of_edges()} network edges, {len(bldgs_gdf)} buildings, "
+        f"and {len(landuses_gdf)} landuses."
+    )
+    return timings
+
+
+def print_stats(stand_in: osm_server.OSMStandIn):
+    for service, stats in stand_in.stats.items():
+        print(
+            f"{service:>10}: {stats['requests']} requests, {stats['ok']} ok, {stats['rate_limited']} rate limited, "
+            f"{stats['errors']} errors, {stats['bytes'] / 1024**2:.1f}MB served"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--layout", choices=list(synthetic.LAYOUTS), default="organic")
+    parser.add_argument("--edges", type=int, default=10000)
+    parser.add_argument("--elements", help="A recorded Overpass JSON response.")
+    parser.add_argument("--places", help="A recorded Nominatim JSON response.")
+    parser.add_argument("--origin", type=float, nargs=2, default=[33.36, 35.17])
+    parser.add_argument("--place-name", default="Synthetic City")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, help="Requests per second.")
+    parser.add_argument("--burst", type=int, default=2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--serve", action="store_true")
+    args = parser.parse_args()
+    if args.elements is not None:
+        data = osm_server.OSMData.from_recorded(args.elements, args.places)
+    else:
+        data = synthetic_data(
+            args.layout, args.edges, tuple(args.origin), args.place_name
+        )
+    stand_in = osm_server.OSMStandIn(
+        data,
+        latency=args.latency,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+        error_rate=args.error_rate,
+        port=args.port,
+    )
+    with stand_in:
+        if args.serve:
+            print(
+                f"export {cache.OVERPASS_URL_ENV}={stand_in.overpass_url} "
+                f"{cache.NOMINATIM_URL_ENV}={stand_in.nominatim_url}"
+            )
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                print_stats(stand_in)
+        else:
+            # osmnx's own response cache would otherwise hide the requests from the stand-in
+            ox.settings.use_cache = False
+            with tempfile.TemporaryDirectory() as cache_dir:
+                osm_cache = cache.OSMCache(
+                    cache_dir,
+                    overpass_url=stand_in.overpass_url,
+                    nominatim_url=stand_in.nominatim_url,
+                )
+                for run_label in ["cold cache", "warm cache"]:
+                    timings = run_downloads(osm_cache, args.place_name)
+                    print(
+                        f"{run_label}: "
+                        + ", ".join(
+                            f"{key} {secs:.2f}s" for key, secs in timings.items()
+                        )
+                    )
+                osm_cache.report()
+            print_stats(stand_in)
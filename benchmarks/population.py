@@ -0,0 +1,249 @@
+"""
+Compares the manual QGIS population interpolation steps against src.population on a synthetic GeoTIFF.
+
+A synthetic 1km population grid in EPSG:3035 is written as a GeoTIFF, with a few dense centres, random noise, and a
+nodata area standing in for the sea. The steps in workflows/population_density.md are then emulated with rasterio:
+the grid is clipped to the buffered boundary, warped to 100m with bilinear resampling, and sampled at random node
+locations in EPSG:6312. These are compared against population.sample_raster, which reads only the window of the grid
+and interpolates at the nodes directly. The script fails unless the interpolation reproduces a linear field exactly and
+matches the warped raster at the centres of its pixels. Run from the repository root, e.g.
+
+    python -m benchmarks.population --nodes 500000 --boundary-km 40
+"""
+
+import argparse
+import logging
+import math
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import rasterio
+from rasterio import warp, windows
+from rasterio.transform import from_origin
+from shapely import geometry
+
+from src import boundaries, population
+
+RASTER_CRS = 3035
+WORKING_CRS = 6312
+# the lower left corner of the synthetic grid in EPSG:3035, near Nicosia
+ORIGIN = (6_350_000, 1_600_000)
+NODATA = -9999.0
+
+
+def write_grid(
+    raster_path: Path, side_km: int, seed: int = 0, linear: bool = False
+) -> rasterio.Affine:
+    """Writes a side_km x side_km grid of 1km pixels and returns its transform"""
+    rng = np.random.default_rng(seed)
+    centres = np.arange(side_km) + 0.5
+    col_km, row_km = np.meshgrid(centres, centres)
+    if linear:
+        values = 3 * col_km - 2 * row_km + 1000
+    else:
+        values = rng.gamma(1, 50, size=(side_km, side_km))
+        for cx, cy, peak in rng.uniform([0, 0, 2000], [side_km, side_km, 8000], (8, 3)):
+            values += peak * np.exp(-((col_km - cx) ** 2 + (row_km - cy) ** 2) / 20)
+        # the sea to the south
+        values[row_km > side_km * 0.9] = NODATA
+    transform = from_origin(ORIGIN[0], ORIGIN[1] + side_km * 1000, 1000, 1000)
+    with rasterio.open(
+        raster_path,
+        "w",
+        driver="GTiff",
+        width=side_km,
+        height=side_km,
+        count=1,
+        dtype="float32",
+        crs=f"EPSG:{RASTER_CRS}",
+        transform=transform,
+        nodata=NODATA,
+        tiled=True,
+        blockxsize=256,
+        blockysize=256,
+    ) as dst:
+        dst.write(values.astype(np.float32), 1)
+    return transform
+
+
+def boundary_3035(side_km: int, boundary_km: float) -> geometry.Polygon:
+    """A square boundary in the middle of the grid"""
+    mid_x = ORIGIN[0] + side_km * 500
+    mid_y = ORIGIN[1] + side_km * 500
+    half = boundary_km * 500
+    return geometry.box(mid_x - half, mid_y - half, mid_x + half, mid_y + half)
+
+
+def qgis_steps(
+    raster_path: Path,
+    bounds_geom_3035: geometry.Polygon,
+    xs: np.ndarray,
+    ys: np.ndarray,
+    resolution: float,
+) -> tuple[np.ndarray, np.ndarray, rasterio.Affine]:
+    """Clips, warps to resolution with bilinear resampling, and samples the warped pixels at the nodes, as in QGIS"""
+    with rasterio.open(raster_path) as src:
+        window = windows.from_bounds(*bounds_geom_3035.bounds, transform=src.transform)
+        window = windows.Window(
+            math.floor(window.col_off),
+            math.floor(window.row_off),
+            math.ceil(window.width) + 1,
+            math.ceil(window.height) + 1,
+        ).intersection(windows.Window(0, 0, src.width, src.height))
+        clipped = src.read(1, window=window)
+        clipped_transform = src.window_transform(window)
+    left, top = clipped_transform * (0, 0)
+    width = int(round(clipped.shape[1] * clipped_transform.a / resolution))
+    height = int(round(clipped.shape[0] * -clipped_transform.e / resolution))
+    warped_transform = from_origin(left, top, resolution, resolution)
+    warped = np.full((height, width), NODATA, dtype=np.float32)
+    warp.reproject(
+        clipped,
+        warped,
+        src_transform=clipped_transform,
+        src_crs=f"EPSG:{RASTER_CRS}",
+        dst_transform=warped_transform,
+        dst_crs=f"EPSG:{RASTER_CRS}",
+        src_nodata=NODATA,
+        dst_nodata=NODATA,
+        resampling=warp.Resampling.bilinear,
+    )
+    xs_3035, ys_3035 = boundaries.transformer(WORKING_CRS, RASTER_CRS).transform(xs, ys)
+    cols, rows = ~warped_transform * (xs_3035, ys_3035)
+    cols = np.clip(np.floor(cols).astype(np.int64), 0, width - 1)
+    rows = np.clip(np.floor(rows).astype(np.int64), 0, height - 1)
+    sampled = warped[rows, cols].astype(np.float64)
+    sampled[sampled == NODATA] = np.nan
+    return sampled, warped, warped_transform
+
+
+def measure(func, *args):
+    """Returns the result, the seconds taken, and the tracemalloc peak in MB"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    secs = time.perf_counter() - start
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, secs, peak / 1024**2
+
+
+def run(
+    node_count: int,
+    side_km: int,
+    boundary_km: float,
+    buffer_dist: float,
+    resolution: float,
+    seed: int = 0,
+):
+    rng = np.random.default_rng(seed)
+    bounds_geom_3035 = boundary_3035(side_km, boundary_km)
+    bounds_geom = boundaries.project_geom(bounds_geom_3035, RASTER_CRS, WORKING_CRS)
+    bounds_geom_buff = bounds_geom.buffer(buffer_dist)
+    # random node locations within the boundary, in the working CRS
+    min_x, min_y, max_x, max_y = bounds_geom_3035.bounds
+    xs_3035 = rng.uniform(min_x, max_x, node_count)
+    ys_3035 = rng.uniform(min_y, max_y, node_count)
+    xs, ys = boundaries.transformer(RASTER_CRS, WORKING_CRS).transform(xs_3035, ys_3035)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # a linear field is reproduced exactly by bilinear interpolation
+        linear_path = Path(temp_dir) / "linear.tif"
+        write_grid(linear_path, side_km, seed, linear=True)
+        linear = population.sample_raster(
+            linear_path, xs, ys, WORKING_CRS, bounds_geom=bounds_geom_buff
+        )
+        expected = (
+            3 * (xs_3035 - ORIGIN[0]) / 1000
+            - 2 * (ORIGIN[1] + side_km * 1000 - ys_3035) / 1000
+            + 1000
+        )
+        if not np.allclose(linear, expected, rtol=0, atol=1e-3):
+            raise ValueError("The interpolation does not reproduce a linear field.")
+        print("linear field reproduced exactly")
+        raster_path = Path(temp_dir) / "population.tif"
+        write_grid(raster_path, side_km, seed)
+        print(
+            f"{node_count} nodes, {side_km}km grid, {boundary_km}km boundary buffered by {buffer_dist}m"
+        )
+        bounds_geom_buff_3035 = boundaries.project_geom(
+            bounds_geom_buff, WORKING_CRS, RASTER_CRS
+        )
+        (qgis, warped, warped_transform), qgis_s, qgis_mb = measure(
+            qgis_steps, raster_path, bounds_geom_buff_3035, xs, ys, resolution
+        )
+        print(
+            f"  clip, warp to {resolution:.0f}m, and sample: {qgis_s:.2f}s, peak {qgis_mb:.1f}MB, "
+            f"warped raster {warped.shape[1]} x {warped.shape[0]} pixels"
+        )
+        direct, direct_s, direct_mb = measure(
+            population.sample_raster,
+            raster_path,
+            xs,
+            ys,
+            WORKING_CRS,
+            bounds_geom_buff,
+        )
+        print(f"  windowed bilinear sampling: {direct_s:.2f}s, peak {direct_mb:.1f}MB")
+        # at the centres of the warped pixels both approaches evaluate the same interpolation
+        centre_cols, centre_rows = np.meshgrid(
+            np.arange(warped.shape[1]) + 0.5, np.arange(warped.shape[0]) + 0.5
+        )
+        centre_xs, centre_ys = warped_transform * (
+            centre_cols.ravel(),
+            centre_rows.ravel(),
+        )
+        at_centres = population.sample_raster(
+            raster_path,
+            centre_xs,
+            centre_ys,
+            RASTER_CRS,
+            bounds_geom=bounds_geom_buff_3035,
+        )
+        warped_values = warped.ravel().astype(np.float64)
+        # within half a source pixel of the clipped edge, GDAL has no neighbours beyond the clip
+        # whereas the window is read with a margin, so only the interior is compared
+        edge_px = int(np.ceil(500 / resolution))
+        interior = np.zeros(warped.shape, dtype=bool)
+        interior[edge_px:-edge_px, edge_px:-edge_px] = True
+        # GDAL also leaves the pixels next to nodata as nodata, which are renormalised here instead
+        comparable = (
+            interior.ravel() & (warped_values != NODATA) & ~np.isnan(at_centres)
+        )
+        if not np.allclose(
+            at_centres[comparable], warped_values[comparable], rtol=1e-5, atol=1e-3
+        ):
+            raise ValueError("The interpolation differs from the warped raster.")
+        print(
+            f"  matches the warped raster at {int(comparable.sum())} of {len(warped_values)} pixel centres, "
+            f"excluding the clipped edge and nodata"
+        )
+        both = ~np.isnan(qgis) & ~np.isnan(direct)
+        diff = np.abs(direct[both] - qgis[both])
+        print(
+            f"  at the nodes, the nearest warped pixel differs from the exact interpolation by "
+            f"{np.median(diff):.2f} median and {diff.max():.2f} max persons per km2, "
+            f"of a mean {direct[both].mean():.0f}"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=200000)
+    parser.add_argument("--grid-km", type=int, default=1000)
+    parser.add_argument("--boundary-km", type=float, default=40)
+    parser.add_argument("--buffer-dist", type=float, default=1000)
+    parser.add_argument("--resolution", type=float, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(
+        args.nodes,
+        args.grid_km,
+        args.boundary_km,
+        args.buffer_dist,
+        args.resolution,
+        args.seed,
+    )
@@ -0,0 +1,193 @@
+"""
+Compares the QGIS join by location and virtual layer sum against population.aggregate_blocks on synthetic blocks.
+
+A synthetic city of rectangular blocks with random populations is separated by streets, with nodes placed along the
+streets. The blocks are written to a GPKG, which is read in full and joined to the buffered nodes with geopandas as for
+the QGIS steps in workflows/population_density.md, then summed per node. These are compared against
+population.aggregate_blocks streaming the same file in chunks. The area weighted sums are compared against an overlay
+of the buffered nodes and blocks. The script fails unless the sums match and the area weighted sums keep the total
+population of the joined blocks. Run from the repository root, e.g.
+
+    python -m benchmarks.population_blocks --blocks 1000000 --chunk-sizes 50000 200000
+"""
+
+import argparse
+import logging
+import tempfile
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+from src import population, profiling, synthetic
+
+BUFFER_DIST = 20
+POPULATION_COLUMN = "Pop2018"
+
+
+def city_blocks(
+    block_count: int, seed: int = 0
+) -> tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]:
+    """Returns a square grid of jittered blocks with populations, and nodes along the streets between them"""
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(block_count)))
+    # blocks of 60 to 120m separated by streets of 10 to 30m
+    widths = rng.uniform(60, 120, side)
+    heights = rng.uniform(60, 120, side)
+    gaps_x = rng.uniform(10, 30, side)
+    gaps_y = rng.uniform(10, 30, side)
+    lefts = np.concatenate([[0], np.cumsum(widths + gaps_x)[:-1]])
+    bottoms = np.concatenate([[0], np.cumsum(heights + gaps_y)[:-1]])
+    cols, rows = np.meshgrid(np.arange(side), np.arange(side))
+    cols = cols.ravel()[:block_count]
+    rows = rows.ravel()[:block_count]
+    geoms = shapely.box(
+        lefts[cols],
+        bottoms[rows],
+        lefts[cols] + widths[cols],
+        bottoms[rows] + heights[rows],
+    )
+    blocks_gdf = gpd.GeoDataFrame(
+        {POPULATION_COLUMN: rng.gamma(1, 200, block_count).round()},
+        geometry=geoms,
+        crs=synthetic.SYNTHETIC_CRS,
+    )
+    # one node along the street to the right of and above each block, as for dual nodes at street midpoints
+    street_xs = lefts[cols] + widths[cols] + gaps_x[cols] / 2
+    street_ys = bottoms[rows] + heights[rows] + gaps_y[rows] / 2
+    xs = np.concatenate(
+        [street_xs, lefts[cols] + rng.uniform(0, 1, block_count) * widths[cols]]
+    )
+    ys = np.concatenate(
+        [bottoms[rows] + rng.uniform(0, 1, block_count) * heights[rows], street_ys]
+    )
+    nodes_gdf = gpd.GeoDataFrame(
+        {"x": xs, "y": ys},
+        geometry=shapely.points(xs, ys),
+        crs=synthetic.SYNTHETIC_CRS,
+    )
+    return blocks_gdf, nodes_gdf
+
+
+def qgis_steps(nodes_gdf: gpd.GeoDataFrame, blocks_path: Path) -> np.ndarray:
+    """Buffers the nodes, joins them to the blocks by intersection, and sums the populations per node"""
+    blocks_gdf = gpd.read_file(blocks_path, columns=[POPULATION_COLUMN])
+    buffers_gdf = gpd.GeoDataFrame(
+        geometry=nodes_gdf.buffer(BUFFER_DIST, resolution=8), crs=nodes_gdf.crs
+    )
+    joined = buffers_gdf.sjoin(blocks_gdf, predicate="intersects")
+    pop_agg = joined.groupby(level=0)[POPULATION_COLUMN].sum()
+    return pop_agg.reindex(nodes_gdf.index, fill_value=0).to_numpy()
+
+
+def overlay_weighted(
+    nodes_gdf: gpd.GeoDataFrame, blocks_gdf: gpd.GeoDataFrame
+) -> np.ndarray:
+    """Splits each block's population between the node buffers by the areas of their overlay"""
+    buffers_gdf = gpd.GeoDataFrame(
+        {"node_idx": np.arange(len(nodes_gdf))},
+        geometry=nodes_gdf.buffer(BUFFER_DIST, resolution=8).values,
+        crs=nodes_gdf.crs,
+    )
+    blocks_gdf = blocks_gdf.assign(block_idx=np.arange(len(blocks_gdf)))
+    overlay = gpd.overlay(buffers_gdf, blocks_gdf, how="intersection")
+    overlay["area"] = overlay.area
+    overlay["share"] = overlay["area"] / overlay.groupby("block_idx")["area"].transform(
+        "sum"
+    )
+    overlay["pop"] = overlay[POPULATION_COLUMN] * overlay["share"]
+    pop_agg = overlay.groupby("node_idx")["pop"].sum()
+    return pop_agg.reindex(np.arange(len(nodes_gdf)), fill_value=0).to_numpy()
+
+
+def measure(func, *args, **kwargs):
+    """Returns the result, the seconds taken, and the growth of the sampled peak RSS in MB"""
+    # tracemalloc does not see the GEOS geometries, so the RSS is sampled instead
+    with profiling.RunProfiler("population_blocks", trace_memory=False) as profiler:
+        with profiling.stage("measure"):
+            result = func(*args, **kwargs)
+    stage = profiler.stages[0]
+    return result, stage["wall_s"], stage["peak_rss_mb"] - stage["rss_start_mb"]
+
+
+def run(block_count: int, chunk_sizes: list[int], weighted_blocks: int, seed: int = 0):
+    blocks_gdf, nodes_gdf = city_blocks(block_count, seed)
+    print(
+        f"{len(blocks_gdf)} blocks, {len(nodes_gdf)} nodes buffered by {BUFFER_DIST}m"
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        blocks_path = Path(temp_dir) / "blocks.gpkg"
+        blocks_gdf.to_file(blocks_path)
+        results = {}
+        for chunk_size in sorted(chunk_sizes):
+            pop_gdf, direct_s, direct_mb = measure(
+                population.aggregate_blocks,
+                nodes_gdf,
+                blocks_path,
+                population_column=POPULATION_COLUMN,
+                buffer_dist=BUFFER_DIST,
+                chunk_size=chunk_size,
+            )
+            print(
+                f"  aggregate_blocks streaming chunks of {chunk_size}: {direct_s:.2f}s, peak RSS growth {direct_mb:.0f}MB"
+            )
+            results[chunk_size] = pop_gdf["pop_agg"].to_numpy()
+        # the full read runs last, as freed memory is kept by the process and hides the growth of later runs
+        qgis, qgis_s, qgis_mb = measure(qgis_steps, nodes_gdf, blocks_path)
+        print(
+            f"  read, buffer, join, and group by: {qgis_s:.2f}s, peak RSS growth {qgis_mb:.0f}MB"
+        )
+        first = next(iter(results.values()))
+        for chunk_size, pop_agg in results.items():
+            if not np.allclose(pop_agg, first, rtol=0, atol=1e-6):
+                raise ValueError(f"The sums for chunks of {chunk_size} differ.")
+            # the buffers are polygons with 32 sides, so blocks just within the distance can miss the buffer
+            differs = ~np.isclose(pop_agg, qgis)
+            if differs.mean() > 0.001:
+                raise ValueError("The summed populations differ from the join.")
+        print(
+            f"  matches the join at {int((~differs).sum())} of {len(qgis)} nodes, "
+            f"the others are near a block within {BUFFER_DIST}m but outside the buffer polygon"
+        )
+        # the overlay is slow, so the area weighting is checked on a subset of the blocks
+        subset_gdf, subset_nodes_gdf = city_blocks(weighted_blocks, seed)
+        expected, overlay_s, _ = measure(overlay_weighted, subset_nodes_gdf, subset_gdf)
+        weighted_gdf, weighted_s, _ = measure(
+            population.aggregate_blocks,
+            subset_nodes_gdf,
+            subset_gdf,
+            population_column=POPULATION_COLUMN,
+            buffer_dist=BUFFER_DIST,
+            area_weighted=True,
+        )
+        weighted = weighted_gdf["pop_agg"].to_numpy()
+        if not np.allclose(weighted, expected, rtol=1e-6, atol=1e-6):
+            raise ValueError("The area weighted populations differ from the overlay.")
+        block_idx, _node_idx = shapely.STRtree(subset_nodes_gdf.geometry.values).query(
+            subset_gdf.geometry.values, predicate="dwithin", distance=BUFFER_DIST
+        )
+        joined_total = (
+            subset_gdf[POPULATION_COLUMN].to_numpy()[np.unique(block_idx)].sum()
+        )
+        if not np.isclose(weighted.sum(), joined_total):
+            raise ValueError("The area weighted populations do not keep the total.")
+        unweighted_gdf = population.aggregate_blocks(
+            subset_nodes_gdf, subset_gdf, population_column=POPULATION_COLUMN
+        )
+        print(
+            f"  area weighted for {len(subset_gdf)} blocks: {weighted_s:.2f}s against {overlay_s:.2f}s for the overlay, "
+            f"keeping the total of {weighted.sum():.0f} against {unweighted_gdf['pop_agg'].sum():.0f} "
+            f"when counting shared blocks for every node"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blocks", type=int, default=200000)
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[20000, 100000])
+    parser.add_argument("--weighted-blocks", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.blocks, args.chunk_sizes, args.weighted_blocks, args.seed)
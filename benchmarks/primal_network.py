@@ -0,0 +1,116 @@
+"""
+Times the networkX route from an edges GeoDataFrame to a NetworkStructure against the direct builder in src.primal.
+
+Synthetic edges from src.synthetic have some of their rows combined into MultiLineStrings, as found in custom and
+official networks. The edges are exploded and loaded with io.nx_from_generic_geopandas and io.network_structure_from_nx,
+as in workflows/compute_custom_network.py, and loaded directly with primal.primal_edges and
+primal.network_structure_from_primal. The edge endpoints are then jittered, as for networks whose edges miss each other
+by a few metres, and both consolidated with graphs.nx_consolidate_nodes and snapped with primal_edges. The parity of the
+two routes is tested in tests/test_primal.py. Run from the repository root, e.g.
+
+    python -m benchmarks.primal_network --layouts grid organic --edges 100000
+"""
+
+import argparse
+import logging
+import time
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from cityseer import config
+from cityseer.tools import graphs, io
+
+from src import primal, synthetic
+
+
+def with_multilines(
+    edges_gdf: gpd.GeoDataFrame, fraction: float, seed: int
+) -> gpd.GeoDataFrame:
+    """Combines a fraction of the edges, each with the following edge, into MultiLineStrings"""
+    rng = np.random.default_rng(seed)
+    group_ids = np.arange(len(edges_gdf))
+    combined = np.arange(0, len(edges_gdf) - 1, 2)
+    combined = combined[rng.random(len(combined)) < fraction]
+    group_ids[combined + 1] = combined
+    geoms = shapely.multilinestrings(
+        edges_gdf.geometry.values, indices=np.unique(group_ids, return_inverse=True)[1]
+    )
+    single = shapely.get_num_geometries(geoms) == 1
+    geoms[single] = shapely.get_geometry(geoms[single], 0)
+    return gpd.GeoDataFrame(geometry=geoms, crs=edges_gdf.crs)
+
+
+def jittered(edges_gdf: gpd.GeoDataFrame, jitter: float, seed: int) -> gpd.GeoDataFrame:
+    """Moves each end of each edge independently by up to jitter in x and y"""
+    rng = np.random.default_rng(seed)
+    coords, coord_idx = shapely.get_coordinates(
+        edges_gdf.geometry.values, return_index=True
+    )
+    is_end = (
+        np.r_[True, coord_idx[1:] != coord_idx[:-1]]
+        | np.r_[coord_idx[1:] != coord_idx[:-1], True]
+    )
+    coords[is_end] += rng.uniform(-jitter, jitter, (int(is_end.sum()), 2))
+    return gpd.GeoDataFrame(
+        geometry=shapely.linestrings(coords, indices=coord_idx), crs=edges_gdf.crs
+    )
+
+
+def run(layouts: list[str], edge_count: int, seed: int = 0):
+    config.QUIET_MODE = True
+    for layout in layouts:
+        edges_gdf = with_multilines(
+            synthetic.LAYOUTS[layout](edge_count, seed=seed), 0.1, seed
+        )
+        multi_count = int((edges_gdf.geom_type == "MultiLineString").sum())
+        print(f"{layout}: {len(edges_gdf)} edges, {multi_count} MultiLineStrings")
+        start = time.perf_counter()
+        G = io.nx_from_generic_geopandas(edges_gdf.explode(ignore_index=True))
+        nodes_gdf, _, network_structure = io.network_structure_from_nx(
+            G, crs=edges_gdf.crs
+        )
+        nx_s = time.perf_counter() - start
+        print(
+            f"  explode, nx_from_generic_geopandas, and network_structure_from_nx: {nx_s:.2f}s"
+        )
+        start = time.perf_counter()
+        primal_net = primal.primal_edges(edges_gdf)
+        p_nodes_gdf, _, p_network_structure = primal.network_structure_from_primal(
+            primal_net, crs=edges_gdf.crs
+        )
+        primal_s = time.perf_counter() - start
+        print(f"  primal_edges and network_structure_from_primal: {primal_s:.2f}s")
+        print(
+            f"  {len(nodes_gdf)} and {len(p_nodes_gdf)} nodes, "
+            f"{network_structure.edge_count} and {p_network_structure.edge_count} directed edges"
+        )
+        # endpoints missing each other by up to a metre
+        jittered_gdf = jittered(edges_gdf.explode(ignore_index=True), 0.5, seed)
+        start = time.perf_counter()
+        G_jittered = io.nx_from_generic_geopandas(jittered_gdf)
+        G_consolidated = graphs.nx_consolidate_nodes(G_jittered, 2)
+        consolidate_s = time.perf_counter() - start
+        start = time.perf_counter()
+        snapped = primal.primal_edges(jittered_gdf, snap_dist=2)
+        snap_s = time.perf_counter() - start
+        print(
+            f"  jittered endpoints: nx_from_generic_geopandas and nx_consolidate_nodes took {consolidate_s:.2f}s "
+            f"for {G_consolidated.number_of_nodes()} nodes, snapping took {snap_s:.2f}s "
+            f"for {snapped.node_count} nodes"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--layouts",
+        nargs="+",
+        default=list(synthetic.LAYOUTS),
+        choices=synthetic.LAYOUTS,
+    )
+    parser.add_argument("--edges", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    run(args.layouts, args.edges, args.seed)
@@ -0,0 +1,117 @@
+"""
+Compares a full read and unary union hull against the pruned readers in src.readers on a synthetic shapefile.
+
+The synthetic network is a jittered grid of two-vertex street segments with a handful of attribute columns, similar in
+shape to a municipal network export. Run from the repository root: python -m benchmarks.readers
+
+Pass --edges to set the number of edges, e.g. python -m benchmarks.readers --edges 2000000. The unary union baseline
+is slow for multi-million edge networks, so it can be skipped with --skip-union.
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely import ops
+
+from src import readers
+
+
+def build_edges(
+    edge_count: int, spacing: float = 50, seed: int = 0
+) -> gpd.GeoDataFrame:
+    """A jittered grid with horizontal and vertical segments and some attribute columns"""
+    rng = np.random.default_rng(seed)
+    # half of the edges are horizontal and half vertical
+    side = int(np.ceil(np.sqrt(edge_count / 2)))
+    grid_x, grid_y = np.meshgrid(np.arange(side + 1), np.arange(side + 1))
+    xs = grid_x * spacing + rng.uniform(-5, 5, grid_x.shape)
+    ys = grid_y * spacing + rng.uniform(-5, 5, grid_y.shape)
+    starts = np.concatenate(
+        [
+            np.stack([xs[:, :-1].ravel(), ys[:, :-1].ravel()], axis=1),
+            np.stack([xs[:-1, :].ravel(), ys[:-1, :].ravel()], axis=1),
+        ]
+    )[:edge_count]
+    ends = np.concatenate(
+        [
+            np.stack([xs[:, 1:].ravel(), ys[:, 1:].ravel()], axis=1),
+            np.stack([xs[1:, :].ravel(), ys[1:, :].ravel()], axis=1),
+        ]
+    )[:edge_count]
+    lines = shapely.linestrings(np.stack([starts, ends], axis=1))
+    return gpd.GeoDataFrame(
+        {
+            "edge_id": np.arange(len(lines)),
+            "road_class": rng.choice(["primary", "secondary", "local"], len(lines)),
+            "name": rng.choice(["Storgatan", "Kungsgatan", "Vasagatan"], len(lines)),
+            "speed": rng.choice([30, 50, 70], len(lines)),
+            "width": rng.uniform(3, 20, len(lines)),
+        },
+        geometry=lines,
+        crs=3007,
+    )
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run(edge_count: int, skip_union: bool = False):
+    """Times the original and pruned reads and extents, and checks that the hulls match"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shp_path = Path(tmp_dir) / "network.shp"
+        edges_gdf = build_edges(edge_count)
+        edges_gdf.to_file(shp_path, engine="pyogrio")
+        del edges_gdf
+        print(
+            f"{edge_count} edges written to a {shp_path.stat().st_size / 1024**2:.0f}MB shapefile"
+        )
+        timings = {}
+        # original approach - read every column, then union all geoms for the hull
+        full_gdf, timings["full read"] = timed(gpd.read_file, shp_path)
+        if not skip_union:
+            union_hull, timings["unary_union hull"] = timed(
+                lambda: ops.unary_union(full_gdf["geometry"]).convex_hull
+            )
+        # pruned approach
+        _, timings["arrow read, geoms only"] = timed(
+            readers.read_layer, shp_path, columns=[]
+        )
+        _, timings["arrow read, one column"] = timed(
+            readers.read_layer, shp_path, columns=["road_class"]
+        )
+        hull, timings["vertex hull"] = timed(readers.vertex_hull, full_gdf.geometry)
+        _, timings["sampled vertex hull"] = timed(
+            readers.vertex_hull, full_gdf.geometry, max_vertices=100_000
+        )
+        bounds, timings["metadata bounds"] = timed(readers.layer_bounds, shp_path)
+        # read a quarter of the extents, e.g. a study area within a larger network
+        min_x, min_y, max_x, max_y = bounds
+        quarter_bbox = (min_x, min_y, (min_x + max_x) / 2, (min_y + max_y) / 2)
+        bbox_gdf, timings["arrow read, quarter bbox"] = timed(
+            readers.read_layer, shp_path, columns=[], bbox=quarter_bbox
+        )
+        if not skip_union and not hull.equals(union_hull):
+            raise ValueError("Vertex hull does not match the unary union hull.")
+        if not np.allclose(bounds, full_gdf.total_bounds):
+            raise ValueError("Metadata bounds do not match the data bounds.")
+        print(f"quarter bbox read returned {len(bbox_gdf)} of {len(full_gdf)} edges")
+        for label, duration in timings.items():
+            print(f"{label:>26}: {duration:>8.3f}s")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edges", type=int, default=2_000_000)
+    parser.add_argument("--skip-union", action="store_true")
+    args = parser.parse_args()
+    run(args.edges, args.skip_union)
@@ -0,0 +1,195 @@
+"""
+Compares the peak memory of writing wide result tables in memory against streaming column groups via src.outputs.
+
+A synthetic dual nodes table is built from a synthetic street network, with the primal edges as the line geometry and
+their midpoints as a second geometry column. Groups of float64 metric columns are then generated in the shape of the
+cityseer outputs for the given distances: shortest and simplest path centralities, accessibilities for 16 landuse
+categories, and mixed uses. The in-memory approach adds every group to the table and writes it at the end, as the
+workflows did, whereas the streamed approach hands each group to outputs.ResultWriter as soon as it is generated.
+Peak memory is measured with tracemalloc and the outputs are checked against each other. Run from the repository root,
+e.g. python -m benchmarks.result_storage --edges 200000 --float32
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from src import outputs, synthetic
+
+LANDUSE_CATEGORIES = [f"landuse_{idx}" for idx in range(16)]
+
+
+def nodes_gdf(edge_count: int, seed: int = 0) -> gpd.GeoDataFrame:
+    edges_gdf = synthetic.grid_edges(edge_count, seed=seed)
+    nodes_gdf = gpd.GeoDataFrame(
+        {
+            "live": True,
+            "weight": 1,
+            "point_geom": edges_gdf.geometry.interpolate(0.5, normalized=True),
+        },
+        geometry=edges_gdf.geometry.values,
+        crs=edges_gdf.crs,
+    ).rename_geometry("line_geometry")
+    nodes_gdf.index = nodes_gdf.index.astype(str)
+    return nodes_gdf
+
+
+def metric_groups(distances: list[int]) -> dict[str, list[str]]:
+    """Column names for each group of metrics, as returned by the respective cityseer call"""
+    shortest_keys = [
+        "density",
+        "farness",
+        "cycles",
+        "harmonic",
+        "beta",
+        "hillier",
+        "betweenness",
+        "betweenness_beta",
+    ]
+    simplest_keys = ["density", "farness", "harmonic", "hillier", "betweenness"]
+    mixed_keys = [f"hill_q{q}_{{}}_{wt}" for q in range(3) for wt in ["nw", "wt"]]
+    return {
+        "shortest": [f"cc_{key}_{dist}" for dist in distances for key in shortest_keys],
+        "simplest": [
+            f"cc_{key}_{dist}_ang" for dist in distances for key in simplest_keys
+        ],
+        "accessibility": [
+            col
+            for dist in distances
+            for cat in LANDUSE_CATEGORIES
+            for col in [
+                f"cc_{cat}_{dist}_nw",
+                f"cc_{cat}_{dist}_wt",
+                f"cc_{cat}_nearest_max_{dist}",
+            ]
+        ],
+        "mixed_uses": [
+            col
+            for dist in distances
+            for col in [f"cc_{key.format(dist)}" for key in mixed_keys]
+            + [f"cc_shannon_{dist}", f"cc_gini_{dist}"]
+        ],
+    }
+
+
+def add_group(
+    gdf: gpd.GeoDataFrame, cols: list[str], rng: np.random.Generator
+) -> gpd.GeoDataFrame:
+    values = rng.gamma(2, 100, size=(len(gdf), len(cols)))
+    return pd.concat([gdf, pd.DataFrame(values, index=gdf.index, columns=cols)], axis=1)
+
+
+def run_in_memory(
+    base_gdf: gpd.GeoDataFrame,
+    groups: dict[str, list[str]],
+    out_path: Path,
+    result_schema: outputs.ResultSchema | None,
+    seed: int,
+):
+    rng = np.random.default_rng(seed)
+    gdf = base_gdf.copy()
+    for cols in groups.values():
+        gdf = add_group(gdf, cols, rng)
+    outputs.write_geodataframe(gdf, out_path, result_schema=result_schema)
+
+
+def run_streamed(
+    base_gdf: gpd.GeoDataFrame,
+    groups: dict[str, list[str]],
+    out_path: Path,
+    result_schema: outputs.ResultSchema | None,
+    seed: int,
+):
+    rng = np.random.default_rng(seed)
+    gdf = base_gdf.copy()
+    with outputs.ResultWriter(
+        gdf, out_path, result_schema=result_schema
+    ) as result_writer:
+        for cols in groups.values():
+            gdf = add_group(gdf, cols, rng)
+            gdf = result_writer.add_columns(gdf)
+        result_writer.write()
+
+
+def measure(func, *args) -> tuple[float, float]:
+    """Returns the seconds taken and the tracemalloc peak in MB"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    secs = time.perf_counter() - start
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return secs, peak / 1024**2
+
+
+def run(
+    edge_count: int,
+    distances: list[int],
+    result_schema: outputs.ResultSchema | None,
+    output_format: str,
+    seed: int = 0,
+):
+    base_gdf = nodes_gdf(edge_count, seed)
+    groups = metric_groups(distances)
+    print(
+        f"{len(base_gdf)} nodes with {sum(len(cols) for cols in groups.values())} metric columns "
+        f"in {len(groups)} groups"
+    )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        paths = {}
+        for label, func in [("in memory", run_in_memory), ("streamed", run_streamed)]:
+            out_path = Path(temp_dir) / f"{label.replace(' ', '_')}.{output_format}"
+            secs, peak_mb = measure(
+                func, base_gdf, groups, out_path, result_schema, seed
+            )
+            paths[label] = out_path
+            print(
+                f"{label:>10}: {secs:6.2f}s, peak {peak_mb:8.1f}MB, "
+                f"file {out_path.stat().st_size / 1024**2:.1f}MB"
+            )
+        if output_format == "parquet":
+            in_memory_gdf = outputs.read_geoparquet(paths["in memory"])
+            streamed_gdf = outputs.read_geoparquet(paths["streamed"])
+        else:
+            in_memory_gdf = gpd.read_file(paths["in memory"])
+            streamed_gdf = gpd.read_file(paths["streamed"])
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(in_memory_gdf).drop(columns=in_memory_gdf.geometry.name),
+        pd.DataFrame(streamed_gdf).drop(columns=streamed_gdf.geometry.name),
+    )
+    if not in_memory_gdf.geometry.geom_equals(streamed_gdf.geometry).all():
+        raise ValueError("The streamed geometries do not match.")
+    print(
+        f"Outputs match with {len(streamed_gdf.columns)} columns, "
+        f"{int((streamed_gdf.dtypes == np.float32).sum())} of which are float32."
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edges", type=int, default=100000)
+    parser.add_argument(
+        "--distances", type=int, nargs="+", default=[400, 800, 1200, 2000, 5000]
+    )
+    parser.add_argument("--metrics", nargs="+", help="metric families or keys to keep")
+    parser.add_argument(
+        "--keep-distances", type=int, nargs="+", help="only keep these distances"
+    )
+    parser.add_argument("--float32", action="store_true")
+    parser.add_argument("--format", choices=list(outputs.SUFFIXES), default="parquet")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    result_schema = None
+    if args.metrics or args.keep_distances or args.float32:
+        result_schema = outputs.ResultSchema(
+            metrics=args.metrics, distances=args.keep_distances, float32=args.float32
+        )
+    run(args.edges, args.distances, result_schema, args.format, args.seed)
@@ -0,0 +1,233 @@
+"""
+Offline benchmark suite for the network, centrality, accessibility, and building stages on synthetic street networks.
+
+Each case generates a deterministic synthetic network via src.synthetic, as an edges GeoDataFrame in the form of edges
+reopened from a GeoPackage, and runs it through the same cityseer calls as the workflows: io.nx_from_generic_geopandas,
+graphs.nx_to_dual, io.network_structure_from_nx, networks.node_centrality_shortest, and layers.compute_accessibilities
+with synthetic landuses, as well as util.generate_points_along_perimeter on synthetic buildings. No OSM downloads are
+needed, so runs are comparable between changes and machines.
+
+Run from the repository root, e.g. python -m benchmarks.suite --layouts grid organic --sizes 10000 100000
+
+Each stage's wall time, CPU time, peak RSS, and throughput in edges per second are recorded with src.profiling and
+appended as one JSON line per case to the history file, together with the git commit. The latest results are printed
+against the previous run of the same case. Pass --trace-memory to also record tracemalloc peaks, which slows down the
+Python-heavy stages considerably. The 1M edge cases take a long time and several GB of memory for the dual graph.
+"""
+
+import argparse
+import json
+import logging
+import subprocess
+import time
+from pathlib import Path
+
+from cityseer import config
+from cityseer.metrics import layers, networks
+from cityseer.tools import graphs, io
+
+from src import profiling, synthetic, util
+
+HISTORY_PATH = Path("temp/benchmark_history.jsonl")
+SIZES = [10_000, 100_000, 1_000_000]
+STAGES = [
+    "nx_from_generic_geopandas",
+    "nx_to_dual",
+    "network_structure_from_nx",
+    "node_centrality_shortest",
+    "compute_accessibilities",
+    "generate_points_along_perimeter",
+]
+LANDUSE_CATEGORIES = ["eating", "retail", "education", "health", "cultural"]
+
+
+def git_commit() -> str | None:
+    """The current commit, suffixed with -dirty if there are uncommitted changes"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if status else commit
+
+
+def run_case(
+    layout: str,
+    edge_count: int,
+    distances: list[int],
+    stages: list[str],
+    trace_memory: bool = False,
+    seed: int = 0,
+) -> dict:
+    """Runs the stages on a synthetic network and returns the run report"""
+    with profiling.RunProfiler(
+        f"{layout}_{edge_count}", trace_memory=trace_memory
+    ) as run_profiler:
+        with profiling.stage("generate"):
+            edges_gdf = synthetic.LAYOUTS[layout](edge_count, seed=seed)
+            # landuses and buildings scale with the network, roughly as for a mid-density city
+            landuses_gdf = synthetic.landuses_gdf(
+                edges_gdf, len(edges_gdf) // 4, LANDUSE_CATEGORIES, seed=seed
+            )
+            bldgs_gdf = synthetic.buildings_gdf(
+                edges_gdf, len(edges_gdf) // 2, seed=seed
+            )
+        run_profiler.record(
+            layout=layout,
+            edges=len(edges_gdf),
+            landuses=len(landuses_gdf),
+            buildings=len(bldgs_gdf),
+            distances=distances,
+        )
+        # the centrality and accessibility stages need the network structure, the perimeter points only the buildings
+        last_network_stage = max(
+            (STAGES.index(stage) for stage in stages if stage in STAGES[:5]),
+            default=-1,
+        )
+        network_stages = STAGES[: min(last_network_stage + 1, 3)]
+        if "nx_from_generic_geopandas" in network_stages:
+            with profiling.stage("nx_from_generic_geopandas"):
+                G = io.nx_from_generic_geopandas(edges_gdf)
+                profiling.record(**profiling.graph_info(G))
+        if "nx_to_dual" in network_stages:
+            with profiling.stage("nx_to_dual"):
+                G_dual = graphs.nx_to_dual(G)
+                profiling.record(**profiling.graph_info(G_dual))
+        if "network_structure_from_nx" in network_stages:
+            with profiling.stage("network_structure_from_nx"):
+                nodes_gdf, _edges_gdf, network_structure = io.network_structure_from_nx(
+                    G_dual, crs=edges_gdf.crs
+                )
+                profiling.record(**profiling.network_info(network_structure))
+        if "node_centrality_shortest" in stages:
+            with profiling.stage("node_centrality_shortest"):
+                nodes_gdf = networks.node_centrality_shortest(
+                    network_structure, nodes_gdf, distances=distances
+                )
+        if "compute_accessibilities" in stages:
+            with profiling.stage("compute_accessibilities"):
+                nodes_gdf, _landuses_gdf = layers.compute_accessibilities(
+                    landuses_gdf,
+                    landuse_column_label="cat_key",
+                    accessibility_keys=LANDUSE_CATEGORIES,
+                    nodes_gdf=nodes_gdf,
+                    network_structure=network_structure,
+                    distances=distances,
+                    spatial_tolerance=50,
+                )
+        if "generate_points_along_perimeter" in stages:
+            with profiling.stage("generate_points_along_perimeter"):
+                points_gdf = util.generate_points_along_perimeter(bldgs_gdf, 20)
+                profiling.record(points=len(points_gdf))
+    report = run_profiler.report()
+    for stage in report["stages"]:
+        if stage["wall_s"] > 0:
+            stage["edges_per_s"] = round(report["edges"] / stage["wall_s"], 1)
+    return report
+
+
+def read_history(history_path: Path) -> list[dict]:
+    if not history_path.exists():
+        return []
+    with open(history_path) as history_file:
+        return [json.loads(line) for line in history_file if line.strip()]
+
+
+def append_history(history_path: Path, entry: dict):
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(history_path, "a") as history_file:
+        history_file.write(json.dumps(entry, default=str) + "\n")
+
+
+def print_comparison(entry: dict, previous: dict | None):
+    """Prints each stage's wall time, throughput, and peak RSS against the previous run of the case"""
+    previous_stages = (
+        {} if previous is None else {s["name"]: s for s in previous["stages"]}
+    )
+    label = "" if previous is None else f" vs {previous['commit']}"
+    print(f"{entry['case']} @ {entry['commit']}{label}")
+    for stage in entry["stages"]:
+        line = (
+            f"  {stage['name']:>32}: {stage['wall_s']:8.2f}s "
+            f"{stage.get('edges_per_s', 0):10.0f} edges/s {stage['peak_rss_mb']:8.1f}MB"
+        )
+        prev_stage = previous_stages.get(stage["name"])
+        if prev_stage is not None and prev_stage["wall_s"] > 0:
+            line += (
+                f"  ({stage['wall_s'] / prev_stage['wall_s']:.2f}x time, "
+                f"{stage['peak_rss_mb'] - prev_stage['peak_rss_mb']:+.1f}MB)"
+            )
+        print(line)
+
+
+def run(
+    layouts: list[str],
+    sizes: list[int],
+    distances: list[int],
+    stages: list[str],
+    history_path: Path = HISTORY_PATH,
+    trace_memory: bool = False,
+    seed: int = 0,
+):
+    """Runs each layout and size, appending the results to the history file"""
+    config.QUIET_MODE = True
+    commit = git_commit()
+    history = read_history(history_path)
+    for layout in layouts:
+        for edge_count in sizes:
+            case = f"{layout}_{edge_count}"
+            report = run_case(layout, edge_count, distances, stages, trace_memory, seed)
+            entry = {
+                "case": case,
+                "commit": commit,
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "seed": seed,
+                "trace_memory": trace_memory,
+                **report,
+            }
+            append_history(history_path, entry)
+            # only compare against runs with the same settings
+            previous = [
+                prev
+                for prev in history
+                if prev["case"] == case
+                and prev["distances"] == distances
+                and prev.get("seed") == seed
+                and prev.get("trace_memory") == trace_memory
+            ]
+            print_comparison(entry, previous[-1] if previous else None)
+    print(f"Appended results to {history_path}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--layouts", nargs="+", choices=list(synthetic.LAYOUTS), default=["grid"]
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES[:1])
+    parser.add_argument("--distances", type=int, nargs="+", default=[400, 800])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--history", type=Path, default=HISTORY_PATH)
+    parser.add_argument("--trace-memory", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(
+        args.layouts,
+        args.sizes,
+        args.distances,
+        args.stages,
+        args.history,
+        args.trace_memory,
+        args.seed,
+    )
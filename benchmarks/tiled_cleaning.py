@@ -0,0 +1,152 @@
+"""
+Compares the multi-tier cleaning of a whole network against the tile-parallel cleaning in src.cleaning.
+
+A synthetic network with OSM highway tags, dual carriageways, and filler nodes is cleaned with the tiers of
+cases/clean_cyprus_network.py, both as a whole and in tiles with halos of the largest buffer distance and of the
+default sum of the tiers' buffer distances. The cleaning varies slightly with Python's string hashing, so the whole
+network is cleaned both in the current process and in a fresh process with the string hashing of the tiled cleaning's
+workers, showing the variation between processes. For each result, the script reports the nodes and edges, the share
+of nodes without a node of the reference cleaning within the tolerance, and the share of edge length further than the
+tolerance from the reference edges, and vice versa. It fails if the tiled cleaning with the default halo differs by more
+than 0.1% in any of these from the monolithic cleaning with the same string hashing. Run from the repository root, e.g.
+
+    python -m benchmarks.tiled_cleaning --side 80 --tile-size 2000 --max-workers 4
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import networkx as nx
+import numpy as np
+import shapely
+from cityseer import config
+from cityseer.tools import graphs
+
+from src import cleaning, synthetic
+
+MAX_DIFFERENCE = 0.001
+
+
+def unmatched_shares(
+    G: nx.MultiGraph, G_other: nx.MultiGraph, tolerance: float
+) -> tuple[float, float]:
+    """Returns the shares of G's nodes and edge length further than the tolerance from G_other's nodes and edges"""
+    xys = np.array([(data["x"], data["y"]) for _key, data in G.nodes(data=True)])
+    other_xys = np.array(
+        [(data["x"], data["y"]) for _key, data in G_other.nodes(data=True)]
+    )
+    _idx, node_dists = shapely.STRtree(shapely.points(other_xys)).query_nearest(
+        shapely.points(xys), return_distance=True, all_matches=False
+    )
+    # vertices at most a metre apart weight the edges by their length
+    geoms = shapely.segmentize(
+        np.array([geom for _start, _end, geom in G.edges(data="geom")]), 1
+    )
+    other_geoms = np.array([geom for _start, _end, geom in G_other.edges(data="geom")])
+    _idx, edge_dists = shapely.STRtree(other_geoms).query_nearest(
+        shapely.points(shapely.get_coordinates(geoms)),
+        return_distance=True,
+        all_matches=False,
+    )
+    return float((node_dists > tolerance).mean()), float(
+        (edge_dists > tolerance).mean()
+    )
+
+
+def report(
+    label: str,
+    G: nx.MultiGraph,
+    G_reference: nx.MultiGraph,
+    seconds: float,
+    tolerance: float,
+) -> float:
+    """Prints the differences from the reference cleaning and returns the largest share"""
+    node_share, length_share = unmatched_shares(G, G_reference, tolerance)
+    ref_node_share, ref_length_share = unmatched_shares(G_reference, G, tolerance)
+    print(
+        f"  {label}: {seconds:.1f}s, {G.number_of_nodes()} nodes and {G.number_of_edges()} edges, "
+        f"{node_share:.2%} and {ref_node_share:.2%} of the nodes and "
+        f"{length_share:.2%} and {ref_length_share:.2%} of the edge length unmatched within {tolerance}m"
+    )
+    return max(node_share, length_share, ref_node_share, ref_length_share)
+
+
+def fresh_clean_tiers(G: nx.MultiGraph) -> tuple[nx.MultiGraph, float]:
+    """Cleans the tiers in a fresh process with the string hashing of the tiled cleaning's workers"""
+    hash_seed = os.environ.get("PYTHONHASHSEED")
+    os.environ["PYTHONHASHSEED"] = hash_seed or str(cleaning.HASH_SEED)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            start = time.perf_counter()
+            G_fresh = executor.submit(cleaning.clean_tiers, G).result()
+            return G_fresh, time.perf_counter() - start
+    finally:
+        if hash_seed is None:
+            del os.environ["PYTHONHASHSEED"]
+
+
+def run(
+    side: int,
+    tile_size: float,
+    tolerance: float,
+    max_workers: int | None,
+    seed: int = 0,
+):
+    config.QUIET_MODE = True
+    G = graphs.nx_remove_dangling_nodes(synthetic.osm_graph(side, seed=seed))
+    print(
+        f"{side} x {side} grid: {G.number_of_nodes()} nodes and {G.number_of_edges()} edges, "
+        f"tiles of {tile_size}m"
+    )
+    start = time.perf_counter()
+    G_monolithic = cleaning.clean_tiers(G)
+    mono_s = time.perf_counter() - start
+    print(
+        f"  monolithic: {mono_s:.1f}s, {G_monolithic.number_of_nodes()} nodes and "
+        f"{G_monolithic.number_of_edges()} edges"
+    )
+    G_fresh, fresh_s = fresh_clean_tiers(G)
+    report(
+        "monolithic in a process with the workers' string hashing, against the above",
+        G_fresh,
+        G_monolithic,
+        fresh_s,
+        tolerance,
+    )
+    # tiles cleaned in the current process share its string hashing
+    G_reference = G_monolithic if max_workers == 1 else G_fresh
+    buffer_dists = cleaning.tier_buffer_dists(cleaning.OSM_TIERS)
+    for halo in [max(buffer_dists), sum(buffer_dists)]:
+        start = time.perf_counter()
+        G_tiled = cleaning.tiled_clean_tiers(
+            G, tile_size, halo=halo, max_workers=max_workers
+        )
+        tiled_s = time.perf_counter() - start
+        difference = report(
+            f"tiled with a {halo}m halo, against the same string hashing",
+            G_tiled,
+            G_reference,
+            tiled_s,
+            tolerance,
+        )
+    if difference > MAX_DIFFERENCE:
+        raise ValueError("The tiled cleaning with the default halo differs.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--side", type=int, default=40)
+    parser.add_argument("--tile-size", type=float, default=1000)
+    parser.add_argument("--tolerance", type=float, default=1)
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("cityseer").setLevel(logging.ERROR)
+    run(args.side, args.tile_size, args.tolerance, args.max_workers, args.seed)
@@ -0,0 +1,147 @@
+"""
+Compares the networkX export of primal nodes as vis lines against the array-based export via src.dual and src.outputs.
+
+A synthetic network is given reversed geoms, bent parallel edges, and self-loops, as for benchmarks/dual_network.py,
+and its nodes GDF is built with primal.network_structure_from_primal. The networkX route builds the graph with
+primal.nx_from_primal and graphs.nx_generate_vis_lines, then looks up each node's lines and converts each node's point
+to WKT row by row, as previously in the Gothenburg cases. The array route builds the lines with dual.vis_lines and
+attaches them with outputs.nodes_as_lines. Both tables are then written to GPKG, and the edge geoms are read from WKT
+both row by row and at once. The script fails unless the node points and the lines match, the latter within a Hausdorff
+distance of 1mm as the half edges may be in a different order and the midpoints may differ by rounding. Run from the
+repository root, e.g.
+
+    python -m benchmarks.vis_lines --layouts grid organic --edges 100000
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from cityseer import config
+from cityseer.tools import graphs
+from shapely.wkt import loads
+
+from benchmarks.dual_network import with_irregular_edges
+from src import dual, outputs, primal, synthetic
+
+TOLERANCE = 0.001
+
+
+def nx_route(primal_net: primal.PrimalEdges, nodes_gdf: gpd.GeoDataFrame):
+    G = graphs.nx_generate_vis_lines(primal.nx_from_primal(primal_net))
+
+    def generate_vis_lines(node_row):
+        return G.nodes[node_row.name]["line_geom"]
+
+    def geom_to_wkt(node_row):
+        return shapely.to_wkt(node_row["geom"])
+
+    crs = nodes_gdf.crs
+    nodes_gdf = nodes_gdf.copy()
+    nodes_gdf["edge_geom"] = nodes_gdf.apply(generate_vis_lines, axis=1)
+    nodes_gdf["node_geom_wkt"] = nodes_gdf.apply(geom_to_wkt, axis=1)
+    nodes_gdf = nodes_gdf.drop(columns=["geom"])
+    return nodes_gdf.set_geometry("edge_geom").set_crs(crs)
+
+
+def array_route(primal_net: primal.PrimalEdges, nodes_gdf: gpd.GeoDataFrame):
+    return outputs.nodes_as_lines(
+        nodes_gdf, dual.vis_lines(primal_net), point_col="node_geom_wkt"
+    )
+
+
+def compare(lines_gdf: gpd.GeoDataFrame, a_lines_gdf: gpd.GeoDataFrame):
+    if not lines_gdf.index.equals(a_lines_gdf.index):
+        raise ValueError("The node keys differ.")
+    if not (
+        lines_gdf["node_geom_wkt"].to_numpy()
+        == shapely.to_wkt(a_lines_gdf["node_geom_wkt"].to_numpy())
+    ).all():
+        raise ValueError("The node points differ.")
+    part_counts = shapely.get_num_geometries(lines_gdf.geometry.values)
+    a_part_counts = shapely.get_num_geometries(a_lines_gdf.geometry.values)
+    if not (part_counts == a_part_counts).all():
+        raise ValueError("The numbers of half edges differ.")
+    dists = shapely.hausdorff_distance(
+        lines_gdf.geometry.values, a_lines_gdf.geometry.values
+    )
+    if not (dists <= TOLERANCE).all():
+        raise ValueError(
+            f"The lines of {(dists > TOLERANCE).sum()} nodes differ, by up to {dists.max():.3f}m."
+        )
+    return int(part_counts.sum())
+
+
+def run(layouts: list[str], edge_count: int, fraction: float, seed: int = 0):
+    config.QUIET_MODE = True
+    for layout in layouts:
+        edges_gdf = synthetic.LAYOUTS[layout](edge_count, seed=seed)
+        G = with_irregular_edges(
+            primal.nx_from_primal(primal.primal_edges(edges_gdf)), fraction, seed
+        )
+        primal_net = primal.primal_from_nx(G)
+        nodes_gdf, _edges_gdf, _network_structure = (
+            primal.network_structure_from_primal(
+                primal_net, crs=synthetic.SYNTHETIC_CRS
+            )
+        )
+        print(
+            f"{layout}: {primal_net.node_count} nodes, {primal_net.edge_count} edges "
+            f"including parallel edges and self-loops"
+        )
+        start = time.perf_counter()
+        a_lines_gdf = array_route(primal_net, nodes_gdf)
+        a_s = time.perf_counter() - start
+        start = time.perf_counter()
+        lines_gdf = nx_route(primal_net, nodes_gdf)
+        nx_s = time.perf_counter() - start
+        print(f"  vis_lines and nodes_as_lines: {a_s:.2f}s")
+        print(
+            f"  nx_from_primal, nx_generate_vis_lines, and row-wise lookups and WKT: {nx_s:.2f}s"
+        )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            start = time.perf_counter()
+            outputs.write_gpkg(a_lines_gdf, Path(temp_dir) / "array.gpkg")
+            a_write_s = time.perf_counter() - start
+            start = time.perf_counter()
+            lines_gdf.to_file(Path(temp_dir) / "nx.gpkg")
+            nx_write_s = time.perf_counter() - start
+        print(
+            f"  GPKG: {a_write_s:.2f}s via write_gpkg against {nx_write_s:.2f}s via to_file"
+        )
+        # as for geoms stored as WKT in a second geometry column of a GPKG
+        wkts = shapely.to_wkt(primal_net.geoms)
+        start = time.perf_counter()
+        loaded = np.array([loads(wkt) for wkt in wkts.tolist()])
+        loads_s = time.perf_counter() - start
+        start = time.perf_counter()
+        a_loaded = shapely.from_wkt(wkts)
+        from_wkt_s = time.perf_counter() - start
+        if not shapely.equals(loaded, a_loaded).all():
+            raise ValueError("The edge geoms loaded from WKT differ.")
+        print(
+            f"  reading the edge geoms from WKT: {from_wkt_s:.2f}s via from_wkt against {loads_s:.2f}s row by row"
+        )
+        half_count = compare(lines_gdf, a_lines_gdf)
+        print(f"  {len(lines_gdf)} node points and {half_count} half edges match")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--layouts",
+        nargs="+",
+        default=list(synthetic.LAYOUTS),
+        choices=synthetic.LAYOUTS,
+    )
+    parser.add_argument("--edges", type=int, default=10000)
+    parser.add_argument("--fraction", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    run(args.layouts, args.edges, args.fraction, args.seed)
@@ -0,0 +1,297 @@
+"""
+Network-distance-weighted aggregation of numerical data, such as building morphometrics, onto network nodes.
+
+cityseer's layers.compute_stats assigns the data points to the network and traverses the network from every node once
+per column, so aggregating several columns repeats both the assignment and the traversals. Here the assignment is
+computed once and cached on disk, keyed by a hash of the network and the data point coordinates, so that later runs
+with other distances or columns reuse it. compute_stats then traverses the network once per node up to the largest
+distance and derives every statistic for every column and distance from the reachable data points with numpy, a chunk
+of nodes at a time. The statistics and column names match layers.compute_stats, except that the max and min of nodes
+without data points are NaN.
+"""
+
+import hashlib
+import logging
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from cityseer import config, rustalgos
+
+logger = logging.getLogger(__name__)
+
+# bump if the assignment changes so that older cache entries are not reused
+ASSIGNMENT_VERSION = 1
+
+STATS_COLUMNS = [
+    "area",
+    "perimeter",
+    "circular_compact",
+    "square_compactness",
+    "shared_walls_ratio",
+]
+# the statistics and whether weighted, in the order of layers.compute_stats, None for those without variants
+STATS_KEYS = [
+    ("sum", False),
+    ("sum", True),
+    ("mean", False),
+    ("mean", True),
+    ("count", False),
+    ("count", True),
+    ("var", False),
+    ("var", True),
+    ("max", None),
+    ("min", None),
+]
+
+
+def building_points(
+    bldgs_gdf: gpd.GeoDataFrame, stats_columns: list[str]
+) -> gpd.GeoDataFrame:
+    """Returns the building centroids with the stats columns, indexed by string keys as required by cityseer"""
+    missing = [col for col in stats_columns if col not in bldgs_gdf.columns]
+    if missing:
+        raise ValueError(f"Buildings are missing the stats columns {missing}.")
+    points_gdf = gpd.GeoDataFrame(
+        bldgs_gdf[stats_columns].astype(np.float64),
+        geometry=bldgs_gdf.geometry.centroid,
+        crs=bldgs_gdf.crs,
+    )
+    points_gdf.index = points_gdf.index.astype(str)
+    return points_gdf
+
+
+def assignment_digest(
+    network_structure: rustalgos.NetworkStructure,
+    xys: np.ndarray,
+    max_netw_assign_dist: float,
+) -> str:
+    """Hashes the node coordinates, edges, data point coordinates, and assignment distance"""
+    digest = hashlib.sha256(f"{ASSIGNMENT_VERSION}:{max_netw_assign_dist}".encode())
+    digest.update(np.asarray(network_structure.node_xys, dtype=np.float64).tobytes())
+    digest.update(
+        np.asarray(network_structure.edge_references(), dtype=np.int64).tobytes()
+    )
+    digest.update(np.ascontiguousarray(xys, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def assign_to_network(
+    data_gdf: gpd.GeoDataFrame,
+    network_structure: rustalgos.NetworkStructure,
+    max_netw_assign_dist: float = 400,
+    cache_dir: Path | str | None = None,
+) -> tuple[rustalgos.DataMap, np.ndarray]:
+    """
+    Assigns the data points to the nearest and next nearest network nodes, as for layers.assign_gdf_to_network.
+
+    Returns the DataMap, keyed by the position of each data point in data_gdf, and an array of the nearest and next
+    nearest node indices shaped points x 2, with -1 where unassigned. If cache_dir is set, the assignment is read from
+    or written to a file named by assignment_digest.
+    """
+    xys = np.column_stack([data_gdf.geometry.x, data_gdf.geometry.y])
+    cache_path = None
+    assigned = None
+    if cache_dir is not None:
+        cache_path = (
+            Path(cache_dir)
+            / f"{assignment_digest(network_structure, xys, max_netw_assign_dist)}.npy"
+        )
+        if cache_path.exists():
+            logger.info(f"Reusing the cached network assignment {cache_path.name}.")
+            assigned = np.load(cache_path)
+    data_map = rustalgos.DataMap()
+    for data_idx, (x, y) in enumerate(xys.tolist()):
+        if assigned is None:
+            data_map.insert(str(data_idx), x, y)
+        else:
+            nearest, next_nearest = assigned[data_idx].tolist()
+            data_map.insert(
+                str(data_idx),
+                x,
+                y,
+                None,
+                None if nearest < 0 else nearest,
+                None if next_nearest < 0 else next_nearest,
+            )
+    if assigned is None:
+        logger.info(f"Assigning {len(xys)} data points to the network.")
+        assigned = np.full((len(xys), 2), -1, dtype=np.int64)
+        for data_idx in range(len(xys)):
+            data_key = str(data_idx)
+            nearest, next_nearest = network_structure.assign_to_network(
+                data_map.get_data_coord(data_key), max_netw_assign_dist
+            )
+            if nearest is not None:
+                data_map.set_nearest_assign(data_key, nearest)
+                assigned[data_idx, 0] = nearest
+            if next_nearest is not None:
+                data_map.set_next_nearest_assign(data_key, next_nearest)
+                assigned[data_idx, 1] = next_nearest
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            np.save(cache_path, assigned)
+    if len(xys) and (assigned[:, 0] < 0).all():
+        logger.warning("No assignments for nearest assigned direction.")
+    return data_map, assigned
+
+
+def _empty_stats(
+    shape: tuple[int, int], distances: list[int]
+) -> dict[tuple[str, int, bool | None], np.ndarray]:
+    """Arrays for each statistic and distance, zero for the sums and counts and NaN otherwise"""
+    return {
+        (stat, dist, weighted): np.full(
+            shape, 0.0 if stat in ("sum", "count") else np.nan
+        )
+        for dist in distances
+        for stat, weighted in STATS_KEYS
+    }
+
+
+def _chunk_stats(
+    values: np.ndarray,
+    node_idx: np.ndarray,
+    data_idx: np.ndarray,
+    data_dists: np.ndarray,
+    node_count: int,
+    distances: list[int],
+    betas: list[float],
+) -> dict[tuple[str, int, bool | None], np.ndarray]:
+    """
+    Computes the statistics for the nodes of a chunk from the pairs of nodes and reachable data points.
+
+    The pairs should be sorted by node_idx. Returns arrays shaped nodes x columns keyed by statistic, distance, and
+    weighted.
+    """
+    results = {}
+    for dist, beta in zip(distances, betas):
+        # only the pairs within this distance, which remain sorted by node
+        within = data_dists <= dist
+        pair_nodes = node_idx[within]
+        pair_values = values[data_idx[within]]
+        # as for cityseer, which computes the weights in single precision
+        wts = np.exp(-np.float32(beta) * data_dists[within]).astype(np.float64)
+        valid = ~np.isnan(pair_values)
+        wts_valid = np.where(valid, wts[:, None], 0)
+        masked = np.where(valid, pair_values, 0)
+        # the start of each node's pairs, for nodes with at least one pair
+        seg_starts = np.flatnonzero(np.diff(pair_nodes, prepend=-1))
+        seg_nodes = pair_nodes[seg_starts]
+        dist_results = _empty_stats((node_count, values.shape[1]), [dist])
+        if not len(seg_starts):
+            results.update(dist_results)
+            continue
+        count = np.add.reduceat(valid.astype(np.float64), seg_starts)
+        count_wt = np.add.reduceat(wts_valid, seg_starts)
+        total = np.add.reduceat(masked, seg_starts)
+        total_wt = np.add.reduceat(masked * wts_valid, seg_starts)
+        # expands per node values to the pairs
+        pair_seg = np.repeat(
+            np.arange(len(seg_starts)), np.diff(seg_starts, append=len(pair_nodes))
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+            mean_wt = total_wt / count_wt
+            var = (
+                np.add.reduceat(
+                    np.where(valid, (pair_values - mean[pair_seg]) ** 2, 0), seg_starts
+                )
+                / count
+            )
+            # cityseer's weighted variance is the unweighted sum of squares about the weighted mean
+            var_wt = (
+                np.add.reduceat(
+                    np.where(valid, (pair_values - mean_wt[pair_seg]) ** 2, 0),
+                    seg_starts,
+                )
+                / count_wt
+            )
+        max_ = np.maximum.reduceat(np.where(valid, pair_values, -np.inf), seg_starts)
+        min_ = np.minimum.reduceat(np.where(valid, pair_values, np.inf), seg_starts)
+        max_[count == 0] = np.nan
+        min_[count == 0] = np.nan
+        for key, arr in zip(
+            dist_results,
+            [total, total_wt, mean, mean_wt, count, count_wt, var, var_wt, max_, min_],
+        ):
+            dist_results[key][seg_nodes] = arr
+        results.update(dist_results)
+    return results
+
+
+def compute_stats(
+    data_gdf: gpd.GeoDataFrame,
+    stats_columns: list[str],
+    nodes_gdf: gpd.GeoDataFrame,
+    network_structure: rustalgos.NetworkStructure,
+    distances: list[int],
+    max_netw_assign_dist: float = 400,
+    angular: bool = False,
+    cache_dir: Path | str | None = None,
+    chunk_size: int = 1000,
+) -> gpd.GeoDataFrame:
+    """
+    Returns nodes_gdf with the network-distance-weighted statistics of each stats column at each distance.
+
+    The columns match layers.compute_stats called for each column in turn, e.g. cc_area_mean_400_wt, and are float32 as
+    for cityseer. Each live node is traversed once, up to the largest distance, and the statistics are computed for
+    chunk_size nodes at a time. See assign_to_network for cache_dir.
+    """
+    missing = [col for col in stats_columns if col not in data_gdf.columns]
+    if missing:
+        raise ValueError(
+            f"The stats columns {missing} can't be found in the GeoDataFrame."
+        )
+    distances, betas = rustalgos.pair_distances_and_betas(distances, None)
+    data_map, _assigned = assign_to_network(
+        data_gdf, network_structure, max_netw_assign_dist, cache_dir=cache_dir
+    )
+    values = data_gdf[stats_columns].to_numpy(dtype=np.float64)
+    stats = _empty_stats(
+        (network_structure.node_count(), len(stats_columns)), distances
+    )
+    live_idx = np.flatnonzero(np.asarray(network_structure.node_lives, dtype=bool))
+    logger.info(
+        f"Computing {len(stats_columns)} stats columns for {len(live_idx)} live nodes "
+        f"from {len(data_gdf)} data points."
+    )
+    max_dist = max(distances)
+    for chunk_start in range(0, len(live_idx), chunk_size):
+        chunk_idx = live_idx[chunk_start : chunk_start + chunk_size]
+        chunk_data_idx = []
+        chunk_dists = []
+        for netw_src_idx in chunk_idx.tolist():
+            reachable = data_map.aggregate_to_src_idx(
+                netw_src_idx, network_structure, max_dist, angular=angular
+            )
+            chunk_data_idx.append(
+                np.fromiter(map(int, reachable.keys()), np.int64, len(reachable))
+            )
+            chunk_dists.append(
+                np.fromiter(reachable.values(), np.float32, len(reachable))
+            )
+        seg_lens = [len(arr) for arr in chunk_data_idx]
+        chunk_results = _chunk_stats(
+            values,
+            np.repeat(np.arange(len(chunk_idx)), seg_lens),
+            np.concatenate(chunk_data_idx),
+            np.concatenate(chunk_dists),
+            len(chunk_idx),
+            distances,
+            betas,
+        )
+        for stats_key, arr in chunk_results.items():
+            stats[stats_key][chunk_idx] = arr
+    # ordered by column, distance, and statistic, as for successive calls to layers.compute_stats
+    stats_cols = {}
+    for col_idx, col in enumerate(stats_columns):
+        for (stat, dist, weighted), arr in stats.items():
+            key = config.prep_gdf_key(
+                f"{col}_{stat}", dist, angular=angular, weighted=weighted
+            )
+            stats_cols[key] = arr[:, col_idx].astype(np.float32)
+    return pd.concat(
+        [nodes_gdf, pd.DataFrame(stats_cols, index=nodes_gdf.index)], axis=1
+    )
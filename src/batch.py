@@ -0,0 +1,247 @@
+"""
+Memory-aware process pool for running a workflow over many regions.
+
+Jobs are admitted by estimated peak memory rather than by a fixed worker count: a job starts once the estimates of the
+running jobs plus its own fit within the memory budget, and a job larger than the budget runs on its own. Each job runs
+in a fresh process so that memory is released between jobs, and a failed job, including one whose process crashed, is
+retried without affecting the others. A crashed process breaks the whole pool, failing every running job, so these are
+rerun one at a time without counting the attempt, and only a job that crashes while running on its own is charged. A
+throughput report is returned and optionally written as JSON.
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+import psutil
+
+if sys.platform != "win32":
+    import resource
+
+logger = logging.getLogger(__name__)
+
+# coefficients for the peak memory estimate - calibrate against the peak RSS in the batch reports
+BASE_MEMORY_MB = 400
+NODE_MEMORY_KB = 6
+NODE_MEMORY_KB_PER_KM = 0.5
+
+
+def estimate_peak_memory_mb(
+    node_count: int,
+    max_distance: float,
+    base_mb: float = BASE_MEMORY_MB,
+    node_kb: float = NODE_MEMORY_KB,
+    node_kb_per_km: float = NODE_MEMORY_KB_PER_KM,
+) -> float:
+    """
+    Estimates a region's peak memory from its node count and largest distance.
+
+    The estimate is linear in the node count: the graph, GeoDataFrames, and results take a fixed amount per node, and
+    the per-node search state grows with the largest distance since more nodes are reached from each source.
+    """
+    per_node_kb = node_kb + node_kb_per_km * max_distance / 1000
+    return base_mb + node_count * per_node_kb / 1024
+
+
+@dataclass
+class BatchJob:
+    """A job's arguments for the batch func, its estimated peak memory, and its outcome"""
+
+    name: str
+    kwargs: dict[str, Any]
+    memory_mb: float
+    attempts: int = 0
+    status: str = "pending"
+    errors: list[str] = field(default_factory=list)
+    wall_s: float = 0
+    cpu_s: float = 0
+    peak_rss_mb: float = 0
+
+
+def _peak_rss_mb() -> float:
+    """Returns the peak RSS of this process, as tracked by the OS"""
+    if sys.platform == "win32":
+        return psutil.Process().memory_info().peak_wset / 1024**2
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in KB on Linux
+    return peak_rss / 1024**2 if sys.platform == "darwin" else peak_rss / 1024
+
+
+def _run_job(func: Callable[..., Any], kwargs: dict[str, Any]) -> dict[str, float]:
+    """Runs a job in a worker process and returns its timings"""
+    start_wall = time.perf_counter()
+    func(**kwargs)
+    cpu_times = psutil.Process().cpu_times()
+    return {
+        "wall_s": time.perf_counter() - start_wall,
+        # includes time from all threads, e.g. the parallelised centrality computations
+        "cpu_s": cpu_times.user + cpu_times.system,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def default_memory_budget_mb(fraction: float = 0.8) -> float:
+    """Returns a fraction of the currently available memory"""
+    return psutil.virtual_memory().available / 1024**2 * fraction
+
+
+def run_batch(
+    func: Callable[..., Any],
+    jobs: list[BatchJob],
+    memory_budget_mb: float | None = None,
+    max_workers: int | None = None,
+    retries: int = 1,
+    report_path: Path | str | None = None,
+) -> dict[str, Any]:
+    """
+    Runs func(**job.kwargs) for each job in a process pool, admitting jobs by their estimated memory.
+
+    The func must be importable by the worker processes, i.e. defined at module level. Failed jobs are retried up to
+    retries times. Returns the throughput report.
+    """
+    if memory_budget_mb is None:
+        memory_budget_mb = default_memory_budget_mb()
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    # start the largest jobs first so that smaller jobs fill the remaining budget
+    pending = sorted(jobs, key=lambda job: job.memory_mb, reverse=True)
+    running: dict[Future, BatchJob] = {}
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    executor = ProcessPoolExecutor(max_workers=max_workers, max_tasks_per_child=1)
+
+    def _fail(job: BatchJob, error: str):
+        job.errors.append(error)
+        if job.attempts <= retries:
+            logger.warning(f"Job {job.name} failed, retrying: {error.splitlines()[-1]}")
+            job.status = "pending"
+            pending.append(job)
+        else:
+            logger.error(f"Job {job.name} failed after {job.attempts} attempts.")
+            job.status = "failed"
+
+    # the jobs running when a worker crashed, rerun one at a time to find the one that crashed
+    suspects: list[BatchJob] = []
+
+    def _start(job: BatchJob):
+        job.attempts += 1
+        job.status = "running"
+        logger.info(
+            f"Starting job {job.name} (attempt {job.attempts}, ~{job.memory_mb:.0f}MB)."
+        )
+        running[executor.submit(_run_job, func, job.kwargs)] = job
+
+    try:
+        while pending or suspects or running:
+            if suspects:
+                if not running:
+                    _start(suspects.pop(0))
+            else:
+                # admit pending jobs while they fit in the remaining budget
+                in_use_mb = sum(job.memory_mb for job in running.values())
+                for job in list(pending):
+                    if len(running) >= max_workers:
+                        break
+                    # a job exceeding the whole budget runs once nothing else is running
+                    if running and in_use_mb + job.memory_mb > memory_budget_mb:
+                        continue
+                    pending.remove(job)
+                    _start(job)
+                    in_use_mb += job.memory_mb
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            crashed = []
+            for future in done:
+                job = running.pop(future)
+                try:
+                    timings = future.result()
+                except BrokenProcessPool:
+                    crashed.append(job)
+                except Exception:
+                    _fail(job, traceback.format_exc())
+                else:
+                    job.status = "done"
+                    job.wall_s = timings["wall_s"]
+                    job.cpu_s = timings["cpu_s"]
+                    job.peak_rss_mb = timings["peak_rss_mb"]
+                    logger.info(f"Job {job.name} completed in {job.wall_s:.1f}s.")
+            if crashed:
+                # a crashed worker breaks the pool, failing the other running jobs too
+                crashed.extend(running.values())
+                running.clear()
+                if len(crashed) == 1:
+                    _fail(crashed[0], "Worker process terminated abruptly.")
+                else:
+                    logger.warning(
+                        f"A worker crashed while running {len(crashed)} jobs, rerunning these one at a time."
+                    )
+                    for job in crashed:
+                        job.attempts -= 1
+                        job.status = "pending"
+                        suspects.append(job)
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = ProcessPoolExecutor(
+                    max_workers=max_workers, max_tasks_per_child=1
+                )
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    wall_s = time.perf_counter() - start_wall
+    report = batch_report(
+        jobs, wall_s, time.process_time() - start_cpu, memory_budget_mb, max_workers
+    )
+    if report_path is not None:
+        with open(report_path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        logger.info(f"Wrote batch report to {report_path}.")
+    return report
+
+
+def batch_report(
+    jobs: list[BatchJob],
+    wall_s: float,
+    parent_cpu_s: float,
+    memory_budget_mb: float,
+    max_workers: int,
+) -> dict[str, Any]:
+    """Summarises throughput and CPU utilisation for a batch run"""
+    completed = [job for job in jobs if job.status == "done"]
+    cpu_s = parent_cpu_s + sum(job.cpu_s for job in jobs)
+    cpu_count = os.cpu_count() or 1
+    report = {
+        "regions": len(jobs),
+        "completed": len(completed),
+        "failed": len(jobs) - len(completed),
+        "wall_s": round(wall_s, 3),
+        "regions_per_hour": round(len(completed) / wall_s * 3600, 2) if wall_s else 0,
+        "cpu_s": round(cpu_s, 3),
+        # share of the machine's CPU capacity used over the run
+        "cpu_utilisation": round(cpu_s / (wall_s * cpu_count), 3) if wall_s else 0,
+        "cpu_count": cpu_count,
+        "max_workers": max_workers,
+        "memory_budget_mb": round(memory_budget_mb),
+        "jobs": [
+            {
+                "name": job.name,
+                "status": job.status,
+                "attempts": job.attempts,
+                "estimated_memory_mb": round(job.memory_mb),
+                "peak_rss_mb": round(job.peak_rss_mb),
+                "wall_s": round(job.wall_s, 3),
+                "cpu_s": round(job.cpu_s, 3),
+                "errors": job.errors,
+            }
+            for job in jobs
+        ],
+    }
+    logger.info(
+        f"Batch: {report['completed']} of {report['regions']} regions in {wall_s:.0f}s "
+        f"({report['regions_per_hour']} regions/hour, {report['cpu_utilisation']:.0%} CPU utilisation)."
+    )
+    return report
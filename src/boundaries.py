@@ -0,0 +1,107 @@
+"""
+Boundary preparation shared by the workflows: reprojection and live and buffered extents.
+
+Geometries are reprojected in a single vectorised pyproj call over all of their coordinates via shapely.transform,
+which keeps interior rings and multipart geometries intact, and Transformer instances are cached per CRS pair. The
+live extents are the convex hull of the boundary, optionally buffered, and simplified so that the OSM APIs do not
+complain of overly long URIs. The buffered extents add the largest analysis distance to avoid edge roll-off.
+"""
+
+import functools
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from pyproj import CRS, Transformer
+from shapely import geometry
+
+from src import readers
+
+CRSLike = int | str | CRS
+
+
+@functools.lru_cache(maxsize=32)
+def _cached_transformer(from_crs: str, to_crs: str) -> Transformer:
+    return Transformer.from_crs(from_crs, to_crs, always_xy=True)
+
+
+def transformer(from_crs: CRSLike, to_crs: CRSLike) -> Transformer:
+    """Returns a cached always_xy Transformer for the CRS pair"""
+    return _cached_transformer(
+        CRS.from_user_input(from_crs).to_wkt(), CRS.from_user_input(to_crs).to_wkt()
+    )
+
+
+def project_geom(
+    geom: geometry.base.BaseGeometry, from_crs: CRSLike, to_crs: CRSLike
+) -> geometry.base.BaseGeometry:
+    """Reprojects a geometry, including any interior rings and parts, with one transform over all coordinates"""
+    geom_transformer = transformer(from_crs, to_crs)
+
+    def _transform(coords: np.ndarray) -> np.ndarray:
+        xs, ys = geom_transformer.transform(coords[:, 0], coords[:, 1])
+        return np.column_stack([xs, ys])
+
+    return shapely.transform(geom, _transform)
+
+
+def boundary_geom(
+    bounds: geometry.base.BaseGeometry | gpd.GeoSeries | gpd.GeoDataFrame,
+    to_crs: CRSLike | None = None,
+    from_crs: CRSLike | None = None,
+) -> geometry.base.BaseGeometry:
+    """
+    Returns the boundary as a single geometry, reprojected to to_crs if set.
+
+    The CRS of a GeoSeries or GeoDataFrame is used unless from_crs is set, which is required for shapely geometries
+    if reprojecting. Multiple rows are combined into a MultiPolygon without a union, so that detailed boundaries are
+    not noded.
+    """
+    if isinstance(bounds, (gpd.GeoSeries, gpd.GeoDataFrame)):
+        from_crs = bounds.crs if from_crs is None else from_crs
+        geoms = (
+            bounds.geometry.values
+            if isinstance(bounds, gpd.GeoDataFrame)
+            else bounds.values
+        )
+        if not len(geoms):
+            raise ValueError("The boundary is empty.")
+        parts = shapely.get_parts(np.asarray(geoms))
+        bounds = parts[0] if len(parts) == 1 else shapely.multipolygons(parts)
+    if bounds.geom_type not in ("Polygon", "MultiPolygon"):
+        raise ValueError("Input data should be Polygon or MultiPolygon type.")
+    if to_crs is None:
+        return bounds
+    if from_crs is None:
+        raise ValueError("A source CRS is required to reproject a shapely geometry.")
+    return project_geom(bounds, from_crs, to_crs)
+
+
+def prepare_extents(
+    bounds: geometry.base.BaseGeometry | gpd.GeoSeries | gpd.GeoDataFrame,
+    buffer_dist: float,
+    simplify_dist: float = 100,
+    live_buffer_dist: float = 0,
+    hull: bool = True,
+    to_crs: CRSLike | None = None,
+    from_crs: CRSLike | None = None,
+) -> tuple[geometry.base.BaseGeometry, geometry.base.BaseGeometry]:
+    """
+    Returns the live extents and the live extents buffered by buffer_dist, in to_crs if set.
+
+    The live extents are the convex hull of the boundary's vertices, buffered by live_buffer_dist if set, then
+    simplified by simplify_dist. Simplifying only removes vertices from the convex hull, so the live extents can fall
+    short of the hull by up to simplify_dist. Set hull to False to keep the boundary's own shape, including holes and
+    parts, in which case the simplification preserves topology. Distances are in the units of the output CRS, which
+    should therefore be projected. See boundary_geom for the input types and from_crs.
+    """
+    bounds_geom = boundary_geom(bounds, to_crs=to_crs, from_crs=from_crs)
+    if hull:
+        extents_geom = readers.vertex_hull(shapely.get_parts(bounds_geom))
+    else:
+        extents_geom = bounds_geom
+    if live_buffer_dist:
+        extents_geom = extents_geom.buffer(live_buffer_dist)
+    if simplify_dist:
+        extents_geom = extents_geom.simplify(simplify_dist)
+    return extents_geom, extents_geom.buffer(buffer_dist)
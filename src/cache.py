@@ -0,0 +1,245 @@
+"""
+On-disk cache for OSM downloads.
+
+Results are keyed by a hash of the query (polygon WKB, tags, CRS codes and options) and are stored as compressed
+pickles. Entries older than max_age_days are refetched and the least recently used entries are evicted once the cache
+exceeds max_size_mb.
+
+Downloads go to the public Overpass and Nominatim APIs unless other endpoints are set, e.g. the local stand-in in
+src.osm_server, via the overpass_url and nominatim_url arguments or the OSM_OVERPASS_URL and OSM_NOMINATIM_URL
+environment variables. Results from other endpoints are cached under separate keys.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable
+
+import geopandas as gpd
+import networkx as nx
+import osmnx as ox
+import requests
+import shapely
+from cityseer.tools import io
+from osmnx import features
+from shapely import geometry
+
+logger = logging.getLogger(__name__)
+
+# bump if the stored format changes so that stale entries are not reused
+CACHE_VERSION = 1
+
+OVERPASS_URL_ENV = "OSM_OVERPASS_URL"
+NOMINATIM_URL_ENV = "OSM_NOMINATIM_URL"
+
+
+def _geom_digest(geom: geometry.base.BaseGeometry) -> str:
+    """Hashes the normalised WKB so that equivalent polygons share a key"""
+    return hashlib.sha256(shapely.to_wkb(shapely.normalize(geom))).hexdigest()
+
+
+def _overpass_fetcher(overpass_url: str) -> Callable:
+    """
+    Returns a replacement for cityseer's io.fetch_osm_network, which always requests the public Overpass API.
+
+    Unlike cityseer's version, 429 and 504 responses are retried after the Retry-After header or an exponential
+    backoff.
+    """
+
+    def fetch_osm_network(
+        osm_request: str, timeout: int = 300, max_tries: int = 3
+    ) -> requests.Response:
+        for attempt in range(max_tries):
+            osm_response = requests.get(
+                f"{overpass_url.rstrip('/')}/interpreter",
+                timeout=timeout,
+                params={"data": osm_request},
+            )
+            if osm_response.status_code == 200:
+                return osm_response
+            if attempt + 1 < max_tries:
+                pause = float(osm_response.headers.get("Retry-After", 2**attempt))
+                logger.warning(
+                    f"Overpass responded {osm_response.status_code}, retrying in {pause}s."
+                )
+                time.sleep(pause)
+        osm_response.raise_for_status()
+        raise requests.RequestException(
+            f"Unsuccessful OSM API request with status {osm_response.status_code}."
+        )
+
+    return fetch_osm_network
+
+
+class OSMCache:
+    """Content-addressed cache wrapping the OSM network, features, and geocoding fetches"""
+
+    def __init__(
+        self,
+        cache_dir: Path | str = "../temp/osm_cache",
+        max_size_mb: float = 5000,
+        max_age_days: float = 30,
+        overpass_url: str | None = None,
+        nominatim_url: str | None = None,
+    ):
+        self.overpass_url = overpass_url or os.environ.get(OVERPASS_URL_ENV)
+        self.nominatim_url = nominatim_url or os.environ.get(NOMINATIM_URL_ENV)
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_size_mb * 1024**2
+        self.max_age_secs = max_age_days * 24 * 60 * 60
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    def _key(self, func_name: str, query: dict[str, Any]) -> str:
+        """Hashes the function name and query parameters"""
+        key_query = {"version": CACHE_VERSION, "func": func_name, **query}
+        # keys for the public APIs are unchanged so that existing entries stay valid
+        if self.overpass_url or self.nominatim_url:
+            key_query["endpoints"] = [self.overpass_url, self.nominatim_url]
+        payload = json.dumps(key_query, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pkl.gz"
+
+    def _fetch(
+        self, func_name: str, query: dict[str, Any], fetch: Callable[[], Any]
+    ) -> Any:
+        """Returns a cached result if fresh, otherwise fetches and stores the result"""
+        cache_path = self._path(self._key(func_name, query))
+        if cache_path.exists():
+            stat = cache_path.stat()
+            # mtime records when the entry was written
+            if time.time() - stat.st_mtime <= self.max_age_secs:
+                with gzip.open(cache_path, "rb") as cache_file:
+                    result = pickle.load(cache_file)
+                # atime records when the entry was last used for LRU eviction
+                os.utime(cache_path, (time.time(), stat.st_mtime))
+                self.stats["hits"] += 1
+                logger.info(f"Cache hit for {func_name}: {cache_path.name}")
+                return result
+            self.stats["expired"] += 1
+            cache_path.unlink()
+        self.stats["misses"] += 1
+        logger.info(f"Cache miss for {func_name}, fetching.")
+        with self._endpoints():
+            result = fetch()
+        # write to a temporary file first so that interrupted writes do not leave corrupt entries
+        # the process id keeps temporary files distinct when batch jobs share a cache
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with gzip.open(tmp_path, "wb", compresslevel=5) as cache_file:
+            pickle.dump(result, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+        self.evict()
+        return result
+
+    @contextmanager
+    def _endpoints(self):
+        """Points osmnx and cityseer at the configured endpoints for the duration of a fetch"""
+        prev_settings = (ox.settings.overpass_url, ox.settings.nominatim_url)
+        prev_fetch = io.fetch_osm_network
+        if self.overpass_url:
+            ox.settings.overpass_url = self.overpass_url
+            # osm_graph_from_poly looks up fetch_osm_network in cityseer's io module at call time
+            io.fetch_osm_network = _overpass_fetcher(self.overpass_url)
+        if self.nominatim_url:
+            ox.settings.nominatim_url = self.nominatim_url
+        try:
+            yield
+        finally:
+            ox.settings.overpass_url, ox.settings.nominatim_url = prev_settings
+            io.fetch_osm_network = prev_fetch
+
+    def evict(self):
+        """Removes expired entries, then least recently used entries until within the size budget"""
+        now = time.time()
+        entries = []
+        for cache_path in self.cache_dir.glob("*.pkl.gz"):
+            try:
+                stat = cache_path.stat()
+            except FileNotFoundError:
+                # removed by another process sharing the cache
+                continue
+            if now - stat.st_mtime > self.max_age_secs:
+                cache_path.unlink(missing_ok=True)
+                self.stats["expired"] += 1
+                continue
+            entries.append((stat.st_atime, stat.st_size, cache_path))
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, cache_path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            cache_path.unlink(missing_ok=True)
+            total_bytes -= size
+            self.stats["evicted"] += 1
+
+    def clear(self):
+        """Removes all cache entries"""
+        for cache_path in self.cache_dir.glob("*.pkl.gz"):
+            cache_path.unlink()
+
+    def size_bytes(self) -> int:
+        """Returns the total size of the cache entries"""
+        return sum(p.stat().st_size for p in self.cache_dir.glob("*.pkl.gz"))
+
+    def report(self) -> dict[str, int]:
+        """Logs and returns the hit and miss statistics for the run"""
+        n_requests = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / n_requests if n_requests else 0
+        logger.info(
+            f"OSM cache: {self.stats['hits']} hits, {self.stats['misses']} misses "
+            f"({hit_rate:.0%} hit rate), {self.stats['expired']} expired, "
+            f"{self.stats['evicted']} evicted, {self.size_bytes() / 1024**2:.1f}MB on disk."
+        )
+        return dict(self.stats)
+
+    def osm_graph_from_poly(
+        self,
+        poly_geom: geometry.Polygon,
+        poly_crs_code: int | str = 4326,
+        to_crs_code: int | str | None = None,
+        **kwargs,
+    ) -> nx.MultiGraph:
+        """Cached version of cityseer's io.osm_graph_from_poly"""
+        query = {
+            "poly_wkb": _geom_digest(poly_geom),
+            "poly_crs_code": poly_crs_code,
+            "to_crs_code": to_crs_code,
+            "options": kwargs,
+        }
+        return self._fetch(
+            "osm_graph_from_poly",
+            query,
+            lambda: io.osm_graph_from_poly(
+                poly_geom,
+                poly_crs_code=poly_crs_code,
+                to_crs_code=to_crs_code,
+                **kwargs,
+            ),
+        )
+
+    def features_from_polygon(
+        self, polygon: geometry.Polygon | geometry.MultiPolygon, tags: dict
+    ) -> gpd.GeoDataFrame:
+        """Cached version of osmnx's features.features_from_polygon"""
+        # osmnx takes WGS84 polygons
+        query = {"poly_wkb": _geom_digest(polygon), "poly_crs_code": 4326, "tags": tags}
+        return self._fetch(
+            "features_from_polygon",
+            query,
+            lambda: features.features_from_polygon(polygon, tags=tags),
+        )
+
+    def geocode_to_gdf(self, query: str | list[str], **kwargs) -> gpd.GeoDataFrame:
+        """Cached version of osmnx's geocode_to_gdf"""
+        return self._fetch(
+            "geocode_to_gdf",
+            {"query": query, "options": kwargs},
+            lambda: ox.geocode_to_gdf(query, **kwargs),
+        )
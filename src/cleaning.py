@@ -0,0 +1,345 @@
+"""
+Multi-tier cleaning of OSM networks, on a whole graph or in parallel spatial tiles.
+
+clean_tiers applies a table of highway tiers as previously looped over in cases/clean_cyprus_network.py: for each tier,
+opposing geoms are split, nearby nodes are consolidated, and filler nodes are removed, before the edges are ironed.
+Each step only looks up to its buffer distance from a node or edge, so tiled_clean_tiers cleans square tiles in
+parallel processes, each with the edges intersecting the tile expanded by a halo at least as large as the largest
+buffer distance. The cleaned edges are clipped to the tile, and the clipped ends at the seams between tiles are
+reconciled by snapping them together within a tolerance. Seam nodes then have two edges and are welded away by a final
+pass removing filler nodes, before the edges are ironed as for the whole graph.
+
+Consolidation crawls from node to node and each tier builds on the results of the previous tiers, so changes can reach
+further than the largest buffer distance. The default halo is therefore the sum of each tier's largest buffer distance.
+The cleaning iterates sets of node keys, so its results vary slightly with Python's string hashing, which is randomised
+for each process unless PYTHONHASHSEED is set. The worker processes are therefore started with a fixed PYTHONHASHSEED,
+in which case the tiled cleaning matches a monolithic cleaning in a process with the same PYTHONHASHSEED, given a
+sufficient halo. The seam points that do not meet a seam point from a neighbouring tile are logged, as these indicate an
+insufficient halo.
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+import shapely
+from cityseer.tools import graphs
+from scipy import sparse
+from scipy.sparse import csgraph
+
+logger = logging.getLogger(__name__)
+
+# the string hashing of the worker processes, unless PYTHONHASHSEED is set
+HASH_SEED = 0
+
+# highway tags, whether to only merge edges with matching names or routes, the split and consolidation buffer distances,
+# and whether to favour intersections for the consolidated centroids
+OSM_TIERS: list[tuple[list[str], bool, float, float, bool]] = [
+    (["motorway"], True, 80, 40, False),
+    (["trunk"], True, 60, 30, False),
+    (["primary"], True, 40, 20, False),
+    (["secondary"], True, 30, 15, False),
+    (["tertiary"], True, 30, 15, False),
+    (["residential"], True, 20, 12, True),
+    (["motorway"], False, 60, 30, False),
+    (["trunk", "primary"], False, 30, 20, False),
+    (["secondary", "tertiary"], False, 15, 12, False),
+    (["residential", "service"], False, 12, 10, True),
+]
+
+
+def contains_buffer_dist(split_dist: float) -> float:
+    """The buffer distance for checking whether parallel edges are adjacent enough to be merged"""
+    return max(split_dist, 25)
+
+
+def tier_buffer_dists(tiers: list[tuple]) -> list[float]:
+    """Returns the largest buffer distance used by each tier"""
+    return [
+        max(split_dist, consol_dist, contains_buffer_dist(split_dist))
+        for _hwy_keys, _matched_only, split_dist, consol_dist, _cent_by_itx in tiers
+    ]
+
+
+def clean_tiers(
+    nx_multigraph: nx.MultiGraph,
+    tiers: list[tuple] = OSM_TIERS,
+    iron: bool = True,
+) -> nx.MultiGraph:
+    """Splits opposing geoms, consolidates nodes, and removes filler nodes for each tier in turn, then irons edges"""
+    graph_crs = nx_multigraph
+    for hwy_keys, matched_only, split_dist, consol_dist, cent_by_itx in tiers:
+        graph_crs = graphs.nx_split_opposing_geoms(
+            graph_crs,
+            buffer_dist=split_dist,
+            prioritise_by_hwy_tag=True,
+            osm_hwy_target_tags=hwy_keys,
+            osm_matched_tags_only=matched_only,
+            contains_buffer_dist=contains_buffer_dist(split_dist),
+        )
+        graph_crs = graphs.nx_consolidate_nodes(
+            graph_crs,
+            buffer_dist=consol_dist,
+            crawl=True,
+            centroid_by_itx=cent_by_itx,
+            prioritise_by_hwy_tag=True,
+            contains_buffer_dist=contains_buffer_dist(split_dist),
+            osm_hwy_target_tags=hwy_keys,
+            osm_matched_tags_only=matched_only,
+        )
+        graph_crs = graphs.nx_remove_filler_nodes(graph_crs)
+    if iron:
+        graph_crs = graphs.nx_iron_edges(graph_crs)
+    return graph_crs
+
+
+def tile_subgraphs(
+    nx_multigraph: nx.MultiGraph, tile_size: float, halo: float
+) -> list[dict]:
+    """
+    Returns the bounds and halo subgraph of each tile intersecting at least one edge.
+
+    Tiles are anchored at the minimum coordinates of the edge geoms. Each subgraph contains the edges intersecting the
+    tile's bounds expanded by the halo, with their nodes, in the order of the input graph.
+    """
+    if tile_size <= 0:
+        raise ValueError("Tile size should be a positive number.")
+    edges = list(nx_multigraph.edges(keys=True, data=True))
+    geoms = np.array([data["geom"] for _start, _end, _key, data in edges])
+    min_x, min_y, max_x, max_y = shapely.total_bounds(geoms)
+    tree = shapely.STRtree(geoms)
+    node_order = {nd_key: nd_idx for nd_idx, nd_key in enumerate(nx_multigraph)}
+    subgraphs = []
+    for tile_row in range(int(np.floor((max_y - min_y) / tile_size)) + 1):
+        for tile_col in range(int(np.floor((max_x - min_x) / tile_size)) + 1):
+            bounds = (
+                min_x + tile_col * tile_size,
+                min_y + tile_row * tile_size,
+                min_x + (tile_col + 1) * tile_size,
+                min_y + (tile_row + 1) * tile_size,
+            )
+            if len(tree.query(shapely.box(*bounds), predicate="intersects")) == 0:
+                continue
+            halo_bounds = (
+                bounds[0] - halo,
+                bounds[1] - halo,
+                bounds[2] + halo,
+                bounds[3] + halo,
+            )
+            edge_idx = np.sort(
+                tree.query(shapely.box(*halo_bounds), predicate="intersects")
+            )
+            nd_keys = sorted(
+                {nd_key for idx in edge_idx.tolist() for nd_key in edges[idx][:2]},
+                key=node_order.get,
+            )
+            G_tile = nx.MultiGraph()
+            G_tile.add_nodes_from(
+                (nd_key, nx_multigraph.nodes[nd_key]) for nd_key in nd_keys
+            )
+            G_tile.add_edges_from(edges[idx] for idx in edge_idx.tolist())
+            subgraphs.append(
+                {"tile": (tile_col, tile_row), "bounds": bounds, "graph": G_tile}
+            )
+    return subgraphs
+
+
+def _clean_tile(
+    G_tile: nx.MultiGraph, tiers: list[tuple], bounds: tuple
+) -> tuple[np.ndarray, list[dict], np.ndarray]:
+    """
+    Cleans a tile's subgraph and clips the cleaned edges to the tile's bounds.
+
+    Returns the clipped geoms, their edge data, and the node key at the start and end of each geom, which is None
+    where the geom was clipped at the tile's bounds or ends at a node owned by another tile.
+    """
+    G_clean = clean_tiers(G_tile, tiers, iron=False)
+    edges = list(G_clean.edges(data=True))
+    if not edges:
+        return np.empty(0, dtype=object), [], np.empty((0, 2), dtype=object)
+    geoms = np.array([data["geom"] for _start, _end, data in edges])
+    parts, part_idx = shapely.get_parts(
+        shapely.clip_by_rect(geoms, *bounds), return_index=True
+    )
+    keep = (shapely.get_type_id(parts) == 1) & (shapely.length(parts) > 0)
+    parts, part_idx = parts[keep], part_idx[keep]
+    ends_xy = np.stack(
+        [
+            shapely.get_coordinates(shapely.get_point(parts, 0)),
+            shapely.get_coordinates(shapely.get_point(parts, -1)),
+        ],
+        axis=1,
+    )
+    # nodes on the upper bounds belong to the next tile, as for the half-open tiles in src.tiling
+    node_keys = np.empty((len(parts), 2), dtype=object)
+    for end in range(2):
+        for node in range(2):
+            nd_keys = np.array([edges[idx][node] for idx in part_idx], dtype=object)
+            node_xy = np.array(
+                [
+                    (G_clean.nodes[nd_key]["x"], G_clean.nodes[nd_key]["y"])
+                    for nd_key in nd_keys
+                ]
+            ).reshape(-1, 2)
+            owned = (
+                (node_xy[:, 0] >= bounds[0])
+                & (node_xy[:, 0] < bounds[2])
+                & (node_xy[:, 1] >= bounds[1])
+                & (node_xy[:, 1] < bounds[3])
+            )
+            at_node = owned & (np.hypot(*(ends_xy[:, end] - node_xy).T) < 1e-6)
+            node_keys[at_node, end] = nd_keys[at_node]
+    return parts, [edges[idx][2] for idx in part_idx.tolist()], node_keys
+
+
+def stitch_tiles(
+    tile_results: list[tuple[np.ndarray, list[dict], np.ndarray]],
+    seam_tolerance: float,
+) -> nx.MultiGraph:
+    """
+    Joins the clipped geoms of the tiles into a graph, snapping the clipped ends within the seam tolerance together.
+
+    Each group of ends within the seam tolerance of a clipped end becomes one node, keyed by its smallest node key, or
+    else a seam node keyed by the smallest of its coordinates. Geom ends are snapped to their nodes, and geoms reduced
+    to a single node by the snapping are dropped. Seam nodes are left in place for nx_remove_filler_nodes.
+    """
+    geoms = np.concatenate([parts for parts, _data, _keys in tile_results])
+    edge_data = [
+        data for _parts, tile_data, _keys in tile_results for data in tile_data
+    ]
+    node_keys = np.concatenate([keys for _parts, _data, keys in tile_results]).ravel()
+    ends_xy = np.stack(
+        [
+            shapely.get_coordinates(shapely.get_point(geoms, 0)),
+            shapely.get_coordinates(shapely.get_point(geoms, -1)),
+        ],
+        axis=1,
+    ).reshape(-1, 2)
+    is_seam = pd.isna(node_keys)
+    # group the clipped ends with any ends within the tolerance, and node ends with the same key
+    points = shapely.points(ends_xy)
+    seam_idx, near_idx = shapely.STRtree(points).query(
+        points[is_seam], predicate="dwithin", distance=seam_tolerance
+    )
+    seam_idx = np.flatnonzero(is_seam)[seam_idx]
+    unique_keys, key_idx = np.unique(
+        np.where(is_seam, "", node_keys.astype(str)), return_inverse=True
+    )
+    first_of_key = np.full(len(unique_keys), -1, dtype=np.int64)
+    first_of_key[key_idx[::-1]] = np.arange(len(node_keys))[::-1]
+    pair_a = np.concatenate([seam_idx, np.flatnonzero(~is_seam)])
+    pair_b = np.concatenate([near_idx, first_of_key[key_idx[~is_seam]]])
+    adjacency = sparse.coo_matrix(
+        (np.ones(len(pair_a)), (pair_a, pair_b)),
+        shape=(len(node_keys), len(node_keys)),
+    )
+    _count, group_idx = csgraph.connected_components(adjacency, directed=False)
+    ends_df = pd.DataFrame(
+        {
+            "group": group_idx,
+            "is_seam": is_seam,
+            "key": np.where(is_seam, "", node_keys.astype(str)),
+            "x": ends_xy[:, 0],
+            "y": ends_xy[:, 1],
+        }
+    )
+    group_sizes = ends_df.groupby("group")["group"].transform("size")
+    unmatched = int((is_seam & (group_sizes == 1)).sum())
+    if unmatched:
+        logger.warning(
+            f"{unmatched} seam points did not meet a seam point from a neighbouring tile within {seam_tolerance}m, "
+            "consider a larger halo."
+        )
+    nodes_df = (
+        ends_df.sort_values(["group", "is_seam", "key", "x", "y"])
+        .drop_duplicates("group")
+        .set_index("group")
+    )
+    seam_keys = (
+        "seam§"
+        + nodes_df["x"].round(2).astype(str)
+        + "_"
+        + nodes_df["y"].round(2).astype(str)
+    )
+    nodes_df["key"] = nodes_df["key"].where(~nodes_df["is_seam"], seam_keys)
+    end_groups = group_idx.reshape(-1, 2)
+    # snap the geom ends to their nodes
+    coords, coord_idx = shapely.get_coordinates(geoms, return_index=True)
+    first_pos = np.flatnonzero(np.r_[True, coord_idx[1:] != coord_idx[:-1]])
+    last_pos = np.r_[first_pos[1:] - 1, len(coords) - 1]
+    coords[first_pos] = nodes_df.loc[end_groups[:, 0], ["x", "y"]].to_numpy()
+    coords[last_pos] = nodes_df.loc[end_groups[:, 1], ["x", "y"]].to_numpy()
+    geoms = shapely.linestrings(coords, indices=coord_idx)
+    collapsed = (end_groups[:, 0] == end_groups[:, 1]) & (
+        shapely.length(geoms) < 2 * seam_tolerance
+    )
+    G_stitched = nx.MultiGraph()
+    G_stitched.add_nodes_from(
+        (key, {"x": x, "y": y})
+        for key, x, y in nodes_df.loc[
+            np.unique(end_groups[~collapsed]), ["key", "x", "y"]
+        ].itertuples(index=False)
+    )
+    start_keys = nodes_df.loc[end_groups[:, 0], "key"].to_numpy()
+    end_keys = nodes_df.loc[end_groups[:, 1], "key"].to_numpy()
+    for idx in np.flatnonzero(~collapsed).tolist():
+        G_stitched.add_edge(
+            start_keys[idx], end_keys[idx], **{**edge_data[idx], "geom": geoms[idx]}
+        )
+    return G_stitched
+
+
+def tiled_clean_tiers(
+    nx_multigraph: nx.MultiGraph,
+    tile_size: float,
+    tiers: list[tuple] = OSM_TIERS,
+    halo: float | None = None,
+    seam_tolerance: float = 0.5,
+    max_workers: int | None = None,
+) -> nx.MultiGraph:
+    """
+    Cleans the tiers tile by tile and stitches the tiles, returning a graph comparable to clean_tiers.
+
+    The halo defaults to the sum of each tier's largest buffer distance, and should be at least the largest buffer
+    distance. Set max_workers to 1 to clean the tiles in the current process, with its own string hashing. Nodes in the
+    returned graph keep their keys from the cleaning, other than where filler nodes are welded across the seams.
+    """
+    buffer_dists = tier_buffer_dists(tiers)
+    if halo is None:
+        halo = sum(buffer_dists)
+    if halo < max(buffer_dists):
+        raise ValueError(
+            f"The halo of {halo}m is smaller than the largest buffer distance of {max(buffer_dists)}m."
+        )
+    if nx_multigraph.number_of_edges() == 0:
+        return nx_multigraph.copy()
+    subgraphs = tile_subgraphs(nx_multigraph, tile_size, halo)
+    logger.info(
+        f"Cleaning {nx_multigraph.number_of_edges()} edges in {len(subgraphs)} tiles of {tile_size}m with a "
+        f"{halo}m halo, including {sum(s['graph'].number_of_edges() for s in subgraphs)} edges in total."
+    )
+    tasks = [(subgraph["graph"], tiers, subgraph["bounds"]) for subgraph in subgraphs]
+    if max_workers == 1:
+        tile_results = [_clean_tile(*task) for task in tasks]
+    else:
+        # spawn fresh processes for consistency with the tiled centralities, see src.tiling, with the string hashing
+        # fixed so that the sets of node keys iterate in the same order in every run
+        hash_seed = os.environ.get("PYTHONHASHSEED")
+        os.environ["PYTHONHASHSEED"] = hash_seed or str(HASH_SEED)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as executor:
+                tile_results = list(executor.map(_clean_tile, *zip(*tasks)))
+        finally:
+            if hash_seed is None:
+                del os.environ["PYTHONHASHSEED"]
+    graph_crs = stitch_tiles(tile_results, seam_tolerance)
+    # weld the edges across the seams
+    graph_crs = graphs.nx_remove_filler_nodes(graph_crs)
+    return graphs.nx_iron_edges(graph_crs)
@@ -0,0 +1,494 @@
+"""
+Dual networks built directly from primal edge arrays, without going through networkX.
+
+graphs.nx_to_dual splits and welds the primal edge geoms one edge pair at a time with ops.substring and ops.linemerge,
+and io.network_structure_from_nx then measures each dual edge in Python. For raw networks of millions of edges both
+steps are slow, and the primal and dual graphs are memory hungry. Here, the dual nodes are placed at the midpoints of
+the primal edges and the dual edges are found by pairing the edges meeting at each primal node. The half edges are cut
+and welded for all pairs at once, and the angular change and bearings of the dual edges are measured as flat
+coordinate arrays before building the NetworkStructure via snapshot.structure_from_arrays.
+
+The dual is the same as from graphs.nx_to_dual and io.network_structure_from_nx, down to the order of the dual edges
+and the last bit of their measures, so that shortest and simplest path centralities match exactly. As per
+graphs.nx_to_dual, parallel edges are not paired, and a self-loop is paired via its first half only. The halves are
+cut as per ops.substring, and the pairs are welded and ordered following the order of the edges in the networkX graph,
+see nx_edge_order, as a vertex at the midpoint of an edge can be kept or dropped depending on the direction it is cut.
+The nodes GDF keeps the primal edge geoms as its primal_edge geometry, which snapshot.write_network_snapshot stores as
+WKB, along with the primal_edge_node_a, primal_edge_node_b, primal_edge_idx, and dual_node columns of
+io.network_structure_from_nx.
+"""
+
+import logging
+
+import geopandas as gpd
+import networkx as nx
+import numpy as np
+import pandas as pd
+import shapely
+from cityseer import rustalgos
+from shapely import geometry
+
+from src import primal, snapshot, util
+
+logger = logging.getLogger(__name__)
+
+# vertices within this fraction of the edge length from the midpoint are taken to be at the midpoint
+MID_RTOL = 1e-9
+
+
+def dual_node_keys(primal_net: primal.PrimalEdges) -> np.ndarray:
+    """Dual node keys in the form used by graphs.nx_to_dual, e.g. x1.0-y2.0_x3.0-y4.0_k0"""
+    # the primal node keys are sorted as strings
+    node_keys = [str(key) for key in primal_net.node_keys.tolist()]
+    dual_keys = np.empty(primal_net.edge_count, dtype=object)
+    dual_keys[:] = [
+        "_".join(sorted((node_keys[start], node_keys[end]))) + f"_k{edge_key}"
+        for start, end, edge_key in zip(
+            primal_net.start_idx.tolist(),
+            primal_net.end_idx.tolist(),
+            primal.pair_edge_keys(primal_net).tolist(),
+        )
+    ]
+    return dual_keys
+
+
+def half_edges(
+    primal_net: primal.PrimalEdges, mid_xy: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Cuts each edge in half at its midpoint, returning the half edges running from the nodes to the midpoints.
+
+    Returns the coordinates of the half edges and the half edge each belongs to, and the edge, node, and far node of
+    each half edge. The half edges at the start nodes come first, followed by those at the end nodes of edges that are
+    not self-loops. As per ops.substring, the vertices strictly between the node and the midpoint are kept.
+    """
+    edge_count = primal_net.edge_count
+    coords, coord_idx = shapely.get_coordinates(primal_net.geoms, return_index=True)
+    coord_counts = np.bincount(coord_idx, minlength=edge_count)
+    first_pos = np.cumsum(coord_counts) - coord_counts
+    last_pos = first_pos + coord_counts - 1
+    # the distance of each vertex along its edge, summed per edge as for ops.substring
+    seg_lengths = np.zeros(len(coords))
+    seg_lengths[1:] = np.sqrt(np.sum(np.diff(coords, axis=0) ** 2, axis=1))
+    seg_lengths[first_pos] = 0
+    vertex_dists = pd.Series(seg_lengths).groupby(coord_idx).cumsum().to_numpy()
+    lengths = shapely.length(primal_net.geoms)[coord_idx]
+    # a vertex at the midpoint is replaced by the midpoint, even if rounding puts it to either side
+    mid_dists = vertex_dists - 0.5 * lengths
+    at_mid = np.abs(mid_dists) <= MID_RTOL * lengths
+    interior = np.ones(len(coords), dtype=bool)
+    interior[first_pos] = False
+    interior[last_pos] = False
+    interior &= ~at_mid
+    loops = primal_net.start_idx == primal_net.end_idx
+    in_start_half = interior & (vertex_dists > 0) & (mid_dists < 0)
+    in_end_half = (
+        interior & (mid_dists > 0) & (vertex_dists < lengths) & ~loops[coord_idx]
+    )
+    # a self-loop only has a half edge at its start node
+    end_half_idx = np.full(edge_count, -1, dtype=np.int64)
+    end_half_idx[~loops] = edge_count + np.arange(int((~loops).sum()))
+    half_edge_idx = np.concatenate([np.arange(edge_count), np.flatnonzero(~loops)])
+    half_node_idx = np.concatenate([primal_net.start_idx, primal_net.end_idx[~loops]])
+    half_far_idx = np.concatenate([primal_net.end_idx, primal_net.start_idx[~loops]])
+    half_count = len(half_edge_idx)
+    # the node, the vertices in order away from the node, then the midpoint
+    position = np.arange(len(coords)) - first_pos[coord_idx]
+    parts = [
+        (
+            np.arange(half_count),
+            np.zeros(half_count, dtype=np.int64),
+            np.column_stack(
+                [primal_net.xs[half_node_idx], primal_net.ys[half_node_idx]]
+            ),
+        ),
+        (coord_idx[in_start_half], position[in_start_half], coords[in_start_half]),
+        (
+            end_half_idx[coord_idx[in_end_half]],
+            coord_counts[coord_idx[in_end_half]] - position[in_end_half],
+            coords[in_end_half],
+        ),
+        (
+            np.arange(half_count),
+            np.full(half_count, coord_counts.max() + 1, dtype=np.int64),
+            mid_xy[half_edge_idx],
+        ),
+    ]
+    part_idx = np.concatenate([part[0] for part in parts])
+    part_order = np.concatenate([part[1] for part in parts])
+    order = np.lexsort((part_order, part_idx))
+    half_coords = np.concatenate([part[2] for part in parts])[order]
+    return (
+        half_coords,
+        part_idx[order],
+        half_edge_idx,
+        half_node_idx,
+        half_far_idx,
+    )
+
+
+def half_edge_pairs(
+    half_node_idx: np.ndarray, half_far_idx: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pairs the half edges meeting at each node, returning the positions of the first and second half edge of each pair.
+
+    As per graphs.nx_to_dual, half edges are not paired if their far nodes are the same, i.e. for parallel edges.
+    """
+    order = np.argsort(half_node_idx, kind="stable")
+    group_starts = np.flatnonzero(np.r_[True, np.diff(half_node_idx[order]) != 0])
+    group_sizes = np.diff(np.r_[group_starts, len(order)])
+    firsts, seconds = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    # every pair within the nodes of each degree at once
+    for size in np.unique(group_sizes[group_sizes > 1]).tolist():
+        starts = group_starts[group_sizes == size]
+        tri_first, tri_second = np.triu_indices(size, k=1)
+        firsts.append((starts[:, None] + tri_first).ravel())
+        seconds.append((starts[:, None] + tri_second).ravel())
+    firsts = order[np.concatenate(firsts)]
+    seconds = order[np.concatenate(seconds)]
+    keep = half_far_idx[firsts] != half_far_idx[seconds]
+    return firsts[keep], seconds[keep]
+
+
+def nx_edge_order(primal_net: primal.PrimalEdges) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the position of each edge in the edges of its networkX graph, and in the adjacency of either node.
+
+    As per MultiGraph.edges, the edges are listed from their first node in node order, in the order of its adjacency.
+    The adjacency positions read by primal_from_nx are used if set, otherwise those of a graph from nx_from_primal,
+    where the neighbours of a node are in the order of the first edge added between them, then by key.
+    """
+    u_idx = np.minimum(primal_net.start_idx, primal_net.end_idx)
+    edge_idx = np.arange(primal_net.edge_count)
+    adjacency_pos = primal_net.adjacency_pos
+    if adjacency_pos is None:
+        v_idx = np.maximum(primal_net.start_idx, primal_net.end_idx)
+        _pairs, pair_idx = np.unique(
+            np.column_stack([u_idx, v_idx]), axis=0, return_inverse=True
+        )
+        pair_idx = pair_idx.ravel()
+        first_idx = np.full(
+            pair_idx.max() + 1 if len(pair_idx) else 0, primal_net.edge_count
+        )
+        np.minimum.at(first_idx, pair_idx, edge_idx)
+        # ordered within each node, rather than counted from zero per node
+        pos = np.empty(primal_net.edge_count, dtype=np.int64)
+        pos[np.lexsort((edge_idx, first_idx[pair_idx]))] = edge_idx
+        adjacency_pos = np.column_stack([pos, pos])
+    u_pos = np.where(
+        primal_net.start_idx == u_idx, adjacency_pos[:, 0], adjacency_pos[:, 1]
+    )
+    ranks = np.empty(primal_net.edge_count, dtype=np.int64)
+    ranks[np.lexsort((u_pos, u_idx))] = edge_idx
+    return ranks, adjacency_pos
+
+
+def substring_halves(
+    geoms: np.ndarray, a_xy: np.ndarray, b_xy: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Cuts each geom at its midpoint as per get_half_geoms in graphs.nx_to_dual, with the geoms running from a to b.
+
+    As per ops.substring, the midpoint is interpolated at half the GEOS length and a vertex is kept if its distance
+    along the geom, summed per segment in Python, is strictly within the half. The ends are snapped to a_xy and b_xy.
+    Returns the halves from a to the midpoint, and those from the midpoint to b.
+    """
+    count = len(geoms)
+    coords, coord_idx = shapely.get_coordinates(geoms, return_index=True)
+    coord_counts = np.bincount(coord_idx, minlength=count)
+    first_pos = np.cumsum(coord_counts) - coord_counts
+    last_pos = first_pos + coord_counts - 1
+    seg_lengths = np.zeros(len(coords))
+    seg_lengths[1:] = np.sqrt(np.sum(np.diff(coords, axis=0) ** 2, axis=1))
+    seg_lengths[first_pos] = 0
+    vertex_dists = pd.Series(seg_lengths).groupby(coord_idx).cumsum().to_numpy()
+    lengths = shapely.length(geoms)
+    mid_xy = shapely.get_coordinates(
+        shapely.line_interpolate_point(geoms, 0.5 * lengths)
+    )
+    line_lengths = lengths[coord_idx]
+    # the last vertex is never kept, as ops.substring only visits the first vertex of each segment
+    not_last = np.ones(len(coords), dtype=bool)
+    not_last[last_pos] = False
+    in_a = not_last & (vertex_dists > 0) & (vertex_dists < 0.5 * line_lengths)
+    in_b = (
+        not_last & (vertex_dists > 0.5 * line_lengths) & (vertex_dists < line_lengths)
+    )
+    halves = []
+    for in_half, start_xy, end_xy in [(in_a, a_xy, mid_xy), (in_b, mid_xy, b_xy)]:
+        half_coords = np.concatenate([start_xy, coords[in_half], end_xy])
+        half_idx = np.concatenate(
+            [np.arange(count), coord_idx[in_half], np.arange(count)]
+        )
+        half_order = np.concatenate(
+            [
+                np.full(count, -1),
+                np.flatnonzero(in_half),
+                np.full(count, len(coords)),
+            ]
+        )
+        order = np.lexsort((half_order, half_idx))
+        halves.append(shapely.linestrings(half_coords[order], indices=half_idx[order]))
+    return halves[0], halves[1]
+
+
+def vis_lines(primal_net: primal.PrimalEdges) -> np.ndarray:
+    """
+    Returns a MultiLineString per primal node of the half edges running from the node to the midpoints of its edges.
+
+    As per graphs.nx_generate_vis_lines, but from the half edges of the dual conversion. The lines are in the order of
+    the primal nodes, and a node without edges has an empty MultiLineString.
+    """
+    mid_xy = shapely.get_coordinates(
+        shapely.line_interpolate_point(primal_net.geoms, 0.5, normalized=True)
+    )
+    half_coords, half_idx, _half_edge_idx, half_node_idx, _half_far_idx = half_edges(
+        primal_net, mid_xy
+    )
+    halves = shapely.linestrings(half_coords, indices=half_idx)
+    # the halves are grouped by node, in increasing order as required for the indices
+    order = np.argsort(half_node_idx, kind="stable")
+    node_idx, line_idx = np.unique(half_node_idx[order], return_inverse=True)
+    lines = np.full(primal_net.node_count, geometry.MultiLineString(), dtype=object)
+    lines[node_idx] = shapely.multilinestrings(halves[order], indices=line_idx)
+    return lines
+
+
+def dual_edge_arrays(
+    primal_net: primal.PrimalEdges, mid_xy: np.ndarray
+) -> tuple[dict[str, np.ndarray], np.ndarray, np.ndarray]:
+    """
+    Welds the half edges of each pair into a dual edge, and measures the dual edges in both directions.
+
+    As per graphs.nx_to_dual, each pair is welded when visiting whichever edge comes first in the graph, the hub. The
+    edges are cut from the node they are listed from, u, so the hub's half at its other node, v, is the second half of
+    the cut from u, while a later edge's half at v is the first half of a cut from v. The halves are welded with
+    shapely.line_merge, as for ops.linemerge. Returns the edge arrays for snapshot.structure_from_arrays, with each dual
+    edge added once from each of its dual nodes as per io.network_structure_from_nx, and the welded geoms and primal
+    node of each dual edge.
+    """
+    ranks, adjacency_pos = nx_edge_order(primal_net)
+    u_idx = np.minimum(primal_net.start_idx, primal_net.end_idx)
+    v_idx = primal_net.start_idx + primal_net.end_idx - u_idx
+    loops = u_idx == v_idx
+    u_xy = np.column_stack([primal_net.xs[u_idx], primal_net.ys[u_idx]])
+    v_xy = np.column_stack([primal_net.xs[v_idx], primal_net.ys[v_idx]])
+    u_geoms = np.where(
+        primal_net.start_idx == u_idx,
+        primal_net.geoms,
+        shapely.reverse(primal_net.geoms),
+    )
+    u_halves, v_halves = substring_halves(u_geoms, u_xy, v_xy)
+    # a self-loop is only cut from u
+    later_v_halves, _ = substring_halves(
+        shapely.reverse(u_geoms[~loops]), v_xy[~loops], u_xy[~loops]
+    )
+    # a half edge at each node of each edge, the half at u first, as for half_edges
+    half_edge_idx = np.concatenate(
+        [np.arange(primal_net.edge_count), np.flatnonzero(~loops)]
+    )
+    half_node_idx = np.concatenate([u_idx, v_idx[~loops]])
+    half_far_idx = np.concatenate([v_idx, u_idx[~loops]])
+    firsts, seconds = half_edge_pairs(half_node_idx, half_far_idx)
+    first_hub = ranks[half_edge_idx[firsts]] < ranks[half_edge_idx[seconds]]
+    hubs = np.where(first_hub, firsts, seconds)
+    spokes = np.where(first_hub, seconds, firsts)
+    hub_halves = np.concatenate([u_halves, v_halves[~loops]])
+    spoke_halves = np.concatenate([u_halves, later_v_halves])
+    weld_geoms = shapely.line_merge(
+        shapely.multilinestrings(
+            np.column_stack([hub_halves[hubs], spoke_halves[spokes]]).ravel(),
+            indices=np.repeat(np.arange(len(hubs)), 2),
+        )
+    )
+    if not (shapely.get_type_id(weld_geoms) == 1).all():
+        raise ValueError("Welded dual edges should be LineString type.")
+    lengths = shapely.length(weld_geoms)
+    if not (np.isfinite(lengths) & (lengths > 0)).all():
+        raise ValueError("Dual edge lengths must be finite and positive.")
+    dual_firsts = half_edge_idx[firsts]
+    dual_seconds = half_edge_idx[seconds]
+    starts = np.concatenate([dual_firsts, dual_seconds])
+    # the order the dual edges are added: by hub, its half at u then v, then the spoke's position in the adjacency
+    spoke_edge_idx = half_edge_idx[spokes]
+    spoke_pos = np.where(
+        primal_net.start_idx[spoke_edge_idx] == half_node_idx[spokes],
+        adjacency_pos[spoke_edge_idx, 0],
+        adjacency_pos[spoke_edge_idx, 1],
+    )
+    weld_order = np.empty(len(hubs), dtype=np.int64)
+    weld_order[
+        np.lexsort(
+            (spoke_pos, hubs >= primal_net.edge_count, ranks[half_edge_idx[hubs]])
+        )
+    ] = np.arange(len(hubs))
+    # the welds aligned to run from the start dual node of each directed edge, see util.align_linestring_coords
+    coords, coord_idx = shapely.get_coordinates(weld_geoms, return_index=True)
+    coord_counts = np.bincount(coord_idx, minlength=len(weld_geoms))
+    first_pos = np.cumsum(coord_counts) - coord_counts
+    last_pos = first_pos + coord_counts - 1
+    weld_pos = np.tile(np.arange(len(weld_geoms)), 2)
+    start_xy = mid_xy[starts]
+    flip = np.hypot(*(coords[first_pos][weld_pos] - start_xy).T) > np.hypot(
+        *(coords[last_pos][weld_pos] - start_xy).T
+    )
+    directed_counts = coord_counts[weld_pos]
+    directed_idx = np.repeat(np.arange(len(weld_pos)), directed_counts)
+    position = np.arange(len(directed_idx)) - np.repeat(
+        np.cumsum(directed_counts) - directed_counts, directed_counts
+    )
+    directed_coords = coords[
+        np.where(
+            flip[directed_idx],
+            last_pos[weld_pos][directed_idx] - position,
+            first_pos[weld_pos][directed_idx] + position,
+        )
+    ]
+    measures = primal.measure_lines(directed_coords, directed_idx, len(weld_pos))
+    # grouped by start node, as io.network_structure_from_nx adds the edges of each node in turn, in adjacency order
+    order = np.lexsort((np.tile(weld_order, 2), starts))
+    arrays = {
+        "edge_refs": np.column_stack(
+            [
+                starts,
+                np.concatenate([dual_seconds, dual_firsts]),
+                np.zeros(len(starts), dtype=np.int64),
+            ]
+        )[order],
+        # the GEOS length of the weld, as per io.network_structure_from_nx
+        "length": lengths[weld_pos][order],
+        "angle_sum": measures["angle_sum"][order],
+        "imp_factor": np.ones(len(starts)),
+    }
+    for attr in ["in_bearing", "out_bearing", "total_bearing"]:
+        arrays[attr] = measures[attr][order]
+    # the position of each directed edge's welded geom
+    arrays["weld_pos"] = weld_pos[order]
+    return arrays, weld_geoms, half_node_idx[firsts]
+
+
+def network_structure_dual(
+    primal_net: primal.PrimalEdges,
+    crs: str | int,
+    boundary_geom: geometry.Polygon | geometry.MultiPolygon | None = None,
+) -> tuple[gpd.GeoDataFrame, gpd.GeoDataFrame, rustalgos.NetworkStructure]:
+    """
+    Returns the dual nodes GDF, edges GDF, and NetworkStructure as per graphs.nx_to_dual and io.network_structure_from_nx.
+
+    Dual nodes inside boundary_geom are live, as per util.mark_live_nodes on the dual graph. If it is None, a dual node
+    is live if either primal node is live, as per graphs.nx_to_dual, otherwise all dual nodes are live. The
+    primal_edge_node_a and primal_edge_node_b columns are the first and second node of each edge in node order, as the
+    edges are listed by graphs.nx_to_dual.
+    """
+    mid_points = shapely.line_interpolate_point(primal_net.geoms, 0.5, normalized=True)
+    mid_xy = shapely.get_coordinates(mid_points)
+    dual_keys = dual_node_keys(primal_net)
+    if boundary_geom is not None:
+        lives = util.points_in_boundary(mid_xy[:, 0], mid_xy[:, 1], boundary_geom)
+    elif primal_net.lives is not None:
+        lives = (
+            primal_net.lives[primal_net.start_idx]
+            | primal_net.lives[primal_net.end_idx]
+        )
+    else:
+        lives = np.ones(primal_net.edge_count, dtype=bool)
+    weights = np.ones(primal_net.edge_count)
+    edge_arrays, weld_geoms, weld_node_idx = dual_edge_arrays(primal_net, mid_xy)
+    edge_refs = edge_arrays["edge_refs"]
+    edge_arrays["start_nd_key"] = dual_keys[edge_refs[:, 0]]
+    edge_arrays["end_nd_key"] = dual_keys[edge_refs[:, 1]]
+    network_structure = snapshot.structure_from_arrays(
+        dual_keys,
+        mid_xy[:, 0],
+        mid_xy[:, 1],
+        lives,
+        weights,
+        edge_arrays,
+    )
+    nodes_gdf = gpd.GeoDataFrame(
+        {
+            "ns_node_idx": np.arange(primal_net.edge_count),
+            "x": mid_xy[:, 0],
+            "y": mid_xy[:, 1],
+            "live": lives,
+            "weight": weights,
+            "primal_edge": primal_net.geoms,
+            "primal_edge_node_a": primal_net.node_keys[
+                np.minimum(primal_net.start_idx, primal_net.end_idx)
+            ],
+            "primal_edge_node_b": primal_net.node_keys[
+                np.maximum(primal_net.start_idx, primal_net.end_idx)
+            ],
+            "primal_edge_idx": primal.pair_edge_keys(primal_net),
+            "dual_node": shapely.to_wkt(mid_points),
+        },
+        index=dual_keys,
+        geometry="primal_edge",
+        crs=crs,
+    )
+    edges_gdf = gpd.GeoDataFrame(
+        {
+            "ns_edge_idx": np.arange(len(edge_refs)),
+            "start_ns_node_idx": edge_refs[:, 0],
+            "end_ns_node_idx": edge_refs[:, 1],
+            "edge_idx": edge_refs[:, 2],
+            "nx_start_node_key": edge_arrays["start_nd_key"],
+            "nx_end_node_key": edge_arrays["end_nd_key"],
+            "length": edge_arrays["length"],
+            "angle_sum": edge_arrays["angle_sum"],
+            "imp_factor": edge_arrays["imp_factor"],
+            "in_bearing": edge_arrays["in_bearing"],
+            "out_bearing": edge_arrays["out_bearing"],
+            "total_bearing": edge_arrays["total_bearing"],
+        },
+        index=[
+            f"{start_key}-{end_key}"
+            for start_key, end_key in zip(
+                edge_arrays["start_nd_key"].tolist(), edge_arrays["end_nd_key"].tolist()
+            )
+        ],
+        geometry=weld_geoms[edge_arrays["weld_pos"]],
+        crs=crs,
+    ).rename_geometry("geom")
+    edges_gdf["primal_node_id"] = primal_net.node_keys[
+        weld_node_idx[edge_arrays["weld_pos"]]
+    ]
+    logger.info(
+        f"Built {primal_net.edge_count} dual nodes and {len(weld_geoms)} dual edges."
+    )
+    return nodes_gdf, edges_gdf, network_structure
+
+
+def nx_from_dual(
+    nodes_gdf: gpd.GeoDataFrame, edges_gdf: gpd.GeoDataFrame
+) -> nx.MultiGraph:
+    """
+    Returns the dual networkX MultiGraph for steps that need a graph, e.g. graphs.nx_weight_by_dissolved_edges.
+
+    As per io.nx_from_cityseer_geopandas but added in bulk, and with the welded dual edge geoms.
+    """
+    G = nx.MultiGraph()
+    G.graph["is_dual"] = True
+    G.add_nodes_from(
+        (key, {"x": x, "y": y, "live": live, "weight": weight})
+        for key, x, y, live, weight in zip(
+            nodes_gdf.index.tolist(),
+            nodes_gdf["x"].tolist(),
+            nodes_gdf["y"].tolist(),
+            nodes_gdf["live"].tolist(),
+            nodes_gdf["weight"].tolist(),
+        )
+    )
+    # each dual edge is in the edges GDF once from each of its dual nodes
+    once = edges_gdf["start_ns_node_idx"] < edges_gdf["end_ns_node_idx"]
+    G.add_edges_from(
+        (start, end, 0, {"geom": geom, "primal_node_id": primal_node_id})
+        for start, end, geom, primal_node_id in zip(
+            edges_gdf.loc[once, "nx_start_node_key"].tolist(),
+            edges_gdf.loc[once, "nx_end_node_key"].tolist(),
+            edges_gdf.geometry[once],
+            edges_gdf.loc[once, "primal_node_id"].tolist(),
+        )
+    )
+    return G
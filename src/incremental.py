@@ -0,0 +1,169 @@
+"""
+Incremental centrality recomputation after manual network edits, e.g. in QGIS.
+
+The reopened edges are compared with the edges of the previous run by geometry hash, and only the nodes near the
+changed edges are recomputed. A node's centralities at distance d can only change if a changed edge lies within d of
+the node along the network: for closeness because the node reaches the edge, and for betweenness because a path of at
+most d that gained or lost the node as well as the changed edge starts within d of both. Since network distances are
+never shorter than straight-line distances, the nodes within max(distances) of a changed edge are a safe superset.
+
+The affected nodes are recomputed on a subgraph with the same halo approach as src.tiling: the live nodes within
+2 x max(distances) of a change are sources, so that each affected node receives betweenness from all the sources that
+can reach it, and the subgraph extends a further max(distances) around the sources. The remaining nodes keep their
+previous results, matched by coordinates.
+"""
+
+import hashlib
+import logging
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from cityseer import rustalgos
+
+from src import snapshot, tiling
+
+logger = logging.getLogger(__name__)
+
+# cityseer rounds edge coordinates to 0.1m when building graphs from GeoDataFrames, see io.nx_from_generic_geopandas
+HASH_PRECISION = 1
+
+
+def geometry_hashes(geoms: gpd.GeoSeries | np.ndarray) -> np.ndarray:
+    """
+    Returns a hash per geometry that ignores edge direction and sub-10cm coordinate differences.
+
+    Coordinates are rounded as per HASH_PRECISION and geometries are normalised, so that a reversed line hashes the same.
+    """
+    geoms = np.asarray(geoms)
+    rounded = shapely.transform(geoms, lambda coords: np.round(coords, HASH_PRECISION))
+    wkbs = shapely.to_wkb(shapely.normalize(rounded))
+    return np.array(
+        [hashlib.blake2b(wkb, digest_size=16).hexdigest() for wkb in wkbs], dtype=str
+    )
+
+
+def changed_geometries(
+    prev_geoms: gpd.GeoSeries, geoms: gpd.GeoSeries
+) -> gpd.GeoSeries:
+    """Returns the geometries that were removed from prev_geoms or added in geoms"""
+    prev_hashes = geometry_hashes(prev_geoms)
+    hashes = geometry_hashes(geoms)
+    removed = prev_geoms[~np.isin(prev_hashes, hashes)]
+    added = geoms[~np.isin(hashes, prev_hashes)]
+    logger.info(f"Found {len(removed)} removed and {len(added)} added edges.")
+    return gpd.GeoSeries(
+        np.concatenate([np.asarray(removed), np.asarray(added)]), crs=geoms.crs
+    )
+
+
+def _within(xs: np.ndarray, ys: np.ndarray, tree: shapely.STRtree, distance: float):
+    """Returns a mask of the points within distance of any geometry in the tree"""
+    point_idx, _ = tree.query(
+        shapely.points(xs, ys), predicate="dwithin", distance=distance
+    )
+    mask = np.zeros(len(xs), dtype=bool)
+    mask[point_idx] = True
+    return mask
+
+
+def _coord_keys(xs: np.ndarray, ys: np.ndarray) -> pd.MultiIndex:
+    """Coordinate keys for matching nodes between runs"""
+    return pd.MultiIndex.from_arrays([np.round(xs, 3), np.round(ys, 3)])
+
+
+def incremental_node_centrality(
+    network_structure: rustalgos.NetworkStructure,
+    nodes_gdf: gpd.GeoDataFrame,
+    prev_nodes_gdf: pd.DataFrame,
+    changed_geoms: gpd.GeoSeries,
+    distances: list[int],
+    shortest: bool = True,
+    simplest: bool = False,
+    **centrality_kwargs,
+) -> gpd.GeoDataFrame:
+    """
+    Recomputes centralities for the nodes near changed geometries and reuses the previous results elsewhere.
+
+    The nodes GDF is expected in network structure order as returned by io.network_structure_from_nx. The previous
+    nodes need x and y columns and the centrality columns computed with the same distances and settings. Pass the
+    output of changed_geometries as changed_geoms. Set shortest and simplest to select node_centrality_shortest and
+    node_centrality_simplest. Further keyword arguments are passed to these.
+    """
+    if not distances:
+        raise ValueError("Incremental centrality requires explicit distances.")
+    if centrality_kwargs.get("jitter_scale"):
+        raise ValueError("Incremental centrality does not support jitter.")
+    node_count = network_structure.node_count()
+    if len(nodes_gdf) != node_count:
+        raise ValueError(
+            "The nodes GDF does not match the network structure node count."
+        )
+    arrays = snapshot.structure_arrays(network_structure)
+    node_keys = np.asarray(nodes_gdf.index.astype(str), dtype=str)
+    xs, ys, lives = arrays["x"], arrays["y"], arrays["live"]
+    # nodes without a unique match in the previous results are recomputed along with their neighbourhoods
+    prev_keys = _coord_keys(
+        prev_nodes_gdf["x"].to_numpy(dtype=float),
+        prev_nodes_gdf["y"].to_numpy(dtype=float),
+    )
+    prev_lookup = pd.Series(np.arange(len(prev_keys)), index=prev_keys)
+    prev_lookup = prev_lookup[~prev_lookup.index.duplicated(keep=False)]
+    prev_idx = prev_lookup.reindex(_coord_keys(xs, ys)).to_numpy()
+    unmatched = np.isnan(prev_idx)
+    seeds = np.concatenate(
+        [
+            np.asarray(changed_geoms),
+            shapely.points(xs[unmatched], ys[unmatched]),
+        ]
+    )
+    max_dist = max(distances)
+    if not len(seeds):
+        logger.info("No changes found, reusing the previous results.")
+        affected = np.zeros(node_count, dtype=bool)
+    else:
+        tree = shapely.STRtree(seeds)
+        affected = _within(xs, ys, tree, max_dist)
+    metric_cols = None
+    if affected.any():
+        sources = _within(xs, ys, tree, 2 * max_dist) & lives
+        node_idx = np.flatnonzero(_within(xs, ys, tree, 3 * max_dist))
+        logger.info(
+            f"Recomputing {affected.sum()} of {node_count} nodes "
+            f"from {sources.sum()} sources on a subgraph of {len(node_idx)} nodes."
+        )
+        node_arrays = {
+            "x": xs[node_idx],
+            "y": ys[node_idx],
+            "live": sources[node_idx],
+            "weight": arrays["weight"][node_idx],
+        }
+        sub_df = tiling.subgraph_centrality(
+            node_keys[node_idx],
+            node_arrays,
+            tiling.subset_edges(arrays, node_idx, node_count),
+            distances,
+            shortest,
+            simplest,
+            centrality_kwargs,
+        )
+        metric_cols = list(sub_df.columns)
+    if metric_cols is None:
+        metric_cols = [col for col in prev_nodes_gdf.columns if col.startswith("cc_")]
+    missing_cols = [col for col in metric_cols if col not in prev_nodes_gdf.columns]
+    if missing_cols:
+        raise ValueError(
+            f"The previous results are missing {missing_cols}, run a full computation instead."
+        )
+    nodes_gdf = nodes_gdf.copy()
+    reused = ~affected
+    for col in metric_cols:
+        values = np.zeros(node_count, dtype=np.float64)
+        values[reused] = prev_nodes_gdf[col].to_numpy(dtype=np.float64)[
+            prev_idx[reused].astype(np.int64)
+        ]
+        if affected.any():
+            values[affected] = sub_df[col].reindex(node_keys[affected]).to_numpy()
+        nodes_gdf[col] = values
+    return nodes_gdf
@@ -0,0 +1,109 @@
+"""
+Classifies OSM features into landuse categories from a single merged query.
+
+The schema maps category keys to OSM keys, which map either to a list of accepted values or to True (any value). The
+schema is compiled once into an inverted index from (osm_key, value) to category so that a whole GeoDataFrame of
+features can be classified with vectorised joins instead of one Overpass request per category and OSM key.
+"""
+
+from typing import Literal
+
+import geopandas as gpd
+import pandas as pd
+
+Schema = dict[str, dict[str, list[str] | bool]]
+
+
+def schema_tags(schema: Schema) -> dict[str, list[str] | bool]:
+    """Merges the schema into the union of OSM tags for a single features query"""
+    tags: dict[str, list[str] | bool] = {}
+    for osm_tags in schema.values():
+        for osm_key, osm_vals in osm_tags.items():
+            # a True wildcard matches any value so supersedes explicit values
+            if osm_vals is True or tags.get(osm_key) is True:
+                tags[osm_key] = True
+                continue
+            merged = tags.setdefault(osm_key, [])
+            merged.extend(val for val in osm_vals if val not in merged)
+    return tags
+
+
+def compile_schema(schema: Schema) -> pd.DataFrame:
+    """
+    Compiles the schema into an inverted index with one row per (osm_key, osm_val, cat_key) combination.
+
+    Wildcard entries have a missing osm_val. The cat_order column records schema order for resolving multiple matches.
+    """
+    rows = []
+    for cat_order, (cat_key, osm_tags) in enumerate(schema.items()):
+        for osm_key, osm_vals in osm_tags.items():
+            if osm_vals is True:
+                rows.append((osm_key, None, cat_key, cat_order))
+            elif isinstance(osm_vals, list):
+                rows.extend((osm_key, val, cat_key, cat_order) for val in osm_vals)
+            else:
+                raise ValueError(
+                    f"Expected a list of values or True for {cat_key}: {osm_key} but found {osm_vals}."
+                )
+    return pd.DataFrame(rows, columns=["osm_key", "osm_val", "cat_key", "cat_order"])
+
+
+def classify_landuses(
+    data_gdf: gpd.GeoDataFrame,
+    schema: Schema,
+    multi_match: Literal["all", "first"] = "all",
+) -> gpd.GeoDataFrame:
+    """
+    Assigns landuse categories to OSM features using the compiled schema index.
+
+    Features can match more than one category, e.g. amenity=ice_cream is both "eating" and "grocery_store", or can match
+    the same category through more than one OSM key. With multi_match="all" a row is returned for each matching
+    category and OSM key, which is consistent with issuing a separate query per category and key. With
+    multi_match="first" only the first match in schema order is kept. Features without a match are dropped.
+
+    The cat_key, osm_key, and osm_val columns are returned as categoricals.
+    """
+    if multi_match not in ("all", "first"):
+        raise ValueError('multi_match should be one of "all" or "first".')
+    schema_idx = compile_schema(schema)
+    matches = []
+    for osm_key, key_idx in schema_idx.groupby("osm_key", sort=False):
+        if osm_key not in data_gdf.columns:
+            continue
+        feature_vals = pd.DataFrame(
+            {"row_pos": range(len(data_gdf)), "osm_val": data_gdf[osm_key].to_numpy()}
+        ).dropna(subset=["osm_val"])
+        # explicit values are joined on the feature's tag value
+        explicit_idx = key_idx.dropna(subset=["osm_val"])
+        matches.append(
+            feature_vals.merge(explicit_idx, on="osm_val", how="inner", sort=False)
+        )
+        # wildcards match any feature carrying the key
+        wildcard_idx = key_idx[key_idx["osm_val"].isna()].drop(columns="osm_val")
+        if len(wildcard_idx):
+            matches.append(feature_vals.merge(wildcard_idx, how="cross", sort=False))
+    if not matches:
+        matches.append(
+            pd.DataFrame(
+                columns=["row_pos", "osm_val", "osm_key", "cat_key", "cat_order"]
+            )
+        )
+    matches_df = pd.concat(matches, ignore_index=True)
+    # a feature matching the same category via an explicit value and a wildcard on the same key counts once
+    matches_df = matches_df.drop_duplicates(subset=["row_pos", "cat_key", "osm_key"])
+    matches_df = matches_df.sort_values(["row_pos", "cat_order"], kind="stable")
+    if multi_match == "first":
+        matches_df = matches_df.drop_duplicates(subset="row_pos")
+    # repeat the feature rows by position and attach the categories
+    landuses_gdf = data_gdf.iloc[matches_df["row_pos"].to_numpy()].copy()
+    landuses_gdf["cat_key"] = pd.Categorical(
+        matches_df["cat_key"].to_numpy(), categories=list(schema)
+    )
+    landuses_gdf["osm_key"] = pd.Categorical(
+        matches_df["osm_key"].to_numpy(),
+        categories=schema_idx["osm_key"].unique(),
+    )
+    landuses_gdf["osm_val"] = pd.Categorical(
+        matches_df["osm_val"].astype(str).to_numpy()
+    )
+    return landuses_gdf
@@ -0,0 +1,570 @@
+"""
+Local stand-in for the Overpass and Nominatim APIs, for testing and benchmarking the download stages offline.
+
+The stand-in serves OSM data from recorded Overpass JSON responses, or from synthetic networks, landuses, and buildings
+generated by src.synthetic, over HTTP on localhost:
+
+- /api/interpreter answers Overpass QL queries of the form issued by cityseer and osmnx, i.e. node, way, and relation
+  statements with tag filters and a poly filter. Elements are matched if they have a node within the polygon, and the
+  nodes of matched ways are always included, as for the recursion in these queries;
+- /api/status reports the free rate limit slots in the format parsed by osmnx;
+- /nominatim/search and /nominatim/lookup geocode the registered places by name or by OSM id, e.g. R1.
+
+Point OSMCache at the stand-in with the overpass_url and nominatim_url arguments or the OSM_OVERPASS_URL and
+OSM_NOMINATIM_URL environment variables, see src.cache. Latency, rate limits, and injected errors are configurable so
+that download throughput, retries, and caching can be measured repeatably.
+"""
+
+import datetime as dt
+import json
+import logging
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from pyproj import Transformer
+from shapely import geometry
+
+logger = logging.getLogger(__name__)
+
+# statements such as way["highway"]["area"!="yes"](poly:"lat lng lat lng ...")
+STATEMENT_PATTERN = re.compile(
+    r"(node|way|relation)((?:\s*\[[^\]]*\])*)\s*\(poly:([\"'])([^\"']*)\3\)"
+)
+# tag filters such as ["highway"], ['amenity'='cafe'], ["service"!~"parking_aisle|driveway"]
+FILTER_PATTERN = re.compile(
+    r"\[\s*([\"'])(?P<key>.+?)\1\s*(?:(?P<op>!=|!~|=|~)\s*([\"'])(?P<val>.*?)\4)?\s*\]"
+)
+
+
+def _matches_filters(tags: dict[str, str], filters: list[tuple]) -> bool:
+    """Applies Overpass tag filters, where != and !~ also match elements without the key"""
+    for key, op, val in filters:
+        tag_val = tags.get(key)
+        if op is None:
+            matched = tag_val is not None
+        elif op == "=":
+            matched = tag_val == val
+        elif op == "!=":
+            matched = tag_val != val
+        elif op == "~":
+            matched = tag_val is not None and re.search(val, tag_val) is not None
+        else:
+            matched = tag_val is None or re.search(val, tag_val) is None
+        if not matched:
+            return False
+    return True
+
+
+def parse_overpass_query(query: str) -> list[tuple[str, list[tuple], geometry.Polygon]]:
+    """Returns the element type, tag filters, and WGS84 polygon of each statement in an Overpass query"""
+    statements = []
+    for element_type, filter_str, _, poly_str in STATEMENT_PATTERN.findall(query):
+        filters = [
+            (match["key"], match["op"], match["val"])
+            for match in FILTER_PATTERN.finditer(filter_str)
+        ]
+        lat_lngs = np.array(poly_str.split(), dtype=float).reshape(-1, 2)
+        statements.append((element_type, filters, geometry.Polygon(lat_lngs[:, ::-1])))
+    if not statements:
+        raise ValueError("No statements with a poly filter found in the query.")
+    return statements
+
+
+def _key_index(elements: list[dict[str, Any]]) -> dict[str, np.ndarray]:
+    """Returns the positions of the elements with each tag key"""
+    key_positions: dict[str, list[int]] = {}
+    for pos, element in enumerate(elements):
+        for key in element.get("tags", {}):
+            key_positions.setdefault(key, []).append(pos)
+    return {
+        key: np.array(positions, dtype=np.int64)
+        for key, positions in key_positions.items()
+    }
+
+
+class OSMData:
+    """OSM elements and geocodable places served by the stand-in"""
+
+    def __init__(self, elements: list[dict[str, Any]], places: list[dict[str, Any]]):
+        self.nodes = [el for el in elements if el["type"] == "node"]
+        self.ways = [el for el in elements if el["type"] == "way"]
+        self.relations = [el for el in elements if el["type"] == "relation"]
+        self.places = places
+        # arrays for vectorised point in polygon tests
+        self.node_ids = np.array([node["id"] for node in self.nodes], dtype=np.int64)
+        self.node_lngs = np.array([node["lon"] for node in self.nodes], dtype=float)
+        self.node_lats = np.array([node["lat"] for node in self.nodes], dtype=float)
+        node_pos = {node_id: pos for pos, node_id in enumerate(self.node_ids.tolist())}
+        self.way_node_pos = [
+            np.array([node_pos[ref] for ref in way["nodes"]], dtype=np.int64)
+            for way in self.ways
+        ]
+        way_pos = {way["id"]: pos for pos, way in enumerate(self.ways)}
+        self.relation_way_pos = [
+            [
+                way_pos[member["ref"]]
+                for member in relation.get("members", [])
+                if member["type"] == "way" and member["ref"] in way_pos
+            ]
+            for relation in self.relations
+        ]
+        # flat way node positions for testing all ways against a polygon at once
+        self.way_node_flat = np.concatenate(
+            self.way_node_pos + [np.zeros(0, dtype=np.int64)]
+        )
+        self.way_node_starts = np.cumsum([0] + [len(pos) for pos in self.way_node_pos])[
+            :-1
+        ]
+        # positions of the elements with each tag key, as every statement from cityseer and osmnx filters on a key
+        self.key_index = {
+            element_type: _key_index(elements)
+            for element_type, elements in [
+                ("node", self.nodes),
+                ("way", self.ways),
+                ("relation", self.relations),
+            ]
+        }
+        logger.info(
+            f"Serving {len(self.nodes)} nodes, {len(self.ways)} ways, {len(self.relations)} relations, "
+            f"and {len(self.places)} places."
+        )
+
+    @classmethod
+    def from_recorded(
+        cls, elements_path: Path | str, places_path: Path | str | None = None
+    ) -> "OSMData":
+        """
+        Loads a recorded Overpass JSON response, and optionally a recorded Nominatim JSON response for the places.
+
+        Ways and relations should be recorded with their nodes, e.g. with out body; >; out qt; as for cityseer.
+        """
+        with open(elements_path) as elements_file:
+            elements = json.load(elements_file)["elements"]
+        places = []
+        if places_path is not None:
+            with open(places_path) as places_file:
+                places = json.load(places_file)
+        return cls(elements, places)
+
+    @classmethod
+    def from_synthetic(
+        cls,
+        edges_gdf: gpd.GeoDataFrame,
+        landuses_gdf: gpd.GeoDataFrame | None = None,
+        buildings_gdf: gpd.GeoDataFrame | None = None,
+        landuse_tags: dict[str, dict[str, str]] | None = None,
+        origin: tuple[float, float] = (33.36, 35.17),
+        place_name: str = "Synthetic City",
+        place_osm_id: int = 1,
+    ) -> "OSMData":
+        """
+        Converts synthetic edges, landuses, and buildings in metres to OSM elements centred on the origin lng, lat.
+
+        Edges become residential highway ways and buildings become building ways from their exterior rings. Landuses
+        become nodes tagged as per landuse_tags for their cat_key. The network's hull is registered as a place,
+        geocodable by place_name or as a relation with place_osm_id.
+        """
+        # a transverse mercator projection centred on the origin keeps the synthetic distances in metres
+        to_wgs = Transformer.from_crs(
+            f"+proj=tmerc +lat_0={origin[1]} +lon_0={origin[0]} +k=1 +x_0=0 +y_0=0 +ellps=WGS84",
+            4326,
+            always_xy=True,
+        )
+        centre = np.array(edges_gdf.geometry.union_all().centroid.coords[0])
+        elements: list[dict[str, Any]] = []
+        node_keys: dict[tuple[float, float], int] = {}
+
+        def _node_ids(coords: np.ndarray, tags: list[dict] | None = None) -> list[int]:
+            """Returns node ids for coords, adding nodes for new coordinates rounded to 1cm"""
+            coords = np.round(coords - centre, 2)
+            lngs, lats = to_wgs.transform(coords[:, 0], coords[:, 1])
+            ids = []
+            for idx, (x, y) in enumerate(coords.tolist()):
+                node_id = node_keys.get((x, y))
+                # tagged nodes are features in their own right so are not shared
+                if node_id is None or tags is not None:
+                    node_id = len(elements) + 1
+                    if tags is None:
+                        node_keys[(x, y)] = node_id
+                    node = {"type": "node", "id": node_id}
+                    node.update(lat=round(lats[idx], 7), lon=round(lngs[idx], 7))
+                    if tags is not None:
+                        node["tags"] = tags[idx]
+                    elements.append(node)
+                ids.append(node_id)
+            return ids
+
+        def _add_ways(lines: np.ndarray, tags: dict[str, str]):
+            coords, line_idx = shapely.get_coordinates(lines, return_index=True)
+            node_ids = np.array(_node_ids(coords), dtype=np.int64)
+            splits = np.flatnonzero(np.diff(line_idx)) + 1
+            for way_nodes in np.split(node_ids, splits):
+                elements.append(
+                    {
+                        "type": "way",
+                        "id": len(elements) + 1,
+                        "nodes": way_nodes.tolist(),
+                        "tags": dict(tags),
+                    }
+                )
+
+        _add_ways(edges_gdf.geometry.values, {"highway": "residential"})
+        if buildings_gdf is not None:
+            _add_ways(
+                shapely.get_exterior_ring(buildings_gdf.geometry.values),
+                {"building": "yes"},
+            )
+        if landuses_gdf is not None:
+            if landuse_tags is None:
+                raise ValueError(
+                    "Landuse tags are required to convert landuses to OSM nodes."
+                )
+            coords = shapely.get_coordinates(landuses_gdf.geometry.values)
+            tags = [dict(landuse_tags[cat_key]) for cat_key in landuses_gdf["cat_key"]]
+            _node_ids(coords, tags)
+        hull = shapely.transform(
+            shapely.convex_hull(edges_gdf.geometry.union_all()).buffer(100),
+            lambda coords: np.column_stack(to_wgs.transform(*(coords - centre).T)),
+        )
+        return cls(elements, [place_result(hull, place_name, place_osm_id)])
+
+    def query(self, query: str) -> dict[str, Any]:
+        """Answers an Overpass query with the matched elements and the nodes of matched ways"""
+        matched_nodes = np.zeros(len(self.nodes), dtype=bool)
+        matched_ways = np.zeros(len(self.ways), dtype=bool)
+        matched_relations = np.zeros(len(self.relations), dtype=bool)
+        elements_by_type = {
+            "node": (self.nodes, matched_nodes),
+            "way": (self.ways, matched_ways),
+            "relation": (self.relations, matched_relations),
+        }
+        # queries repeat the same polygon for each statement
+        in_poly_cache: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for element_type, filters, polygon in parse_overpass_query(query):
+            if polygon.wkb_hex not in in_poly_cache:
+                in_poly_cache[polygon.wkb_hex] = self._in_polygon(polygon)
+            node_in_poly, way_in_poly = in_poly_cache[polygon.wkb_hex]
+            elements, matched = elements_by_type[element_type]
+            key, op, _ = filters[0] if filters else (None, "!=", None)
+            if op in (None, "=", "~"):
+                candidates = self.key_index[element_type].get(
+                    key, np.zeros(0, dtype=np.int64)
+                )
+            else:
+                candidates = np.arange(len(elements))
+            for pos in candidates[~matched[candidates]]:
+                if not _matches_filters(elements[pos].get("tags", {}), filters):
+                    continue
+                if element_type == "node":
+                    matched[pos] = node_in_poly[pos]
+                elif element_type == "way":
+                    matched[pos] = way_in_poly[pos]
+                else:
+                    matched[pos] = way_in_poly[self.relation_way_pos[pos]].any()
+        # recurse down from relations to ways and from ways to nodes
+        member_ways = matched_ways.copy()
+        for pos in np.flatnonzero(matched_relations):
+            member_ways[self.relation_way_pos[pos]] = True
+        member_nodes = matched_nodes.copy()
+        for pos in np.flatnonzero(member_ways):
+            member_nodes[self.way_node_pos[pos]] = True
+        # nodes first, as osmnx expects a way's nodes to precede the way
+        elements = (
+            [self.nodes[pos] for pos in np.flatnonzero(member_nodes)]
+            + [self.ways[pos] for pos in np.flatnonzero(member_ways)]
+            + [self.relations[pos] for pos in np.flatnonzero(matched_relations)]
+        )
+        return {
+            "version": 0.6,
+            "generator": "local Overpass stand-in",
+            "osm3s": {
+                "timestamp_osm_base": "",
+                "copyright": "Synthetic or recorded data.",
+            },
+            "elements": elements,
+        }
+
+    def _in_polygon(self, polygon: geometry.Polygon) -> tuple[np.ndarray, np.ndarray]:
+        """Returns masks of the nodes within the polygon and of the ways with a node within the polygon"""
+        node_in_poly = shapely.contains_xy(polygon, self.node_lngs, self.node_lats)
+        if not len(self.ways):
+            return node_in_poly, np.zeros(0, dtype=bool)
+        way_in_poly = np.logical_or.reduceat(
+            node_in_poly[self.way_node_flat], self.way_node_starts
+        )
+        return node_in_poly, way_in_poly
+
+    def geocode(
+        self, params: dict[str, str], request_type: str
+    ) -> list[dict[str, Any]]:
+        """Answers a Nominatim search by case-insensitive name match, or a lookup by OSM ids such as R1"""
+        if request_type == "lookup":
+            osm_ids = params.get("osm_ids", "").upper().split(",")
+            return [
+                place
+                for place in self.places
+                if f"{place['osm_type'][0].upper()}{place['osm_id']}" in osm_ids
+            ]
+        query = params.get("q", "").lower()
+        results = [
+            place
+            for place in self.places
+            if query and query in place["display_name"].lower()
+        ]
+        return results[: int(params.get("limit", 50))]
+
+
+def place_result(
+    polygon: geometry.Polygon | geometry.MultiPolygon, name: str, osm_id: int
+) -> dict[str, Any]:
+    """A Nominatim result for a WGS84 polygon"""
+    west, south, east, north = polygon.bounds
+    centroid = polygon.centroid
+    return {
+        "place_id": osm_id,
+        "licence": "Synthetic data.",
+        "osm_type": "relation",
+        "osm_id": osm_id,
+        "boundingbox": [str(south), str(north), str(west), str(east)],
+        "lat": str(centroid.y),
+        "lon": str(centroid.x),
+        "display_name": name,
+        "class": "boundary",
+        "type": "administrative",
+        "importance": 0.5,
+        "geojson": geometry.mapping(polygon),
+    }
+
+
+class _RateLimiter:
+    """A token bucket allowing rate requests per second with bursts of up to burst requests"""
+
+    def __init__(self, rate: float | None, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self) -> float:
+        """Takes a token and returns zero, or returns the seconds until the next token is available"""
+        if self.rate is None:
+            return 0.0
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def available(self) -> tuple[int, float]:
+        """Returns the available slots and the seconds until the next slot"""
+        if self.rate is None:
+            return self.burst, 0.0
+        with self.lock:
+            self._refill()
+            return int(self.tokens), max(0.0, (1 - self.tokens) / self.rate)
+
+
+class OSMStandIn:
+    """
+    Serves OSMData over HTTP on localhost in a background thread.
+
+    Each request is delayed by latency seconds. With a rate_limit, in requests per second per service, requests
+    beyond a burst of burst requests are answered with 429 and a Retry-After header. A fraction error_rate of the
+    remaining requests is answered with 504, as for an overloaded Overpass server. Use as a context manager or call
+    start and stop. Port 0 picks a free port.
+    """
+
+    def __init__(
+        self,
+        data: OSMData,
+        latency: float = 0.0,
+        rate_limit: float | None = None,
+        burst: int = 2,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        if latency < 0:
+            raise ValueError("Latency should not be negative.")
+        if rate_limit is not None and rate_limit <= 0:
+            raise ValueError("The rate limit should be a positive number.")
+        if not 0 <= error_rate < 1:
+            raise ValueError("The error rate should be at least 0 and less than 1.")
+        self.data = data
+        self.latency = latency
+        self.error_rate = error_rate
+        self.limiters = {
+            "overpass": _RateLimiter(rate_limit, burst),
+            "nominatim": _RateLimiter(rate_limit, burst),
+        }
+        self.stats = {
+            service: {
+                "requests": 0,
+                "ok": 0,
+                "rate_limited": 0,
+                "errors": 0,
+                "bytes": 0,
+            }
+            for service in self.limiters
+        }
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def overpass_url(self) -> str:
+        return f"{self.url}/api"
+
+    @property
+    def nominatim_url(self) -> str:
+        return f"{self.url}/nominatim"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Serving the Overpass and Nominatim stand-in at {self.url}.")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _count(self, service: str, stat: str, n: int = 1):
+        with self._lock:
+            self.stats[service][stat] += n
+
+    def _status_text(self) -> str:
+        """Overpass status text, where osmnx reads the free slots from the fifth line"""
+        slots, wait_s = self.limiters["overpass"].available()
+        now = dt.datetime.now(dt.timezone.utc)
+        if slots > 0:
+            slot_line = f"{slots} slots available now."
+        else:
+            wait_s = int(np.ceil(wait_s))
+            available_at = (now + dt.timedelta(seconds=wait_s)).strftime(
+                "%Y-%m-%dT%H:%M:%SZ"
+            )
+            slot_line = f"Slot available after: {available_at}, in {wait_s} seconds."
+        return "\n".join(
+            [
+                "Connected as: 0",
+                f"Current time: {now.strftime('%Y-%m-%dT%H:%M:%SZ')}",
+                "Announced endpoint: none",
+                f"Rate limit: {self.limiters['overpass'].burst}",
+                slot_line,
+                "Currently running queries (pid, space limit, time limit, start time):",
+                "",
+            ]
+        )
+
+    def _handler_class(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+            def _send(self, status: int, body: str, content_type: str, headers=None):
+                payload = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                for key, val in (headers or {}).items():
+                    self.send_header(key, val)
+                self.end_headers()
+                self.wfile.write(payload)
+                return len(payload)
+
+            def _params(self) -> dict[str, str]:
+                params = parse_qs(urlparse(self.path).query)
+                if self.command == "POST":
+                    length = int(self.headers.get("Content-Length", 0))
+                    params.update(parse_qs(self.rfile.read(length).decode("utf-8")))
+                return {key: vals[0] for key, vals in params.items()}
+
+            def _handle(self):
+                path = urlparse(self.path).path.rstrip("/")
+                params = self._params()
+                if path == "/api/status":
+                    self._send(200, stand_in._status_text(), "text/plain")
+                    return
+                if path == "/api/interpreter":
+                    service = "overpass"
+                elif path in ("/nominatim/search", "/nominatim/lookup"):
+                    service = "nominatim"
+                else:
+                    self._send(404, "Not found.", "text/plain")
+                    return
+                stand_in._count(service, "requests")
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                retry_after = stand_in.limiters[service].acquire()
+                if retry_after:
+                    stand_in._count(service, "rate_limited")
+                    self._send(
+                        429,
+                        "Too many requests.",
+                        "text/plain",
+                        {"Retry-After": str(int(np.ceil(retry_after)))},
+                    )
+                    return
+                with stand_in._lock:
+                    failed = stand_in._rng.random() < stand_in.error_rate
+                if failed:
+                    stand_in._count(service, "errors")
+                    self._send(504, "Gateway timeout.", "text/plain")
+                    return
+                try:
+                    if service == "overpass":
+                        response = stand_in.data.query(params.get("data", ""))
+                    else:
+                        response = stand_in.data.geocode(
+                            params, path.rsplit("/", 1)[-1]
+                        )
+                except ValueError as err:
+                    stand_in._count(service, "errors")
+                    self._send(400, str(err), "text/plain")
+                    return
+                n_bytes = self._send(200, json.dumps(response), "application/json")
+                stand_in._count(service, "ok")
+                stand_in._count(service, "bytes", n_bytes)
+
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                self._handle()
+
+        return Handler
@@ -0,0 +1,510 @@
+"""
+Writers and readers for result tables with more than one geometry column.
+
+GeoParquet stores every geometry column natively as WKB, so the point and line geoms of dual nodes can be kept together
+without serialising either to WKT. GPKG remains available for QGIS users: only the active geometry is kept as a
+geometry and the remaining geometry columns are written as WKT. Both writers process the table in chunks so that the
+WKB or WKT copy of a large nodes table never exists in memory at once.
+
+A ResultSchema selects the metric families and distances to keep and downcasts metrics to float32 where the values
+round trip within tolerance. For large runs, ResultWriter spills each group of metric columns to disk as soon as it is
+computed, e.g. after each cityseer call, so that the full width of the results is only assembled one chunk of rows at
+a time while writing the output.
+"""
+
+import json
+import logging
+import re
+import shutil
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Literal
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+
+logger = logging.getLogger(__name__)
+
+OutputFormat = Literal["parquet", "gpkg"]
+SUFFIXES = {"parquet": ".parquet", "gpkg": ".gpkg"}
+
+# cityseer metric columns, e.g. cc_harmonic_800, cc_betweenness_800_ang, cc_eating_400_wt, or cc_hill_q0_400_nw
+# sampled centralities add a companion column suffixed with _err
+METRIC_COLUMN_PATTERN = re.compile(
+    r"^cc_(?P<key>.+?)_(?P<distance>\d+)(?P<angular>_ang)?(?:_wt|_nw)?(?:_err)?$"
+)
+CLOSENESS_KEYS = {"density", "farness", "cycles", "harmonic", "beta", "hillier"}
+BETWEENNESS_KEYS = {"betweenness", "betweenness_beta"}
+MIXED_USE_PREFIXES = ("hill_q", "shannon", "gini")
+# statistics of numerical columns, e.g. cc_area_mean_400_wt, see src.aggregation
+STATS_SUFFIXES = ("_sum", "_mean", "_count", "_var", "_max", "_min")
+METRIC_FAMILIES = [
+    "shortest_closeness",
+    "shortest_betweenness",
+    "simplest_closeness",
+    "simplest_betweenness",
+    "accessibility",
+    "mixed_uses",
+    "stats",
+]
+
+
+def parse_metric_column(col: str) -> tuple[str, str, int] | None:
+    """Returns the metric family, metric key, and distance of a cityseer metric column, or None for other columns"""
+    match = METRIC_COLUMN_PATTERN.match(col)
+    if match is None:
+        return None
+    key = match["key"]
+    path = "simplest" if match["angular"] else "shortest"
+    if key in CLOSENESS_KEYS:
+        family = f"{path}_closeness"
+    elif key in BETWEENNESS_KEYS:
+        family = f"{path}_betweenness"
+    elif key.startswith(MIXED_USE_PREFIXES):
+        family = "mixed_uses"
+    elif key.endswith(STATS_SUFFIXES) and not key.endswith("_nearest_max"):
+        family = "stats"
+    else:
+        family = "accessibility"
+    return family, key, int(match["distance"])
+
+
+@dataclass
+class ResultSchema:
+    """
+    Selects the metric columns to keep and the dtypes to store them as.
+
+    Set metrics to a list of families from METRIC_FAMILIES or of metric keys, e.g. harmonic, betweenness, or a landuse
+    category such as eating, which also keeps its nearest_max column, or a stats column such as area, which keeps all of
+    its statistics. Set distances to keep only these distances.
+    None keeps all metrics or distances. Columns that are not cityseer metrics, e.g. the geometries and the live
+    column, are always kept. With float32 set, float64 metric columns are downcast if every value round trips within
+    float32_rtol, so that columns with values beyond the float32 range stay float64.
+    """
+
+    metrics: list[str] | None = None
+    distances: list[int] | None = None
+    float32: bool = True
+    float32_rtol: float = 1e-6
+
+    def __post_init__(self):
+        if self.metrics is not None and not self.metrics:
+            raise ValueError(
+                "Metrics should be None, to keep all, or a non-empty list."
+            )
+        if self.distances is not None and not self.distances:
+            raise ValueError(
+                "Distances should be None, to keep all, or a non-empty list."
+            )
+
+    def keep_column(self, col: str) -> bool:
+        parsed = parse_metric_column(col)
+        if parsed is None:
+            return True
+        family, key, distance = parsed
+        if self.distances is not None and distance not in self.distances:
+            return False
+        if self.metrics is None:
+            return True
+        return (
+            family in self.metrics
+            or key in self.metrics
+            or key.removesuffix("_nearest_max") in self.metrics
+            or (family == "stats" and key.rsplit("_", 1)[0] in self.metrics)
+        )
+
+    def downcast(self, values: pd.Series) -> pd.Series:
+        """Returns the column as float32 if it is a float64 metric and precision allows, otherwise unchanged"""
+        if (
+            not self.float32
+            or values.dtype != np.float64
+            or parse_metric_column(values.name) is None
+        ):
+            return values
+        values_f32 = values.to_numpy().astype(np.float32)
+        with np.errstate(over="ignore"):
+            if not np.allclose(
+                values_f32,
+                values.to_numpy(),
+                rtol=self.float32_rtol,
+                atol=0,
+                equal_nan=True,
+            ):
+                return values
+        return pd.Series(values_f32, index=values.index, name=values.name)
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Returns the kept columns, downcast where possible"""
+        df = df[[col for col in df.columns if self.keep_column(col)]]
+        downcast_cols = {}
+        for col in df.columns:
+            values = self.downcast(df[col])
+            if values.dtype != df[col].dtype:
+                downcast_cols[col] = values
+        if not downcast_cols:
+            return df
+        return df.assign(**downcast_cols)
+
+
+def geometry_columns(gdf: gpd.GeoDataFrame) -> list[str]:
+    """Returns the names of all geometry columns, not only the active geometry"""
+    return [
+        col
+        for col in gdf.columns
+        if isinstance(gdf[col].dtype, gpd.array.GeometryDtype)
+    ]
+
+
+def nodes_as_lines(
+    nodes_gdf: gpd.GeoDataFrame,
+    line_geoms: gpd.GeoSeries | pd.Series | np.ndarray,
+    line_col: str = "edge_geom",
+    point_col: str = "node_geom",
+) -> gpd.GeoDataFrame:
+    """
+    Returns the nodes GDF with line geoms as the active geometry and the node points kept as a second geometry column.
+
+    A Series of line geoms is aligned to the nodes by index, whereas an array is taken in the order of the nodes, e.g.
+    as returned by dual.vis_lines. The writers then store the points as WKB in GeoParquet or as WKT in GPKG.
+    """
+    if isinstance(line_geoms, pd.Series):
+        missing = ~nodes_gdf.index.isin(line_geoms.index)
+        if missing.any():
+            raise ValueError(f"No line geoms for {missing.sum()} nodes.")
+        line_geoms = line_geoms.reindex(nodes_gdf.index).to_numpy()
+    elif len(line_geoms) != len(nodes_gdf):
+        raise ValueError("Line geoms should match the nodes in length.")
+    point_geoms = nodes_gdf.geometry.rename(point_col)
+    lines_gdf = pd.DataFrame(nodes_gdf.drop(columns=nodes_gdf.geometry.name))
+    lines_gdf[point_col] = point_geoms
+    return gpd.GeoDataFrame(
+        lines_gdf,
+        geometry=gpd.GeoSeries(line_geoms, index=nodes_gdf.index, crs=nodes_gdf.crs),
+    ).rename_geometry(line_col)
+
+
+def _geo_metadata(gdf: gpd.GeoDataFrame, geom_cols: list[str]) -> dict:
+    """GeoParquet 1.0.0 file metadata describing each WKB geometry column"""
+    columns_meta = {}
+    for col in geom_cols:
+        geom_series = gdf[col]
+        crs = geom_series.crs
+        columns_meta[col] = {
+            "encoding": "WKB",
+            "geometry_types": sorted(geom_series.geom_type.dropna().unique().tolist()),
+            "crs": crs.to_json_dict() if crs is not None else None,
+            "bbox": geom_series.total_bounds.tolist() if len(geom_series) else [],
+        }
+    return {
+        "version": "1.0.0",
+        "primary_column": gdf.geometry.name,
+        "columns": columns_meta,
+    }
+
+
+def _iter_chunks(gdf: gpd.GeoDataFrame, chunk_size: int) -> Iterable[gpd.GeoDataFrame]:
+    # always yield at least one (possibly empty) chunk so that the schema or layer is written
+    for start_idx in range(0, max(len(gdf), 1), chunk_size):
+        yield gdf.iloc[start_idx : start_idx + chunk_size]
+
+
+def _parquet_schema(
+    gdf: gpd.GeoDataFrame, extra_schemas: list[pa.Schema] | None = None
+) -> pa.Schema:
+    """
+    The Arrow schema for writing a GDF as GeoParquet, with the geometry columns as WKB.
+
+    The fields of any extra schemas, written from pandas without an index, are added after the GDF's columns.
+    """
+    geom_cols = geometry_columns(gdf)
+    geo_meta = json.dumps(_geo_metadata(gdf, geom_cols))
+    # infer the attribute types over all rows so that e.g. chunks of missing values do not fix a null type
+    schema = pa.Schema.from_pandas(
+        pd.DataFrame(gdf).assign(**{col: b"" for col in geom_cols}),
+        preserve_index=True,
+    )
+    pandas_meta = schema.pandas_metadata
+    # pandas places the index fields last, so insert the extra fields before these
+    index_cols = [col for col in pandas_meta["index_columns"] if isinstance(col, str)]
+    fields = [field for field in schema if field.name not in index_cols]
+    columns_meta = [
+        col_meta
+        for col_meta in pandas_meta["columns"]
+        if col_meta["field_name"] not in index_cols
+    ]
+    for extra_schema in extra_schemas or []:
+        fields += list(extra_schema)
+        columns_meta += extra_schema.pandas_metadata["columns"]
+    fields += [schema.field(col) for col in index_cols]
+    columns_meta += [
+        col_meta
+        for col_meta in pandas_meta["columns"]
+        if col_meta["field_name"] in index_cols
+    ]
+    return pa.schema(
+        fields,
+        metadata={
+            b"pandas": json.dumps({**pandas_meta, "columns": columns_meta}).encode(
+                "utf-8"
+            ),
+            b"geo": geo_meta.encode("utf-8"),
+        },
+    )
+
+
+def _write_geoparquet_chunks(
+    chunks: Iterable[gpd.GeoDataFrame],
+    out_path: Path | str,
+    schema: pa.Schema,
+    row_group_size: int,
+    compression: str,
+) -> int:
+    """Writes the chunks to GeoParquet and returns the number of rows written"""
+    row_count = 0
+    with pq.ParquetWriter(out_path, schema, compression=compression) as writer:
+        for chunk_gdf in chunks:
+            chunk_df = pd.DataFrame(chunk_gdf)
+            # encode the chunk's geoms as WKB in place to retain the column order
+            for col in geometry_columns(chunk_gdf):
+                chunk_df[col] = shapely.to_wkb(chunk_df[col].values)
+            table = pa.Table.from_pandas(chunk_df, schema=schema, preserve_index=True)
+            writer.write_table(table, row_group_size=row_group_size)
+            row_count += len(chunk_df)
+    return row_count
+
+
+def write_geoparquet(
+    gdf: gpd.GeoDataFrame,
+    out_path: Path | str,
+    row_group_size: int = 100000,
+    compression: str = "zstd",
+):
+    """Writes a GDF with any number of geometry columns to GeoParquet, one row group at a time"""
+    if row_group_size <= 0:
+        raise ValueError("Row group size should be a positive number.")
+    _write_geoparquet_chunks(
+        _iter_chunks(gdf, row_group_size),
+        out_path,
+        _parquet_schema(gdf),
+        row_group_size,
+        compression,
+    )
+    logger.info(f"Wrote {len(gdf)} rows to {out_path}.")
+
+
+def read_geoparquet(
+    in_path: Path | str, columns: list[str] | None = None
+) -> gpd.GeoDataFrame:
+    """Reads a GeoParquet file, decoding all geometry columns, optionally limited to the given columns"""
+    return gpd.read_parquet(in_path, columns=columns)
+
+
+def write_gpkg(
+    gdf: gpd.GeoDataFrame,
+    out_path: Path | str,
+    chunk_size: int = 100000,
+    layer: str | None = None,
+):
+    """Writes a GDF to GPKG in chunks, converting geometry columns other than the active geometry to WKT"""
+    if chunk_size <= 0:
+        raise ValueError("Chunk size should be a positive number.")
+    _write_gpkg_chunks(_iter_chunks(gdf, chunk_size), out_path, layer)
+    logger.info(f"Wrote {len(gdf)} rows to {out_path}.")
+
+
+def _write_gpkg_chunks(
+    chunks: Iterable[gpd.GeoDataFrame], out_path: Path | str, layer: str | None
+) -> int:
+    """Writes the chunks to a GPKG layer and returns the number of rows written"""
+    row_count = 0
+    for chunk_idx, chunk_gdf in enumerate(chunks):
+        chunk_gdf = chunk_gdf.copy()
+        for col in geometry_columns(chunk_gdf):
+            if col != chunk_gdf.geometry.name:
+                chunk_gdf[col] = shapely.to_wkt(chunk_gdf[col].values)
+        chunk_gdf.to_file(
+            out_path, layer=layer, driver="GPKG", mode="w" if chunk_idx == 0 else "a"
+        )
+        row_count += len(chunk_gdf)
+    return row_count
+
+
+def _output_path(
+    out_path: Path | str, output_format: OutputFormat | None
+) -> tuple[Path, OutputFormat]:
+    """Sets the path's suffix for the output format, or infers the output format from the path's suffix"""
+    out_path = Path(out_path)
+    if output_format is None:
+        output_format = next(
+            (fmt for fmt, suffix in SUFFIXES.items() if suffix == out_path.suffix), None
+        )
+        if output_format is None:
+            raise ValueError(f"Unable to infer output format from {out_path}.")
+    elif output_format in SUFFIXES:
+        out_path = out_path.with_suffix(SUFFIXES[output_format])
+    else:
+        raise ValueError(f"Output format should be one of {list(SUFFIXES)}.")
+    return out_path, output_format
+
+
+def write_geodataframe(
+    gdf: gpd.GeoDataFrame,
+    out_path: Path | str,
+    output_format: OutputFormat | None = None,
+    chunk_size: int = 100000,
+    result_schema: ResultSchema | None = None,
+) -> Path:
+    """
+    Writes a GDF to GeoParquet or GPKG and returns the written path.
+
+    If output_format is provided then the path's suffix is set accordingly, otherwise the format is inferred from the
+    path's suffix. If result_schema is provided then only its metric columns are written, downcast where possible.
+    """
+    out_path, output_format = _output_path(out_path, output_format)
+    if result_schema is not None:
+        gdf = result_schema.apply(gdf)
+    if output_format == "parquet":
+        write_geoparquet(gdf, out_path, row_group_size=chunk_size)
+    else:
+        write_gpkg(gdf, out_path, chunk_size=chunk_size)
+    return out_path
+
+
+class ResultWriter:
+    """
+    Writes a result table one group of metric columns at a time.
+
+    The base GDF, i.e. the nodes with their geometries and attributes, is copied on creation. Each call to add_columns
+    writes the columns added to the GDF since then, as selected and downcast by the result schema, to a temporary
+    Parquet file, and returns the GDF without these columns so that they can be freed before computing the next group.
+    Calling write then assembles the output one chunk of rows at a time from the base GDF and the group files, so that
+    peak memory depends on the number of nodes, the width of a single group, and the chunk size, rather than on the
+    width of all results. The group
+    files are removed on leaving the context.
+
+    with outputs.ResultWriter(nodes_gdf, out_path, result_schema=outputs.ResultSchema(distances=[800])) as writer:
+        nodes_gdf = networks.node_centrality_shortest(network_structure, nodes_gdf, distances=[800, 1600])
+        nodes_gdf = writer.add_columns(nodes_gdf)
+        writer.write()
+    """
+
+    def __init__(
+        self,
+        base_gdf: gpd.GeoDataFrame,
+        out_path: Path | str,
+        output_format: OutputFormat | None = None,
+        result_schema: ResultSchema | None = None,
+        chunk_size: int = 25000,
+    ):
+        if chunk_size <= 0:
+            raise ValueError("Chunk size should be a positive number.")
+        self.out_path, self.output_format = _output_path(out_path, output_format)
+        self.result_schema = result_schema or ResultSchema(float32=False)
+        self.chunk_size = chunk_size
+        # metric columns already present, e.g. from reading previous results, are selected as per the schema
+        self._base_gdf = self.result_schema.apply(base_gdf)
+        self._group_paths: list[Path] = []
+        self._written_cols: set[str] = set()
+        self._temp_dir: Path | None = None
+
+    def __enter__(self):
+        # keep the group files next to the output rather than in a possibly small system temp directory
+        self.out_path.parent.mkdir(parents=True, exist_ok=True)
+        self._temp_dir = Path(
+            tempfile.mkdtemp(prefix=f".{self.out_path.stem}_", dir=self.out_path.parent)
+        )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        shutil.rmtree(self._temp_dir, ignore_errors=True)
+        self._temp_dir = None
+
+    def add_columns(self, gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+        """Writes the columns added to the GDF as a group and returns the GDF without them"""
+        if self._temp_dir is None:
+            raise ValueError("Columns can only be written within the writer's context.")
+        if len(gdf) != len(self._base_gdf) or not gdf.index.equals(
+            self._base_gdf.index
+        ):
+            raise ValueError("The GDF's rows do not match the base GDF.")
+        new_cols = [
+            col
+            for col in gdf.columns
+            if col not in self._base_gdf.columns and col not in self._written_cols
+        ]
+        if not new_cols:
+            return gdf
+        if any(isinstance(gdf[col].dtype, gpd.array.GeometryDtype) for col in new_cols):
+            raise ValueError("Geometry columns should be part of the base GDF.")
+        # copy the kept columns once, after downcasting, rather than the whole group
+        group_df = pd.DataFrame(
+            {
+                col: self.result_schema.downcast(gdf[col]).to_numpy()
+                for col in new_cols
+                if self.result_schema.keep_column(col)
+            }
+        )
+        if len(group_df.columns):
+            group_path = self._temp_dir / f"group_{len(self._group_paths)}.parquet"
+            # one row group per output chunk so that the chunks can be read back by position
+            pq.write_table(
+                pa.Table.from_pandas(group_df, preserve_index=False),
+                group_path,
+                row_group_size=self.chunk_size,
+            )
+            self._group_paths.append(group_path)
+            logger.info(
+                f"Wrote {len(group_df.columns)} of {len(new_cols)} new columns to {group_path.name}."
+            )
+        self._written_cols.update(new_cols)
+        return gdf.drop(columns=new_cols)
+
+    def _iter_result_chunks(
+        self, group_files: list[pq.ParquetFile]
+    ) -> Iterable[gpd.GeoDataFrame]:
+        for chunk_idx, base_chunk in enumerate(
+            _iter_chunks(self._base_gdf, self.chunk_size)
+        ):
+            group_dfs = []
+            for group_file in group_files:
+                if chunk_idx < group_file.num_row_groups:
+                    group_table = group_file.read_row_group(chunk_idx)
+                else:
+                    group_table = group_file.schema_arrow.empty_table()
+                group_df = group_table.to_pandas()
+                group_df.index = base_chunk.index
+                group_dfs.append(group_df)
+            yield gpd.GeoDataFrame(
+                pd.concat([pd.DataFrame(base_chunk), *group_dfs], axis=1),
+                geometry=self._base_gdf.geometry.name,
+                crs=self._base_gdf.crs,
+            )
+
+    def write(self) -> Path:
+        """Assembles the output from the base GDF and the column groups written so far, and returns its path"""
+        if self._temp_dir is None:
+            raise ValueError("Columns can only be written within the writer's context.")
+        group_files = [pq.ParquetFile(group_path) for group_path in self._group_paths]
+        chunks = self._iter_result_chunks(group_files)
+        if self.output_format == "parquet":
+            row_count = _write_geoparquet_chunks(
+                chunks,
+                self.out_path,
+                _parquet_schema(
+                    self._base_gdf,
+                    [group_file.schema_arrow for group_file in group_files],
+                ),
+                self.chunk_size,
+                "zstd",
+            )
+        else:
+            row_count = _write_gpkg_chunks(chunks, self.out_path, None)
+        logger.info(
+            f"Wrote {row_count} rows with {len(self._group_paths)} column groups to {self.out_path}."
+        )
+        return self.out_path
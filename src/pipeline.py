@@ -0,0 +1,250 @@
+"""
+Incremental runner for a graph of workflow stages.
+
+Each stage declares its input paths, output paths, and parameters. After a stage runs, the runner records content hashes
+of its inputs, outputs, and parameters in a manifest. On later runs a stage is skipped when none of these have changed.
+Stages are connected through paths: a stage reading another stage's output runs after it, and only reruns if the content
+of that output changes. For example, changing the centrality distances reruns the centrality stage but not the download.
+
+File hashes are cached in the manifest against each file's size and modification time, so unchanged files are not
+rehashed on every run.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+from src import profiling
+
+logger = logging.getLogger(__name__)
+
+# bump if the manifest format changes so that all stages rerun
+MANIFEST_VERSION = 1
+HASH_CHUNK_BYTES = 1024**2
+
+
+@dataclass
+class Stage:
+    """
+    A workflow stage.
+
+    The func is called as func(inputs, outputs, **params) where inputs and outputs are dicts of labels to paths. Values
+    which should not trigger reruns, such as caches or loggers, should be bound to the func, e.g. with a closure, rather
+    than passed as params. Params must be JSON serialisable or have a stable string representation.
+    """
+
+    name: str
+    func: Callable[..., None]
+    inputs: dict[str, Path] = field(default_factory=dict)
+    outputs: dict[str, Path] = field(default_factory=dict)
+    params: dict[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        self.inputs = {label: Path(p) for label, p in self.inputs.items()}
+        self.outputs = {label: Path(p) for label, p in self.outputs.items()}
+        if not self.outputs:
+            raise ValueError(f"Stage {self.name} should declare at least one output.")
+
+
+def params_digest(params: dict[str, Any]) -> str:
+    """Hashes stage parameters independently of dict ordering"""
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Pipeline:
+    """Runs stages in dependency order, skipping those with unchanged inputs, outputs, and params"""
+
+    def __init__(
+        self,
+        work_dir: Path | str,
+        stages: list[Stage] | None = None,
+        manifest_name: str = "pipeline_manifest.json",
+    ):
+        self.work_dir = Path(work_dir)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.work_dir / manifest_name
+        self.manifest = self._load_manifest()
+        self.stages: dict[str, Stage] = {}
+        for stage in stages or []:
+            self.add(stage)
+
+    def _load_manifest(self) -> dict[str, Any]:
+        empty = {"version": MANIFEST_VERSION, "stages": {}, "files": {}}
+        if not self.manifest_path.exists():
+            return empty
+        with open(self.manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("version") != MANIFEST_VERSION:
+            logger.info("Pipeline manifest is an older version, all stages will rerun.")
+            return empty
+        return manifest
+
+    def _save_manifest(self):
+        # write to a temporary file first so that interrupted writes do not leave a corrupt manifest
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as manifest_file:
+            json.dump(self.manifest, manifest_file, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def add(self, stage: Stage):
+        """Adds a stage - each output path can only be produced by one stage"""
+        if stage.name in self.stages:
+            raise ValueError(f"Duplicate stage name: {stage.name}")
+        producers = self._producers()
+        for out_path in stage.outputs.values():
+            if out_path.resolve() in producers:
+                raise ValueError(
+                    f"Output {out_path} of stage {stage.name} is already produced by "
+                    f"stage {producers[out_path.resolve()]}."
+                )
+        self.stages[stage.name] = stage
+
+    def _producers(self) -> dict[Path, str]:
+        """Maps each output path to the stage producing it"""
+        return {
+            out_path.resolve(): stage.name
+            for stage in self.stages.values()
+            for out_path in stage.outputs.values()
+        }
+
+    def dependencies(self, stage_name: str) -> list[str]:
+        """Returns the names of the stages producing the given stage's inputs"""
+        producers = self._producers()
+        deps = []
+        for in_path in self.stages[stage_name].inputs.values():
+            producer = producers.get(in_path.resolve())
+            if producer is not None and producer not in deps:
+                deps.append(producer)
+        return deps
+
+    def order(self, targets: list[str] | None = None) -> list[str]:
+        """Returns the target stages and their upstream stages in dependency order"""
+        if targets is None:
+            targets = list(self.stages)
+        ordered: list[str] = []
+        visiting: set[str] = set()
+
+        def _visit(stage_name: str):
+            if stage_name not in self.stages:
+                raise ValueError(f"Unknown stage: {stage_name}")
+            if stage_name in ordered:
+                return
+            if stage_name in visiting:
+                raise ValueError(f"Stage graph contains a cycle at {stage_name}.")
+            visiting.add(stage_name)
+            for dep_name in self.dependencies(stage_name):
+                _visit(dep_name)
+            visiting.remove(stage_name)
+            ordered.append(stage_name)
+
+        for target in targets:
+            _visit(target)
+        return ordered
+
+    def _file_digest(self, file_path: Path) -> str:
+        """Hashes a file's content, reusing the cached hash if the size and modification time are unchanged"""
+        stat = file_path.stat()
+        cache_key = str(file_path.resolve())
+        cached = self.manifest["files"].get(cache_key)
+        if cached is not None and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+        hasher = hashlib.sha256()
+        with open(file_path, "rb") as in_file:
+            while chunk := in_file.read(HASH_CHUNK_BYTES):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        self.manifest["files"][cache_key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def content_hash(self, path: Path | str) -> str | None:
+        """Hashes a file or a directory's files and names, returning None for missing paths"""
+        path = Path(path)
+        if path.is_file():
+            return self._file_digest(path)
+        if path.is_dir():
+            hasher = hashlib.sha256()
+            for file_path in sorted(p for p in path.rglob("*") if p.is_file()):
+                hasher.update(file_path.relative_to(path).as_posix().encode("utf-8"))
+                hasher.update(self._file_digest(file_path).encode("utf-8"))
+            return hasher.hexdigest()
+        return None
+
+    def _hashes(self, paths: dict[str, Path]) -> dict[str, str | None]:
+        return {label: self.content_hash(p) for label, p in paths.items()}
+
+    def stale_reason(self, stage_name: str) -> str | None:
+        """Returns why a stage needs to run, or None if it is up to date"""
+        stage = self.stages[stage_name]
+        record = self.manifest["stages"].get(stage_name)
+        if record is None:
+            return "no previous run"
+        if record["params"] != params_digest(stage.params):
+            return "params changed"
+        if record["inputs"] != self._hashes(stage.inputs):
+            return "inputs changed"
+        output_hashes = self._hashes(stage.outputs)
+        if any(digest is None for digest in output_hashes.values()):
+            return "outputs missing"
+        if record["outputs"] != output_hashes:
+            return "outputs changed"
+        return None
+
+    def run_stage(self, stage_name: str):
+        """Runs a single stage unconditionally and records its hashes"""
+        stage = self.stages[stage_name]
+        for label, in_path in stage.inputs.items():
+            if not in_path.exists():
+                raise IOError(
+                    f"Missing input {label} for stage {stage_name}: {in_path}"
+                )
+        for out_path in stage.outputs.values():
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        # recorded on the active run profiler, if any
+        with profiling.stage(stage_name):
+            stage.func(stage.inputs, stage.outputs, **stage.params)
+        duration = time.perf_counter() - start
+        output_hashes = self._hashes(stage.outputs)
+        missing = [label for label, digest in output_hashes.items() if digest is None]
+        if missing:
+            raise ValueError(f"Stage {stage_name} did not write outputs: {missing}")
+        self.manifest["stages"][stage_name] = {
+            "params": params_digest(stage.params),
+            "inputs": self._hashes(stage.inputs),
+            "outputs": output_hashes,
+            "duration_s": round(duration, 3),
+            "completed_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self._save_manifest()
+        logger.info(f"Stage {stage_name} completed in {duration:.1f}s.")
+
+    def run(
+        self, targets: list[str] | None = None, force: bool | list[str] = False
+    ) -> dict[str, str]:
+        """
+        Runs the target stages and their upstream stages where out of date.
+
+        Set force to True to rerun all stages, or to a list of stage names to rerun those stages. Downstream stages
+        still only rerun if the forced stage's outputs change. Returns a dict of each stage's status: "ran" or
+        "skipped".
+        """
+        statuses = {}
+        for stage_name in self.order(targets):
+            forced = force is True or (isinstance(force, list) and stage_name in force)
+            reason = "forced" if forced else self.stale_reason(stage_name)
+            if reason is None:
+                logger.info(f"Stage {stage_name} is up to date, skipping.")
+                statuses[stage_name] = "skipped"
+                continue
+            logger.info(f"Running stage {stage_name}: {reason}.")
+            self.run_stage(stage_name)
+            statuses[stage_name] = "ran"
+        # persist any newly cached file hashes
+        self._save_manifest()
+        return statuses
@@ -0,0 +1,330 @@
+"""
+Population at network nodes, interpolated from a gridded population raster such as the 1km Eurostat census grid.
+
+This replaces the manual QGIS steps in workflows/population_density.md, which clip the raster to the buffered
+boundary, warp it to 100m with bilinear resampling, and sample the warped raster at the nodes. Only the raster window
+covering the buffered boundary, plus a one pixel margin for the interpolation, is read from disk, and the bilinear
+interpolation is evaluated directly at every node's coordinates in one vectorised step, so no upsampled raster is
+created. The values match sampling a warped raster at the centres of its pixels, while nodes elsewhere get the
+interpolated value at their exact location rather than at the centre of the nearest 100m pixel.
+
+The aggregative alternative sums the population of the blocks, e.g. Copernicus Urban Atlas blocks, within a short
+distance of each node. This replaces the QGIS buffer, join by location, and virtual layer steps: the blocks are queried
+against an STRtree of the nodes in chunks, and the populations are summed per node from the matching index pairs.
+"""
+
+import logging
+import math
+from pathlib import Path
+from typing import Iterator
+
+import geopandas as gpd
+import numpy as np
+import pyogrio
+import rasterio
+import shapely
+from pyproj import CRS
+from rasterio import windows
+from shapely import geometry
+
+from src import boundaries
+
+logger = logging.getLogger(__name__)
+
+
+def read_window(
+    raster_path: Path | str,
+    bounds: tuple[float, float, float, float] | None = None,
+    band: int = 1,
+) -> tuple[np.ndarray, rasterio.Affine]:
+    """
+    Reads the window of a raster band covering bounds, in the raster's CRS, with a one pixel margin.
+
+    Returns the values as float64, with nodata as NaN, and the window's transform. The window is clipped to the
+    raster, and the whole band is read if bounds is None. Only north-up rasters are supported.
+    """
+    with rasterio.open(raster_path) as src:
+        if src.transform.b != 0 or src.transform.d != 0:
+            raise ValueError("Rotated rasters are not supported.")
+        full_window = windows.Window(0, 0, src.width, src.height)
+        if bounds is None:
+            window = full_window
+        else:
+            window = windows.from_bounds(*bounds, transform=src.transform)
+            # whole pixels covering the bounds, with a margin to keep the neighbouring pixels of points near the edge
+            col_start = math.floor(window.col_off) - 1
+            row_start = math.floor(window.row_off) - 1
+            col_stop = math.ceil(window.col_off + window.width) + 1
+            row_stop = math.ceil(window.row_off + window.height) + 1
+            window = windows.Window(
+                col_start, row_start, col_stop - col_start, row_stop - row_start
+            ).intersection(full_window)
+        values = src.read(band, window=window, masked=True)
+        transform = src.window_transform(window)
+    logger.info(
+        f"Read a {values.shape[1]} x {values.shape[0]} pixel window of {Path(raster_path).name}."
+    )
+    return values.astype(np.float64).filled(np.nan), transform
+
+
+def bilinear_sample(
+    values: np.ndarray, transform: rasterio.Affine, xs: np.ndarray, ys: np.ndarray
+) -> np.ndarray:
+    """
+    Evaluates the bilinear interpolation of a raster at the given coordinates, in the raster's CRS.
+
+    The raster values are taken to lie at the pixel centres, as for GDAL's bilinear resampling. Beyond the outermost
+    pixel centres, and next to NaN pixels, the interpolation is renormalised over the available neighbours. Points
+    outside the raster are NaN.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    # fractional pixel coordinates relative to the pixel centres
+    cols, rows = ~transform * (xs, ys)
+    inside = (
+        (cols >= 0)
+        & (cols <= values.shape[1])
+        & (rows >= 0)
+        & (rows <= values.shape[0])
+    )
+    cols = np.asarray(cols) - 0.5
+    rows = np.asarray(rows) - 0.5
+    col_0 = np.floor(cols).astype(np.int64)
+    row_0 = np.floor(rows).astype(np.int64)
+    col_frac = cols - col_0
+    row_frac = rows - row_0
+    weighted_sum = np.zeros(len(xs))
+    weight_total = np.zeros(len(xs))
+    for row_offset, row_wt in [(0, 1 - row_frac), (1, row_frac)]:
+        for col_offset, col_wt in [(0, 1 - col_frac), (1, col_frac)]:
+            nb_rows = row_0 + row_offset
+            nb_cols = col_0 + col_offset
+            in_raster = (
+                (nb_rows >= 0)
+                & (nb_rows < values.shape[0])
+                & (nb_cols >= 0)
+                & (nb_cols < values.shape[1])
+            )
+            nb_values = np.full(len(xs), np.nan)
+            nb_values[in_raster] = values[nb_rows[in_raster], nb_cols[in_raster]]
+            wts = np.where(np.isnan(nb_values), 0, row_wt * col_wt)
+            weighted_sum += wts * np.nan_to_num(nb_values)
+            weight_total += wts
+    with np.errstate(invalid="ignore", divide="ignore"):
+        sampled = weighted_sum / weight_total
+    sampled[~inside | (weight_total == 0)] = np.nan
+    return sampled
+
+
+def sample_raster(
+    raster_path: Path | str,
+    xs: np.ndarray,
+    ys: np.ndarray,
+    crs: boundaries.CRSLike,
+    bounds_geom: geometry.base.BaseGeometry | None = None,
+    band: int = 1,
+) -> np.ndarray:
+    """
+    Returns the bilinear interpolation of a raster band at the coordinates, given in crs.
+
+    Only the window covering the coordinates, and bounds_geom in crs if set, is read. Pass the buffered boundary as
+    bounds_geom to read the same window whichever nodes are sampled.
+    """
+    with rasterio.open(raster_path) as src:
+        raster_crs = src.crs
+    if raster_crs is None:
+        raise ValueError(f"The raster {raster_path} has no CRS.")
+    if not len(xs):
+        return np.full(0, np.nan)
+    transformer = boundaries.transformer(crs, raster_crs.to_wkt())
+    raster_xs, raster_ys = transformer.transform(
+        np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+    )
+    # points beyond the window would be interpolated from its edge pixels only
+    window_bounds = [
+        np.min(raster_xs),
+        np.min(raster_ys),
+        np.max(raster_xs),
+        np.max(raster_ys),
+    ]
+    if bounds_geom is not None:
+        geom_bounds = boundaries.project_geom(
+            bounds_geom, crs, raster_crs.to_wkt()
+        ).bounds
+        window_bounds = [
+            min(window_bounds[0], geom_bounds[0]),
+            min(window_bounds[1], geom_bounds[1]),
+            max(window_bounds[2], geom_bounds[2]),
+            max(window_bounds[3], geom_bounds[3]),
+        ]
+    values, transform = read_window(raster_path, window_bounds, band=band)
+    return bilinear_sample(values, transform, raster_xs, raster_ys)
+
+
+def population_at_nodes(
+    nodes_gdf: gpd.GeoDataFrame,
+    raster_path: Path | str,
+    bounds_geom: geometry.base.BaseGeometry | None = None,
+    column: str = "population",
+) -> gpd.GeoDataFrame:
+    """
+    Returns a copy of nodes_gdf with the population raster interpolated at each node's x and y columns.
+
+    The x and y columns, as added by cityseer, are in the CRS of nodes_gdf, which is reprojected to the raster's CRS.
+    For the Eurostat grid the values are persons per 1km2 pixel, i.e. a density. See sample_raster for bounds_geom.
+    """
+    if nodes_gdf.crs is None:
+        raise ValueError("The nodes GeoDataFrame has no CRS.")
+    nodes_gdf = nodes_gdf.copy()
+    nodes_gdf[column] = sample_raster(
+        raster_path,
+        nodes_gdf["x"].to_numpy(),
+        nodes_gdf["y"].to_numpy(),
+        nodes_gdf.crs,
+        bounds_geom=bounds_geom,
+    )
+    missing = int(nodes_gdf[column].isna().sum())
+    if missing:
+        logger.warning(f"{missing} nodes fall outside the raster or on nodata pixels.")
+    return nodes_gdf
+
+
+def _populations(values: np.ndarray) -> np.ndarray:
+    # blocks without a population contribute nothing
+    return np.nan_to_num(np.asarray(values, dtype=np.float64))
+
+
+def block_chunks(
+    blocks: gpd.GeoDataFrame | Path | str,
+    population_column: str,
+    crs: boundaries.CRSLike,
+    chunk_size: int = 100_000,
+    bounds: tuple[float, float, float, float] | None = None,
+    layer: str | int | None = None,
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """
+    Yields the geometries, reprojected to crs, and populations of the blocks in chunks of at most chunk_size blocks.
+
+    blocks is a GeoDataFrame or a vector file, which is streamed in Arrow batches so that only one chunk is held in
+    memory. For files, only the blocks intersecting bounds, given in crs, are read. Missing populations are zero.
+    """
+    if chunk_size < 1:
+        raise ValueError("The chunk size must be at least one.")
+    if isinstance(blocks, gpd.GeoDataFrame):
+        if blocks.crs is None:
+            raise ValueError("The blocks GeoDataFrame has no CRS.")
+        if population_column not in blocks.columns:
+            raise ValueError(f"The blocks have no {population_column} column.")
+        same_crs = CRS.from_user_input(blocks.crs) == CRS.from_user_input(crs)
+        for start in range(0, len(blocks), chunk_size):
+            chunk = blocks.iloc[start : start + chunk_size]
+            geoms = chunk.geometry.to_numpy()
+            if not same_crs:
+                geoms = boundaries.project_geom(geoms, blocks.crs, crs)
+            yield geoms, _populations(chunk[population_column].to_numpy())
+        return
+    blocks_crs = pyogrio.read_info(blocks, layer=layer)["crs"]
+    if blocks_crs is None:
+        raise ValueError(f"The blocks layer {blocks} has no CRS.")
+    same_crs = CRS.from_user_input(blocks_crs) == CRS.from_user_input(crs)
+    bbox = None
+    if bounds is not None:
+        bbox = boundaries.project_geom(geometry.box(*bounds), crs, blocks_crs).bounds
+    with pyogrio.open_arrow(
+        blocks,
+        layer=layer,
+        columns=[population_column],
+        bbox=bbox,
+        batch_size=chunk_size,
+        use_pyarrow=True,
+    ) as (meta, reader):
+        if population_column not in meta["fields"]:
+            raise ValueError(
+                f"The blocks layer {blocks} has no {population_column} field."
+            )
+        geom_column = meta["geometry_name"] or "wkb_geometry"
+        for batch in reader:
+            geoms = shapely.from_wkb(
+                batch.column(geom_column).to_numpy(zero_copy_only=False)
+            )
+            if not same_crs:
+                geoms = boundaries.project_geom(geoms, blocks_crs, crs)
+            pops = batch.column(population_column).to_numpy(zero_copy_only=False)
+            yield geoms, _populations(pops)
+
+
+def aggregate_blocks(
+    nodes_gdf: gpd.GeoDataFrame,
+    blocks: gpd.GeoDataFrame | Path | str,
+    population_column: str = "Pop2018",
+    buffer_dist: float = 20,
+    area_weighted: bool = False,
+    chunk_size: int = 100_000,
+    column: str = "pop_agg",
+    layer: str | int | None = None,
+) -> gpd.GeoDataFrame:
+    """
+    Returns a copy of nodes_gdf with the summed population of the blocks within buffer_dist of each node.
+
+    The nodes are located from their x and y columns, in the CRS of nodes_gdf. blocks is a GeoDataFrame or a vector
+    file, e.g. Copernicus Urban Atlas blocks, and is processed in chunks of chunk_size blocks: each chunk is queried
+    against an STRtree of the nodes, and the populations of the matching blocks are summed per node. Memory is bounded
+    by the chunk size rather than the number of blocks. Nodes without blocks nearby get zero.
+
+    By default every node gets the whole population of each block it touches, as for the QGIS join by location, so
+    blocks near several nodes are counted several times. Set area_weighted to instead split each block's population
+    between the nodes' buffers in proportion to the area of the block within each buffer, which keeps the total.
+    """
+    if nodes_gdf.crs is None:
+        raise ValueError("The nodes GeoDataFrame has no CRS.")
+    if buffer_dist <= 0:
+        raise ValueError("The buffer distance must be positive.")
+    points = shapely.points(nodes_gdf["x"].to_numpy(), nodes_gdf["y"].to_numpy())
+    tree = shapely.STRtree(points)
+    min_x, min_y, max_x, max_y = shapely.total_bounds(points)
+    bounds = (
+        min_x - buffer_dist,
+        min_y - buffer_dist,
+        max_x + buffer_dist,
+        max_y + buffer_dist,
+    )
+    pop_agg = np.zeros(len(points))
+    block_count = 0
+    for geoms, pops in block_chunks(
+        blocks, population_column, nodes_gdf.crs, chunk_size, bounds, layer
+    ):
+        block_count += len(geoms)
+        # index pairs of the blocks within the buffer distance of each node, as for intersecting the buffered nodes
+        block_idx, node_idx = tree.query(
+            geoms, predicate="dwithin", distance=buffer_dist
+        )
+        if not len(block_idx):
+            continue
+        if not area_weighted:
+            pop_agg += np.bincount(
+                node_idx, weights=pops[block_idx], minlength=len(points)
+            )
+            continue
+        # only the nodes touched by this chunk are buffered
+        touched, touched_idx = np.unique(node_idx, return_inverse=True)
+        node_buffers = shapely.buffer(points[touched], buffer_dist)
+        areas = shapely.area(
+            shapely.intersection(geoms[block_idx], node_buffers[touched_idx])
+        )
+        block_areas = np.bincount(block_idx, weights=areas, minlength=len(geoms))
+        # blocks only touching the buffers at a point or along an edge are split equally
+        block_counts = np.bincount(block_idx, minlength=len(geoms))
+        shares = np.where(
+            block_areas[block_idx] > 0,
+            areas / np.maximum(block_areas[block_idx], np.finfo(np.float64).tiny),
+            1 / block_counts[block_idx],
+        )
+        pop_agg += np.bincount(
+            node_idx, weights=pops[block_idx] * shares, minlength=len(points)
+        )
+    logger.info(
+        f"Aggregated the population of {block_count} blocks onto {len(points)} nodes."
+    )
+    nodes_gdf = nodes_gdf.copy()
+    nodes_gdf[column] = pop_agg
+    return nodes_gdf
@@ -0,0 +1,540 @@
+"""
+Primal networks built directly from LineString edge GeoDataFrames, without going through networkX.
+
+io.nx_from_generic_geopandas adds the edges to a networkX MultiGraph one row at a time, and io.network_structure_from_nx
+then measures the lengths, angles, and bearings of each edge in Python. For networks of millions of edges both steps
+are slow and the graph is memory hungry. Here, MultiLineStrings are split into their parts, coordinates are rounded to
+0.1m as per cityseer, and edge endpoints are matched to nodes by hashing their quantised coordinates. Endpoints that
+miss each other by up to snap_dist, as in official networks that otherwise need graphs.nx_consolidate_nodes, are merged
+via a KD-tree. The lengths, angular change, and bearings are measured for all edges at once, and the NetworkStructure
+is built from the flat arrays via snapshot.structure_from_arrays.
+
+Parallel edges are merged as per graphs.nx_merge_parallel_edges with a midline and a 1m buffer, as for
+io.nx_from_generic_geopandas. nx_from_primal returns the equivalent networkX graph for steps that still need one, and
+primal_from_nx reads a graph, e.g. as downloaded from OSM, into arrays for src.dual.
+"""
+
+import logging
+from dataclasses import dataclass
+
+import geopandas as gpd
+import networkx as nx
+import numpy as np
+import shapely
+from cityseer import rustalgos
+from scipy import sparse
+from scipy.sparse import csgraph
+from scipy.spatial import cKDTree
+from shapely import geometry
+
+from src import snapshot, util
+
+logger = logging.getLogger(__name__)
+
+# cityseer rounds edge coordinates to 0.1m, see io.nx_from_generic_geopandas
+COORD_PRECISION = 1
+# longer parallel edges within this distance of the shortest are merged, as per io.nx_from_generic_geopandas
+PARALLEL_BUFFER_DIST = 1
+
+
+@dataclass
+class PrimalEdges:
+    """Nodes and edges of a primal network, with each edge geom running from its start node to its end node"""
+
+    node_keys: np.ndarray
+    xs: np.ndarray
+    ys: np.ndarray
+    start_idx: np.ndarray
+    end_idx: np.ndarray
+    geoms: np.ndarray
+    # position of each edge's source row in the edges GDF
+    src_idx: np.ndarray
+    # MultiGraph edge keys and node live flags, if read from a networkX graph
+    edge_keys: np.ndarray | None = None
+    lives: np.ndarray | None = None
+    # position of each edge in the MultiGraph adjacency of its start and end nodes, if read from a networkX graph
+    adjacency_pos: np.ndarray | None = None
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_keys)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.geoms)
+
+
+def node_keys(xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """Node keys in the form used by io.nx_from_generic_geopandas, e.g. x100.5-y200.0"""
+    return np.array(
+        [f"x{x}-y{y}" for x, y in zip(xs.tolist(), ys.tolist())], dtype=object
+    )
+
+
+def edge_lines(geoms: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Splits MultiLineStrings into parts and rounds the coordinates, returning the lines and their source positions"""
+    geoms = np.asarray(geoms)
+    # 1 is LineString, 5 is MultiLineString - missing geoms (-1) contribute no lines
+    if not np.isin(shapely.get_type_id(geoms), [-1, 1, 5]).all():
+        raise ValueError("Edges should be LineString or MultiLineString type.")
+    lines, src_idx = shapely.get_parts(geoms, return_index=True)
+    lines = shapely.transform(
+        shapely.force_2d(lines), lambda coords: np.round(coords, COORD_PRECISION)
+    )
+    keep = ~shapely.is_empty(lines)
+    return lines[keep], src_idx[keep]
+
+
+def snap_endpoints(
+    xs: np.ndarray, ys: np.ndarray, snap_dist: float = 0
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Matches endpoint coordinates to nodes, returning each endpoint's node index and the node coordinates.
+
+    Endpoints sharing the same coordinates, as rounded per COORD_PRECISION, are matched via a hash of the quantised
+    coordinates. If snap_dist is set, nodes within snap_dist of each other are then merged via a KD-tree and placed at
+    their centroid. As for graphs.nx_consolidate_nodes, chains of nearby nodes are merged into one.
+    """
+    scale = 10**COORD_PRECISION
+    quantised = np.column_stack(
+        [np.round(xs * scale).astype(np.int64), np.round(ys * scale).astype(np.int64)]
+    )
+    unique_coords, first_idx, endpoint_idx = np.unique(
+        quantised, axis=0, return_index=True, return_inverse=True
+    )
+    endpoint_idx = endpoint_idx.ravel()
+    # the rounded coordinates themselves, rather than the quantised values, keep the node keys as per cityseer
+    node_xs = np.asarray(xs, dtype=np.float64)[first_idx]
+    node_ys = np.asarray(ys, dtype=np.float64)[first_idx]
+    if snap_dist <= 0 or len(unique_coords) < 2:
+        return endpoint_idx, node_xs, node_ys
+    pairs = cKDTree(np.column_stack([node_xs, node_ys])).query_pairs(
+        snap_dist, output_type="ndarray"
+    )
+    if not len(pairs):
+        return endpoint_idx, node_xs, node_ys
+    node_count = len(unique_coords)
+    adjacency = sparse.coo_matrix(
+        (np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])),
+        shape=(node_count, node_count),
+    )
+    _, labels = csgraph.connected_components(adjacency, directed=False)
+    counts = np.bincount(labels)
+    merged_xs = np.round(np.bincount(labels, weights=node_xs) / counts, COORD_PRECISION)
+    merged_ys = np.round(np.bincount(labels, weights=node_ys) / counts, COORD_PRECISION)
+    logger.info(
+        f"Snapped {node_count} nodes to {len(counts)} within {snap_dist}m of each other."
+    )
+    return labels[endpoint_idx], merged_xs, merged_ys
+
+
+def _merge_parallel(
+    geoms: list[geometry.LineString],
+) -> tuple[list[geometry.LineString], list[int]]:
+    """
+    Merges parallel edges as per graphs.nx_merge_parallel_edges with merge_edges_by_midline.
+
+    Returns the new geoms, running in the direction of the shortest, and the position of the edge each came from.
+    """
+    lengths = [geom.length for geom in geoms]
+    shortest_pos = lengths.index(min(lengths))
+    shortest = geoms[shortest_pos]
+    shortest_buffer = shortest.buffer(PARALLEL_BUFFER_DIST)
+    merged_geoms = []
+    merged_pos = []
+    longer_geoms = []
+    for pos, geom in enumerate(geoms):
+        if pos == shortest_pos:
+            continue
+        if shortest_buffer.contains(geom):
+            longer_geoms.append(geom)
+        else:
+            merged_geoms.append(geom)
+            merged_pos.append(pos)
+    if not longer_geoms:
+        return [shortest] + merged_geoms, [shortest_pos] + merged_pos
+    # the midline of the shortest and the nearest points on the longer geoms, away from their ends
+    coords = np.asarray(shortest.coords)
+    short_points = shapely.points(coords)
+    mid_coords = []
+    for coord, short_point in zip(coords, short_points):
+        multi_coords = [coord]
+        for longer_geom in longer_geoms:
+            longer_point = shapely.get_coordinates(
+                shapely.shortest_line(short_point, longer_geom)
+            )[-1]
+            longer_ends = np.asarray(longer_geom.coords)[[0, -1]]
+            if (np.hypot(*(longer_ends - longer_point).T) < 1).any():
+                continue
+            multi_coords.append(longer_point)
+        mid_coords.append(np.mean(multi_coords, axis=0))
+    # the ends stay at the nodes
+    mid_coords[0] = coords[0]
+    mid_coords[-1] = coords[-1]
+    return [geometry.LineString(mid_coords)] + merged_geoms, [shortest_pos] + merged_pos
+
+
+def primal_edges(
+    edges_gdf: gpd.GeoDataFrame,
+    snap_dist: float = 0,
+    drop_self_loops_dist: float = 50,
+) -> PrimalEdges:
+    """
+    Builds the primal nodes and edges from a LineString or MultiLineString edges GDF.
+
+    Equivalent to io.nx_from_generic_geopandas, followed by graphs.nx_consolidate_nodes if snap_dist is set, but
+    only the edge endpoints are snapped. Self-loops shorter than drop_self_loops_dist are dropped, as are edges
+    collapsed to a point by the snapping.
+    """
+    if edges_gdf.crs is None or not edges_gdf.crs.is_projected:
+        raise ValueError("The GeoDataframe CRS must be projected, i.e. not geographic.")
+    lines, src_idx = edge_lines(edges_gdf.geometry.values)
+    coords, coord_idx = shapely.get_coordinates(lines, return_index=True)
+    coord_counts = np.bincount(coord_idx, minlength=len(lines))
+    first_pos = np.cumsum(coord_counts) - coord_counts
+    last_pos = first_pos + coord_counts - 1
+    endpoint_idx, node_xs, node_ys = snap_endpoints(
+        np.concatenate([coords[first_pos, 0], coords[last_pos, 0]]),
+        np.concatenate([coords[first_pos, 1], coords[last_pos, 1]]),
+        snap_dist,
+    )
+    start_idx = endpoint_idx[: len(lines)]
+    end_idx = endpoint_idx[len(lines) :]
+    if snap_dist > 0:
+        # move the ends of the lines onto their snapped nodes
+        coords[first_pos] = np.column_stack([node_xs[start_idx], node_ys[start_idx]])
+        coords[last_pos] = np.column_stack([node_xs[end_idx], node_ys[end_idx]])
+        lines = shapely.linestrings(coords, indices=coord_idx)
+    lengths = shapely.length(lines)
+    drop = (lengths <= 0) | ((start_idx == end_idx) & (lengths < drop_self_loops_dist))
+    lines, src_idx = lines[~drop], src_idx[~drop]
+    start_idx, end_idx = start_idx[~drop], end_idx[~drop]
+    # merge the parallel edges, which are few, one node pair at a time
+    pair_keys = np.minimum(start_idx, end_idx).astype(np.int64) * len(
+        node_xs
+    ) + np.maximum(start_idx, end_idx)
+    _, pair_inverse, pair_counts = np.unique(
+        pair_keys, return_inverse=True, return_counts=True
+    )
+    parallel = pair_counts[pair_inverse] > 1
+    if parallel.any():
+        keep = ~parallel
+        new_lines, new_src, new_starts, new_ends = [], [], [], []
+        parallel_idx = np.flatnonzero(parallel)
+        order = parallel_idx[np.argsort(pair_inverse[parallel_idx], kind="stable")]
+        groups = np.split(order, np.flatnonzero(np.diff(pair_inverse[order])) + 1)
+        for group in groups:
+            group_geoms, group_pos = _merge_parallel(list(lines[group]))
+            # a midline runs in the direction of the shortest edge, which it replaces
+            for geom, pos in zip(group_geoms, group_pos):
+                edge = group[pos]
+                new_lines.append(geom)
+                new_src.append(src_idx[edge])
+                new_starts.append(start_idx[edge])
+                new_ends.append(end_idx[edge])
+        lines = np.concatenate([lines[keep], np.array(new_lines, dtype=object)])
+        src_idx = np.concatenate([src_idx[keep], new_src])
+        start_idx = np.concatenate([start_idx[keep], new_starts])
+        end_idx = np.concatenate([end_idx[keep], new_ends])
+        logger.info(
+            f"Merged {int(parallel.sum())} parallel edges into {len(new_lines)}."
+        )
+    # only keep the nodes of the remaining edges, in node order
+    used, node_remap = np.unique(
+        np.concatenate([start_idx, end_idx]), return_inverse=True
+    )
+    node_xs, node_ys = node_xs[used], node_ys[used]
+    logger.info(f"Built {len(used)} nodes and {len(lines)} edges.")
+    return PrimalEdges(
+        node_keys=node_keys(node_xs, node_ys),
+        xs=node_xs,
+        ys=node_ys,
+        start_idx=node_remap[: len(lines)].astype(np.int64),
+        end_idx=node_remap[len(lines) :].astype(np.int64),
+        geoms=lines,
+        src_idx=src_idx.astype(np.int64),
+    )
+
+
+def _bearings(from_xy: np.ndarray, to_xy: np.ndarray) -> np.ndarray:
+    """Bearings in degrees as per cityseer's util.measure_bearing"""
+    return np.rad2deg(
+        np.arctan2(to_xy[:, 1] - from_xy[:, 1], to_xy[:, 0] - from_xy[:, 0])
+    )
+
+
+def measure_lines(
+    coords: np.ndarray, coord_idx: np.ndarray, line_count: int
+) -> dict[str, np.ndarray]:
+    """
+    Measures lines given as flat coordinate arrays, as per io.network_structure_from_nx.
+
+    Returns the length and angular change of each line, and the in, out, and total bearings in either direction. The
+    angular change is summed from the bearing changes at every interior vertex, and is the same in either direction.
+    """
+    coord_counts = np.bincount(coord_idx, minlength=line_count)
+    first_pos = np.cumsum(coord_counts) - coord_counts
+    last_pos = first_pos + coord_counts - 1
+    # bearings of the reversed segments and the change across each vertex, see util.measure_coords_angle
+    seg_bearings = _bearings(coords[1:], coords[:-1])
+    turns = np.abs((seg_bearings[1:] - seg_bearings[:-1] + 180) % 360 - 180)
+    # only vertices between two segments of the same line
+    within = coord_idx[:-2] == coord_idx[2:]
+    angle_sums = np.bincount(
+        coord_idx[:-2][within], weights=turns[within], minlength=line_count
+    )
+    # summed per line in coordinate order, as for the shapely length
+    seg_lengths = np.sqrt(np.sum(np.diff(coords, axis=0) ** 2, axis=1))
+    same_line = coord_idx[:-1] == coord_idx[1:]
+    lengths = np.bincount(
+        coord_idx[:-1][same_line], weights=seg_lengths[same_line], minlength=line_count
+    )
+    return {
+        "length": lengths,
+        "angle_sum": angle_sums,
+        "in_bearing": _bearings(coords[first_pos], coords[first_pos + 1]),
+        "out_bearing": _bearings(coords[last_pos - 1], coords[last_pos]),
+        "total_bearing": _bearings(coords[first_pos], coords[last_pos]),
+        "back_in_bearing": _bearings(coords[last_pos], coords[last_pos - 1]),
+        "back_out_bearing": _bearings(coords[first_pos + 1], coords[first_pos]),
+        "back_total_bearing": _bearings(coords[last_pos], coords[first_pos]),
+    }
+
+
+def pair_edge_keys(primal: PrimalEdges) -> np.ndarray:
+    """
+    The edge key of each edge, as for networkX MultiGraph edge keys.
+
+    Keys read from a graph are kept, otherwise parallel edges between the same nodes are numbered in edge order.
+    """
+    if primal.edge_keys is not None:
+        return primal.edge_keys
+    pair_keys = np.minimum(
+        primal.start_idx, primal.end_idx
+    ) * primal.node_count + np.maximum(primal.start_idx, primal.end_idx)
+    order = np.argsort(pair_keys, kind="stable")
+    group_starts = np.flatnonzero(np.r_[True, np.diff(pair_keys[order]) != 0])
+    group_sizes = np.diff(np.r_[group_starts, primal.edge_count])
+    edge_keys = np.empty(primal.edge_count, dtype=np.int64)
+    edge_keys[order] = np.arange(primal.edge_count) - np.repeat(
+        group_starts, group_sizes
+    )
+    return edge_keys
+
+
+def structure_edge_arrays(primal: PrimalEdges) -> dict[str, np.ndarray]:
+    """
+    Measures the edges in both directions, returning the edge arrays for snapshot.structure_from_arrays.
+
+    The values match io.network_structure_from_nx, which adds each edge once from each of its nodes and self-loops
+    only once.
+    """
+    coords, coord_idx = shapely.get_coordinates(primal.geoms, return_index=True)
+    measures = measure_lines(coords, coord_idx, primal.edge_count)
+    lengths = measures["length"]
+    if not (np.isfinite(lengths) & (lengths > 0)).all():
+        raise ValueError("Edge lengths must be finite and positive.")
+    loops = primal.start_idx == primal.end_idx
+    starts = np.concatenate([primal.start_idx, primal.end_idx[~loops]])
+    ends = np.concatenate([primal.end_idx, primal.start_idx[~loops]])
+    # parallel edges between the same nodes are told apart by their edge index, as for MultiGraph edge keys
+    edge_keys = pair_edge_keys(primal)
+    arrays = {
+        "edge_refs": np.column_stack(
+            [starts, ends, np.concatenate([edge_keys, edge_keys[~loops]])]
+        ),
+        "start_nd_key": primal.node_keys[starts].astype(str),
+        "end_nd_key": primal.node_keys[ends].astype(str),
+        "length": np.concatenate([lengths, lengths[~loops]]),
+        "angle_sum": np.concatenate(
+            [measures["angle_sum"], measures["angle_sum"][~loops]]
+        ),
+        "imp_factor": np.ones(len(starts)),
+    }
+    for attr in ["in_bearing", "out_bearing", "total_bearing"]:
+        arrays[attr] = np.concatenate(
+            [measures[attr], measures[f"back_{attr}"][~loops]]
+        )
+    # the position of each directed edge's primal edge
+    arrays["edge_pos"] = np.concatenate(
+        [np.arange(primal.edge_count), np.flatnonzero(~loops)]
+    )
+    return arrays
+
+
+def network_structure_from_primal(
+    primal: PrimalEdges,
+    crs: str | int,
+    boundary_geom: geometry.Polygon | geometry.MultiPolygon | None = None,
+) -> tuple[gpd.GeoDataFrame, gpd.GeoDataFrame, rustalgos.NetworkStructure]:
+    """
+    Returns the nodes GDF, edges GDF, and NetworkStructure in the form of io.network_structure_from_nx.
+
+    Nodes inside boundary_geom are live. If it is None, the live flags read from a graph are used, otherwise all nodes
+    are live. The edges GDF has a row per directed edge, with
+    the primal edge geom and the position of the source row in the edges GDF in src_edge_idx.
+    """
+    if boundary_geom is not None:
+        lives = util.points_in_boundary(primal.xs, primal.ys, boundary_geom)
+    elif primal.lives is not None:
+        lives = primal.lives
+    else:
+        lives = np.ones(primal.node_count, dtype=bool)
+    weights = np.ones(primal.node_count)
+    edge_arrays = structure_edge_arrays(primal)
+    network_structure = snapshot.structure_from_arrays(
+        primal.node_keys.astype(str),
+        primal.xs,
+        primal.ys,
+        lives,
+        weights,
+        edge_arrays,
+    )
+    nodes_gdf = gpd.GeoDataFrame(
+        {
+            "ns_node_idx": np.arange(primal.node_count),
+            "x": primal.xs,
+            "y": primal.ys,
+            "live": lives,
+            "weight": weights,
+        },
+        index=primal.node_keys,
+        geometry=shapely.points(primal.xs, primal.ys),
+        crs=crs,
+    ).rename_geometry("geom")
+    edge_refs = edge_arrays["edge_refs"]
+    edges_gdf = gpd.GeoDataFrame(
+        {
+            "ns_edge_idx": np.arange(len(edge_refs)),
+            "start_ns_node_idx": edge_refs[:, 0],
+            "end_ns_node_idx": edge_refs[:, 1],
+            "edge_idx": edge_refs[:, 2],
+            "nx_start_node_key": edge_arrays["start_nd_key"],
+            "nx_end_node_key": edge_arrays["end_nd_key"],
+            "length": edge_arrays["length"],
+            "angle_sum": edge_arrays["angle_sum"],
+            "imp_factor": edge_arrays["imp_factor"],
+            "in_bearing": edge_arrays["in_bearing"],
+            "out_bearing": edge_arrays["out_bearing"],
+            "total_bearing": edge_arrays["total_bearing"],
+            "src_edge_idx": primal.src_idx[edge_arrays["edge_pos"]],
+        },
+        index=np.char.add(
+            np.char.add(edge_arrays["start_nd_key"], "-"), edge_arrays["end_nd_key"]
+        ),
+        geometry=primal.geoms[edge_arrays["edge_pos"]],
+        crs=crs,
+    ).rename_geometry("geom")
+    return nodes_gdf, edges_gdf, network_structure
+
+
+def nx_from_primal(primal: PrimalEdges) -> nx.MultiGraph:
+    """Returns the networkX MultiGraph that io.nx_from_generic_geopandas would build, for steps that need a graph"""
+    G = nx.MultiGraph()
+    G.add_nodes_from(
+        (key, {"x": x, "y": y})
+        for key, x, y in zip(
+            primal.node_keys.tolist(), primal.xs.tolist(), primal.ys.tolist()
+        )
+    )
+    if primal.lives is not None:
+        nx.set_node_attributes(
+            G, dict(zip(primal.node_keys.tolist(), primal.lives.tolist())), "live"
+        )
+    G.add_edges_from(
+        (
+            primal.node_keys[start],
+            primal.node_keys[end],
+            key,
+            {"geom": geom, "src_edge_idx": src},
+        )
+        for start, end, key, geom, src in zip(
+            primal.start_idx.tolist(),
+            primal.end_idx.tolist(),
+            pair_edge_keys(primal).tolist(),
+            primal.geoms,
+            primal.src_idx.tolist(),
+        )
+    )
+    return G
+
+
+def primal_from_nx(nx_multigraph: nx.MultiGraph) -> PrimalEdges:
+    """
+    Reads the nodes and edges of a networkX MultiGraph, e.g. as downloaded from OSM, into a PrimalEdges.
+
+    The node keys, edge keys, and live flags are kept and the geoms are not modified. As the geoms of a graph can run
+    either way, the start and end of each edge are set to the nodes its geom runs from and to, as for the alignment in
+    io.network_structure_from_nx.
+    """
+    if not isinstance(nx_multigraph, nx.MultiGraph):
+        raise ValueError("This method requires an undirected networkX MultiGraph.")
+    node_count = nx_multigraph.number_of_nodes()
+    node_keys = np.empty(node_count, dtype=object)
+    node_keys[:] = list(nx_multigraph.nodes)
+    node_lookup = {key: idx for idx, key in enumerate(node_keys.tolist())}
+    xs = np.fromiter(
+        (x for _, x in nx_multigraph.nodes(data="x")),
+        dtype=np.float64,
+        count=node_count,
+    )
+    ys = np.fromiter(
+        (y for _, y in nx_multigraph.nodes(data="y")),
+        dtype=np.float64,
+        count=node_count,
+    )
+    live_flags = [live for _, live in nx_multigraph.nodes(data="live")]
+    lives = None
+    if None not in live_flags:
+        lives = np.array(live_flags, dtype=bool)
+    # the edges as listed by MultiGraph.edges, with their positions in the adjacency of either node
+    edges = []
+    adjacency_pos = []
+    edge_lookup = {}
+    for node_key, nbrs in nx_multigraph.adjacency():
+        pos = 0
+        for nb_key, key_dict in nbrs.items():
+            for key, edge_data in key_dict.items():
+                if (nb_key, node_key, key) in edge_lookup:
+                    adjacency_pos[edge_lookup[(nb_key, node_key, key)]][1] = pos
+                else:
+                    edge_lookup[(node_key, nb_key, key)] = len(edges)
+                    edges.append((node_key, nb_key, key, edge_data.get("geom")))
+                    adjacency_pos.append([pos, pos])
+                pos += 1
+    adjacency_pos = np.array(adjacency_pos, dtype=np.int64).reshape(-1, 2)
+    start_idx = np.fromiter(
+        (node_lookup[start] for start, _, _, _ in edges), dtype=np.int64
+    )
+    end_idx = np.fromiter((node_lookup[end] for _, end, _, _ in edges), dtype=np.int64)
+    edge_keys = np.fromiter((key for _, _, key, _ in edges), dtype=np.int64)
+    geoms = np.empty(len(edges), dtype=object)
+    geoms[:] = [geom for _, _, _, geom in edges]
+    if not (shapely.get_type_id(geoms) == 1).all():
+        raise ValueError("Edge geoms should be LineString type.")
+    # swap the nodes of edges whose geoms run from the end node, as per util.align_linestring_coords
+    first_xy = shapely.get_coordinates(shapely.get_point(geoms, 0))
+    last_xy = shapely.get_coordinates(shapely.get_point(geoms, -1))
+    start_xy = np.column_stack([xs[start_idx], ys[start_idx]])
+    flip = np.hypot(*(first_xy - start_xy).T) > np.hypot(*(last_xy - start_xy).T)
+    start_idx[flip], end_idx[flip] = end_idx[flip], start_idx[flip]
+    adjacency_pos[flip] = adjacency_pos[flip][:, ::-1]
+    start_dists = np.hypot(
+        xs[start_idx] - first_xy[:, 0], ys[start_idx] - first_xy[:, 1]
+    )
+    end_dists = np.hypot(xs[end_idx] - last_xy[:, 0], ys[end_idx] - last_xy[:, 1])
+    if (start_dists > 0.5).any() or (end_dists > 0.5).any():
+        raise ValueError("Edge geoms should start and end within 0.5m of their nodes.")
+    logger.info(f"Read {node_count} nodes and {len(edges)} edges.")
+    return PrimalEdges(
+        node_keys=node_keys,
+        xs=xs,
+        ys=ys,
+        start_idx=start_idx,
+        end_idx=end_idx,
+        geoms=geoms,
+        src_idx=np.arange(len(edges)),
+        edge_keys=edge_keys,
+        lives=lives,
+        adjacency_pos=adjacency_pos,
+    )
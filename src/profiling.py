@@ -0,0 +1,298 @@
+"""
+Per-stage profiling for workflow runs.
+
+A RunProfiler records wall time, CPU time, peak RSS, and the tracemalloc peak for each stage, along with any recorded
+details such as graph sizes and distances, and writes these as a JSON run report. Stages can be nested, e.g. the dual
+stage of the composite workflow contains nx_to_dual and network_structure_from_nx stages.
+
+Code opts in through the module level stage and record functions, which apply to the currently running profiler and
+do nothing otherwise, so the src helpers and workflow stages can be instrumented without passing a profiler around:
+
+    with profiling.RunProfiler("nicosia", report_path="../temp/nicosia_run_report.json"):
+        with profiling.stage("nx_to_dual"):
+            G_dual = graphs.nx_to_dual(G)
+            profiling.record(**profiling.graph_info(G_dual))
+
+For cell-based workflows, call start and stop instead of using the profiler as a context manager.
+
+CPU time includes all threads, e.g. cityseer's parallelised centrality computations, so can exceed the wall time. Peak
+RSS, of each stage and of the run, is sampled by a background thread with psutil, so works on any platform and includes
+memory allocated by cityseer's Rust code, whereas tracemalloc only traces Python allocations. Set profiler to "cprofile"
+or "pyinstrument" to profile each top level stage and dump the profile of the slowest stage next to the report.
+"""
+
+import cProfile
+import json
+import logging
+import platform
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Iterator, Literal
+
+import networkx as nx
+import psutil
+from cityseer import rustalgos
+
+logger = logging.getLogger(__name__)
+
+Profiler = Literal["cprofile", "pyinstrument"]
+
+# profilers currently running - the module level functions apply to the innermost
+_active: list["RunProfiler"] = []
+
+
+def _mb(n_bytes: float) -> float:
+    return round(n_bytes / 1024**2, 1)
+
+
+class RunProfiler:
+    """Records per-stage timings, memory, and details for a run and writes them as a JSON report"""
+
+    def __init__(
+        self,
+        run_name: str,
+        report_path: Path | str | None = None,
+        trace_memory: bool = True,
+        profiler: Profiler | None = None,
+        sample_interval: float = 0.05,
+    ):
+        if profiler not in (None, "cprofile", "pyinstrument"):
+            raise ValueError(f"Unknown profiler: {profiler}")
+        self.run_name = run_name
+        self.report_path = None if report_path is None else Path(report_path)
+        self.trace_memory = trace_memory
+        self.profiler = profiler
+        self.sample_interval = sample_interval
+        self.stages: list[dict[str, Any]] = []
+        self.info: dict[str, Any] = {}
+        self._open: list[dict[str, Any]] = []
+        self._peak_rss = 0
+        self._profiles: dict[str, Any] = {}
+        self._process = psutil.Process()
+        self._lock = threading.Lock()
+        self._stop_sampling = threading.Event()
+        self._sampler: threading.Thread | None = None
+        self._started_tracing = False
+        self._start_wall = 0.0
+        self._start_cpu = 0.0
+        self._started_at = ""
+
+    def start(self):
+        """Starts the RSS sampler and tracemalloc, and makes this the active profiler"""
+        if self.profiler == "pyinstrument":
+            # fail early rather than after the first stage
+            _pyinstrument()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._peak_rss = self._process.memory_info().rss
+        self._stop_sampling.clear()
+        self._sampler = threading.Thread(target=self._sample_rss, daemon=True)
+        self._sampler.start()
+        _active.append(self)
+        return self
+
+    def stop(self) -> dict[str, Any]:
+        """Stops profiling, writes the report and the slowest stage's profile if set, and returns the report"""
+        self._stop_sampling.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        if self in _active:
+            _active.remove(self)
+        report = self.report()
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        if self.report_path is not None:
+            self.report_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.profiler is not None and report["hottest_stage"] is not None:
+            report["profile_path"] = str(self._dump_profile(report["hottest_stage"]))
+        if self.report_path is not None:
+            with open(self.report_path, "w") as report_file:
+                json.dump(report, report_file, indent=2, default=str)
+            logger.info(f"Wrote run report to {self.report_path}.")
+        return report
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _sample_rss(self):
+        while not self._stop_sampling.wait(self.sample_interval):
+            self._update_rss()
+
+    def _update_rss(self):
+        rss = self._process.memory_info().rss
+        with self._lock:
+            self._peak_rss = max(self._peak_rss, rss)
+            for open_stage in self._open:
+                open_stage["_peak_rss"] = max(open_stage["_peak_rss"], rss)
+
+    def _fold_traced_peak(self):
+        """Folds the tracemalloc peak since the last reset into the open stages"""
+        if not tracemalloc.is_tracing():
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        for open_stage in self._open:
+            open_stage["_traced_peak"] = max(open_stage["_traced_peak"], peak)
+
+    @contextmanager
+    def stage(self, name: str, **info) -> Iterator[dict[str, Any]]:
+        """Records a stage - nested stages are named by their path, e.g. dual/nx_to_dual"""
+        path = f"{self._open[-1]['name']}/{name}" if self._open else name
+        rss = self._process.memory_info().rss
+        record = {
+            "name": path,
+            "depth": len(self._open),
+            "info": dict(info),
+            "_peak_rss": rss,
+            "_rss_start": rss,
+            "_traced_peak": 0,
+        }
+        if tracemalloc.is_tracing():
+            # fold the running peak into the enclosing stages before resetting it for this stage
+            self._fold_traced_peak()
+            tracemalloc.reset_peak()
+        with self._lock:
+            self._open.append(record)
+        profile = None
+        if self.profiler is not None and record["depth"] == 0:
+            profile = _start_profile(self.profiler)
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield record["info"]
+        finally:
+            wall_s = time.perf_counter() - start_wall
+            cpu_s = time.process_time() - start_cpu
+            if profile is not None:
+                self._profiles[path] = _stop_profile(self.profiler, profile)
+            self._update_rss()
+            self._fold_traced_peak()
+            with self._lock:
+                self._open.remove(record)
+            rss_end = self._process.memory_info().rss
+            self.stages.append(
+                {
+                    "name": path,
+                    "depth": record["depth"],
+                    "wall_s": round(wall_s, 3),
+                    "cpu_s": round(cpu_s, 3),
+                    "peak_rss_mb": _mb(record["_peak_rss"]),
+                    "rss_start_mb": _mb(record["_rss_start"]),
+                    "rss_end_mb": _mb(rss_end),
+                    "tracemalloc_peak_mb": (
+                        _mb(record["_traced_peak"])
+                        if tracemalloc.is_tracing()
+                        else None
+                    ),
+                    **record["info"],
+                }
+            )
+            logger.info(f"Stage {path} took {wall_s:.1f}s.")
+
+    def record(self, **info):
+        """Adds details to the innermost open stage, or to the run if no stage is open"""
+        if self._open:
+            self._open[-1]["info"].update(info)
+        else:
+            self.info.update(info)
+
+    def report(self) -> dict[str, Any]:
+        """Returns the run report"""
+        top_stages = [stage for stage in self.stages if stage["depth"] == 0]
+        hottest = max(top_stages, key=lambda stage: stage["wall_s"], default=None)
+        wall_s = time.perf_counter() - self._start_wall
+        self._update_rss()
+        return {
+            "run": self.run_name,
+            "started_at": self._started_at,
+            "wall_s": round(wall_s, 3),
+            "cpu_s": round(time.process_time() - self._start_cpu, 3),
+            # the sampled peak since the run started
+            "peak_rss_mb": _mb(self._peak_rss),
+            "cpu_count": psutil.cpu_count(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            **self.info,
+            "hottest_stage": None if hottest is None else hottest["name"],
+            # in order of completion, so nested stages precede their parents
+            "stages": self.stages,
+        }
+
+    def _dump_profile(self, stage_name: str) -> Path:
+        """Writes the profile of a stage next to the report, or the working directory if there is no report"""
+        out_dir = Path(".") if self.report_path is None else self.report_path.parent
+        file_stem = f"{self.run_name}_{stage_name.replace('/', '_')}"
+        profile = self._profiles[stage_name]
+        if self.profiler == "cprofile":
+            out_path = out_dir / f"{file_stem}.prof"
+            profile.dump_stats(out_path)
+        else:
+            out_path = out_dir / f"{file_stem}_profile.html"
+            out_path.write_text(profile.output_html())
+        logger.info(f"Wrote the profile for stage {stage_name} to {out_path}.")
+        return out_path
+
+
+def _pyinstrument():
+    try:
+        import pyinstrument
+    except ImportError as err:
+        raise ImportError(
+            "pyinstrument is not installed, install it with pdm add pyinstrument or use the cprofile profiler."
+        ) from err
+    return pyinstrument
+
+
+def _start_profile(profiler: Profiler):
+    if profiler == "cprofile":
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+    profile = _pyinstrument().Profiler()
+    profile.start()
+    return profile
+
+
+def _stop_profile(profiler: Profiler, profile):
+    if profiler == "cprofile":
+        profile.disable()
+    else:
+        profile.stop()
+    return profile
+
+
+def stage(name: str, **info):
+    """Records a stage on the active profiler, if any"""
+    if not _active:
+        return nullcontext({})
+    return _active[-1].stage(name, **info)
+
+
+def record(**info):
+    """Adds details to the active profiler's innermost stage, if any"""
+    if _active:
+        _active[-1].record(**info)
+
+
+def network_info(network_structure: rustalgos.NetworkStructure) -> dict[str, int]:
+    """Node, edge, and live node counts for a network structure"""
+    return {
+        "nodes": network_structure.node_count(),
+        "edges": network_structure.edge_count,
+        "live_nodes": int(sum(network_structure.node_lives)),
+    }
+
+
+def graph_info(G: nx.MultiGraph) -> dict[str, int]:
+    """Node and edge counts for a networkX graph"""
+    return {"nodes": G.number_of_nodes(), "edges": G.number_of_edges()}
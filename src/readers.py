@@ -0,0 +1,133 @@
+"""
+Column-pruned and spatially filtered readers for large network and boundary files.
+
+Layers are read through pyogrio with Arrow batches, only requesting the columns a stage needs. Bounding box and mask
+filters are passed to GDAL so that features outside the area of interest are skipped before any geometries are built.
+Extents are taken from the layer metadata or from the convex hull of the geometry vertices, which avoids noding every
+geometry with a unary union only to discard the result for its hull.
+"""
+
+import logging
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pyogrio
+import shapely
+from shapely import geometry
+
+logger = logging.getLogger(__name__)
+
+# columns used by io.nx_from_cityseer_geopandas when reloading networks saved by the download workflows
+# the "index" column holds the GDF index written to GPKG
+CITYSEER_NODE_COLUMNS = ["index", "x", "y", "live", "weight"]
+CITYSEER_EDGE_COLUMNS = [
+    "index",
+    "nx_start_node_key",
+    "nx_end_node_key",
+    "edge_idx",
+    "length",
+    "angle_sum",
+    "imp_factor",
+    "in_bearing",
+    "out_bearing",
+    "total_bearing",
+]
+
+
+def read_layer(
+    in_path: Path | str,
+    columns: list[str] | None = None,
+    bbox: tuple[float, float, float, float] | None = None,
+    mask: geometry.base.BaseGeometry | None = None,
+    layer: str | int | None = None,
+    where: str | None = None,
+) -> gpd.GeoDataFrame:
+    """
+    Reads a vector layer with the Arrow engine, keeping only the requested attribute columns.
+
+    Pass columns=[] to read only the geometries. The bbox or mask, given in the layer's CRS, and the SQL where clause
+    are applied by GDAL while reading. Raises a ValueError if any requested columns are missing from the layer.
+    """
+    if bbox is not None and mask is not None:
+        raise ValueError("Provide either a bbox or a mask, not both.")
+    if columns:
+        fields = pyogrio.read_info(in_path, layer=layer)["fields"]
+        missing = [col for col in columns if col not in fields]
+        if missing:
+            raise ValueError(
+                f"The layer {in_path} has no {', '.join(missing)} column(s)."
+            )
+    gdf = gpd.read_file(
+        in_path,
+        engine="pyogrio",
+        use_arrow=True,
+        columns=columns,
+        bbox=bbox,
+        mask=mask,
+        layer=layer,
+        where=where,
+    )
+    logger.info(f"Read {len(gdf)} features from {in_path}.")
+    return gdf
+
+
+def layer_bounds(
+    in_path: Path | str, layer: str | int | None = None
+) -> tuple[float, float, float, float]:
+    """Returns a layer's total bounds from its metadata, e.g. a shapefile header, without reading features"""
+    info = pyogrio.read_info(in_path, layer=layer, force_total_bounds=True)
+    return tuple(info["total_bounds"])
+
+
+def layer_crs(in_path: Path | str, layer: str | int | None = None) -> str:
+    """Returns a layer's CRS from its metadata"""
+    return pyogrio.read_info(in_path, layer=layer)["crs"]
+
+
+def vertex_hull(
+    geoms: gpd.GeoSeries | np.ndarray,
+    max_vertices: int | None = None,
+    seed: int = 0,
+) -> geometry.Polygon:
+    """
+    Returns the convex hull of the geometries' vertices.
+
+    This is the same polygon as the hull of a unary union but does not node the geometries. If max_vertices is set and
+    exceeded then the hull is computed from a random sample of vertices together with the vertices at the coordinate
+    extremes, which can slightly undershoot the exact hull.
+    """
+    coords = shapely.get_coordinates(np.asarray(geoms))
+    if not len(coords):
+        raise ValueError("Unable to compute a hull for empty geometries.")
+    xs, ys = coords[:, 0], coords[:, 1]
+    # the vertices at the extremes along the axes and diagonals always lie on the exact hull
+    extreme_idx = np.unique(
+        [
+            func(vals)
+            for vals in (xs, ys, xs + ys, xs - ys)
+            for func in (np.argmin, np.argmax)
+        ]
+    )
+    if max_vertices is not None and len(coords) > max_vertices:
+        rng = np.random.default_rng(seed)
+        sample_idx = rng.choice(len(coords), size=max_vertices, replace=False)
+        coords = coords[np.union1d(sample_idx, extreme_idx)]
+    else:
+        # vertices strictly inside the hull of the extremes cannot be on the exact hull
+        extremes_hull = shapely.convex_hull(shapely.multipoints(coords[extreme_idx]))
+        if extremes_hull.geom_type == "Polygon":
+            shapely.prepare(extremes_hull)
+            coords = coords[~shapely.contains_xy(extremes_hull, xs, ys)]
+    return shapely.convex_hull(shapely.multipoints(coords))
+
+
+def layer_hull(
+    in_path: Path | str,
+    bbox: tuple[float, float, float, float] | None = None,
+    layer: str | int | None = None,
+    max_vertices: int | None = None,
+) -> geometry.Polygon:
+    """Reads only a layer's geometries and returns the convex hull of their vertices"""
+    gdf = read_layer(in_path, columns=[], bbox=bbox, layer=layer)
+    return vertex_hull(gdf.geometry, max_vertices=max_vertices)
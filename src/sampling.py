@@ -0,0 +1,366 @@
+"""
+Approximate centralities for large distances from a sample of source nodes.
+
+Centralities at distances up to exact_max_distance are computed exactly. For larger distances only a stratified random
+sample of the live nodes is used as sources:
+
+- betweenness is accumulated by each source on the nodes along its shortest paths, so the sum over the sampled sources
+  divided by the sampling fraction is an unbiased estimate of the full betweenness;
+- closeness is only computed for the sampled sources themselves, so it is interpolated to the remaining nodes from the
+  nearest sampled sources by inverse distance weighting, which relies on closeness at large distances varying smoothly
+  over space.
+
+Sources are drawn per square stratum so that the sample covers the whole network, and the sample is split into
+independent replicates. Each metric gets a companion _err column with its estimated standard error. For betweenness,
+this is the spread across the replicates, pooled over the nearest nodes. For closeness, the interpolation error
+dominates, so each sampled source is held out in turn and interpolated from the others, and the error at each node is
+the root mean square of the hold-out errors of its nearest sources. The error columns are zero for the exactly computed
+metrics and for the sampled sources' closeness.
+"""
+
+import logging
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from cityseer import rustalgos
+from scipy.spatial import cKDTree
+
+from src import snapshot, tiling
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXACT_MAX_DISTANCE = 2000
+DEFAULT_STRATUM_SIZE = 1000
+# the betweenness standard errors are pooled over this many nearest nodes
+POOLED_NODES = 16
+
+
+def stratified_sample(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    lives: np.ndarray,
+    fraction: float,
+    stratum_size: float,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """
+    Returns a mask of live nodes sampled with an inclusion probability of fraction, spread evenly over square strata.
+
+    Each stratum takes the floor of its expected sample size plus one more node with a probability of the remainder,
+    so that every live node has the same inclusion probability.
+    """
+    if not 0 < fraction <= 1:
+        raise ValueError("The sample fraction should be greater than 0 and at most 1.")
+    tile_cols, tile_rows, _ = tiling.assign_tiles(xs, ys, stratum_size)
+    # shuffle the live nodes, then group by stratum while keeping the shuffled order within each stratum
+    live_idx = rng.permutation(np.flatnonzero(lives))
+    _, strata = np.unique(
+        np.stack([tile_cols[live_idx], tile_rows[live_idx]], axis=1),
+        axis=0,
+        return_inverse=True,
+    )
+    strata = strata.ravel()
+    sort_idx = np.argsort(strata, kind="stable")
+    live_idx, strata = live_idx[sort_idx], strata[sort_idx]
+    counts = np.bincount(strata)
+    ranks = (
+        np.arange(len(live_idx)) - np.concatenate([[0], np.cumsum(counts)[:-1]])[strata]
+    )
+    expected = counts * fraction
+    quotas = np.floor(expected) + (
+        rng.uniform(size=len(counts)) < expected - np.floor(expected)
+    )
+    sampled = np.zeros(len(xs), dtype=bool)
+    sampled[live_idx[ranks < quotas[strata]]] = True
+    return sampled
+
+
+def interpolate_from_sources(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    sources: np.ndarray,
+    values: np.ndarray,
+    neighbours: int = 8,
+) -> np.ndarray:
+    """
+    Interpolates values known at the source nodes to all nodes by inverse squared distance weighting.
+
+    The values array has a row per node and a column per metric, only the source rows are used. The sources keep
+    their own values.
+    """
+    src_idx = np.flatnonzero(sources)
+    if not len(src_idx):
+        raise ValueError("At least one source node is required for interpolation.")
+    neighbours = min(neighbours, len(src_idx))
+    tree = cKDTree(np.column_stack([xs[src_idx], ys[src_idx]]))
+    dists, nbrs = tree.query(np.column_stack([xs, ys]), k=neighbours)
+    dists = dists.reshape(len(xs), neighbours)
+    nbrs = nbrs.reshape(len(xs), neighbours)
+    weights = 1 / np.maximum(dists, 1) ** 2
+    weights /= weights.sum(axis=1, keepdims=True)
+    src_values = values[src_idx]
+    interpolated = np.empty((len(xs), values.shape[1]), dtype=np.float64)
+    # per column to keep the memory at nodes x neighbours
+    for col_idx in range(values.shape[1]):
+        interpolated[:, col_idx] = (weights * src_values[nbrs, col_idx]).sum(axis=1)
+    interpolated[src_idx] = values[src_idx]
+    return interpolated
+
+
+def relative_error(estimates: pd.DataFrame, errors: pd.DataFrame) -> float:
+    """The median relative standard error over nodes with non-zero estimates, taking the largest across metrics"""
+    rel_errors = [0.0]
+    for col in estimates.columns:
+        nonzero = estimates[col].to_numpy() > 0
+        if nonzero.any():
+            rel_errors.append(
+                float(
+                    np.median(
+                        errors[col].to_numpy()[nonzero]
+                        / estimates[col].to_numpy()[nonzero]
+                    )
+                )
+            )
+    return max(rel_errors)
+
+
+def holdout_errors(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    sources: np.ndarray,
+    values: np.ndarray,
+    neighbours: int = 8,
+) -> np.ndarray:
+    """
+    Estimates the interpolation error at all nodes by holding out each source node in turn.
+
+    Each source is interpolated from the other sources as per interpolate_from_sources, and the error at each node is
+    the root mean square of the hold-out residuals of its nearest sources. The sources have no error.
+    """
+    src_idx = np.flatnonzero(sources)
+    if len(src_idx) < 2:
+        raise ValueError(
+            "At least two source nodes are required to estimate interpolation errors."
+        )
+    src_xy = np.column_stack([xs[src_idx], ys[src_idx]])
+    tree = cKDTree(src_xy)
+    # the source itself is among its nearest sources, so take one more and give it no weight
+    held_neighbours = min(neighbours + 1, len(src_idx))
+    dists, nbrs = tree.query(src_xy, k=held_neighbours)
+    dists = dists.reshape(len(src_idx), held_neighbours)
+    nbrs = nbrs.reshape(len(src_idx), held_neighbours)
+    weights = 1 / np.maximum(dists, 1) ** 2
+    weights[nbrs == np.arange(len(src_idx))[:, None]] = 0
+    weights /= weights.sum(axis=1, keepdims=True)
+    neighbours = min(neighbours, len(src_idx))
+    _, node_nbrs = tree.query(np.column_stack([xs, ys]), k=neighbours)
+    node_nbrs = node_nbrs.reshape(len(xs), neighbours)
+    src_values = values[src_idx]
+    errors = np.empty((len(xs), values.shape[1]), dtype=np.float64)
+    # per column to keep the memory at nodes x neighbours
+    for col_idx in range(values.shape[1]):
+        sq_residuals = (
+            (weights * src_values[nbrs, col_idx]).sum(axis=1) - src_values[:, col_idx]
+        ) ** 2
+        errors[:, col_idx] = np.sqrt(sq_residuals[node_nbrs].mean(axis=1))
+    errors[src_idx] = 0
+    return errors
+
+
+def pooled_errors(
+    xs: np.ndarray, ys: np.ndarray, errors: np.ndarray, pooled_nodes: int = POOLED_NODES
+) -> np.ndarray:
+    """
+    Raises each node's standard errors to the root mean square of the standard errors of its nearest nodes.
+
+    Where a node's betweenness comes from a few sources, the replicates rarely sample these and their spread
+    understates the error. Nearby nodes share most of their paths, so their pooled spread is the more reliable guide.
+    """
+    pooled_nodes = min(pooled_nodes, len(xs))
+    _, nbrs = cKDTree(np.column_stack([xs, ys])).query(
+        np.column_stack([xs, ys]), k=pooled_nodes
+    )
+    nbrs = nbrs.reshape(len(xs), pooled_nodes)
+    pooled = np.empty_like(errors, dtype=np.float64)
+    # per column to keep the memory at nodes x pooled nodes
+    for col_idx in range(errors.shape[1]):
+        pooled[:, col_idx] = np.sqrt((errors[nbrs, col_idx] ** 2).mean(axis=1))
+    return np.maximum(errors, pooled)
+
+
+def _combine_replicates(
+    replicate_results: list[pd.DataFrame],
+    xs: np.ndarray,
+    ys: np.ndarray,
+    sources: np.ndarray,
+    source_values: pd.DataFrame,
+    lives: np.ndarray,
+    neighbours: int,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Returns the estimates and standard errors for the sampled distances.
+
+    Betweenness is the mean across the replicates, with the standard error of the mean pooled over the nearest nodes.
+    Closeness is interpolated from all sampled sources, with the hold-out error of the interpolation.
+    """
+    stacked = np.stack([result.to_numpy() for result in replicate_results])
+    betweenness_cols = replicate_results[0].columns
+    closeness_cols = [
+        col for col in source_values.columns if col not in betweenness_cols
+    ]
+    estimates = pd.DataFrame(index=source_values.index)
+    errors = pd.DataFrame(index=source_values.index)
+    estimates[betweenness_cols] = stacked.mean(axis=0)
+    errors[betweenness_cols] = pooled_errors(
+        xs, ys, stacked.std(axis=0, ddof=1) / np.sqrt(len(replicate_results))
+    )
+    if closeness_cols:
+        closeness_values = source_values[closeness_cols].to_numpy()
+        estimates[closeness_cols] = interpolate_from_sources(
+            xs, ys, sources, closeness_values, neighbours
+        )
+        errors[closeness_cols] = holdout_errors(
+            xs, ys, sources, closeness_values, neighbours
+        )
+        # consistent with the exact computation, closeness is not computed for non-live nodes
+        estimates.loc[~lives, closeness_cols] = 0
+        errors.loc[~lives, closeness_cols] = 0
+    columns = source_values.columns
+    return estimates[columns], errors[columns]
+
+
+def approximate_node_centrality(
+    network_structure: rustalgos.NetworkStructure,
+    nodes_gdf: gpd.GeoDataFrame,
+    distances: list[int],
+    exact_max_distance: int = DEFAULT_EXACT_MAX_DISTANCE,
+    sample_fraction: float = 0.1,
+    error_target: float | None = None,
+    replicates: int = 4,
+    max_fraction: float = 0.5,
+    stratum_size: float = DEFAULT_STRATUM_SIZE,
+    neighbours: int = 8,
+    shortest: bool = True,
+    simplest: bool = False,
+    seed: int = 0,
+    **centrality_kwargs,
+) -> gpd.GeoDataFrame:
+    """
+    Computes exact centralities up to exact_max_distance and sampled estimates for larger distances.
+
+    The nodes GDF is expected in network structure order as returned by io.network_structure_from_nx. The sampled
+    sources are split into replicates, each drawing sample_fraction / replicates of the live nodes. If error_target
+    is set, e.g. 0.05 for a median relative standard error of 5%, further replicates are added until the error target
+    is met or max_fraction of the live nodes have been drawn. Set shortest and simplest to select
+    node_centrality_shortest and node_centrality_simplest. Further keyword arguments are passed to these.
+
+    Each metric column gets a companion column suffixed with _err holding the estimated standard error. cityseer checks
+    its progress once a second, so each replicate takes at least a second and the sampled run is no faster than the
+    exact computation for networks below roughly 2,500 nodes.
+    """
+    if not distances:
+        raise ValueError("Approximate centrality requires explicit distances.")
+    if replicates < 2:
+        raise ValueError("At least two replicates are required to estimate errors.")
+    if error_target is not None and error_target <= 0:
+        raise ValueError("The error target should be a positive number.")
+    if len(nodes_gdf) != network_structure.node_count():
+        raise ValueError(
+            "The nodes GDF does not match the network structure node count."
+        )
+    arrays = snapshot.structure_arrays(network_structure)
+    node_keys = np.asarray(nodes_gdf.index.astype(str), dtype=str)
+    xs, ys, lives = arrays["x"], arrays["y"], arrays["live"]
+
+    def _compute(live_mask: np.ndarray, run_distances: list[int]) -> pd.DataFrame:
+        node_arrays = {"x": xs, "y": ys, "live": live_mask, "weight": arrays["weight"]}
+        return tiling.subgraph_centrality(
+            node_keys,
+            node_arrays,
+            arrays,
+            run_distances,
+            shortest,
+            simplest,
+            centrality_kwargs,
+        )
+
+    exact_distances = [dist for dist in distances if dist <= exact_max_distance]
+    sampled_distances = [dist for dist in distances if dist > exact_max_distance]
+    replicate_fraction = sample_fraction / replicates
+    if sampled_distances and sample_fraction >= 1:
+        logger.info("The sample fraction covers all nodes, computing exactly.")
+        exact_distances, sampled_distances = distances, []
+    results = []
+    if exact_distances:
+        logger.info(f"Computing exact centralities for distances {exact_distances}.")
+        exact_df = _compute(lives, exact_distances)
+        results.append(
+            (
+                exact_df,
+                pd.DataFrame(0.0, index=exact_df.index, columns=exact_df.columns),
+            )
+        )
+    if sampled_distances:
+        rng = np.random.default_rng(seed)
+        replicate_results = []
+        sampled = np.zeros(len(xs), dtype=bool)
+        source_values = None
+        target_replicates = replicates
+        max_replicates = max(replicates, int(max_fraction / replicate_fraction))
+        while len(replicate_results) < target_replicates:
+            sources = stratified_sample(
+                xs, ys, lives, replicate_fraction, stratum_size, rng
+            )
+            logger.info(
+                f"Replicate {len(replicate_results) + 1}: sampled {sources.sum()} of {lives.sum()} live nodes "
+                f"for distances {sampled_distances}."
+            )
+            sample_df = _compute(sources, sampled_distances)
+            # closeness is exact for the sources of any replicate
+            if source_values is None:
+                source_values = sample_df.copy()
+            source_values.loc[sources] = sample_df.loc[sources]
+            sampled |= sources
+            betweenness_cols = [
+                col for col in sample_df.columns if "betweenness" in col
+            ]
+            replicate_results.append(sample_df[betweenness_cols] / replicate_fraction)
+            if len(replicate_results) == target_replicates and error_target is not None:
+                estimates, errors = _combine_replicates(
+                    replicate_results,
+                    xs,
+                    ys,
+                    sampled,
+                    source_values,
+                    lives,
+                    neighbours,
+                )
+                rel_error = relative_error(estimates, errors)
+                logger.info(
+                    f"Relative error {rel_error:.3f} with {target_replicates} replicates."
+                )
+                if rel_error > error_target:
+                    # the standard error falls with the square root of the number of sources
+                    needed = int(
+                        np.ceil(target_replicates * (rel_error / error_target) ** 2)
+                    )
+                    if target_replicates >= max_replicates:
+                        logger.warning(
+                            f"Stopping at the maximum sample fraction of {max_fraction} with a relative error of "
+                            f"{rel_error:.3f}, above the target of {error_target}."
+                        )
+                    else:
+                        target_replicates = min(needed, max_replicates)
+        results.append(
+            _combine_replicates(
+                replicate_results, xs, ys, sampled, source_values, lives, neighbours
+            )
+        )
+    nodes_gdf = nodes_gdf.copy()
+    for estimates, errors in results:
+        for col in estimates.columns:
+            nodes_gdf[col] = estimates[col].to_numpy()
+        for col in errors.columns:
+            nodes_gdf[f"{col}_err"] = errors[col].to_numpy()
+    return nodes_gdf
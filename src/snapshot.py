@@ -0,0 +1,227 @@
+"""
+Binary snapshots of a cityseer NetworkStructure and its nodes table.
+
+A snapshot is a directory of flat .npy arrays plus a meta.json file. The arrays can be memory-mapped, so loading skips
+the round trip through networkX and the per-edge angle and bearing calculations of io.network_structure_from_nx. The
+metadata records the snapshot version and the size and modification time of the GPKG files written alongside, so that a
+snapshot is treated as stale if those files are edited or rewritten afterwards.
+"""
+
+import json
+import logging
+import shutil
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from cityseer import rustalgos
+
+logger = logging.getLogger(__name__)
+
+# bump if the stored arrays change so that older snapshots are treated as stale
+SNAPSHOT_VERSION = 1
+
+EDGE_STR_ARRAYS = ["start_nd_key", "end_nd_key"]
+EDGE_FLOAT_ARRAYS = ["length", "angle_sum", "imp_factor", "in_bearing", "out_bearing"]
+
+
+def _source_stats(source_paths: list[Path | str]) -> dict[str, list[int]]:
+    """Size and modification time for each source file"""
+    stats = {}
+    for source_path in source_paths:
+        stat = Path(source_path).stat()
+        stats[Path(source_path).name] = [stat.st_size, stat.st_mtime_ns]
+    return stats
+
+
+def structure_arrays(
+    network_structure: rustalgos.NetworkStructure,
+) -> dict[str, np.ndarray]:
+    """Unpacks a NetworkStructure's node and edge data into flat arrays in node and edge index order"""
+    node_count = network_structure.node_count()
+    arrays = {
+        "x": np.asarray(network_structure.node_xs, dtype=np.float64),
+        "y": np.asarray(network_structure.node_ys, dtype=np.float64),
+        "live": np.asarray(network_structure.node_lives, dtype=bool),
+        "weight": np.array(
+            [network_structure.get_node_weight(idx) for idx in range(node_count)],
+            dtype=np.float64,
+        ),
+    }
+    # unpack the edge payloads
+    edge_refs = network_structure.edge_references()
+    arrays["edge_refs"] = np.array(edge_refs, dtype=np.int64).reshape(-1, 3)
+    edge_payloads = [network_structure.get_edge_payload(*ref) for ref in edge_refs]
+    for attr in EDGE_STR_ARRAYS:
+        arrays[attr] = np.array([getattr(p, attr) for p in edge_payloads], dtype=str)
+    for attr in EDGE_FLOAT_ARRAYS:
+        arrays[attr] = np.array(
+            [getattr(p, attr) for p in edge_payloads], dtype=np.float64
+        )
+    return arrays
+
+
+def structure_from_arrays(
+    node_keys: np.ndarray,
+    xs: np.ndarray,
+    ys: np.ndarray,
+    lives: np.ndarray,
+    weights: np.ndarray,
+    edge_arrays: dict[str, np.ndarray],
+) -> rustalgos.NetworkStructure:
+    """Builds and validates a NetworkStructure from the node arrays and the edge arrays of structure_arrays"""
+    network_structure = rustalgos.NetworkStructure()
+    for node_key, x, y, live, weight in zip(
+        node_keys.tolist(), xs.tolist(), ys.tolist(), lives.tolist(), weights.tolist()
+    ):
+        network_structure.add_node(node_key, x, y, live, weight)
+    edge_cols = [
+        edge_arrays[attr].tolist() for attr in EDGE_STR_ARRAYS + EDGE_FLOAT_ARRAYS
+    ]
+    for (start_nd_idx, end_nd_idx, edge_idx), edge_data in zip(
+        edge_arrays["edge_refs"].tolist(), zip(*edge_cols)
+    ):
+        network_structure.add_edge(start_nd_idx, end_nd_idx, edge_idx, *edge_data)
+    network_structure.validate()
+    return network_structure
+
+
+def write_network_snapshot(
+    snapshot_path: Path | str,
+    network_structure: rustalgos.NetworkStructure,
+    nodes_gdf: gpd.GeoDataFrame,
+    crs: int,
+    source_paths: list[Path | str] | None = None,
+    extra_node_arrays: dict[str, np.ndarray] | None = None,
+):
+    """
+    Writes a NetworkStructure and its nodes GDF to a snapshot directory.
+
+    The nodes GDF is expected in ns_node_idx order as returned by io.network_structure_from_nx. If the GDF's geometry
+    is a line geometry, e.g. the primal edges for a dual graph, then it is stored as WKB. The source_paths are the GPKG
+    files written by the same stage and are used for detecting stale snapshots. Optional extra_node_arrays are stored
+    for alternative weightings and can be selected when reading.
+    """
+    snapshot_path = Path(snapshot_path)
+    if snapshot_path.exists():
+        shutil.rmtree(snapshot_path)
+    snapshot_path.mkdir(parents=True)
+    node_count = network_structure.node_count()
+    if len(nodes_gdf) != node_count:
+        raise ValueError(
+            "The nodes GDF does not match the network structure node count."
+        )
+    if not (nodes_gdf["ns_node_idx"].to_numpy() == np.arange(node_count)).all():
+        raise ValueError("The nodes GDF should be in ns_node_idx order.")
+    arrays = {"node_key": np.asarray(nodes_gdf.index.astype(str), dtype=str)}
+    arrays.update(structure_arrays(network_structure))
+    # line geoms are stored as a flat WKB buffer with offsets so that they remain memory-mappable
+    if nodes_gdf.geom_type.isin(["LineString", "MultiLineString"]).all():
+        wkbs = shapely.to_wkb(nodes_gdf.geometry.values)
+        arrays["line_wkb"] = np.frombuffer(b"".join(wkbs), dtype=np.uint8)
+        arrays["line_wkb_offsets"] = np.cumsum([0] + [len(wkb) for wkb in wkbs])
+    extra_node_arrays = extra_node_arrays or {}
+    for name, values in extra_node_arrays.items():
+        if len(values) != node_count:
+            raise ValueError(f"Extra node array {name} does not match the node count.")
+        arrays[f"extra_{name}"] = np.asarray(values)
+    for name, values in arrays.items():
+        np.save(snapshot_path / f"{name}.npy", values, allow_pickle=False)
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "crs": crs,
+        "node_count": node_count,
+        "edge_count": len(arrays["edge_refs"]),
+        "extra_node_arrays": list(extra_node_arrays),
+        "sources": _source_stats(source_paths or []),
+    }
+    with open(snapshot_path / "meta.json", "w") as meta_file:
+        json.dump(meta, meta_file, indent=2)
+    logger.info(f"Wrote network snapshot to {snapshot_path}.")
+
+
+def snapshot_is_current(
+    snapshot_path: Path | str, source_paths: list[Path | str] | None = None
+) -> bool:
+    """Whether a snapshot exists, matches the current version, and its source files are unchanged"""
+    meta_path = Path(snapshot_path) / "meta.json"
+    if not meta_path.exists():
+        logger.info(f"No network snapshot found at {snapshot_path}.")
+        return False
+    with open(meta_path) as meta_file:
+        meta = json.load(meta_file)
+    if meta["version"] != SNAPSHOT_VERSION:
+        logger.info(f"Network snapshot at {snapshot_path} is an older version.")
+        return False
+    if source_paths is not None:
+        if not all(Path(p).exists() for p in source_paths):
+            return False
+        if _source_stats(source_paths) != meta["sources"]:
+            logger.info(f"Network snapshot at {snapshot_path} is stale.")
+            return False
+    return True
+
+
+def read_network_snapshot(
+    snapshot_path: Path | str, weight_key: str | None = None
+) -> tuple[gpd.GeoDataFrame, rustalgos.NetworkStructure]:
+    """
+    Reads a snapshot into a nodes GDF and NetworkStructure.
+
+    The nodes GDF is indexed by node key with ns_node_idx, x, y, live, and weight columns and Point geoms in the "geom"
+    column. If line geoms were stored then these are returned in the "primal_edge" column. Set weight_key to the name
+    of an extra node array to use it for the node weights instead of the stored weights.
+    """
+    snapshot_path = Path(snapshot_path)
+    with open(snapshot_path / "meta.json") as meta_file:
+        meta = json.load(meta_file)
+    if meta["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version: {meta['version']}")
+
+    def _load(name: str) -> np.ndarray:
+        return np.load(snapshot_path / f"{name}.npy", mmap_mode="r")
+
+    node_keys = _load("node_key")
+    xs = _load("x")
+    ys = _load("y")
+    lives = _load("live")
+    if weight_key is None:
+        weights = _load("weight")
+    elif weight_key in meta["extra_node_arrays"]:
+        weights = _load(f"extra_{weight_key}")
+    else:
+        raise ValueError(f"Snapshot does not contain extra node array: {weight_key}")
+    edge_arrays = {
+        name: _load(name)
+        for name in ["edge_refs"] + EDGE_STR_ARRAYS + EDGE_FLOAT_ARRAYS
+    }
+    network_structure = structure_from_arrays(
+        node_keys, xs, ys, lives, weights, edge_arrays
+    )
+    nodes_gdf = gpd.GeoDataFrame(
+        {
+            "ns_node_idx": np.arange(meta["node_count"]),
+            "x": np.asarray(xs),
+            "y": np.asarray(ys),
+            "live": np.asarray(lives),
+            "weight": np.asarray(weights),
+        },
+        index=node_keys.tolist(),
+        geometry=gpd.points_from_xy(xs, ys),
+        crs=meta["crs"],
+    ).rename_geometry("geom")
+    if (snapshot_path / "line_wkb.npy").exists():
+        wkb_buffer = _load("line_wkb")
+        offsets = _load("line_wkb_offsets").tolist()
+        wkbs = [
+            wkb_buffer[start:end].tobytes()
+            for start, end in zip(offsets[:-1], offsets[1:])
+        ]
+        nodes_gdf["primal_edge"] = gpd.GeoSeries.from_wkb(
+            wkbs, index=nodes_gdf.index, crs=meta["crs"]
+        )
+    for name in meta["extra_node_arrays"]:
+        nodes_gdf[name] = np.asarray(_load(f"extra_{name}"))
+    logger.info(f"Loaded network snapshot from {snapshot_path}.")
+    return nodes_gdf, network_structure
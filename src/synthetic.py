@@ -0,0 +1,531 @@
+"""
+Synthetic street networks for verification harnesses and benchmarks.
+
+The graphs are cityseer compatible networkX MultiGraphs with x and y node attributes and LineString edge geoms, so they
+can be passed through the same graphs and io functions as networks downloaded from OSM, and osm_graph adds the highway,
+name, and route tags used to clean OSM networks. The edge generators instead return LineString GeoDataFrames in the
+form of edges reopened from a GeoPackage, to be loaded with io.nx_from_generic_geopandas, together with synthetic
+landuses and buildings placed along the edges.
+
+All generators are deterministic for a given seed.
+"""
+
+from typing import Callable
+
+import geopandas as gpd
+import networkx as nx
+import numpy as np
+import shapely
+from cityseer.tools import graphs
+from scipy import sparse
+from scipy.sparse import csgraph
+from scipy.spatial import Delaunay
+from shapely import geometry
+
+# a metric CRS, as required by io.nx_from_generic_geopandas
+SYNTHETIC_CRS = 3857
+
+
+def _add_edges(
+    G: nx.MultiGraph,
+    xs: np.ndarray,
+    ys: np.ndarray,
+    starts: np.ndarray,
+    ends: np.ndarray,
+):
+    """Adds nodes and straight edges between node indices"""
+    G.add_nodes_from(
+        (str(idx), {"x": x, "y": y})
+        for idx, (x, y) in enumerate(zip(xs.tolist(), ys.tolist()))
+    )
+    for start_idx, end_idx in zip(starts.tolist(), ends.tolist()):
+        G.add_edge(
+            str(start_idx),
+            str(end_idx),
+            geom=geometry.LineString(
+                [(xs[start_idx], ys[start_idx]), (xs[end_idx], ys[end_idx])]
+            ),
+        )
+
+
+def _grid_arrays(
+    side: int, spacing: float, jitter: float, rng: np.random.Generator
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Jittered node coordinates and the start and end node indices of a square grid's edges"""
+    grid_x, grid_y = np.meshgrid(np.arange(side), np.arange(side))
+    xs = grid_x.ravel() * spacing + rng.uniform(-jitter, jitter, side**2)
+    ys = grid_y.ravel() * spacing + rng.uniform(-jitter, jitter, side**2)
+    node_idx = np.arange(side**2).reshape(side, side)
+    starts = np.concatenate([node_idx[:, :-1].ravel(), node_idx[:-1, :].ravel()])
+    ends = np.concatenate([node_idx[:, 1:].ravel(), node_idx[1:, :].ravel()])
+    return xs.astype(float), ys.astype(float), starts, ends
+
+
+def grid_graph(
+    side: int, spacing: float = 100, jitter: float = 10, seed: int = 0
+) -> nx.MultiGraph:
+    """
+    A square grid with side x side nodes, with node positions jittered by up to jitter metres.
+
+    The jitter avoids exactly tied shortest paths, which would otherwise be broken arbitrarily.
+    """
+    rng = np.random.default_rng(seed)
+    xs, ys, starts, ends = _grid_arrays(side, spacing, jitter, rng)
+    G = nx.MultiGraph()
+    _add_edges(G, xs, ys, starts, ends)
+    return G
+
+
+def city_graph(
+    side: int,
+    spacing: float = 100,
+    jitter: float = 20,
+    max_drop_fraction: float = 0.4,
+    seed: int = 0,
+) -> nx.MultiGraph:
+    """
+    A jittered grid with a dense centre and sparser periphery, loosely resembling a city's street network.
+
+    Edges are removed at random with a probability rising from zero at the centre to max_drop_fraction at the
+    corners, and the largest connected component is returned.
+    """
+    rng = np.random.default_rng(seed)
+    xs, ys, starts, ends = _grid_arrays(side, spacing, jitter, rng)
+    centre = (side - 1) * spacing / 2
+    mid_xs = (xs[starts] + xs[ends]) / 2 - centre
+    mid_ys = (ys[starts] + ys[ends]) / 2 - centre
+    drop_prob = max_drop_fraction * np.hypot(mid_xs, mid_ys) / (centre * np.sqrt(2))
+    keep = rng.uniform(size=len(starts)) >= drop_prob
+    G = nx.MultiGraph()
+    _add_edges(G, xs, ys, starts[keep], ends[keep])
+    largest = max(nx.connected_components(G), key=len)
+    return nx.MultiGraph(G.subgraph(largest))
+
+
+def osm_graph(
+    side: int,
+    spacing: float = 100,
+    jitter: float = 10,
+    carriageway: float = 12,
+    filler_spacing: float = 30,
+    seed: int = 0,
+) -> nx.MultiGraph:
+    """
+    A jittered grid with OSM highway, name, and route tags, dual carriageways, and filler nodes, for cleaning.
+
+    Every 16th row and column is a trunk road and every 8th a primary road, each with a second carriageway offset by
+    carriageway metres and joined to the first at every intersection by a link road. Every 4th row and column is a
+    secondary road and the others are residential. The edges are split into segments of up to filler_spacing metres,
+    as for OSM ways with vertices at nodes.
+    """
+    rng = np.random.default_rng(seed)
+    xs, ys, starts, ends = _grid_arrays(side, spacing, jitter, rng)
+    is_row = starts // side == ends // side
+    lines = np.where(is_row, starts // side, starts % side)
+    G = nx.MultiGraph()
+    G.add_nodes_from(
+        (str(idx), {"x": x, "y": y})
+        for idx, (x, y) in enumerate(zip(xs.tolist(), ys.tolist()))
+    )
+    for start_idx, end_idx, row, line in zip(
+        starts.tolist(), ends.tolist(), is_row.tolist(), lines.tolist()
+    ):
+        if line % 16 == 0:
+            highway = "trunk"
+        elif line % 8 == 0:
+            highway = "primary"
+        elif line % 4 == 0:
+            highway = "secondary"
+        else:
+            highway = "residential"
+        tags = {
+            "highways": [highway],
+            "names": [f"{'Row' if row else 'Column'} {line}"],
+            "routes": [],
+        }
+        carriageways = [(str(start_idx), str(end_idx))]
+        if highway in ["trunk", "primary"]:
+            suffix = "r" if row else "c"
+            for nd_idx in [start_idx, end_idx]:
+                nd_key = f"{nd_idx}{suffix}"
+                if nd_key not in G:
+                    x = xs[nd_idx] + (0 if row else carriageway)
+                    y = ys[nd_idx] + (carriageway if row else 0)
+                    G.add_node(nd_key, x=x, y=y)
+                    G.add_edge(
+                        str(nd_idx),
+                        nd_key,
+                        geom=geometry.LineString([(xs[nd_idx], ys[nd_idx]), (x, y)]),
+                        highways=[f"{highway}_link"],
+                        names=[],
+                        routes=[],
+                    )
+            carriageways.append((f"{start_idx}{suffix}", f"{end_idx}{suffix}"))
+        for start_key, end_key in carriageways:
+            start_data, end_data = G.nodes[start_key], G.nodes[end_key]
+            G.add_edge(
+                start_key,
+                end_key,
+                geom=geometry.LineString(
+                    [
+                        (start_data["x"], start_data["y"]),
+                        (end_data["x"], end_data["y"]),
+                    ]
+                ),
+                **tags,
+            )
+    return graphs.nx_decompose(G, filler_spacing)
+
+
+def _edges_gdf(coords: np.ndarray) -> gpd.GeoDataFrame:
+    """Builds an edges GDF from an array of edge coordinates shaped edges x points x 2"""
+    return gpd.GeoDataFrame(
+        geometry=shapely.linestrings(coords), crs=SYNTHETIC_CRS
+    ).rename_axis("fid")
+
+
+def _curved_coords(
+    start_xs: np.ndarray,
+    start_ys: np.ndarray,
+    end_xs: np.ndarray,
+    end_ys: np.ndarray,
+    bend: np.ndarray,
+) -> np.ndarray:
+    """Three point edge coordinates with the midpoint offset sideways by bend times the edge length"""
+    mid_xs = (start_xs + end_xs) / 2 - (end_ys - start_ys) * bend
+    mid_ys = (start_ys + end_ys) / 2 + (end_xs - start_xs) * bend
+    return np.stack(
+        [
+            np.column_stack([start_xs, start_ys]),
+            np.column_stack([mid_xs, mid_ys]),
+            np.column_stack([end_xs, end_ys]),
+        ],
+        axis=1,
+    )
+
+
+def grid_edges(
+    edge_count: int, spacing: float = 100, jitter: float = 10, seed: int = 0
+) -> gpd.GeoDataFrame:
+    """A jittered square grid with at least edge_count straight edges"""
+    # a grid with side nodes per side has 2 x side x (side - 1) edges
+    side = int(np.ceil((1 + np.sqrt(1 + 2 * edge_count)) / 2))
+    rng = np.random.default_rng(seed)
+    xs, ys, starts, ends = _grid_arrays(side, spacing, jitter, rng)
+    coords = np.stack(
+        [
+            np.column_stack([xs[starts], ys[starts]]),
+            np.column_stack([xs[ends], ys[ends]]),
+        ],
+        axis=1,
+    )
+    return _edges_gdf(coords)
+
+
+def radial_edges(
+    edge_count: int, spacing: float = 100, jitter: float = 10, seed: int = 0
+) -> gpd.GeoDataFrame:
+    """
+    Concentric ring roads joined by radial streets, with roughly edge_count edges.
+
+    Each ring has as many nodes as fit its circumference at the given spacing, joined by curved ring segments, and
+    each ring node is joined to the angularly nearest node of the next ring inwards.
+    """
+    rng = np.random.default_rng(seed)
+    # ring i has about 2 x pi x i nodes, each with a ring and a radial edge, so about 2 x pi x rings^2 edges
+    rings = max(1, int(np.ceil(np.sqrt(edge_count / (2 * np.pi)))))
+    ring_counts = np.maximum(6, np.round(2 * np.pi * np.arange(1, rings + 1))).astype(
+        np.int64
+    )
+    ring_of_node = np.repeat(np.arange(1, rings + 1), ring_counts)
+    ring_starts = np.concatenate([[1], 1 + np.cumsum(ring_counts)[:-1]])
+    pos_in_ring = np.arange(len(ring_of_node)) - (ring_starts - 1)[ring_of_node - 1]
+    # rotate each ring at random so that the radial streets do not all line up
+    ring_offsets = rng.uniform(0, 2 * np.pi, rings)
+    angles = (
+        2 * np.pi * pos_in_ring / ring_counts[ring_of_node - 1]
+        + ring_offsets[ring_of_node - 1]
+    )
+    radii = ring_of_node * spacing + rng.uniform(-jitter, jitter, len(ring_of_node))
+    # node 0 is the centre
+    xs = np.concatenate([[0.0], radii * np.cos(angles)])
+    ys = np.concatenate([[0.0], radii * np.sin(angles)])
+    node_idx = np.arange(1, len(xs))
+    next_in_ring = np.where(
+        pos_in_ring + 1 == ring_counts[ring_of_node - 1],
+        ring_starts[ring_of_node - 1],
+        node_idx + 1,
+    )
+    # the angularly nearest node on the next ring inwards
+    inner_ring = ring_of_node - 1
+    inner_counts = np.where(inner_ring > 0, ring_counts[inner_ring - 1], 1)
+    inner_pos = (
+        np.round(
+            (angles - ring_offsets[np.maximum(inner_ring, 1) - 1])
+            / (2 * np.pi)
+            * inner_counts
+        ).astype(np.int64)
+        % inner_counts
+    )
+    inner_node = np.where(
+        inner_ring > 0, ring_starts[np.maximum(inner_ring, 1) - 1] + inner_pos, 0
+    )
+    # ring segments bow outwards with the curvature of the ring
+    ring_bend = np.tan(np.pi / ring_counts[ring_of_node - 1]) / 4
+    ring_coords = _curved_coords(
+        xs[node_idx], ys[node_idx], xs[next_in_ring], ys[next_in_ring], -ring_bend
+    )
+    radial_coords = _curved_coords(
+        xs[node_idx],
+        ys[node_idx],
+        xs[inner_node],
+        ys[inner_node],
+        np.zeros(len(node_idx)),
+    )
+    return _edges_gdf(np.concatenate([ring_coords, radial_coords]))
+
+
+def organic_edges(
+    edge_count: int,
+    spacing: float = 100,
+    edges_per_node: float = 1.5,
+    max_bend: float = 0.1,
+    seed: int = 0,
+) -> gpd.GeoDataFrame:
+    """
+    An irregular network of curved streets with roughly edge_count edges, loosely resembling organic street layouts.
+
+    Nodes are scattered over a strongly jittered grid and joined by a Delaunay triangulation, which is thinned to its
+    minimum spanning tree, keeping the network connected, plus a random selection of the remaining shortest edges
+    to give edges_per_node edges per node on average. Edges are bent sideways by up to max_bend times their length.
+    """
+    rng = np.random.default_rng(seed)
+    side = max(3, int(np.ceil(np.sqrt(edge_count / edges_per_node))))
+    # jittering by less than half the spacing keeps nodes apart, which avoids merged nodes after rounding
+    xs, ys, _, _ = _grid_arrays(side, spacing, 0.4 * spacing, rng)
+    simplices = Delaunay(np.column_stack([xs, ys])).simplices
+    node_count = len(xs)
+    tri_edges = np.sort(
+        np.concatenate(
+            [simplices[:, [0, 1]], simplices[:, [1, 2]], simplices[:, [0, 2]]]
+        ).astype(np.int64),
+        axis=1,
+    )
+    # deduplicate the edges shared by neighbouring triangles via integer edge keys
+    edge_keys = np.unique(tri_edges[:, 0] * node_count + tri_edges[:, 1])
+    starts, ends = edge_keys // node_count, edge_keys % node_count
+    lengths = np.hypot(xs[starts] - xs[ends], ys[starts] - ys[ends])
+    adjacency = sparse.coo_matrix(
+        (lengths, (starts, ends)), shape=(node_count, node_count)
+    )
+    tree = csgraph.minimum_spanning_tree(adjacency).tocoo()
+    tree_keys = np.minimum(tree.row, tree.col).astype(
+        np.int64
+    ) * node_count + np.maximum(tree.row, tree.col)
+    in_tree = np.zeros(len(edge_keys), dtype=bool)
+    in_tree[np.searchsorted(edge_keys, tree_keys)] = True
+    # favour the shorter remaining edges, dropping the long diagonals across blocks - weighted sampling without
+    # replacement via the smallest exponential keys scaled by the inverse weights
+    extra_count = max(0, int(edges_per_node * node_count) - int(in_tree.sum()))
+    candidates = np.flatnonzero(~in_tree)
+    sample_keys = rng.exponential(size=len(candidates)) * lengths[candidates] ** 4
+    extra_count = min(extra_count, len(candidates))
+    extra = candidates[np.argpartition(sample_keys, extra_count - 1)[:extra_count]]
+    keep = in_tree.copy()
+    keep[extra] = True
+    starts, ends = starts[keep], ends[keep]
+    bend = rng.uniform(-max_bend, max_bend, len(starts))
+    return _edges_gdf(_curved_coords(xs[starts], ys[starts], xs[ends], ys[ends], bend))
+
+
+LAYOUTS: dict[str, Callable[..., gpd.GeoDataFrame]] = {
+    "grid": grid_edges,
+    "radial": radial_edges,
+    "organic": organic_edges,
+}
+
+
+def _points_along_edges(
+    edges_gdf: gpd.GeoDataFrame, count: int, rng: np.random.Generator
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Random points along random edges, returned as xs, ys, and the unit direction of each point's edge"""
+    edge_idx = rng.integers(0, len(edges_gdf), count)
+    lines = edges_gdf.geometry.values[edge_idx]
+    fractions = rng.uniform(0.1, 0.9, count)
+    points = shapely.line_interpolate_point(lines, fractions, normalized=True)
+    ahead = shapely.line_interpolate_point(
+        lines, np.minimum(fractions + 0.05, 1), normalized=True
+    )
+    dxs = shapely.get_x(ahead) - shapely.get_x(points)
+    dys = shapely.get_y(ahead) - shapely.get_y(points)
+    norms = np.maximum(np.hypot(dxs, dys), 1e-9)
+    return (
+        shapely.get_x(points),
+        shapely.get_y(points),
+        np.column_stack([dxs / norms, dys / norms]),
+    )
+
+
+def landuses_gdf(
+    edges_gdf: gpd.GeoDataFrame,
+    count: int,
+    categories: list[str],
+    setback: float = 15,
+    seed: int = 0,
+) -> gpd.GeoDataFrame:
+    """
+    Landuse points set back from random positions along the edges, with a cat_key column of random categories.
+
+    The output has the same form as the classified OSM landuses used for accessibilities, see src.landuses.
+    """
+    rng = np.random.default_rng(seed)
+    xs, ys, directions = _points_along_edges(edges_gdf, count, rng)
+    sides = rng.choice([-1, 1], count) * setback
+    landuses = gpd.GeoDataFrame(
+        {"cat_key": rng.choice(categories, count)},
+        geometry=gpd.points_from_xy(
+            xs - directions[:, 1] * sides, ys + directions[:, 0] * sides
+        ),
+        crs=edges_gdf.crs,
+    )
+    landuses.index = landuses.index.astype(str)
+    return landuses
+
+
+def buildings_gdf(
+    edges_gdf: gpd.GeoDataFrame,
+    count: int,
+    setback: float = 20,
+    courtyard_fraction: float = 0.1,
+    terrace_fraction: float = 0,
+    seed: int = 0,
+) -> gpd.GeoDataFrame:
+    """
+    Rectangular building footprints facing random positions along the edges.
+
+    A courtyard_fraction of the buildings have a courtyard, i.e. an interior ring, as for perimeter blocks. A
+    terrace_fraction of the buildings without a courtyard are split into two to five units along their width, which
+    share walls with exactly matching coordinates, so the number of footprints returned then exceeds count.
+    """
+    rng = np.random.default_rng(seed)
+    xs, ys, directions = _points_along_edges(edges_gdf, count, rng)
+    normals = np.column_stack([-directions[:, 1], directions[:, 0]])
+    normals *= rng.choice([-1, 1], count)[:, np.newaxis]
+    widths = rng.uniform(8, 30, count)
+    depths = rng.uniform(8, 20, count)
+    centres = (
+        np.column_stack([xs, ys]) + normals * (setback + depths / 2)[:, np.newaxis]
+    )
+
+    def _rectangles(scale: float) -> np.ndarray:
+        half_along = directions * (widths * scale / 2)[:, np.newaxis]
+        half_across = normals * (depths * scale / 2)[:, np.newaxis]
+        corners = [
+            centres - half_along - half_across,
+            centres + half_along - half_across,
+            centres + half_along + half_across,
+            centres - half_along + half_across,
+        ]
+        return np.stack(corners + corners[:1], axis=1)
+
+    shells = shapely.linearrings(_rectangles(1))
+    holes = shapely.linearrings(_rectangles(0.4))
+    has_courtyard = rng.uniform(size=count) < courtyard_fraction
+    geoms = shapely.polygons(shells)
+    geoms[has_courtyard] = [
+        geometry.Polygon(shell, [hole])
+        for shell, hole in zip(shells[has_courtyard], holes[has_courtyard])
+    ]
+    if terrace_fraction:
+        is_terrace = (rng.uniform(size=count) < terrace_fraction) & ~has_courtyard
+        unit_counts = np.where(is_terrace, rng.integers(2, 6, count), 1)
+        bldg_idx = np.repeat(np.arange(count), unit_counts)
+        # each unit's position along the footprint, so that neighbouring units compute their shared wall identically
+        unit_idx = np.arange(len(bldg_idx)) - np.repeat(
+            np.cumsum(unit_counts) - unit_counts, unit_counts
+        )
+        starts = unit_idx / unit_counts[bldg_idx] - 0.5
+        ends = (unit_idx + 1) / unit_counts[bldg_idx] - 0.5
+        along = directions[bldg_idx] * widths[bldg_idx, np.newaxis]
+        half_across = normals[bldg_idx] * (depths[bldg_idx] / 2)[:, np.newaxis]
+        unit_starts = centres[bldg_idx] + along * starts[:, np.newaxis]
+        unit_ends = centres[bldg_idx] + along * ends[:, np.newaxis]
+        corners = [
+            unit_starts - half_across,
+            unit_ends - half_across,
+            unit_ends + half_across,
+            unit_starts + half_across,
+        ]
+        units = shapely.polygons(np.stack(corners + corners[:1], axis=1))
+        geoms = np.where(is_terrace[bldg_idx], units, geoms[bldg_idx])
+    return gpd.GeoDataFrame(geometry=geoms, crs=edges_gdf.crs).rename_axis("fid")
+
+
+def _star_polygon(
+    vertex_count: int,
+    radius: float,
+    roughness: float,
+    rng: np.random.Generator,
+    centre: tuple[float, float] = (0, 0),
+) -> np.ndarray:
+    """Ring coordinates with a radius following a closed random walk, which is star-shaped so always valid"""
+    angles = np.linspace(0, 2 * np.pi, vertex_count, endpoint=False)
+    steps = rng.normal(0, roughness / np.sqrt(vertex_count), vertex_count)
+    # remove the drift so that the walk returns to its start
+    walk = np.cumsum(steps - steps.mean())
+    radii = radius * np.exp(np.clip(walk - walk.mean(), -0.4, 0.4))
+    coords = np.column_stack(
+        [centre[0] + radii * np.cos(angles), centre[1] + radii * np.sin(angles)]
+    )
+    return np.concatenate([coords, coords[:1]])
+
+
+def coastline(
+    vertex_count: int,
+    radius: float = 50000,
+    islands: int = 20,
+    lakes: int = 5,
+    roughness: float = 2,
+    seed: int = 0,
+) -> geometry.MultiPolygon:
+    """
+    A detailed island boundary in metres with offshore islands and lakes, similar to a national boundary.
+
+    The main island has most of the vertex_count vertices, while the islands and lakes, i.e. interior rings, have 1%
+    of the vertices each.
+    """
+    rng = np.random.default_rng(seed)
+    part_vertices = max(8, vertex_count // 100)
+    main_vertices = max(8, vertex_count - (islands + lakes) * part_vertices)
+    # lakes lie within a fifth of the radius of the centre, well within the coast's minimum radius
+    holes = []
+    for lake_idx in range(lakes):
+        angle = 2 * np.pi * lake_idx / max(lakes, 1)
+        holes.append(
+            _star_polygon(
+                part_vertices,
+                radius / 20,
+                roughness,
+                rng,
+                (radius / 5 * np.cos(angle), radius / 5 * np.sin(angle)),
+            )
+        )
+    parts = [
+        geometry.Polygon(_star_polygon(main_vertices, radius, roughness, rng), holes)
+    ]
+    # islands lie offshore beyond the coast's maximum radius
+    for island_idx in range(islands):
+        angle = 2 * np.pi * island_idx / max(islands, 1)
+        distance = radius * rng.uniform(1.7, 2.2)
+        parts.append(
+            geometry.Polygon(
+                _star_polygon(
+                    part_vertices,
+                    radius / 30,
+                    roughness,
+                    rng,
+                    (distance * np.cos(angle), distance * np.sin(angle)),
+                )
+            )
+        )
+    return geometry.MultiPolygon(parts)
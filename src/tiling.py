@@ -0,0 +1,232 @@
+"""
+Spatially tiled centrality computation with halo buffers.
+
+Live nodes are partitioned into square tiles. Each tile's subgraph contains every node within max(distances) of the
+tile, i.e. a halo, and only the tile's own live nodes are marked live. Since network distances are never shorter than
+straight-line distances, every path of up to max(distances) from a tile's live nodes lies within its subgraph, so the
+centralities computed per tile match those of the monolithic graph:
+
+- closeness metrics are taken from the tile owning each node;
+- betweenness metrics are summed across tiles, because each tile accumulates betweenness on any node (including halo
+  nodes) from its own live source nodes, and the tiles' live nodes partition the monolithic live nodes.
+
+Tiles are computed in parallel processes. The results match the monolithic run up to the floating point order of the
+betweenness summation.
+"""
+
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from cityseer import rustalgos
+from cityseer.metrics import networks
+
+from src import snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def assign_tiles(
+    xs: np.ndarray, ys: np.ndarray, tile_size: float
+) -> tuple[np.ndarray, np.ndarray, tuple[float, float]]:
+    """Returns each node's tile column and row for square tiles anchored at the minimum coordinates"""
+    if tile_size <= 0:
+        raise ValueError("Tile size should be a positive number.")
+    origin = (float(xs.min()), float(ys.min()))
+    tile_cols = np.floor((xs - origin[0]) / tile_size).astype(np.int64)
+    tile_rows = np.floor((ys - origin[1]) / tile_size).astype(np.int64)
+    return tile_cols, tile_rows, origin
+
+
+def tile_subsets(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    lives: np.ndarray,
+    tile_size: float,
+    halo: float,
+) -> list[dict]:
+    """
+    Returns the node subset and live mask for each tile that owns at least one live node.
+
+    The subset contains the nodes within the tile's bounds expanded by the halo, which is a superset of the nodes
+    within the halo distance of the tile.
+    """
+    tile_cols, tile_rows, (min_x, min_y) = assign_tiles(xs, ys, tile_size)
+    subsets = []
+    for tile_col, tile_row in sorted(
+        set(zip(tile_cols[lives].tolist(), tile_rows[lives].tolist()))
+    ):
+        tile_min_x = min_x + tile_col * tile_size
+        tile_min_y = min_y + tile_row * tile_size
+        in_halo = (
+            (xs >= tile_min_x - halo)
+            & (xs <= tile_min_x + tile_size + halo)
+            & (ys >= tile_min_y - halo)
+            & (ys <= tile_min_y + tile_size + halo)
+        )
+        node_idx = np.flatnonzero(in_halo)
+        owned = (tile_cols[node_idx] == tile_col) & (tile_rows[node_idx] == tile_row)
+        subsets.append(
+            {
+                "tile": (tile_col, tile_row),
+                "node_idx": node_idx,
+                "owned": owned,
+                "live": lives[node_idx] & owned,
+            }
+        )
+    return subsets
+
+
+def subset_edges(
+    arrays: dict[str, np.ndarray], node_idx: np.ndarray, node_count: int
+) -> dict[str, np.ndarray]:
+    """Returns the edges between the subset's nodes with remapped node indices"""
+    new_idx = np.full(node_count, -1, dtype=np.int64)
+    new_idx[node_idx] = np.arange(len(node_idx))
+    edge_refs = arrays["edge_refs"]
+    edge_mask = (new_idx[edge_refs[:, 0]] >= 0) & (new_idx[edge_refs[:, 1]] >= 0)
+    edge_arrays = {
+        attr: arrays[attr][edge_mask]
+        for attr in snapshot.EDGE_STR_ARRAYS + snapshot.EDGE_FLOAT_ARRAYS
+    }
+    sub_refs = edge_refs[edge_mask].copy()
+    sub_refs[:, 0] = new_idx[sub_refs[:, 0]]
+    sub_refs[:, 1] = new_idx[sub_refs[:, 1]]
+    edge_arrays["edge_refs"] = sub_refs
+    return edge_arrays
+
+
+def subgraph_centrality(
+    node_keys: np.ndarray,
+    node_arrays: dict[str, np.ndarray],
+    edge_arrays: dict[str, np.ndarray],
+    distances: list[int],
+    shortest: bool,
+    simplest: bool,
+    centrality_kwargs: dict,
+) -> pd.DataFrame:
+    """Builds a NetworkStructure from node and edge arrays and returns its cc_ centrality columns"""
+    network_structure = snapshot.structure_from_arrays(
+        node_keys,
+        node_arrays["x"],
+        node_arrays["y"],
+        node_arrays["live"],
+        node_arrays["weight"],
+        edge_arrays,
+    )
+    nodes_gdf = gpd.GeoDataFrame(
+        {"live": node_arrays["live"]},
+        index=pd.Index(node_keys),
+        geometry=gpd.points_from_xy(node_arrays["x"], node_arrays["y"]),
+    )
+    if shortest:
+        nodes_gdf = networks.node_centrality_shortest(
+            network_structure, nodes_gdf, distances=distances, **centrality_kwargs
+        )
+    if simplest:
+        nodes_gdf = networks.node_centrality_simplest(
+            network_structure, nodes_gdf, distances=distances, **centrality_kwargs
+        )
+    return pd.DataFrame(
+        nodes_gdf[[col for col in nodes_gdf.columns if col.startswith("cc_")]]
+    )
+
+
+def tiled_node_centrality(
+    network_structure: rustalgos.NetworkStructure,
+    nodes_gdf: gpd.GeoDataFrame,
+    distances: list[int],
+    tile_size: float,
+    shortest: bool = True,
+    simplest: bool = False,
+    max_workers: int | None = None,
+    **centrality_kwargs,
+) -> gpd.GeoDataFrame:
+    """
+    Computes node centralities tile by tile and stitches the results onto a copy of nodes_gdf.
+
+    The nodes GDF is expected in network structure order as returned by io.network_structure_from_nx. Set shortest
+    and simplest to select node_centrality_shortest and node_centrality_simplest. Further keyword arguments, e.g.
+    compute_closeness, are passed to these. Set max_workers to 1 to compute tiles in the current process. Jitter
+    would differ between tiles, so jitter_scale is not supported.
+    """
+    if not distances:
+        raise ValueError("Tiled centrality requires explicit distances for the halo.")
+    if centrality_kwargs.get("jitter_scale"):
+        raise ValueError("Tiled centrality does not support jitter.")
+    node_count = network_structure.node_count()
+    if len(nodes_gdf) != node_count:
+        raise ValueError(
+            "The nodes GDF does not match the network structure node count."
+        )
+    arrays = snapshot.structure_arrays(network_structure)
+    node_keys = np.asarray(nodes_gdf.index.astype(str), dtype=str)
+    halo = max(distances)
+    subsets = tile_subsets(arrays["x"], arrays["y"], arrays["live"], tile_size, halo)
+    logger.info(
+        f"Computing centralities for {len(subsets)} tiles of {tile_size}m with a {halo}m halo."
+    )
+    tasks = []
+    for subset in subsets:
+        node_idx = subset["node_idx"]
+        node_arrays = {
+            "x": arrays["x"][node_idx],
+            "y": arrays["y"][node_idx],
+            "live": subset["live"],
+            "weight": arrays["weight"][node_idx],
+        }
+        tasks.append(
+            (
+                node_keys[node_idx],
+                node_arrays,
+                subset_edges(arrays, node_idx, node_count),
+                distances,
+                shortest,
+                simplest,
+                centrality_kwargs,
+            )
+        )
+    if max_workers == 1:
+        tile_results = [subgraph_centrality(*task) for task in tasks]
+    else:
+        # forking after cityseer's thread pool has started can deadlock the workers, so spawn fresh processes
+        with ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            tile_results = list(executor.map(subgraph_centrality, *zip(*tasks)))
+    return stitch_tiles(nodes_gdf, subsets, tile_results, node_keys)
+
+
+def stitch_tiles(
+    nodes_gdf: gpd.GeoDataFrame,
+    subsets: list[dict],
+    tile_results: list[pd.DataFrame],
+    node_keys: np.ndarray,
+) -> gpd.GeoDataFrame:
+    """Stitches per-tile results: closeness from the owning tile and betweenness summed over tiles"""
+    if not tile_results:
+        raise ValueError("No tiles contain live nodes.")
+    metric_cols = list(tile_results[0].columns)
+    betweenness_cols = [col for col in metric_cols if "betweenness" in col]
+    closeness_cols = [col for col in metric_cols if col not in betweenness_cols]
+    closeness_df = pd.concat(
+        [
+            tile_df.loc[subset["owned"], closeness_cols]
+            for subset, tile_df in zip(subsets, tile_results)
+        ]
+    )
+    betweenness_df = (
+        pd.concat([tile_df[betweenness_cols] for tile_df in tile_results])
+        .groupby(level=0, sort=False)
+        .sum()
+    )
+    stitched_df = pd.concat([closeness_df, betweenness_df], axis=1)
+    # nodes in tiles without live nodes are not computed, consistent with the zero values for non-live nodes
+    stitched_df = stitched_df.reindex(node_keys).fillna(0)[metric_cols]
+    nodes_gdf = nodes_gdf.copy()
+    for col in metric_cols:
+        nodes_gdf[col] = stitched_df[col].to_numpy()
+    return nodes_gdf
@@ -1,27 +1,94 @@
+from collections.abc import Iterator
+
 import geopandas as gpd
+import networkx as nx
 import numpy as np
+import shapely
+from shapely import geometry
+
+
+def _perimeter_points(
+    geoms: np.ndarray, spacing: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """Returns points along all rings of the geoms and the position of each point's source geom"""
+    geom_types = shapely.get_type_id(geoms)
+    # 3 is Polygon, 6 is MultiPolygon - missing geoms (-1) contribute no points
+    if not np.isin(geom_types, [-1, 3, 6]).all():
+        raise ValueError("Input data should be Polygon or MultiPolygon type.")
+    # explode multipart geoms, then extract exterior and interior rings
+    parts, part_src_idx = shapely.get_parts(geoms, return_index=True)
+    rings, ring_part_idx = shapely.get_rings(parts, return_index=True)
+    ring_src_idx = part_src_idx[ring_part_idx]
+    # number of points per ring - i * spacing must be less than the ring length to avoid overshoots
+    ring_lengths = shapely.length(rings)
+    ring_counts = np.ceil(ring_lengths / spacing).astype(np.int64)
+    # flat array of distances along each ring, restarting at zero for each ring
+    total = int(ring_counts.sum())
+    ring_starts = np.cumsum(ring_counts) - ring_counts
+    distances = (np.arange(total) - np.repeat(ring_starts, ring_counts)) * spacing
+    points = shapely.line_interpolate_point(np.repeat(rings, ring_counts), distances)
+    return points, np.repeat(ring_src_idx, ring_counts)
+
+
+def _points_gdf(gdf: gpd.GeoDataFrame, spacing: float) -> gpd.GeoDataFrame:
+    """Generates points for a GDF and repeats the source attribute rows by index"""
+    points, src_idx = _perimeter_points(gdf.geometry.values, spacing)
+    new_attributes = gdf.drop(columns=gdf.geometry.name).iloc[src_idx]
+    return gpd.GeoDataFrame(new_attributes, geometry=points, crs=gdf.crs)
 
 
 def generate_points_along_perimeter(gdf: gpd.GeoDataFrame, spacing: int = 20):
-    """Generates points along a polygon perimeter"""
-    new_points = []
-    new_attributes = []
-    # iter GDF
-    for _, row in gdf.iterrows():
-        # extract polygon
-        polygon = row.geometry
-        # calculate number of points based on spacing
-        length = polygon.length
-        num_points = int(np.ceil(length / spacing))
-        # for each spacing, generate a point
-        for i in range(num_points):
-            distance_along_perimeter = i * spacing
-            # catch overshoots
-            if distance_along_perimeter < length:
-                # prepare the point and attribute data for output GDF
-                point = polygon.interpolate(distance_along_perimeter)
-                new_points.append(point)
-                new_attributes.append(row.drop("geometry"))
-    # prepare and return a new GDF
-    new_gdf = gpd.GeoDataFrame(new_attributes, geometry=new_points)
-    return new_gdf
+    """Generates points along polygon perimeters, including holes and multipolygon parts"""
+    if spacing <= 0:
+        raise ValueError("Spacing should be a positive number.")
+    return _points_gdf(gdf, spacing)
+
+
+def iter_points_along_perimeter(
+    gdf: gpd.GeoDataFrame, spacing: int = 20, chunk_size: int = 50000
+) -> Iterator[gpd.GeoDataFrame]:
+    """Yields perimeter points in GDF batches of chunk_size input rows to keep memory flat"""
+    if spacing <= 0:
+        raise ValueError("Spacing should be a positive number.")
+    if chunk_size <= 0:
+        raise ValueError("Chunk size should be a positive number.")
+    for start_idx in range(0, len(gdf), chunk_size):
+        yield _points_gdf(gdf.iloc[start_idx : start_idx + chunk_size], spacing)
+
+
+def points_in_boundary(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    boundary_geom: geometry.Polygon | geometry.MultiPolygon,
+) -> np.ndarray:
+    """Tests arrays of coordinates against a boundary in bulk, returning a boolean array"""
+    if boundary_geom.geom_type not in ("Polygon", "MultiPolygon"):
+        raise ValueError("Boundary should be Polygon or MultiPolygon type.")
+    # prepare in place so that repeated calls against the same boundary reuse the spatial index
+    shapely.prepare(boundary_geom)
+    # same semantics as geom.contains: points on the boundary or within holes are not contained
+    return shapely.contains_xy(boundary_geom, xs, ys)
+
+
+def mark_live_nodes(
+    nx_multigraph: nx.MultiGraph,
+    boundary_geom: geometry.Polygon | geometry.MultiPolygon,
+) -> nx.MultiGraph:
+    """Sets the "live" attribute on graph nodes according to whether they fall inside the boundary"""
+    node_keys = list(nx_multigraph.nodes)
+    node_count = len(node_keys)
+    # pull coordinates into arrays once
+    xs = np.fromiter(
+        (x for _, x in nx_multigraph.nodes(data="x")),
+        dtype=np.float64,
+        count=node_count,
+    )
+    ys = np.fromiter(
+        (y for _, y in nx_multigraph.nodes(data="y")),
+        dtype=np.float64,
+        count=node_count,
+    )
+    live = points_in_boundary(xs, ys, boundary_geom)
+    # write the flags back as python bools
+    nx.set_node_attributes(nx_multigraph, dict(zip(node_keys, live.tolist())), "live")
+    return nx_multigraph
@@ -0,0 +1,32 @@
+"""
+src.batch's retries when a job's worker process crashes and breaks the pool.
+"""
+
+import os
+import time
+
+from src import batch
+
+
+def _job(crash: bool = False, raise_error: bool = False):
+    if crash:
+        os._exit(1)
+    if raise_error:
+        raise ValueError("The job failed.")
+    # keep running while the crashing job breaks the pool
+    time.sleep(0.5)
+
+
+def test_only_the_crashed_job_is_charged():
+    jobs = [
+        batch.BatchJob("crash", {"crash": True}, memory_mb=1),
+        batch.BatchJob("error", {"raise_error": True}, memory_mb=1),
+        batch.BatchJob("a", {}, memory_mb=1),
+        batch.BatchJob("b", {}, memory_mb=1),
+    ]
+    report = batch.run_batch(_job, jobs, memory_budget_mb=100, max_workers=4)
+    statuses = {job["name"]: job["status"] for job in report["jobs"]}
+    attempts = {job["name"]: job["attempts"] for job in report["jobs"]}
+    assert statuses == {"crash": "failed", "error": "failed", "a": "done", "b": "done"}
+    assert attempts == {"crash": 2, "error": 2, "a": 1, "b": 1}
+    assert report["jobs"][0]["errors"] == ["Worker process terminated abruptly."] * 2
@@ -0,0 +1,38 @@
+"""
+Parity of src.morphometrics' tiled computation with the single-process morphometrics on synthetic terraced buildings.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src import morphometrics, synthetic
+
+
+@pytest.fixture
+def bldgs_gdf():
+    edges_gdf = synthetic.grid_edges(300, seed=0)
+    # shuffled so that the building ids are not in spatial order
+    return synthetic.buildings_gdf(edges_gdf, 300, terrace_fraction=0.5, seed=0).sample(
+        frac=1, random_state=0
+    )
+
+
+def test_shared_walls_found(bldgs_gdf):
+    single_gdf = morphometrics.compute_morphometrics(bldgs_gdf)
+    assert (single_gdf["shared_walls"] > 0).any()
+    assert np.isfinite(single_gdf[morphometrics.METRIC_COLUMNS].to_numpy()).all()
+
+
+@pytest.mark.parametrize("tile_size", [100, 400])
+def test_tiled_matches_single_process(bldgs_gdf, tile_size):
+    single_gdf = morphometrics.compute_morphometrics(bldgs_gdf)
+    tiled_gdf = morphometrics.tiled_morphometrics(bldgs_gdf, tile_size, max_workers=1)
+    pd.testing.assert_frame_equal(single_gdf, tiled_gdf, check_exact=True)
+
+
+def test_tiled_requires_unique_ids(bldgs_gdf):
+    with pytest.raises(ValueError):
+        morphometrics.tiled_morphometrics(
+            bldgs_gdf.reset_index(drop=True).set_index(np.zeros(len(bldgs_gdf))), 400
+        )
@@ -0,0 +1,174 @@
+"""
+Write-then-read round trips of src.outputs' GeoParquet and GPKG writers and ResultWriter on synthetic dual nodes.
+"""
+
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+import shapely
+
+from src import outputs, synthetic
+
+NODE_COUNT = 50
+CHUNK_SIZE = 8
+
+
+@pytest.fixture
+def lines_gdf() -> gpd.GeoDataFrame:
+    """Dual nodes with their primal edges as the active geometry and the node points as a second geometry"""
+    edges_gdf = synthetic.grid_edges(NODE_COUNT, seed=0).iloc[:NODE_COUNT]
+    mid_points = shapely.line_interpolate_point(
+        edges_gdf.geometry.values, 0.5, normalized=True
+    )
+    nodes_gdf = gpd.GeoDataFrame(
+        {"live": np.arange(NODE_COUNT) % 3 > 0},
+        index=pd.Index([f"node_{idx}" for idx in range(NODE_COUNT)], name="node_key"),
+        geometry=mid_points,
+        crs=edges_gdf.crs,
+    )
+    return outputs.nodes_as_lines(
+        nodes_gdf, edges_gdf.geometry.to_numpy(), line_col="primal_edge"
+    )
+
+
+def metric_groups() -> list[dict[str, np.ndarray]]:
+    """Two groups of metric columns, as added by successive cityseer calls"""
+    rng = np.random.default_rng(0)
+    return [
+        {
+            "cc_harmonic_400": rng.uniform(0, 100, NODE_COUNT),
+            "cc_harmonic_800": rng.uniform(0, 100, NODE_COUNT),
+            "cc_betweenness_400": rng.uniform(0, 1e4, NODE_COUNT),
+        },
+        {
+            "cc_harmonic_400_ang": rng.uniform(0, 100, NODE_COUNT),
+            # beyond the float32 range, so kept as float64
+            "cc_farness_400": np.full(NODE_COUNT, 1e40),
+        },
+    ]
+
+
+def assert_geoms_equal(geoms, expected_geoms):
+    np.testing.assert_array_equal(
+        shapely.to_wkb(np.asarray(geoms)), shapely.to_wkb(np.asarray(expected_geoms))
+    )
+
+
+def write_results(lines_gdf, out_path, result_schema) -> Path:
+    with outputs.ResultWriter(
+        lines_gdf, out_path, result_schema=result_schema, chunk_size=CHUNK_SIZE
+    ) as writer:
+        gdf = lines_gdf
+        for group in metric_groups():
+            gdf = writer.add_columns(gdf.assign(**group))
+            assert list(gdf.columns) == list(lines_gdf.columns)
+        return writer.write()
+
+
+def test_result_writer_parquet_round_trip(lines_gdf, tmp_path):
+    result_schema = outputs.ResultSchema(
+        metrics=["shortest_closeness"], distances=[400]
+    )
+    out_path = write_results(lines_gdf, tmp_path / "results.parquet", result_schema)
+    # the group files are removed
+    assert list(tmp_path.iterdir()) == [out_path]
+    result_gdf = outputs.read_geoparquet(out_path)
+    assert list(result_gdf.columns) == [
+        "live",
+        "node_geom",
+        "primal_edge",
+        "cc_harmonic_400",
+        "cc_farness_400",
+    ]
+    assert result_gdf.index.equals(lines_gdf.index)
+    assert result_gdf.geometry.name == "primal_edge"
+    assert result_gdf.crs == lines_gdf.crs
+    assert_geoms_equal(result_gdf["primal_edge"], lines_gdf["primal_edge"])
+    assert_geoms_equal(result_gdf["node_geom"], lines_gdf["node_geom"])
+    np.testing.assert_array_equal(result_gdf["live"], lines_gdf["live"])
+    groups = metric_groups()
+    assert result_gdf["cc_harmonic_400"].dtype == np.float32
+    np.testing.assert_allclose(
+        result_gdf["cc_harmonic_400"], groups[0]["cc_harmonic_400"], rtol=1e-6
+    )
+    assert result_gdf["cc_farness_400"].dtype == np.float64
+    np.testing.assert_array_equal(
+        result_gdf["cc_farness_400"], groups[1]["cc_farness_400"]
+    )
+
+
+def test_result_writer_gpkg_round_trip(lines_gdf, tmp_path):
+    result_schema = outputs.ResultSchema(metrics=["harmonic"])
+    out_path = write_results(lines_gdf, tmp_path / "results.gpkg", result_schema)
+    result_gdf = gpd.read_file(out_path)
+    assert list(result_gdf.columns) == [
+        "node_key",
+        "live",
+        "node_geom",
+        "cc_harmonic_400",
+        "cc_harmonic_800",
+        "cc_harmonic_400_ang",
+        "geometry",
+    ]
+    np.testing.assert_array_equal(result_gdf["node_key"], lines_gdf.index)
+    assert_geoms_equal(result_gdf.geometry, lines_gdf["primal_edge"])
+    # the second geometry column is written as WKT, rounded to 6 decimals
+    np.testing.assert_allclose(
+        shapely.get_coordinates(shapely.from_wkt(result_gdf["node_geom"].to_numpy())),
+        shapely.get_coordinates(lines_gdf["node_geom"].values),
+        rtol=0,
+        atol=1e-6,
+    )
+    groups = metric_groups()
+    for col in ["cc_harmonic_400", "cc_harmonic_800"]:
+        np.testing.assert_allclose(result_gdf[col], groups[0][col], rtol=1e-6)
+    np.testing.assert_allclose(
+        result_gdf["cc_harmonic_400_ang"], groups[1]["cc_harmonic_400_ang"], rtol=1e-6
+    )
+
+
+def test_write_geoparquet_round_trip(lines_gdf, tmp_path):
+    out_path = tmp_path / "nodes.parquet"
+    outputs.write_geoparquet(lines_gdf, out_path, row_group_size=CHUNK_SIZE)
+    assert pq.ParquetFile(out_path).num_row_groups == int(
+        np.ceil(NODE_COUNT / CHUNK_SIZE)
+    )
+    result_gdf = outputs.read_geoparquet(out_path)
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(result_gdf[["live"]]), pd.DataFrame(lines_gdf[["live"]])
+    )
+    assert result_gdf.geometry.name == "primal_edge"
+    assert result_gdf["node_geom"].crs == lines_gdf.crs
+    assert_geoms_equal(result_gdf["primal_edge"], lines_gdf["primal_edge"])
+    assert_geoms_equal(result_gdf["node_geom"], lines_gdf["node_geom"])
+    # only some columns, with the point geoms decoded
+    points_gdf = outputs.read_geoparquet(out_path, columns=["node_geom", "live"])
+    assert_geoms_equal(points_gdf["node_geom"], lines_gdf["node_geom"])
+
+
+def test_result_schema_selection():
+    result_schema = outputs.ResultSchema(
+        metrics=["betweenness", "eating"], distances=[400]
+    )
+    kept = [
+        col
+        for col in [
+            "live",
+            "cc_betweenness_400",
+            "cc_betweenness_800",
+            "cc_harmonic_400",
+            "cc_eating_400_wt",
+            "cc_eating_nearest_max_400",
+        ]
+        if result_schema.keep_column(col)
+    ]
+    assert kept == [
+        "live",
+        "cc_betweenness_400",
+        "cc_eating_400_wt",
+        "cc_eating_nearest_max_400",
+    ]
@@ -0,0 +1,133 @@
+"""
+src.population's raster window reading and bilinear interpolation against an exact linear field in a tiny GeoTIFF.
+"""
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+from src import population
+
+# 6 columns and 5 rows of 100m pixels
+WIDTH = 6
+HEIGHT = 5
+PIXEL = 100
+LEFT = 1000
+TOP = 2000
+NODATA = -9999.0
+# the nodata pixel, away from the edges
+NODATA_ROW = 2
+NODATA_COL = 3
+
+
+def linear(xs, ys):
+    return 3 * np.asarray(xs) - 2 * np.asarray(ys) + 10000
+
+
+def pixel_centres():
+    xs = LEFT + (np.arange(WIDTH) + 0.5) * PIXEL
+    ys = TOP - (np.arange(HEIGHT) + 0.5) * PIXEL
+    return np.meshgrid(xs, ys)
+
+
+@pytest.fixture
+def raster_path(tmp_path):
+    values = linear(*pixel_centres())
+    values[NODATA_ROW, NODATA_COL] = NODATA
+    path = tmp_path / "population.tif"
+    with rasterio.open(
+        path,
+        "w",
+        driver="GTiff",
+        width=WIDTH,
+        height=HEIGHT,
+        count=1,
+        dtype="float64",
+        crs="EPSG:3035",
+        transform=from_origin(LEFT, TOP, PIXEL, PIXEL),
+        nodata=NODATA,
+    ) as dst:
+        dst.write(values, 1)
+    return path
+
+
+def test_read_window_whole_band(raster_path):
+    values, transform = population.read_window(raster_path)
+    assert values.shape == (HEIGHT, WIDTH)
+    assert transform == from_origin(LEFT, TOP, PIXEL, PIXEL)
+    expected = linear(*pixel_centres())
+    expected[NODATA_ROW, NODATA_COL] = np.nan
+    np.testing.assert_array_equal(values, expected)
+
+
+def test_read_window_adds_margin(raster_path):
+    # within the pixels of rows 1 to 2 and columns 2 to 3
+    bounds = (LEFT + 250, TOP - 290, LEFT + 390, TOP - 110)
+    values, transform = population.read_window(raster_path, bounds)
+    assert values.shape == (4, 4)
+    assert transform == from_origin(LEFT + PIXEL, TOP, PIXEL, PIXEL)
+    np.testing.assert_array_equal(values[0], linear(*pixel_centres())[0, 1:5])
+
+
+def test_read_window_clipped_to_raster(raster_path):
+    # across the lower left corner
+    bounds = (LEFT - 500, TOP - 700, LEFT + 50, TOP - 450)
+    values, transform = population.read_window(raster_path, bounds)
+    assert values.shape == (2, 2)
+    assert transform == from_origin(LEFT, TOP - 3 * PIXEL, PIXEL, PIXEL)
+
+
+def test_bilinear_sample_matches_linear_field(raster_path):
+    values, transform = population.read_window(raster_path)
+    # between the outermost pixel centres, away from the nodata pixel
+    rng = np.random.default_rng(0)
+    xs = rng.uniform(LEFT + 50, LEFT + 250, 50)
+    ys = rng.uniform(TOP - 450, TOP - 50, 50)
+    xs = np.r_[xs, pixel_centres()[0][:, :3].ravel()]
+    ys = np.r_[ys, pixel_centres()[1][:, :3].ravel()]
+    np.testing.assert_allclose(
+        population.bilinear_sample(values, transform, xs, ys), linear(xs, ys)
+    )
+
+
+def test_bilinear_sample_edge_pixels(raster_path):
+    values, transform = population.read_window(raster_path)
+    # beyond the outermost pixel centres, but inside the raster, the nearest edge values are interpolated
+    xs = np.array([LEFT + 10, LEFT + 20, LEFT + 10, LEFT + 30, LEFT + WIDTH * PIXEL])
+    ys = np.array([TOP - 170, TOP, TOP - HEIGHT * PIXEL, TOP - 480, TOP - 130])
+    expected = linear(
+        np.clip(xs, LEFT + 50, LEFT + WIDTH * PIXEL - 50),
+        np.clip(ys, TOP - HEIGHT * PIXEL + 50, TOP - 50),
+    )
+    np.testing.assert_allclose(
+        population.bilinear_sample(values, transform, xs, ys), expected
+    )
+
+
+def test_bilinear_sample_outside_raster(raster_path):
+    values, transform = population.read_window(raster_path)
+    xs = np.array([LEFT - 1, LEFT + 100, LEFT + WIDTH * PIXEL + 1])
+    ys = np.array([TOP - 100, TOP + 1, TOP - 100])
+    assert np.isnan(population.bilinear_sample(values, transform, xs, ys)).all()
+
+
+def test_bilinear_sample_nodata(raster_path):
+    values, transform = population.read_window(raster_path)
+    centre_x = LEFT + (NODATA_COL + 0.5) * PIXEL
+    centre_y = TOP - (NODATA_ROW + 0.5) * PIXEL
+    # at the centre of the nodata pixel there are no other neighbours
+    assert np.isnan(
+        population.bilinear_sample(values, transform, [centre_x], [centre_y])
+    ).all()
+    # next to it the interpolation is renormalised over the three other neighbours
+    x = centre_x + 40
+    y = centre_y - 30
+    sampled = population.bilinear_sample(values, transform, [x], [y])[0]
+    col_wts = np.array([0.6, 0.4])
+    row_wts = np.array([0.7, 0.3])
+    wts = np.outer(row_wts, col_wts)
+    wts[0, 0] = 0
+    window = values[NODATA_ROW : NODATA_ROW + 2, NODATA_COL : NODATA_COL + 2]
+    expected = np.sum(wts * np.nan_to_num(window)) / wts.sum()
+    assert sampled == pytest.approx(expected)
@@ -0,0 +1,124 @@
+"""
+Parity of src.primal with io.nx_from_generic_geopandas and io.network_structure_from_nx on small synthetic networks.
+"""
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+from cityseer import config
+from cityseer.tools import io
+
+from src import primal, snapshot, synthetic
+
+config.QUIET_MODE = True
+
+EDGE_COLUMNS = ["length", "angle_sum", "in_bearing", "out_bearing"]
+
+
+def with_multilines(edges_gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """Combines every tenth edge with the following edge into a MultiLineString"""
+    group_ids = np.arange(len(edges_gdf))
+    combined = np.arange(0, len(edges_gdf) - 1, 10)
+    group_ids[combined + 1] = combined
+    geoms = shapely.multilinestrings(
+        edges_gdf.geometry.values, indices=np.unique(group_ids, return_inverse=True)[1]
+    )
+    single = shapely.get_num_geometries(geoms) == 1
+    geoms[single] = shapely.get_geometry(geoms[single], 0)
+    return gpd.GeoDataFrame(geometry=geoms, crs=edges_gdf.crs)
+
+
+def directed_edges(network_structure) -> pd.DataFrame:
+    """The directed edges of a NetworkStructure keyed by their node keys, in a comparable order"""
+    arrays = snapshot.structure_arrays(network_structure)
+    edges_df = pd.DataFrame(
+        {
+            "start": arrays["start_nd_key"],
+            "end": arrays["end_nd_key"],
+            **{col: arrays[col] for col in EDGE_COLUMNS},
+        }
+    )
+    return edges_df.sort_values(["start", "end", "length"]).reset_index(drop=True)
+
+
+@pytest.fixture(params=list(synthetic.LAYOUTS))
+def edges_gdf(request) -> gpd.GeoDataFrame:
+    return with_multilines(synthetic.LAYOUTS[request.param](300, seed=0))
+
+
+@pytest.fixture
+def nx_structure(edges_gdf):
+    G = io.nx_from_generic_geopandas(edges_gdf.explode(ignore_index=True))
+    return io.network_structure_from_nx(G, crs=edges_gdf.crs)
+
+
+@pytest.fixture
+def primal_structure(edges_gdf):
+    return primal.network_structure_from_primal(
+        primal.primal_edges(edges_gdf), crs=edges_gdf.crs
+    )
+
+
+def test_nodes_match(nx_structure, primal_structure):
+    nodes_gdf, _, _ = nx_structure
+    p_nodes_gdf, _, _ = primal_structure
+    assert set(p_nodes_gdf.index) == set(nodes_gdf.index)
+    p_nodes_gdf = p_nodes_gdf.loc[nodes_gdf.index]
+    np.testing.assert_allclose(p_nodes_gdf["x"], nodes_gdf["x"])
+    np.testing.assert_allclose(p_nodes_gdf["y"], nodes_gdf["y"])
+
+
+def test_directed_edges_match(nx_structure, primal_structure):
+    edges_df = directed_edges(nx_structure[2])
+    p_edges_df = directed_edges(primal_structure[2])
+    pd.testing.assert_frame_equal(
+        p_edges_df[["start", "end"]], edges_df[["start", "end"]]
+    )
+    for col in EDGE_COLUMNS:
+        np.testing.assert_allclose(p_edges_df[col], edges_df[col], rtol=0, atol=1e-6)
+
+
+def test_closeness_matches(nx_structure, primal_structure):
+    nodes_gdf, _, network_structure = nx_structure
+    p_nodes_gdf, _, p_network_structure = primal_structure
+    # the NetworkStructure methods directly, as networks.node_centrality_shortest polls its progress once a second
+    result = network_structure.local_node_centrality_shortest(
+        distances=[500], compute_betweenness=False, pbar_disabled=True
+    )
+    p_result = p_network_structure.local_node_centrality_shortest(
+        distances=[500], compute_betweenness=False, pbar_disabled=True
+    )
+    # the nodes are in network structure order
+    p_order = pd.Series(np.arange(len(p_nodes_gdf)), index=p_nodes_gdf.index)
+    p_order = p_order.loc[nodes_gdf.index].to_numpy()
+    for metric in ["node_density", "node_farness", "node_harmonic", "node_beta"]:
+        np.testing.assert_allclose(
+            getattr(p_result, metric)[500][p_order],
+            getattr(result, metric)[500],
+            rtol=1e-5,
+            atol=1e-6,
+        )
+
+
+def test_snapping_recovers_jittered_nodes(edges_gdf):
+    exploded_gdf = edges_gdf.explode(ignore_index=True)
+    original = primal.primal_edges(exploded_gdf)
+    # move each end of each edge by up to half a metre in x and y
+    rng = np.random.default_rng(0)
+    coords, coord_idx = shapely.get_coordinates(
+        exploded_gdf.geometry.values, return_index=True
+    )
+    is_end = (
+        np.r_[True, coord_idx[1:] != coord_idx[:-1]]
+        | np.r_[coord_idx[1:] != coord_idx[:-1], True]
+    )
+    coords[is_end] += rng.uniform(-0.5, 0.5, (int(is_end.sum()), 2))
+    jittered_gdf = gpd.GeoDataFrame(
+        geometry=shapely.linestrings(coords, indices=coord_idx), crs=edges_gdf.crs
+    )
+    assert primal.primal_edges(jittered_gdf).node_count > original.node_count
+    snapped = primal.primal_edges(jittered_gdf, snap_dist=2)
+    assert snapped.node_count == original.node_count
+    assert snapped.edge_count == original.edge_count
@@ -0,0 +1,28 @@
+"""
+src.readers' column pruning on a small GPKG of synthetic edges.
+"""
+
+import pytest
+
+from src import readers, synthetic
+
+
+@pytest.fixture
+def edges_path(tmp_path):
+    edges_gdf = synthetic.grid_edges(50, seed=0)
+    edges_gdf["road_class"] = "local"
+    edges_gdf["speed"] = 30
+    path = tmp_path / "edges.gpkg"
+    edges_gdf.to_file(path)
+    return path
+
+
+def test_read_layer_columns(edges_path):
+    edges_gdf = readers.read_layer(edges_path, columns=["speed"])
+    assert list(edges_gdf.columns) == ["speed", "geometry"]
+    assert list(readers.read_layer(edges_path, columns=[]).columns) == ["geometry"]
+
+
+def test_read_layer_missing_columns(edges_path):
+    with pytest.raises(ValueError, match="primal_edge_geom"):
+        readers.read_layer(edges_path, columns=["speed", "primal_edge_geom"])
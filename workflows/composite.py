@@ -1,67 +1,668 @@
 """
+End-to-end workflow from a boundary file to centrality, accessibility, and building metrics.
 
+The workflow is a graph of stages run by src.pipeline: extent, network, dual, centrality, accessibility, and buildings.
+Intermediate files are written to a working directory next to the boundary file, named after the boundary file. Stages
+are skipped when their inputs and params are unchanged, e.g. changing the distances only reruns the metric stages.
 """
 
+import gzip
+import json
+import logging
 import pathlib
+import pickle
 
 import geopandas as gpd
-from cityseer.metrics import networks
-from cityseer.tools import graphs, io
+import networkx as nx
+import pandas as pd
+from cityseer.metrics import layers, networks
+from osmnx import _errors as ox_errs
 from shapely import geometry
 
+from src import (
+    aggregation,
+    batch,
+    boundaries,
+    cache,
+    dual,
+    landuses,
+    morphometrics,
+    outputs,
+    pipeline,
+    population,
+    primal,
+    profiling,
+    sampling,
+    snapshot,
+    tiling,
+    util,
+)
 
-def process_bounds(
-    bounds_path: pathlib.Path | str, out_path: pathlib.Path | str, distances: list[int]
-):
-    """ """
-    bounds_path = pathlib.Path(bounds_path)
-    extents_gpd = gpd.read_file(bounds_path)
+logger = logging.getLogger(__name__)
+
+# the network is downloaded for the extents buffered by this distance to prevent edge roll-off
+# this is independent of the distances so that changing the distances does not trigger a new download
+DEFAULT_BUFFER_DIST = 10000
+# rough density of dual nodes, i.e. street segments, for estimating the memory of regions not yet downloaded
+DEFAULT_NODES_PER_KM2 = 300
+
+
+def _read_extents(
+    extents_path: pathlib.Path,
+) -> tuple[geometry.Polygon, geometry.Polygon, int]:
+    """Reads the live and buffered extents written by the extent stage, and the working EPSG code"""
+    extents_gpd = gpd.read_file(extents_path).set_index("extent")
+    return (
+        extents_gpd.geometry["live"],
+        extents_gpd.geometry["buffered"],
+        extents_gpd.crs.to_epsg(),
+    )
+
+
+def _extents_wgs(extents_geom: geometry.Polygon, crs: int) -> geometry.Polygon:
+    """Converts a geom to WGS84 for passing to osmnx"""
+    return boundaries.project_geom(extents_geom, crs, 4326)
+
+
+def _read_graph(graph_path: pathlib.Path) -> nx.MultiGraph:
+    with gzip.open(graph_path, "rb") as graph_file:
+        return pickle.load(graph_file)
+
+
+def stage_extent(in_paths, out_paths, buffer_dist: int, simplify_dist: int = 100):
+    """Derives the live extents from the boundary and buffers these for downloads"""
+    extents_gpd = gpd.read_file(in_paths["bounds"])
     if not extents_gpd.crs.is_projected:
         raise IOError("Input spatial boundary must be in a projected CRS.")
     working_crs = extents_gpd.crs.to_epsg()
-    working_path = bounds_path.with_suffix("")
     if not isinstance(working_crs, int):
         raise ValueError(f"Expected int for EPSG code: {working_crs}")
     if not extents_gpd.geom_type[0] in ("Polygon", "MultiPolygon"):
         raise ValueError("Input data should be Polygon or MultiPolygon type.")
-    bound_geom = extents_gpd.geometry.unary_union
-    extents_geom = bound_geom.convex_hull.simplify(100)
-    # TODO: max(distances)
-    extents_geom_buff = extents_geom.buffer(max(distances))
-    G_clean_nx = io.osm_graph_from_poly(
-        extents_geom_buff,
-        simplify=True,
-        poly_crs_code=working_crs,
-        to_crs_code=working_crs,
+    extents_geom, extents_geom_buff = boundaries.prepare_extents(
+        extents_gpd, buffer_dist, simplify_dist=simplify_dist
     )
-    for nd_key, nd_data in G_clean_nx.nodes(data=True):
-        if extents_geom.contains(geometry.Point(nd_data["x"], nd_data["y"])):
-            G_clean_nx.nodes[nd_key]["live"] = True
+    gpd.GeoDataFrame(
+        {"extent": ["live", "buffered"]},
+        geometry=[extents_geom, extents_geom_buff],
+        crs=working_crs,
+    ).to_file(out_paths["extents"])
+
+
+def network_stage(osm_cache: cache.OSMCache):
+    """Returns the network stage bound to the OSM cache"""
+
+    def stage_network(in_paths, out_paths, simplify: bool):
+        """Downloads the raw or cleaned network for the buffered extents and tags live nodes"""
+        extents_geom, extents_geom_buff, working_crs = _read_extents(
+            in_paths["extents"]
+        )
+        with profiling.stage("osm_download"):
+            G_nx = osm_cache.osm_graph_from_poly(
+                extents_geom_buff,
+                simplify=simplify,
+                poly_crs_code=working_crs,
+                to_crs_code=working_crs,
+            )
+            profiling.record(**profiling.graph_info(G_nx))
+        G_nx = util.mark_live_nodes(G_nx, extents_geom)
+        # a fixed gzip timestamp keeps the content hash stable if the same network is downloaded again
+        with gzip.GzipFile(
+            out_paths["graph"], "wb", compresslevel=5, mtime=0
+        ) as graph_file:
+            pickle.dump(G_nx, graph_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return stage_network
+
+
+def stage_dual(in_paths, out_paths):
+    """Casts the network to its dual and saves the dual GPKGs and network structure snapshot"""
+    _, _, working_crs = _read_extents(in_paths["extents"])
+    G_nx = _read_graph(in_paths["graph"])
+    with profiling.stage("primal_from_nx", **profiling.graph_info(G_nx)):
+        primal_net = primal.primal_from_nx(G_nx)
+    # the dual is built from the primal edge arrays, see src/dual.py
+    with profiling.stage("network_structure_dual"):
+        (
+            nodes_gdf_dual,
+            edges_gdf_dual,
+            network_structure_dual,
+        ) = dual.network_structure_dual(primal_net, crs=working_crs)
+        profiling.record(**profiling.network_info(network_structure_dual))
+    with profiling.stage("gpkg_write"):
+        nodes_gdf_dual.to_file(out_paths["nodes"])
+        edges_gdf_dual.to_file(out_paths["edges"])
+    with profiling.stage("snapshot_write"):
+        snapshot.write_network_snapshot(
+            out_paths["snapshot"],
+            network_structure_dual,
+            nodes_gdf_dual,
+            crs=working_crs,
+            source_paths=[out_paths["nodes"], out_paths["edges"]],
+        )
+
+
+def _read_dual(snapshot_path: pathlib.Path):
+    """Reads the dual snapshot with the primal edges as the active geometry"""
+    nodes_gdf_dual, network_structure_dual = snapshot.read_network_snapshot(
+        snapshot_path
+    )
+    nodes_gdf_dual = nodes_gdf_dual.rename(columns={"geom": "point_geom"})
+    nodes_gdf_dual = nodes_gdf_dual.set_geometry("primal_edge").rename_geometry(
+        "line_geometry"
+    )
+    return nodes_gdf_dual, network_structure_dual
+
+
+def stage_centrality(
+    in_paths,
+    out_paths,
+    distances: list[int],
+    tile_size: float | None = None,
+    sample_fraction: float | None = None,
+    result_schema: outputs.ResultSchema | None = None,
+):
+    """
+    Computes shortest and simplest path centralities on the dual network, optionally tiled or sampled.
+
+    Each group of centralities is written to disk as soon as computed, keeping the metrics selected by result_schema.
+    """
+    if tile_size is not None and sample_fraction is not None:
+        raise ValueError("Tiled and sampled centralities cannot be combined.")
+    nodes_gdf_dual, network_structure_dual = _read_dual(in_paths["snapshot"])
+    profiling.record(
+        distances=distances, **profiling.network_info(network_structure_dual)
+    )
+    # the output format is inferred from the suffix - .parquet or .gpkg
+    with outputs.ResultWriter(
+        nodes_gdf_dual, out_paths["centrality"], result_schema=result_schema
+    ) as result_writer:
+        if sample_fraction is not None:
+            with profiling.stage("approximate_node_centrality"):
+                nodes_gdf_dual = sampling.approximate_node_centrality(
+                    network_structure_dual,
+                    nodes_gdf_dual,
+                    distances=distances,
+                    sample_fraction=sample_fraction,
+                    shortest=True,
+                    simplest=True,
+                )
+                nodes_gdf_dual = result_writer.add_columns(nodes_gdf_dual)
+        elif tile_size is not None:
+            with profiling.stage("tiled_node_centrality"):
+                nodes_gdf_dual = tiling.tiled_node_centrality(
+                    network_structure_dual,
+                    nodes_gdf_dual,
+                    distances=distances,
+                    tile_size=tile_size,
+                    shortest=True,
+                    simplest=True,
+                )
+                nodes_gdf_dual = result_writer.add_columns(nodes_gdf_dual)
         else:
-            G_clean_nx.nodes[nd_key]["live"] = False
-    G_clean_nx_dual = graphs.nx_to_dual(G_clean_nx)
-    (
-        nodes_gdf_dual,
-        _edges_gdf_dual,
-        network_structure_dual,
-    ) = io.network_structure_from_nx(G_clean_nx_dual, crs=working_crs)
-
-    # centrality
-    nodes_gdf_dual = networks.node_centrality_shortest(
-        network_structure_dual,
-        nodes_gdf_dual,
-        distances=distances,
+            with profiling.stage("node_centrality_shortest"):
+                nodes_gdf_dual = networks.node_centrality_shortest(
+                    network_structure_dual,
+                    nodes_gdf_dual,
+                    distances=distances,
+                )
+                nodes_gdf_dual = result_writer.add_columns(nodes_gdf_dual)
+            with profiling.stage("node_centrality_simplest"):
+                nodes_gdf_dual = networks.node_centrality_simplest(
+                    network_structure_dual,
+                    nodes_gdf_dual,
+                    distances=distances,
+                )
+                nodes_gdf_dual = result_writer.add_columns(nodes_gdf_dual)
+        with profiling.stage("write_results"):
+            result_writer.write()
+
+
+def accessibility_stage(osm_cache: cache.OSMCache):
+    """Returns the accessibility stage bound to the OSM cache"""
+
+    def stage_accessibility(
+        in_paths,
+        out_paths,
+        distances: list[int],
+        schema: landuses.Schema,
+        result_schema: outputs.ResultSchema | None = None,
+    ):
+        """Downloads and classifies OSM landuses, then computes accessibilities and mixed uses"""
+        extents_geom, _, working_crs = _read_extents(in_paths["extents"])
+        # landuses are only needed within the largest distance of the live extents
+        extents_geom_wgs = _extents_wgs(
+            extents_geom.buffer(max(distances)), working_crs
+        )
+        with profiling.stage("osm_download"):
+            try:
+                data_gdf = osm_cache.features_from_polygon(
+                    extents_geom_wgs, tags=landuses.schema_tags(schema)
+                )
+            except ox_errs.InsufficientResponseError as err:
+                # no features match any of the tags, so continue without landuses
+                logger.warning(err)
+                data_gdf = gpd.GeoDataFrame(
+                    geometry=[],
+                    crs=4326,
+                    index=pd.MultiIndex.from_arrays(
+                        [[], []], names=["element_type", "osmid"]
+                    ),
+                )
+        data_gdf = data_gdf[data_gdf.index.get_level_values("element_type") == "node"]
+        data_gdf = data_gdf.reset_index(level="element_type", drop=True)
+        landuses_gdf = landuses.classify_landuses(data_gdf, schema)
+        landuses_gdf = landuses_gdf[["cat_key", "osm_key", "osm_val", "geometry"]]
+        landuses_gdf = landuses_gdf.reset_index()
+        landuses_gdf.index = landuses_gdf.index.astype(str)
+        landuses_gdf = landuses_gdf.to_crs(working_crs)
+        landuses_gdf.to_file(out_paths["landuses"])
+        nodes_gdf_dual, network_structure_dual = _read_dual(in_paths["snapshot"])
+        profiling.record(
+            distances=distances,
+            landuses=len(landuses_gdf),
+            **profiling.network_info(network_structure_dual),
+        )
+        with outputs.ResultWriter(
+            nodes_gdf_dual, out_paths["accessibility"], result_schema=result_schema
+        ) as result_writer:
+            with profiling.stage("compute_accessibilities"):
+                nodes_gdf_dual, landuses_gdf = layers.compute_accessibilities(
+                    landuses_gdf,
+                    landuse_column_label="cat_key",
+                    accessibility_keys=list(schema),
+                    nodes_gdf=nodes_gdf_dual,
+                    network_structure=network_structure_dual,
+                    distances=distances,
+                    spatial_tolerance=50,
+                )
+                nodes_gdf_dual = result_writer.add_columns(nodes_gdf_dual)
+            with profiling.stage("compute_mixed_uses"):
+                nodes_gdf_dual, landuses_gdf = layers.compute_mixed_uses(
+                    landuses_gdf,
+                    landuse_column_label="cat_key",
+                    nodes_gdf=nodes_gdf_dual,
+                    network_structure=network_structure_dual,
+                    distances=distances,
+                    spatial_tolerance=50,
+                )
+                nodes_gdf_dual = result_writer.add_columns(nodes_gdf_dual)
+            with profiling.stage("write_results"):
+                result_writer.write()
+
+    return stage_accessibility
+
+
+def buildings_stage(osm_cache: cache.OSMCache):
+    """Returns the buildings stage bound to the OSM cache"""
+
+    def stage_buildings(in_paths, out_paths, tile_size: float | None = None):
+        """Downloads buildings for the live extents and computes morphometrics, optionally in parallel tiles"""
+        extents_geom, _, working_crs = _read_extents(in_paths["extents"])
+        with profiling.stage("osm_download"):
+            bldgs_gdf = osm_cache.features_from_polygon(
+                _extents_wgs(extents_geom, working_crs), tags={"building": True}
+            )
+        bldgs_gdf = bldgs_gdf[bldgs_gdf.index.get_level_values("element_type") == "way"]
+        bldgs_gdf = bldgs_gdf.reset_index(level="element_type", drop=True)
+        bldgs_gdf = bldgs_gdf.rename_axis("fid")
+        bldgs_gdf = bldgs_gdf[
+            bldgs_gdf.columns.intersection(["height", "name", "geometry"])
+        ]
+        bldgs_gdf = bldgs_gdf[bldgs_gdf.geom_type.isin(["Polygon", "MultiPolygon"])]
+        bldgs_gdf = bldgs_gdf.to_crs(working_crs)
+        with profiling.stage("morphometrics", buildings=len(bldgs_gdf)):
+            if tile_size is None:
+                bldgs_gdf = morphometrics.compute_morphometrics(bldgs_gdf)
+            else:
+                bldgs_gdf = morphometrics.tiled_morphometrics(bldgs_gdf, tile_size)
+        with profiling.stage("gpkg_write"):
+            bldgs_gdf.rename_geometry("geom").to_file(out_paths["buildings"])
+
+    return stage_buildings
+
+
+def building_stats_stage(cache_dir: pathlib.Path):
+    """Returns the building stats stage with the network assignments cached in cache_dir"""
+
+    def stage_building_stats(
+        in_paths,
+        out_paths,
+        distances: list[int],
+        result_schema: outputs.ResultSchema | None = None,
+    ):
+        """Aggregates the building morphometrics onto the dual nodes in one traversal per node"""
+        bldgs_gdf = gpd.read_file(in_paths["buildings"])
+        points_gdf = aggregation.building_points(bldgs_gdf, aggregation.STATS_COLUMNS)
+        nodes_gdf_dual, network_structure_dual = _read_dual(in_paths["snapshot"])
+        profiling.record(
+            distances=distances,
+            buildings=len(points_gdf),
+            **profiling.network_info(network_structure_dual),
+        )
+        with outputs.ResultWriter(
+            nodes_gdf_dual, out_paths["building_stats"], result_schema=result_schema
+        ) as result_writer:
+            with profiling.stage("compute_stats"):
+                nodes_gdf_dual = aggregation.compute_stats(
+                    points_gdf,
+                    aggregation.STATS_COLUMNS,
+                    nodes_gdf_dual,
+                    network_structure_dual,
+                    distances=distances,
+                    cache_dir=cache_dir,
+                )
+                nodes_gdf_dual = result_writer.add_columns(nodes_gdf_dual)
+            with profiling.stage("write_results"):
+                result_writer.write()
+
+    return stage_building_stats
+
+
+def stage_population(in_paths, out_paths):
+    """Interpolates the population raster at the dual nodes, reading only the window of the buffered extents"""
+    _, extents_geom_buff, _ = _read_extents(in_paths["extents"])
+    nodes_gdf_dual, _network_structure_dual = _read_dual(in_paths["snapshot"])
+    with profiling.stage("sample_population", nodes=len(nodes_gdf_dual)):
+        nodes_gdf_dual = population.population_at_nodes(
+            nodes_gdf_dual, in_paths["raster"], bounds_geom=extents_geom_buff
+        )
+    with profiling.stage("write_results"):
+        outputs.write_geodataframe(nodes_gdf_dual, out_paths["population"])
+
+
+def stage_population_blocks(
+    in_paths, out_paths, population_column: str, area_weighted: bool = False
+):
+    """Sums the population of the blocks within 20m of each dual node, streaming the blocks in chunks"""
+    nodes_gdf_dual, _network_structure_dual = _read_dual(in_paths["snapshot"])
+    with profiling.stage("aggregate_blocks", nodes=len(nodes_gdf_dual)):
+        nodes_gdf_dual = population.aggregate_blocks(
+            nodes_gdf_dual,
+            in_paths["blocks"],
+            population_column=population_column,
+            area_weighted=area_weighted,
+        )
+    with profiling.stage("write_results"):
+        outputs.write_geodataframe(nodes_gdf_dual, out_paths["population_blocks"])
+
+
+def build_pipeline(
+    bounds_path: pathlib.Path | str,
+    out_path: pathlib.Path | str,
+    distances: list[int],
+    osm_cache: cache.OSMCache | None = None,
+    buffer_dist: int = DEFAULT_BUFFER_DIST,
+    simplify: bool = True,
+    landuse_schema: landuses.Schema | None = None,
+    landuse_distances: list[int] | None = None,
+    buildings: bool = False,
+    buildings_tile_size: float | None = None,
+    building_distances: list[int] | None = None,
+    population_raster: pathlib.Path | str | None = None,
+    population_blocks: pathlib.Path | str | None = None,
+    population_blocks_column: str = "Pop2018",
+    population_area_weighted: bool = False,
+    tile_size: float | None = None,
+    sample_fraction: float | None = None,
+    result_schema: outputs.ResultSchema | None = None,
+) -> pipeline.Pipeline:
+    """
+    Builds the stage graph for a boundary file.
+
+    The centrality results are written to out_path. The network is downloaded for the extents buffered by buffer_dist to
+    prevent edge roll-off, with a warning if the largest distance exceeds it. The accessibility stage is only added if a
+    landuse schema is provided, and the buildings stage if buildings is True, with the morphometrics computed in
+    parallel tiles of buildings_tile_size in metres if set. The buildings stage is followed by a stage aggregating the
+    morphometrics onto the dual nodes at building_distances, see src.aggregation. If population_raster is set, e.g. to
+    the 1km Eurostat population grid, a population stage interpolates the raster at the dual nodes, see src.population.
+    If population_blocks is set to a blocks file, e.g. Copernicus Urban Atlas blocks, a population_blocks stage sums the
+    population_blocks_column of the blocks near each dual node, optionally area weighted via population_area_weighted.
+    Set simplify to False to use the raw OSM network. Set tile_size to compute the centralities in parallel tiles of
+    this width in metres, see src.tiling. For exploratory runs, set sample_fraction to estimate the centralities beyond
+    2km from a sample of source nodes, see src.sampling. Set result_schema to only keep some metric families or
+    distances in the results and to store them as float32, see src.outputs.
+    """
+    bounds_path = pathlib.Path(bounds_path)
+    if osm_cache is None:
+        osm_cache = cache.OSMCache(bounds_path.parent / "osm_cache")
+    if max(distances) > buffer_dist:
+        logger.warning(
+            f"The largest distance {max(distances)} exceeds the extents buffer {buffer_dist}, "
+            "centralities near the boundary will be affected by edge roll-off."
+        )
+    working_path = bounds_path.with_suffix("")
+    extents_path = working_path / "extents.gpkg"
+    graph_path = working_path / "network.pkl.gz"
+    snapshot_path = working_path / "network_dual.snapshot"
+    stages = [
+        pipeline.Stage(
+            "extent",
+            stage_extent,
+            inputs={"bounds": bounds_path},
+            outputs={"extents": extents_path},
+            params={"buffer_dist": buffer_dist},
+        ),
+        pipeline.Stage(
+            "network",
+            network_stage(osm_cache),
+            inputs={"extents": extents_path},
+            outputs={"graph": graph_path},
+            params={"simplify": simplify},
+        ),
+        pipeline.Stage(
+            "dual",
+            stage_dual,
+            inputs={"extents": extents_path, "graph": graph_path},
+            outputs={
+                "nodes": working_path / "network_nodes_dual.gpkg",
+                "edges": working_path / "network_edges_dual.gpkg",
+                "snapshot": snapshot_path,
+            },
+        ),
+        pipeline.Stage(
+            "centrality",
+            stage_centrality,
+            inputs={"snapshot": snapshot_path},
+            outputs={"centrality": out_path},
+            params={
+                "distances": distances,
+                "tile_size": tile_size,
+                "sample_fraction": sample_fraction,
+                "result_schema": result_schema,
+            },
+        ),
+    ]
+    if landuse_schema is not None:
+        stages.append(
+            pipeline.Stage(
+                "accessibility",
+                accessibility_stage(osm_cache),
+                inputs={"extents": extents_path, "snapshot": snapshot_path},
+                outputs={
+                    "landuses": working_path / "landuses.gpkg",
+                    "accessibility": working_path / "landuse_access.parquet",
+                },
+                params={
+                    "distances": landuse_distances or [100, 200, 500, 1000, 2000],
+                    "schema": landuse_schema,
+                    "result_schema": result_schema,
+                },
+            )
+        )
+    if buildings:
+        stages.append(
+            pipeline.Stage(
+                "buildings",
+                buildings_stage(osm_cache),
+                inputs={"extents": extents_path},
+                outputs={"buildings": working_path / "buildings.gpkg"},
+                params={"tile_size": buildings_tile_size},
+            )
+        )
+        stages.append(
+            pipeline.Stage(
+                "building_stats",
+                building_stats_stage(working_path / "assignment_cache"),
+                inputs={
+                    "buildings": working_path / "buildings.gpkg",
+                    "snapshot": snapshot_path,
+                },
+                outputs={"building_stats": working_path / "building_stats.parquet"},
+                params={
+                    "distances": building_distances or [100, 200, 500, 1000, 2000],
+                    "result_schema": result_schema,
+                },
+            )
+        )
+    if population_raster is not None:
+        stages.append(
+            pipeline.Stage(
+                "population",
+                stage_population,
+                inputs={
+                    "extents": extents_path,
+                    "snapshot": snapshot_path,
+                    "raster": pathlib.Path(population_raster),
+                },
+                outputs={"population": working_path / "population.parquet"},
+            )
+        )
+    if population_blocks is not None:
+        stages.append(
+            pipeline.Stage(
+                "population_blocks",
+                stage_population_blocks,
+                inputs={
+                    "snapshot": snapshot_path,
+                    "blocks": pathlib.Path(population_blocks),
+                },
+                outputs={
+                    "population_blocks": working_path / "population_blocks.parquet"
+                },
+                params={
+                    "population_column": population_blocks_column,
+                    "area_weighted": population_area_weighted,
+                },
+            )
+        )
+    return pipeline.Pipeline(working_path, stages)
+
+
+def process_bounds(
+    bounds_path: pathlib.Path | str,
+    out_path: pathlib.Path | str,
+    distances: list[int],
+    osm_cache: cache.OSMCache | None = None,
+    run_report: pathlib.Path | str | None = None,
+    profiler: profiling.Profiler | None = None,
+    **kwargs,
+) -> dict[str, str]:
+    """
+    Runs the stages for a boundary file, skipping stages that are up to date, and returns each stage's status.
+
+    Set run_report to a JSON path to record per-stage timings, memory, and graph sizes, see src.profiling. Set profiler
+    to "cprofile" or "pyinstrument" to also dump a profile of the slowest stage next to the report.
+    """
+    bounds_path = pathlib.Path(bounds_path)
+    if osm_cache is None:
+        osm_cache = cache.OSMCache(bounds_path.parent / "osm_cache")
+    stage_graph = build_pipeline(
+        bounds_path, out_path, distances, osm_cache=osm_cache, **kwargs
+    )
+    if run_report is None and profiler is None:
+        statuses = stage_graph.run()
+    else:
+        if run_report is None:
+            run_report = stage_graph.work_dir / "run_report.json"
+        with profiling.RunProfiler(
+            bounds_path.stem, report_path=run_report, profiler=profiler
+        ) as run_profiler:
+            statuses = stage_graph.run()
+            run_profiler.record(distances=distances, statuses=statuses)
+    osm_cache.report()
+    return statuses
+
+
+def estimate_node_count(
+    bounds_path: pathlib.Path | str,
+    buffer_dist: int = DEFAULT_BUFFER_DIST,
+    nodes_per_km2: float = DEFAULT_NODES_PER_KM2,
+) -> int:
+    """
+    Estimates the number of dual nodes for a boundary file.
+
+    Uses the node count of an existing dual snapshot from a previous run if available, otherwise the area of the
+    buffered extents multiplied by the node density.
+    """
+    bounds_path = pathlib.Path(bounds_path)
+    meta_path = bounds_path.with_suffix("") / "network_dual.snapshot" / "meta.json"
+    if meta_path.exists():
+        with open(meta_path) as meta_file:
+            return json.load(meta_file)["node_count"]
+    extents_gpd = gpd.read_file(bounds_path)
+    _extents_geom, extents_geom_buff = boundaries.prepare_extents(
+        extents_gpd, buffer_dist, simplify_dist=0
     )
-    nodes_gdf_dual = networks.node_centrality_simplest(
-        network_structure_dual,
-        nodes_gdf_dual,
-        distances=distances,
+    return int(extents_geom_buff.area / 1000**2 * nodes_per_km2)
+
+
+def process_bounds_batch(
+    bounds: pathlib.Path | str | list[pathlib.Path | str],
+    out_dir: pathlib.Path | str,
+    distances: list[int],
+    memory_budget_mb: float | None = None,
+    max_workers: int | None = None,
+    retries: int = 1,
+    nodes_per_km2: float = DEFAULT_NODES_PER_KM2,
+    report_path: pathlib.Path | str | None = None,
+    **kwargs,
+) -> dict:
+    """
+    Runs process_bounds concurrently for a directory of GPKG boundary files or a list of boundary files.
+
+    Results are written to out_dir as {boundary name}_centrality.parquet. Jobs are admitted to the process pool by
+    their estimated peak memory, see src.batch. The throughput report is returned and written to report_path,
+    defaulting to batch_report.json in out_dir. Other kwargs are passed to process_bounds.
+    """
+    if isinstance(bounds, (str, pathlib.Path)):
+        bounds_paths = sorted(pathlib.Path(bounds).glob("*.gpkg"))
+    else:
+        bounds_paths = [pathlib.Path(p) for p in bounds]
+    if not bounds_paths:
+        raise IOError(f"No boundary files found for: {bounds}")
+    out_dir = pathlib.Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    buffer_dist = kwargs.get("buffer_dist", DEFAULT_BUFFER_DIST)
+    jobs = []
+    for bounds_path in bounds_paths:
+        node_count = estimate_node_count(bounds_path, buffer_dist, nodes_per_km2)
+        jobs.append(
+            batch.BatchJob(
+                name=bounds_path.stem,
+                kwargs={
+                    "bounds_path": bounds_path,
+                    "out_path": out_dir / f"{bounds_path.stem}_centrality.parquet",
+                    "distances": distances,
+                    **kwargs,
+                },
+                memory_mb=batch.estimate_peak_memory_mb(node_count, max(distances)),
+            )
+        )
+    return batch.run_batch(
+        process_bounds,
+        jobs,
+        memory_budget_mb=memory_budget_mb,
+        max_workers=max_workers,
+        retries=retries,
+        report_path=report_path or out_dir / "batch_report.json",
     )
-    nodes_gdf_dual.to_file(out_path)
 
 
 if __name__ == "__main__":
+    # only when run as a script, as composite_batch and the batch workers import this module
+    logging.basicConfig(level=logging.INFO)
     bounds_path = "./temp/AbuDhabi_boundary.gpkg"
-    out_path = "./temp/AbuDhabi_auto_clean_centrality.gpkg"
+    out_path = "./temp/AbuDhabi_auto_clean_centrality.parquet"
     distances = [400, 800, 1200, 2000, 5000, 10000]
     process_bounds(bounds_path, out_path, distances)
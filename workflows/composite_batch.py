@@ -0,0 +1,77 @@
+"""
+Runs the composite workflow for many boundary files in a memory-aware process pool.
+
+From the workflows folder, e.g.:
+PYTHONPATH=.. python composite_batch.py ../temp/boundaries ../temp/results --distances 400 800 1200 2000 5000 10000
+
+Each boundary file gets its own working folder next to it, so rerunning a batch skips the stages that are up to date.
+"""
+
+import argparse
+import logging
+
+from composite import process_bounds_batch
+
+from src import outputs
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("bounds_dir", help="directory of projected GPKG boundaries")
+    parser.add_argument("out_dir", help="directory for the results and batch report")
+    parser.add_argument("--distances", type=int, nargs="+", required=True)
+    parser.add_argument(
+        "--memory-budget-mb",
+        type=float,
+        default=None,
+        help="defaults to 80%% of the available memory",
+    )
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--retries", type=int, default=1)
+    parser.add_argument(
+        "--tile-size",
+        type=float,
+        default=None,
+        help="compute centralities in parallel tiles of this width in metres",
+    )
+    parser.add_argument(
+        "--sample-fraction",
+        type=float,
+        default=None,
+        help="estimate centralities beyond 2km from this fraction of source nodes",
+    )
+    parser.add_argument(
+        "--metrics",
+        nargs="+",
+        default=None,
+        help=f"metric families or keys to keep, families are: {', '.join(outputs.METRIC_FAMILIES)}",
+    )
+    parser.add_argument(
+        "--keep-distances",
+        type=int,
+        nargs="+",
+        default=None,
+        help="only keep metrics for these distances",
+    )
+    parser.add_argument(
+        "--float32",
+        action="store_true",
+        help="store metrics as float32 where precision allows",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    result_schema = None
+    if args.metrics or args.keep_distances or args.float32:
+        result_schema = outputs.ResultSchema(
+            metrics=args.metrics, distances=args.keep_distances, float32=args.float32
+        )
+    process_bounds_batch(
+        args.bounds_dir,
+        args.out_dir,
+        args.distances,
+        memory_budget_mb=args.memory_budget_mb,
+        max_workers=args.max_workers,
+        retries=args.retries,
+        tile_size=args.tile_size,
+        sample_fraction=args.sample_fraction,
+        result_schema=result_schema,
+    )
@@ -1,11 +1,15 @@
 """ Runs centrality on a pre-cleaned network."""
 
 # %%
+import logging
 import os
 
 import geopandas as gpd
 from cityseer.metrics import networks
-from cityseer.tools import graphs, io
+
+from src import dual, primal
+
+logging.basicConfig(level=logging.INFO)
 
 os.getcwd()
 
@@ -14,13 +18,11 @@ os.getcwd()
 edges_gdf_custom = gpd.read_file(f"../temp/pedieos_1.gpkg")
 
 # %%
-# generate the primal nx
-G_clean_nx = io.nx_from_generic_geopandas(edges_gdf_custom)
-# generate the dual
-G_clean_nx_dual = graphs.nx_to_dual(G_clean_nx)
-# generate the dual network structure
-nodes_gdf_dual, edges_gdf_dual, network_structure_dual = io.network_structure_from_nx(
-    G_clean_nx_dual, crs=32636
+# generate the primal edges
+primal_clean = primal.primal_edges(edges_gdf_custom)
+# generate the dual network structure directly from the primal edges
+nodes_gdf_dual, edges_gdf_dual, network_structure_dual = dual.network_structure_dual(
+    primal_clean, crs=32636
 )
 
 # %%
@@ -0,0 +1,81 @@
+# %%
+import logging
+
+import geopandas as gpd
+
+from src import aggregation, outputs, profiling, snapshot
+
+logging.basicConfig(level=logging.INFO)
+
+# location key for naming files
+location_key = "nicosia"
+# output format for results - "parquet" keeps the line and point geoms as native geometry columns
+# use "gpkg" for QGIS versions that cannot open GeoParquet
+output_format = "parquet"
+# optionally only keep some stats columns or distances, and store metrics as float32 where precision allows
+# e.g. outputs.ResultSchema(metrics=["area", "shared_walls_ratio"], distances=[500, 1000])
+result_schema = None
+# the assignment of buildings to the network is cached here and reused while the network and buildings are unchanged
+assignment_cache_dir = "../temp/assignment_cache"
+# set to True to write per-stage timings and memory use to a JSON run report, see src/profiling.py
+profile_run = False
+run_profiler = profiling.RunProfiler(
+    f"{location_key}_building_stats",
+    report_path=f"../temp/{location_key}_building_stats_run_report.json",
+)
+if profile_run:
+    run_profiler.start()
+
+# %%
+# requires the snapshot saved by the download workflow and the buildings saved by download_buildings.py
+nodes_dual_path = f"../temp/{location_key}_network_raw_nodes_dual.gpkg"
+edges_dual_path = f"../temp/{location_key}_network_raw_edges_dual.gpkg"
+snapshot_path = f"../temp/{location_key}_network_raw_dual.snapshot"
+if not snapshot.snapshot_is_current(snapshot_path, [nodes_dual_path, edges_dual_path]):
+    raise IOError(
+        f"The network snapshot {snapshot_path} is missing or stale, rerun the download workflow."
+    )
+nodes_gdf_dual, network_structure_dual = snapshot.read_network_snapshot(snapshot_path)
+# use the primal edge geoms so that results can be visualised as lines instead of points
+nodes_gdf_dual = nodes_gdf_dual.rename(columns={"geom": "point_geom"})
+nodes_gdf_dual = nodes_gdf_dual.set_geometry("primal_edge").rename_geometry(
+    "line_geometry"
+)
+
+# %%
+# the buildings are aggregated from their centroids
+bldgs_gdf = gpd.read_file(f"../temp/{location_key}_buildings.gpkg")
+points_gdf = aggregation.building_points(bldgs_gdf, aggregation.STATS_COLUMNS)
+
+# %%
+# compute the sum, mean, count, variance, max, and min of each morphometric in one traversal per node
+distances = [100, 200, 500, 1000, 2000]
+profiling.record(
+    distances=distances,
+    buildings=len(points_gdf),
+    **profiling.network_info(network_structure_dual),
+)
+with profiling.stage("compute_stats"):
+    nodes_gdf_dual = aggregation.compute_stats(
+        points_gdf,
+        aggregation.STATS_COLUMNS,
+        nodes_gdf_dual,
+        network_structure_dual,
+        distances=distances,
+        cache_dir=assignment_cache_dir,
+    )
+
+# %%
+# save to file
+with profiling.stage("write_results"):
+    outputs.write_geodataframe(
+        nodes_gdf_dual,
+        f"../temp/{location_key}_building_stats",
+        output_format,
+        result_schema=result_schema,
+    )
+
+# %%
+# write the run report
+if profile_run:
+    run_profiler.stop()
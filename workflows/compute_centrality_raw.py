@@ -1,68 +1,115 @@
 # %%
-import geopandas as gpd
+import logging
+
 from cityseer.metrics import networks
 from cityseer.tools import graphs, io
-from shapely.wkt import loads
+
+from src import outputs, profiling, readers, snapshot
+
+logging.basicConfig(level=logging.INFO)
 
 # location key for naming files
 location_key = "nicosia"
+# output format for results - "parquet" keeps the line and point geoms as native geometry columns
+# use "gpkg" for QGIS versions that cannot open GeoParquet
+output_format = "parquet"
+# optionally only keep some metric families or distances, and store metrics as float32 where precision allows
+# e.g. outputs.ResultSchema(metrics=["shortest_closeness", "betweenness"], distances=[1000, 5000])
+result_schema = None
+distances = [500, 1000, 2000, 5000, 10000]
+# set to True to write per-stage timings and memory use to a JSON run report, see src/profiling.py
+profile_run = False
+run_profiler = profiling.RunProfiler(
+    f"{location_key}_centrality_raw",
+    report_path=f"../temp/{location_key}_centrality_raw_run_report.json",
+)
+if profile_run:
+    run_profiler.start()
 
 # %%
-# read the dataframes and set the indices
-# when GPD are converted to GPKG the indices are converted to a column called "index"
-nodes_gdf_dual_in = gpd.read_file(f"../temp/{location_key}_network_raw_nodes_dual.gpkg")
-nodes_gdf_dual_in = nodes_gdf_dual_in.set_index("index")
-edges_gdf_dual_in = gpd.read_file(f"../temp/{location_key}_network_raw_edges_dual.gpkg")
-edges_gdf_dual_in = edges_gdf_dual_in.set_index("index")
-
-# %%
-# since the GPD were saved and reloaded network structure needs to be recreated
-dual_nx = io.nx_from_cityseer_geopandas(nodes_gdf_dual_in, edges_gdf_dual_in)
-# apply edge weightings - this weights-down nodes based on duplicitous / parallel segments
-# this is used instead of algorithmic cleaning
-dual_nx_wt = graphs.nx_weight_by_dissolved_edges(dual_nx)
-# generate the network structure
-nodes_gdf_dual, edges_gdf_dual, network_structure_dual = io.network_structure_from_nx(
-    dual_nx_wt, crs=6312
+# the download workflow saves a binary snapshot of the network structure next to the GPKG files
+# use the snapshot if it is current, otherwise recreate the network structure from the GPKG files
+nodes_dual_path = f"../temp/{location_key}_network_raw_nodes_dual.gpkg"
+edges_dual_path = f"../temp/{location_key}_network_raw_edges_dual.gpkg"
+snapshot_path = f"../temp/{location_key}_network_raw_dual.snapshot"
+use_snapshot = snapshot.snapshot_is_current(
+    snapshot_path, [nodes_dual_path, edges_dual_path]
 )
+
 # %%
-# manually copy across primal edge geoms
-# this is done so that results can be visualised as lines instead of points
-nodes_gdf_dual = nodes_gdf_dual.merge(
-    nodes_gdf_dual_in[["primal_edge_geom"]],
-    left_index=True,
-    right_index=True,
-    how="left",
-)
-# these were stored as WKT geometry so load to shapely geoms
-nodes_gdf_dual["line_geometry"] = nodes_gdf_dual["primal_edge_geom"].apply(loads)
+if use_snapshot:
+    # use the dissolved edge weights computed by the download workflow
+    nodes_gdf_dual, network_structure_dual = snapshot.read_network_snapshot(
+        snapshot_path, weight_key="dissolved_weight"
+    )
+    # the primal edge geoms are stored in the snapshot so do not need to be parsed from WKT
+    nodes_gdf_dual = nodes_gdf_dual.rename(columns={"primal_edge": "line_geometry"})
+else:
+    # read the dataframes and set the indices
+    # when GPD are converted to GPKG the indices are converted to a column called "index"
+    # only read the columns needed for recreating the network
+    nodes_gdf_dual_in = readers.read_layer(
+        nodes_dual_path, columns=readers.CITYSEER_NODE_COLUMNS
+    )
+    nodes_gdf_dual_in = nodes_gdf_dual_in.set_index("index")
+    edges_gdf_dual_in = readers.read_layer(
+        edges_dual_path, columns=readers.CITYSEER_EDGE_COLUMNS
+    )
+    edges_gdf_dual_in = edges_gdf_dual_in.set_index("index")
+    # since the GPD were saved and reloaded network structure needs to be recreated
+    dual_nx = io.nx_from_cityseer_geopandas(nodes_gdf_dual_in, edges_gdf_dual_in)
+    # apply edge weightings - this weights-down nodes based on duplicitous / parallel segments
+    # this is used instead of algorithmic cleaning
+    dual_nx_wt = graphs.nx_weight_by_dissolved_edges(dual_nx)
+    # generate the network structure
+    (
+        nodes_gdf_dual,
+        edges_gdf_dual,
+        network_structure_dual,
+    ) = io.network_structure_from_nx(dual_nx_wt, crs=6312)
+    # manually copy across primal edge geoms
+    # this is done so that results can be visualised as lines instead of points
+    # the primal edge geoms are the layer geometry of the dual nodes GPKG
+    nodes_gdf_dual["line_geometry"] = nodes_gdf_dual_in.geometry.reindex(
+        nodes_gdf_dual.index
+    )
 # Set this new column as the main geometry column
 nodes_gdf_dual.set_geometry("line_geometry", inplace=True)
 # set the CRS
 nodes_gdf_dual["line_geometry"].set_crs("EPSG:6312", inplace=True)
-# GPKG can only handle a single official geom column
-# copy old geom column to point_geom as WKT
-nodes_gdf_dual["point_geom"] = nodes_gdf_dual["geom"].to_wkt()
-# drop old geom column
-nodes_gdf_dual = nodes_gdf_dual.drop(columns=["geom"])
+# keep the dual node points as a second geometry column
+# GeoParquet stores both natively, the GPKG writer converts the points to WKT
+nodes_gdf_dual = nodes_gdf_dual.rename(columns={"geom": "point_geom"})
 
 # %%
 # run shortest path centrality
-nodes_gdf_dual = networks.node_centrality_shortest(
-    network_structure_dual,
-    nodes_gdf_dual,
-    distances=[500, 1000, 2000, 5000, 10000],
-    jitter_scale=20,
-)
+profiling.record(distances=distances, **profiling.network_info(network_structure_dual))
+with profiling.stage("node_centrality_shortest"):
+    nodes_gdf_dual = networks.node_centrality_shortest(
+        network_structure_dual,
+        nodes_gdf_dual,
+        distances=distances,
+        jitter_scale=20,
+    )
 # run simplest path centrality
-nodes_gdf_dual = networks.node_centrality_simplest(
-    network_structure_dual,
-    nodes_gdf_dual,
-    distances=[500, 1000, 2000, 5000, 10000],
-    jitter_scale=20,
-)
+with profiling.stage("node_centrality_simplest"):
+    nodes_gdf_dual = networks.node_centrality_simplest(
+        network_structure_dual,
+        nodes_gdf_dual,
+        distances=distances,
+        jitter_scale=20,
+    )
 
 # save
-nodes_gdf_dual.to_file(f"../temp/{location_key}_network_centrality_raw.gpkg")
+with profiling.stage("write_results"):
+    outputs.write_geodataframe(
+        nodes_gdf_dual,
+        f"../temp/{location_key}_network_centrality_raw",
+        output_format,
+        result_schema=result_schema,
+    )
 
-# %%
\ No newline at end of file
+# %%
+# write the run report
+if profile_run:
+    run_profiler.stop()
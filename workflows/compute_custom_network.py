@@ -1,25 +1,26 @@
 """ Runs centrality on a pre-cleaned network."""
 
 # %%
+import logging
+
 import geopandas as gpd
 from cityseer.metrics import networks
-from cityseer.tools import graphs, io
+
+from src import dual, primal
+
+logging.basicConfig(level=logging.INFO)
 
 # %%
 # open custom file
-edges_gdf_input = gpd.read_file(f"../temp/AbuDhabi.gpkg")
-edges_gdf_custom = edges_gdf_input.explode(ignore_index=True)
-edges_gdf_custom.reset_index(drop=True, inplace=True)
+edges_gdf_custom = gpd.read_file(f"../temp/AbuDhabi.gpkg")
 edges_gdf_custom
 
 # %%
-# generate the primal nx
-G_clean_nx = io.nx_from_generic_geopandas(edges_gdf_custom)
-# generate the dual
-G_clean_nx_dual = graphs.nx_to_dual(G_clean_nx)
-# generate the dual network structure
-nodes_gdf_dual, edges_gdf_dual, network_structure_dual = io.network_structure_from_nx(
-    G_clean_nx_dual, crs=32636
+# generate the primal edges - MultiLineStrings are split into their parts, so there is no need to explode first
+primal_clean = primal.primal_edges(edges_gdf_custom)
+# generate the dual network structure directly from the primal edges
+nodes_gdf_dual, edges_gdf_dual, network_structure_dual = dual.network_structure_dual(
+    primal_clean, crs=32636
 )
 
 # %%
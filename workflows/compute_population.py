@@ -0,0 +1,86 @@
+# %%
+import logging
+
+import geopandas as gpd
+
+from src import boundaries, outputs, population, profiling, snapshot
+
+logging.basicConfig(level=logging.INFO)
+
+# location key for naming files
+location_key = "nicosia"
+# the population raster, e.g. the 1km Eurostat census grid, see population_density.md
+# only the window covering the buffered boundary is read, so the Europe-wide file can be used directly
+raster_path = "../temp/JRC_1K_POP_2018.tif"
+# optionally also sum the population of Copernicus Urban Atlas blocks near each node, see population_density.md
+# the blocks file is streamed in chunks, so the whole country file can be used directly
+blocks_path = None  # e.g. "../temp/CY001L1_LEFKOSIA_UA2018_v013.gpkg"
+blocks_population_column = "Pop2018"
+# set to True to split each block's population between nearby nodes by area instead of counting it for every node
+blocks_area_weighted = False
+# output format for results - "parquet" keeps the line and point geoms as native geometry columns
+# use "gpkg" for QGIS versions that cannot open GeoParquet
+output_format = "parquet"
+# set to True to write per-stage timings and memory use to a JSON run report, see src/profiling.py
+profile_run = False
+run_profiler = profiling.RunProfiler(
+    f"{location_key}_population",
+    report_path=f"../temp/{location_key}_population_run_report.json",
+)
+if profile_run:
+    run_profiler.start()
+
+# %%
+# requires the snapshot saved by the download workflow
+nodes_dual_path = f"../temp/{location_key}_network_raw_nodes_dual.gpkg"
+edges_dual_path = f"../temp/{location_key}_network_raw_edges_dual.gpkg"
+snapshot_path = f"../temp/{location_key}_network_raw_dual.snapshot"
+if not snapshot.snapshot_is_current(snapshot_path, [nodes_dual_path, edges_dual_path]):
+    raise IOError(
+        f"The network snapshot {snapshot_path} is missing or stale, rerun the download workflow."
+    )
+nodes_gdf_dual, network_structure_dual = snapshot.read_network_snapshot(snapshot_path)
+# use the primal edge geoms so that results can be visualised as lines instead of points
+nodes_gdf_dual = nodes_gdf_dual.rename(columns={"geom": "point_geom"})
+nodes_gdf_dual = nodes_gdf_dual.set_geometry("primal_edge").rename_geometry(
+    "line_geometry"
+)
+
+# %%
+# the raster window covers the boundary buffered by 1km, as for the clipping step in QGIS
+extents_gpd = gpd.read_file(f"../temp/{location_key}_boundary.gpkg")
+_, extents_geom_buff = boundaries.prepare_extents(
+    extents_gpd, buffer_dist=1000, to_crs=nodes_gdf_dual.crs
+)
+
+# %%
+# interpolate the population at the nodes, replacing the warp and sample steps in QGIS
+# the values are persons per 1km2 pixel for the Eurostat grid
+with profiling.stage("sample_population", nodes=len(nodes_gdf_dual)):
+    nodes_gdf_dual = population.population_at_nodes(
+        nodes_gdf_dual, raster_path, bounds_geom=extents_geom_buff
+    )
+
+# %%
+# sum the population of the blocks within 20m of each node, replacing the buffer, join, and virtual layer steps in QGIS
+if blocks_path is not None:
+    with profiling.stage("aggregate_blocks", nodes=len(nodes_gdf_dual)):
+        nodes_gdf_dual = population.aggregate_blocks(
+            nodes_gdf_dual,
+            blocks_path,
+            population_column=blocks_population_column,
+            buffer_dist=20,
+            area_weighted=blocks_area_weighted,
+        )
+
+# %%
+# save to file
+with profiling.stage("write_results"):
+    outputs.write_geodataframe(
+        nodes_gdf_dual, f"../temp/{location_key}_population", output_format
+    )
+
+# %%
+# write the run report
+if profile_run:
+    run_profiler.stop()
@@ -1,10 +1,19 @@
 # %%
+import logging
+
 import geopandas as gpd
-import momepy
-from osmnx import features
+
+from src import cache, morphometrics
+
+logging.basicConfig(level=logging.INFO)
 
 # location key for naming files
 location_key = "nicosia"
+# set a tile width in metres to compute the morphometrics in parallel tiles, e.g. 1000 for city-scale data
+# tiles are computed in separate processes, so run the cells interactively rather than as a script
+tile_size = None
+# cache OSM downloads so that reruns for the same extents are not refetched
+osm_cache = cache.OSMCache()
 
 # %%
 # recreate the boundary from the extents file
@@ -14,7 +23,7 @@ extents_gpd = gpd.read_file(f"../temp/{location_key}_boundary.gpkg")
 extents_geom_wgs = extents_gpd.iloc[0].geometry
 
 # %%
-bldgs_gdf = features.features_from_polygon(extents_geom_wgs, tags={"building": True})
+bldgs_gdf = osm_cache.features_from_polygon(extents_geom_wgs, tags={"building": True})
 # extract ways
 bldgs_gdf = bldgs_gdf[bldgs_gdf.index.get_level_values("element_type") == "way"]
 # remove double index
@@ -32,16 +41,19 @@ bldgs_gdf = bldgs_gdf[bldgs_gdf["geometry"].type.isin(["Polygon", "MultiPolygon"
 # project
 bldgs_gdf = bldgs_gdf.to_crs(6312)
 # %%
-# calculate momepy stats
+# calculate morphometrics: area, perimeter, circular and square compactness, shared walls, and shared walls ratio
 # these are some examples, see the momepy docs for more options
-bldgs_gdf["area"] = momepy.Area(bldgs_gdf).series
-bldgs_gdf["perimeter"] = momepy.Perimeter(bldgs_gdf).series
-bldgs_gdf["circular_compact"] = momepy.CircularCompactness(bldgs_gdf).series
-bldgs_gdf["square_compactness"] = momepy.SquareCompactness(bldgs_gdf).series
-bldgs_gdf["shared_walls"] = momepy.SharedWalls(bldgs_gdf).series
-bldgs_gdf["shared_walls_ratio"] = momepy.SharedWallsRatio(bldgs_gdf, "perimeter").series
+# the tiled computation gives identical results, see src/morphometrics.py
+if tile_size is None:
+    bldgs_gdf = morphometrics.compute_morphometrics(bldgs_gdf)
+else:
+    bldgs_gdf = morphometrics.tiled_morphometrics(bldgs_gdf, tile_size)
 # rename to geom
 bldgs_gdf = bldgs_gdf.rename_geometry("geom")
 # %%
 # save to file
 bldgs_gdf.to_file(f"../temp/{location_key}_buildings.gpkg")
+
+# %%
+# report OSM cache hits and misses
+osm_cache.report()
@@ -11,13 +11,27 @@ Once happy with the network, continue with STEP 2
 """
 
 # %%
+import logging
+
 import geopandas as gpd
-from cityseer.tools import graphs, io
-from pyproj import Transformer
-from shapely import geometry
+from cityseer.tools import io
+
+from src import boundaries, cache, dual, primal, profiling, snapshot, util
+
+logging.basicConfig(level=logging.INFO)
 
 # location key for naming files
 location_key = "cyprus"
+# cache OSM downloads so that reruns for the same extents are not refetched
+osm_cache = cache.OSMCache()
+# set to True to write per-stage timings and memory use to a JSON run report, see src/profiling.py
+profile_run = False
+run_profiler = profiling.RunProfiler(
+    f"{location_key}_download_network_clean",
+    report_path=f"../temp/{location_key}_download_network_clean_run_report.json",
+)
+if profile_run:
+    run_profiler.start()
 
 # read the extents file
 extents_gpd = gpd.read_file(f"../temp/{location_key}_boundary.gpkg")
@@ -26,46 +40,33 @@ extents_gpd
 # %%
 # STEP 1 - fetch and clean the network
 
-# the input GPD has a single row representing the boundary
-# fetch the row's geometry as a shapely geom
-extents_geom_wgs = extents_gpd.iloc[0].geometry
-
-# if the polygon is in a geographic coordinate system, e.g. WGS84 / EPSG:4326
-# then convert it to a locally suitable projected CRS before buffering
-# Define the coordinate transformation:
-# - in this case the input geom is from OSM via EPSG:4326
-# - in this case the output geom can uses EPSG:6312 which is appropriate for Cyprus
-transformer = Transformer.from_crs("EPSG:4326", "EPSG:6312", always_xy=True)
-# Apply the transformation to each point in the Polygon
-extents_geom = geometry.Polygon(
-    [transformer.transform(x, y) for x, y in extents_geom_wgs.exterior.coords]
-)
-
-# simplify the geometry, otherwise the OSM API might complain of overly long URIs
-extents_geom = extents_geom.convex_hull.simplify(100)
-
-# buffer by the largest distance to be used for the largest centralities or accessibility analysis
+# the input GPD represents the boundary in WGS84 / EPSG:4326, as geocoded from OSM
+# convert it to a locally suitable projected CRS before buffering
+# - in this case EPSG:6312 which is appropriate for Cyprus
+# all rows, parts, and holes are reprojected, then the convex hull is simplified by 100m
+# otherwise the OSM API might complain of overly long URIs
+# the buffered extents add the largest distance to be used for the centralities or accessibility analysis
 # This is not technically necessary for the Cyprus example because it is an island.
-extents_geom_buff = extents_geom.buffer(10000)
+extents_geom, extents_geom_buff = boundaries.prepare_extents(
+    extents_gpd, buffer_dist=10000, to_crs=6312
+)
 
 # %%
 # this will download the OSM network with full simplification
 # specify the input and output EPSG CRS appropriate to the case
 # this is returned as a networkX graph
 # set simplify to False so that the steps can be done manually per below
-G_clean = io.osm_graph_from_poly(
-    extents_geom_buff,
-    simplify=True,
-    poly_crs_code=6312,
-    to_crs_code=6312,
-)
+with profiling.stage("osm_download"):
+    G_clean = osm_cache.osm_graph_from_poly(
+        extents_geom_buff,
+        simplify=True,
+        poly_crs_code=6312,
+        to_crs_code=6312,
+    )
+    profiling.record(**profiling.graph_info(G_clean))
 # set nodes to live where they intersect the original boundary
 # nodes outside of this are only used for preventing edge roll-off
-for nd_key, nd_data in G_clean.nodes(data=True):
-    if extents_geom.contains(geometry.Point(nd_data["x"], nd_data["y"])):
-        G_clean.nodes[nd_key]["live"] = True
-    else:
-        G_clean.nodes[nd_key]["live"] = False
+G_clean = util.mark_live_nodes(G_clean, extents_geom)
 G_clean
 
 
@@ -78,18 +79,44 @@ edges_gdf_primal = io.geopandas_from_nx(G_clean, crs=6312)
 
 # %%
 # save primal to GPKG and do inspection or further cleaning from QGIS
-edges_gdf_primal.to_file(f"../temp/{location_key}_network_clean_edges_primal.gpkg")
+with profiling.stage("gpkg_write_primal"):
+    edges_gdf_primal.to_file(f"../temp/{location_key}_network_clean_edges_primal.gpkg")
 
 # %%
 # dual representations can be preferable for visualisation
 # in this case: cast the graph to dual, then attach the original primal edges for visualisation
-G_clean_nx_dual = graphs.nx_to_dual(G_clean)
-(
-    nodes_gdf_dual,
-    edges_gdf_dual,
-    _network_structure_dual,
-) = io.network_structure_from_nx(G_clean_nx_dual, crs=6312)
+# the dual is built from the primal edge arrays, see src/dual.py
+with profiling.stage("network_structure_dual"):
+    (
+        nodes_gdf_dual,
+        edges_gdf_dual,
+        network_structure_dual,
+    ) = dual.network_structure_dual(primal.primal_from_nx(G_clean), crs=6312)
+    profiling.record(**profiling.network_info(network_structure_dual))
 
 # %% save dual to GPKG
-nodes_gdf_dual.to_file(f"../temp/{location_key}_network_clean_nodes_dual.gpkg")
-edges_gdf_dual.to_file(f"../temp/{location_key}_network_clean_edges_dual.gpkg")
+with profiling.stage("gpkg_write_dual"):
+    nodes_gdf_dual.to_file(f"../temp/{location_key}_network_clean_nodes_dual.gpkg")
+    edges_gdf_dual.to_file(f"../temp/{location_key}_network_clean_edges_dual.gpkg")
+
+# %%
+# save a binary snapshot of the dual network structure
+# the compute workflows load this directly instead of rebuilding from the GPKG files
+# if the GPKG files are later edited in QGIS then the snapshot is ignored as stale
+snapshot.write_network_snapshot(
+    f"../temp/{location_key}_network_clean_dual.snapshot",
+    network_structure_dual,
+    nodes_gdf_dual,
+    crs=6312,
+    source_paths=[
+        f"../temp/{location_key}_network_clean_nodes_dual.gpkg",
+        f"../temp/{location_key}_network_clean_edges_dual.gpkg",
+    ],
+)
+
+# %%
+# report OSM cache hits and misses
+osm_cache.report()
+# write the run report
+if profile_run:
+    run_profiler.stop()
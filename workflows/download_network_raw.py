@@ -1,55 +1,55 @@
 # %%
+import logging
+
 import geopandas as gpd
 from cityseer.tools import graphs, io
-from pyproj import Transformer
-from shapely import geometry
+
+from src import boundaries, cache, dual, primal, profiling, snapshot, util
+
+logging.basicConfig(level=logging.INFO)
 
 # location key for naming files
 location_key = "nicosia"
+# cache OSM downloads so that reruns for the same extents are not refetched
+osm_cache = cache.OSMCache()
+# set to True to write per-stage timings and memory use to a JSON run report, see src/profiling.py
+profile_run = False
+run_profiler = profiling.RunProfiler(
+    f"{location_key}_download_network_raw",
+    report_path=f"../temp/{location_key}_download_network_raw_run_report.json",
+)
+if profile_run:
+    run_profiler.start()
 
 # read the extents file
 extents_gpd = gpd.read_file(f"../temp/{location_key}_boundary.gpkg")
 extents_gpd
 
 # %%
-# the input GPD has a single row representing the boundary
-# fetch the row's geometry as a shapely geom
-extents_geom_wgs = extents_gpd.iloc[0].geometry
-
-# if the polygon is in a geographic coordinate system, e.g. WGS84 / EPSG:4326
-# then convert it to a locally suitable projected CRS before buffering
-# Define the coordinate transformation:
-# - in this case the input geom is from OSM via EPSG:4326
-# - in this case the output geom can uses EPSG:6312 which is appropriate for the EU
-transformer = Transformer.from_crs("EPSG:4326", "EPSG:6312", always_xy=True)
-# Apply the transformation to each point in the Polygon
-extents_geom = geometry.Polygon(
-    [transformer.transform(x, y) for x, y in extents_geom_wgs.exterior.coords]
-)
-
-# simplify the geometry, otherwise the OSM API migth complain of overly long URIs
-extents_geom = extents_geom.convex_hull.simplify(100)
-extents_geom.buffer(2000)
-
-# buffer by the largest distance to be used for the largest centralities or accessibility analysis
+# the input GPD represents the boundary in WGS84 / EPSG:4326, as geocoded from OSM
+# convert it to a locally suitable projected CRS before buffering
+# - in this case EPSG:6312 which is appropriate for the EU
+# all rows, parts, and holes are reprojected, then the convex hull is simplified by 100m
+# otherwise the OSM API might complain of overly long URIs
+# the buffered extents add the largest distance to be used for the centralities or accessibility analysis
 # This is not technically necessary for the Cyprus example because it is an island.
-extents_geom_buff = extents_geom.buffer(10000)
+extents_geom, extents_geom_buff = boundaries.prepare_extents(
+    extents_gpd, buffer_dist=10000, to_crs=6312
+)
 
 # %%
 # this will download the OSM network with minimal simplification
 # specify the input and output EPSG CRS appropriate to the case
 # this is returned as a networkX graph
-G_raw_nx = io.osm_graph_from_poly(
-    extents_geom_buff, simplify=False, poly_crs_code=6312, to_crs_code=6312
-)
+with profiling.stage("osm_download"):
+    G_raw_nx = osm_cache.osm_graph_from_poly(
+        extents_geom_buff, simplify=False, poly_crs_code=6312, to_crs_code=6312
+    )
+    profiling.record(**profiling.graph_info(G_raw_nx))
 # %%
 # set nodes to live where they intersect the original boundary
 # nodes outside of this are only used for preventing edge roll-off
-for nd_key, nd_data in G_raw_nx.nodes(data=True):
-    if extents_geom.contains(geometry.Point(nd_data["x"], nd_data["y"])):
-        G_raw_nx.nodes[nd_key]["live"] = True
-    else:
-        G_raw_nx.nodes[nd_key]["live"] = False
+G_raw_nx = util.mark_live_nodes(G_raw_nx, extents_geom)
 G_raw_nx
 
 # %%
@@ -62,19 +62,52 @@ G_raw_nx
 ) = io.network_structure_from_nx(G_raw_nx, crs=6312)
 
 # %% save primal to GPKG
-nodes_gdf_primal.to_file(f"../temp/{location_key}_network_raw_nodes_primal.gpkg")
-edges_gdf_primal.to_file(f"../temp/{location_key}_network_raw_edges_primal.gpkg")
+with profiling.stage("gpkg_write_primal"):
+    nodes_gdf_primal.to_file(f"../temp/{location_key}_network_raw_nodes_primal.gpkg")
+    edges_gdf_primal.to_file(f"../temp/{location_key}_network_raw_edges_primal.gpkg")
 
 # %%
 # dual representations can be preferable for visualisation
 # in this case: cast the graph to dual, then attach the original primal edges for visualisation
-G_raw_nx_dual = graphs.nx_to_dual(G_raw_nx)
-(
-    nodes_gdf_dual,
-    edges_gdf_dual,
-    _network_structure_dual,
-) = io.network_structure_from_nx(G_raw_nx_dual, crs=6312)
+# the dual is built from the primal edge arrays, which is much faster than graphs.nx_to_dual for raw networks
+with profiling.stage("network_structure_dual"):
+    (
+        nodes_gdf_dual,
+        edges_gdf_dual,
+        network_structure_dual,
+    ) = dual.network_structure_dual(primal.primal_from_nx(G_raw_nx), crs=6312)
+    profiling.record(**profiling.network_info(network_structure_dual))
 
 # %% save dual to GPKG
-nodes_gdf_dual.to_file(f"../temp/{location_key}_network_raw_nodes_dual.gpkg")
-edges_gdf_dual.to_file(f"../temp/{location_key}_network_raw_edges_dual.gpkg")
+with profiling.stage("gpkg_write_dual"):
+    nodes_gdf_dual.to_file(f"../temp/{location_key}_network_raw_nodes_dual.gpkg")
+    edges_gdf_dual.to_file(f"../temp/{location_key}_network_raw_edges_dual.gpkg")
+
+# %%
+# save a binary snapshot of the dual network structure
+# the compute workflows load this directly instead of rebuilding from the GPKG files
+# the raw centrality workflow weights nodes by dissolved edges, so compute these weights up front
+with profiling.stage("dissolved_weights"):
+    G_raw_nx_dual = dual.nx_from_dual(nodes_gdf_dual, edges_gdf_dual)
+    G_raw_nx_dual_wt = graphs.nx_weight_by_dissolved_edges(G_raw_nx_dual)
+    dissolved_weights = [
+        G_raw_nx_dual_wt.nodes[nd_key]["weight"] for nd_key in nodes_gdf_dual.index
+    ]
+snapshot.write_network_snapshot(
+    f"../temp/{location_key}_network_raw_dual.snapshot",
+    network_structure_dual,
+    nodes_gdf_dual,
+    crs=6312,
+    source_paths=[
+        f"../temp/{location_key}_network_raw_nodes_dual.gpkg",
+        f"../temp/{location_key}_network_raw_edges_dual.gpkg",
+    ],
+    extra_node_arrays={"dissolved_weight": dissolved_weights},
+)
+
+# %%
+# report OSM cache hits and misses
+osm_cache.report()
+# write the run report
+if profile_run:
+    run_profiler.stop()